@@ -5,6 +5,7 @@ import json
 import traceback
 from datetime import datetime, timezone
 import uuid
+from collections import Counter
 from typing import Optional, List, Dict, Any
 import jwt
 from pydantic import BaseModel
@@ -12,13 +13,17 @@ import tempfile
 import os
 
 from agentpress.thread_manager import ThreadManager
+from agentpress.chunk_coalescer import coalesce_responses
 from services.supabase import DBConnection
 from services import redis
 from agent.run import run_agent
+from agent.run_archive import pending_archive, schedule_archive
+from agent.run_control import RunControlWatcher
 from utils.auth_utils import get_current_user_id, get_user_id_from_stream_auth, verify_thread_access
 from utils.logger import logger
+from utils.config import config
 from utils.billing import check_billing_status, get_account_id_from_thread
-from sandbox.sandbox import create_sandbox, get_or_start_sandbox
+from sandbox.sandbox import create_sandbox_async, get_or_start_sandbox_async
 from services.llm import make_llm_api_call
 
 # Initialize shared resources
@@ -26,9 +31,16 @@ router = APIRouter()
 thread_manager = None
 db = None
 instance_id = None # Global instance ID for this backend instance
+control_watcher = None # Shared control-channel subscriber for this instance's runs
 
-# TTL for Redis response lists (24 hours)
-REDIS_RESPONSE_LIST_TTL = 3600 * 24
+# Redis stream holding each run's responses: trimmed to about MAXLEN entries while
+# the run is active, expired a while after it ends
+REDIS_RESPONSE_STREAM_MAXLEN = 20000
+REDIS_RESPONSE_STREAM_TTL = 3600 * 24
+STREAM_READ_COUNT = 500
+STREAM_READ_BLOCK_MS = 2000  # Below the Redis client's socket timeout
+TERMINAL_STATUSES = ('completed', 'failed', 'stopped')
+RUN_SUMMARY_ERROR_CHARS = 2000  # The full error and traceback stay in agent_runs.error
 
 MODEL_NAME_ALIASES = {
     "sonnet-3.7": "anthropic/claude-3-7-sonnet-latest",
@@ -45,6 +57,7 @@ class AgentStartRequest(BaseModel):
     reasoning_effort: Optional[str] = 'low'
     stream: Optional[bool] = True
     enable_context_manager: Optional[bool] = False
+    parallel_tool_calls: Optional[bool] = False
 
 class InitiateAgentResponse(BaseModel):
     thread_id: str
@@ -56,9 +69,10 @@ def initialize(
     _instance_id: str = None
 ):
     """Initialize the agent API with resources from the main API."""
-    global thread_manager, db, instance_id
+    global thread_manager, db, instance_id, control_watcher
     thread_manager = _thread_manager
     db = _db
+    control_watcher = RunControlWatcher(heartbeat=_refresh_active_runs)
 
     # Use provided instance_id or generate a new one
     if _instance_id:
@@ -75,26 +89,31 @@ async def cleanup():
     """Clean up resources and stop running agents on shutdown."""
     logger.info("Starting cleanup of agent API resources")
 
-    # Use the instance_id to find and clean up this instance's keys
+    # Use the instance_id to find and clean up this instance's runs
     try:
         if instance_id: # Ensure instance_id is set
-            running_keys = await redis.keys(f"active_run:{instance_id}:*")
-            logger.info(f"Found {len(running_keys)} running agent runs for instance {instance_id} to clean up")
-
-            for key in running_keys:
-                # Key format: active_run:{instance_id}:{agent_run_id}
-                parts = key.split(":")
-                if len(parts) == 3:
-                    agent_run_id = parts[2]
-                    await stop_agent_run(agent_run_id, error_message=f"Instance {instance_id} shutting down")
-                else:
-                    logger.warning(f"Unexpected key format found: {key}")
+            running_run_ids = await redis.smembers(_instance_runs_key(instance_id))
+            logger.info(f"Found {len(running_run_ids)} running agent runs for instance {instance_id} to clean up")
+
+            for agent_run_id in running_run_ids:
+                await stop_agent_run(agent_run_id, error_message=f"Instance {instance_id} shutting down")
         else:
             logger.warning("Instance ID not set, cannot clean up instance-specific agent runs.")
 
     except Exception as e:
         logger.error(f"Failed to clean up running agent runs: {str(e)}")
 
+    # Persist any write-behind messages before shutting down
+    try:
+        if thread_manager:
+            await thread_manager.flush_messages()
+    except Exception as e:
+        logger.error(f"Failed to flush buffered messages on shutdown: {str(e)}")
+
+    # Stop listening for control signals
+    if control_watcher:
+        await control_watcher.close()
+
     # Close Redis connection
     await redis.close()
     logger.info("Completed cleanup of agent API resources")
@@ -104,10 +123,12 @@ async def update_agent_run_status(
     agent_run_id: str,
     status: str,
     error: Optional[str] = None,
-    responses: Optional[List[Any]] = None # Expects parsed list of dicts
+    summary: Optional[Dict[str, Any]] = None
 ) -> bool:
     """
     Centralized function to update agent run status.
+    The responses themselves stay in the Redis stream (and its archive);
+    the run record only gets a compact summary (see _run_summary).
     Returns True if update was successful.
     """
     try:
@@ -119,9 +140,8 @@ async def update_agent_run_status(
         if error:
             update_data["error"] = error
 
-        if responses:
-            # Ensure responses are stored correctly as JSONB
-            update_data["responses"] = responses
+        if summary:
+            update_data["summary"] = summary
 
         # Retry up to 3 times
         for retry in range(3):
@@ -162,54 +182,40 @@ async def stop_agent_run(agent_run_id: str, error_message: Optional[str] = None)
     client = await db.client
     final_status = "failed" if error_message else "stopped"
 
-    # Attempt to fetch final responses from Redis
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    all_responses = []
+    # Count the responses without reading them; the stream itself is kept until its TTL
+    response_count = None
     try:
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
-        logger.info(f"Fetched {len(all_responses)} responses from Redis for DB update on stop/fail: {agent_run_id}")
+        response_count = await redis.xlen(_response_stream_key(agent_run_id))
     except Exception as e:
-        logger.error(f"Failed to fetch responses from Redis for {agent_run_id} during stop/fail: {e}")
-        # Try fetching from DB as a fallback? Or proceed without responses? Proceeding without for now.
+        logger.error(f"Failed to count responses in Redis for {agent_run_id} during stop/fail: {e}")
 
     # Update the agent run status in the database
     update_success = await update_agent_run_status(
-        client, agent_run_id, final_status, error=error_message, responses=all_responses
+        client, agent_run_id, final_status, error=error_message,
+        summary=_run_summary(agent_run_id, final_status, response_count, last_error=error_message)
     )
 
     if not update_success:
         logger.error(f"Failed to update database status for stopped/failed run {agent_run_id}")
 
-    # Send STOP signal to the global control channel
-    global_control_channel = f"agent_run:{agent_run_id}:control"
-    try:
-        await redis.publish(global_control_channel, "STOP")
-        logger.debug(f"Published STOP signal to global channel {global_control_channel}")
-    except Exception as e:
-        logger.error(f"Failed to publish STOP signal to global channel {global_control_channel}: {str(e)}")
+    # Send STOP signal to the global control channel and to stream viewers
+    await _publish_control_signal(agent_run_id, "STOP")
 
     # Find all instances handling this agent run and send STOP to instance-specific channels
     try:
-        instance_keys = await redis.keys(f"active_run:*:{agent_run_id}")
-        logger.debug(f"Found {len(instance_keys)} active instance keys for agent run {agent_run_id}")
+        run_instance_ids = await redis.smembers(_run_instances_key(agent_run_id))
+        logger.debug(f"Found {len(run_instance_ids)} active instances for agent run {agent_run_id}")
 
-        for key in instance_keys:
-            # Key format: active_run:{instance_id}:{agent_run_id}
-            parts = key.split(":")
-            if len(parts) == 3:
-                instance_id_from_key = parts[1]
-                instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_from_key}"
-                try:
-                    await redis.publish(instance_control_channel, "STOP")
-                    logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
-                except Exception as e:
-                    logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
-            else:
-                 logger.warning(f"Unexpected key format found: {key}")
+        for instance_id_for_run in run_instance_ids:
+            instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id_for_run}"
+            try:
+                await redis.publish(instance_control_channel, "STOP")
+                logger.debug(f"Published STOP signal to instance channel {instance_control_channel}")
+            except Exception as e:
+                logger.warning(f"Failed to publish STOP signal to instance channel {instance_control_channel}: {str(e)}")
 
-        # Clean up the response list immediately on stop/fail
-        await _cleanup_redis_response_list(agent_run_id)
+        # Clean up the response stream immediately on stop/fail
+        await _cleanup_redis_response_stream(agent_run_id)
 
     except Exception as e:
         logger.error(f"Failed to find or signal active instances for {agent_run_id}: {str(e)}")
@@ -217,14 +223,96 @@ async def stop_agent_run(agent_run_id: str, error_message: Optional[str] = None)
     logger.info(f"Successfully initiated stop process for agent run: {agent_run_id}")
 
 
-async def _cleanup_redis_response_list(agent_run_id: str):
-    """Set TTL on the Redis response list."""
-    response_list_key = f"agent_run:{agent_run_id}:responses"
+def _response_stream_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:response_stream"
+
+def _response_fields(response: Dict[str, Any]) -> Dict[str, str]:
+    """Stream entry fields of a response.
+
+    Status responses also carry their status as a separate field, so stream
+    readers can spot the end of a run without decoding every entry.
+    """
+    fields = {"data": json.dumps(response)}
+    if response.get('type') == 'status' and response.get('status'):
+        fields["status"] = response['status']
+    return fields
+
+async def _append_response(agent_run_id: str, response: Dict[str, Any]) -> str:
+    """Append a response to the run's Redis stream and return its entry id."""
+    return await redis.xadd(_response_stream_key(agent_run_id), _response_fields(response), maxlen=REDIS_RESPONSE_STREAM_MAXLEN)
+
+async def _append_responses(agent_run_id: str, responses: List[Dict[str, Any]]) -> Optional[str]:
+    """Append a batch of responses to the run's Redis stream in one round trip.
+
+    Returns:
+        The entry id of the last response
+    """
+    if len(responses) == 1:
+        return await _append_response(agent_run_id, responses[0])
+    stream_key = _response_stream_key(agent_run_id)
+    pipe = await redis.pipeline()
+    for response in responses:
+        pipe.xadd(stream_key, _response_fields(response), maxlen=REDIS_RESPONSE_STREAM_MAXLEN, approximate=True)
+    entry_ids = await pipe.execute()
+    return entry_ids[-1] if entry_ids else None
+
+async def _read_responses(agent_run_id: str) -> List[Dict[str, Any]]:
+    """Read all responses of a run from its Redis stream."""
+    entries = await redis.xrange(_response_stream_key(agent_run_id))
+    return [json.loads(fields["data"]) for _, fields in entries if "data" in fields]
+
+def _run_summary(
+    agent_run_id: str,
+    final_status: str,
+    response_count: Optional[int],
+    last_error: Optional[str] = None,
+    response_types: Optional[Dict[str, int]] = None,
+    last_entry_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Compact record of a finished run's responses, stored in agent_runs.summary.
+
+    Points to the run's response stream (kept for REDIS_RESPONSE_STREAM_TTL) and,
+    when retention is enabled, marks its compressed archive as pending. The
+    archive task records where the archive is once it has been uploaded.
+    """
+    summary = {
+        "final_status": final_status,
+        "response_count": response_count,
+        "last_error": last_error[:RUN_SUMMARY_ERROR_CHARS] if last_error else None,
+        "stream": {
+            "key": _response_stream_key(agent_run_id),
+            "last_entry_id": last_entry_id,
+            "ttl_seconds": REDIS_RESPONSE_STREAM_TTL,
+        },
+        "archive": None,
+    }
+    if response_types:
+        summary["response_types"] = response_types
+    if config.AGENT_RUN_ARCHIVE_ENABLED:
+        summary["archive"] = pending_archive(agent_run_id)
+    return summary
+
+async def _publish_control_signal(agent_run_id: str, signal: str):
+    """Send a control signal to the run's global control channel and its stream viewers."""
+    global_control_channel = f"agent_run:{agent_run_id}:control"
+    try:
+        await redis.publish(global_control_channel, signal)
+        logger.debug(f"Published {signal} signal to global channel {global_control_channel}")
+    except Exception as e:
+        logger.error(f"Failed to publish {signal} signal to global channel {global_control_channel}: {str(e)}")
+    try:
+        await redis.xadd(_response_stream_key(agent_run_id), {"control": signal}, maxlen=REDIS_RESPONSE_STREAM_MAXLEN)
+    except Exception as e:
+        logger.error(f"Failed to append {signal} signal to response stream of {agent_run_id}: {str(e)}")
+
+async def _cleanup_redis_response_stream(agent_run_id: str):
+    """Set TTL on the Redis response stream."""
+    stream_key = _response_stream_key(agent_run_id)
     try:
-        await redis.expire(response_list_key, REDIS_RESPONSE_LIST_TTL)
-        logger.debug(f"Set TTL ({REDIS_RESPONSE_LIST_TTL}s) on response list: {response_list_key}")
+        await redis.expire(stream_key, REDIS_RESPONSE_STREAM_TTL)
+        logger.debug(f"Set TTL ({REDIS_RESPONSE_STREAM_TTL}s) on response stream: {stream_key}")
     except Exception as e:
-        logger.warning(f"Failed to set TTL on response list {response_list_key}: {str(e)}")
+        logger.warning(f"Failed to set TTL on response stream {stream_key}: {str(e)}")
 
 async def restore_running_agent_runs():
     """Mark agent runs that were still 'running' in the database as failed."""
@@ -263,19 +351,87 @@ async def get_agent_run_with_access_check(client, agent_run_id: str, user_id: st
     await verify_thread_access(client, thread_id, user_id)
     return agent_run_data
 
+def _instance_runs_key(instance_id_for_key: str) -> str:
+    """Set of agent runs executing on an instance."""
+    return f"instance_runs:{instance_id_for_key}"
+
+def _run_instances_key(agent_run_id: str) -> str:
+    """Set of instances executing an agent run."""
+    return f"run_instances:{agent_run_id}"
+
+async def _register_active_run(agent_run_id: str):
+    """Mark an agent run as active on this instance.
+
+    Sets the TTL'd active_run key and adds the run to the index sets used to
+    find an instance's runs and a run's instances without scanning keys.
+    """
+    key = f"active_run:{instance_id}:{agent_run_id}"
+    pipe = await redis.pipeline(transaction=True)
+    pipe.set(key, "running", ex=redis.REDIS_KEY_TTL)
+    pipe.sadd(_instance_runs_key(instance_id), agent_run_id)
+    pipe.expire(_instance_runs_key(instance_id), redis.REDIS_KEY_TTL)
+    pipe.sadd(_run_instances_key(agent_run_id), instance_id)
+    pipe.expire(_run_instances_key(agent_run_id), redis.REDIS_KEY_TTL)
+    await pipe.execute()
+
+async def _refresh_active_runs(agent_run_ids: List[str]):
+    """Refresh the TTLs of this instance's active run keys and index sets in one round trip."""
+    pipe = await redis.pipeline()
+    pipe.expire(_instance_runs_key(instance_id), redis.REDIS_KEY_TTL)
+    for agent_run_id in agent_run_ids:
+        pipe.expire(f"active_run:{instance_id}:{agent_run_id}", redis.REDIS_KEY_TTL)
+        pipe.expire(_run_instances_key(agent_run_id), redis.REDIS_KEY_TTL)
+    await pipe.execute()
+
 async def _cleanup_redis_instance_key(agent_run_id: str):
-    """Clean up the instance-specific Redis key for an agent run."""
+    """Clean up the instance-specific Redis key and index entries for an agent run."""
     if not instance_id:
         logger.warning("Instance ID not set, cannot clean up instance key.")
         return
     key = f"active_run:{instance_id}:{agent_run_id}"
     logger.debug(f"Cleaning up Redis instance key: {key}")
     try:
-        await redis.delete(key)
+        pipe = await redis.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.srem(_instance_runs_key(instance_id), agent_run_id)
+        pipe.srem(_run_instances_key(agent_run_id), instance_id)
+        await pipe.execute()
         logger.debug(f"Successfully cleaned up Redis key: {key}")
     except Exception as e:
         logger.warning(f"Failed to clean up Redis key {key}: {str(e)}")
 
+async def migrate_active_run_keys() -> int:
+    """Index active_run keys written before the run index sets existed.
+
+    Uses SCAN, so Redis is not blocked while the keyspace is walked. Safe to
+    run repeatedly; entries already indexed are left unchanged.
+
+    Returns:
+        Number of keys indexed
+    """
+    indexed = 0
+    try:
+        pipe = await redis.pipeline()
+        async for key in redis.scan_keys("active_run:*"):
+            # Key format: active_run:{instance_id}:{agent_run_id}
+            parts = key.split(":")
+            if len(parts) != 3:
+                logger.warning(f"Unexpected key format found: {key}")
+                continue
+            _, instance_id_from_key, agent_run_id = parts
+            pipe.sadd(_instance_runs_key(instance_id_from_key), agent_run_id)
+            pipe.expire(_instance_runs_key(instance_id_from_key), redis.REDIS_KEY_TTL)
+            pipe.sadd(_run_instances_key(agent_run_id), instance_id_from_key)
+            pipe.expire(_run_instances_key(agent_run_id), redis.REDIS_KEY_TTL)
+            indexed += 1
+            if indexed % 500 == 0:
+                await pipe.execute()
+        await pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to index active run keys: {str(e)}")
+    logger.info(f"Indexed {indexed} active run keys")
+    return indexed
+
 
 async def get_or_create_project_sandbox(client, project_id: str):
     """Get or create a sandbox for a project."""
@@ -292,7 +448,7 @@ async def get_or_create_project_sandbox(client, project_id: str):
         sandbox_pass = sandbox_info['pass']
         logger.info(f"Project {project_id} already has sandbox {sandbox_id}, retrieving it")
         try:
-            sandbox = get_or_start_sandbox(sandbox_id)
+            sandbox = await get_or_start_sandbox_async(sandbox_id)
             if not sandbox:
                 logger.error(f"get_or_start_sandbox 返回 None, sandbox_id={sandbox_id}")
                 raise Exception(f"get_or_start_sandbox 返回 None, sandbox_id={sandbox_id}")
@@ -304,15 +460,9 @@ async def get_or_create_project_sandbox(client, project_id: str):
 
     logger.info(f"Creating new sandbox for project {project_id}")
     sandbox_pass = str(uuid.uuid4())
-    command = "/usr/bin/supervisord -c /etc/supervisor/conf.d/supervisord.conf"
-    ports = None
-    env = {
-        "VNC_PASSWORD": "vncpassword",
-        "DISPLAY": ":99",
-        "SANDBOX_PASS": sandbox_pass
-    }
     try:
-        sandbox = create_sandbox(command=command, ports=ports, env=env)
+        # 默认命令与环境变量，可直接使用预热池中的容器；sandbox_pass 只保存在项目记录中
+        sandbox = await create_sandbox_async()
     except Exception as e:
         logger.error(f"创建新sandbox失败: {e}")
         raise Exception(f"创建新sandbox失败: {e}")
@@ -365,7 +515,7 @@ async def start_agent(
     if not instance_id:
         raise HTTPException(status_code=500, detail="Agent API not initialized with instance ID")
 
-    logger.info(f"Starting new agent for thread: {thread_id} with config: model={body.model_name}, thinking={body.enable_thinking}, effort={body.reasoning_effort}, stream={body.stream}, context_manager={body.enable_context_manager} (Instance: {instance_id})")
+    logger.info(f"Starting new agent for thread: {thread_id} with config: model={body.model_name}, thinking={body.enable_thinking}, effort={body.reasoning_effort}, stream={body.stream}, context_manager={body.enable_context_manager}, parallel_tools={body.parallel_tool_calls} (Instance: {instance_id})")
     client = await db.client
 
     await verify_thread_access(client, thread_id, user_id)
@@ -403,11 +553,10 @@ async def start_agent(
     logger.info(f"Created new agent run: {agent_run_id}")
 
     # Register this run in Redis with TTL using instance ID
-    instance_key = f"active_run:{instance_id}:{agent_run_id}"
     try:
-        await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+        await _register_active_run(agent_run_id)
     except Exception as e:
-        logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
+        logger.warning(f"Failed to register agent run {agent_run_id} in Redis: {str(e)}")
 
     # Run the agent in the background
     task = asyncio.create_task(
@@ -416,7 +565,8 @@ async def start_agent(
             project_id=project_id, sandbox=sandbox,
             model_name=MODEL_NAME_ALIASES.get(body.model_name, body.model_name),
             enable_thinking=body.enable_thinking, reasoning_effort=body.reasoning_effort,
-            stream=body.stream, enable_context_manager=body.enable_context_manager
+            stream=body.stream, enable_context_manager=body.enable_context_manager,
+            parallel_tool_calls=body.parallel_tool_calls
         )
     )
 
@@ -457,45 +607,69 @@ async def get_agent_run(agent_run_id: str, user_id: str = Depends(get_current_us
         "status": agent_run_data['status'],
         "startedAt": agent_run_data['started_at'],
         "completedAt": agent_run_data['completed_at'],
-        "error": agent_run_data['error']
+        "error": agent_run_data['error'],
+        "summary": agent_run_data.get('summary')
     }
 
+def _stream_event(entry_id: str, fields: Dict[str, str]) -> tuple:
+    """Format a response stream entry as an SSE event.
+
+    Returns:
+        Tuple of (event, is_terminal)
+    """
+    if "control" in fields:
+        data = json.dumps({'type': 'status', 'status': fields["control"]})
+        return f"id: {entry_id}\ndata: {data}\n\n", True
+    # The stored JSON is sent as is, without decoding it per viewer
+    return f"id: {entry_id}\ndata: {fields.get('data', '{}')}\n\n", fields.get("status") in TERMINAL_STATUSES
+
 @router.get("/agent-run/{agent_run_id}/stream")
 async def stream_agent_run(
     agent_run_id: str,
     token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
     request: Request = None
 ):
-    """Stream the responses of an agent run using Redis Lists and Pub/Sub."""
+    """Stream the responses of an agent run from its Redis stream.
+
+    Every event carries its stream entry id. A reconnecting client resumes
+    after the last event it received, given by the Last-Event-ID header (sent
+    by EventSource on reconnect) or the last_event_id query parameter.
+    """
     logger.info(f"Starting stream for agent run: {agent_run_id}")
     client = await db.client
 
     user_id = await get_user_id_from_stream_auth(request, token)
     agent_run_data = await get_agent_run_with_access_check(client, agent_run_id, user_id)
 
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    response_channel = f"agent_run:{agent_run_id}:new_response"
-    control_channel = f"agent_run:{agent_run_id}:control" # Global control channel
+    stream_key = _response_stream_key(agent_run_id)
+    resume_id = (request.headers.get("last-event-id") if request else None) or last_event_id or "0"
 
     async def stream_generator():
-        logger.debug(f"Streaming responses for {agent_run_id} using Redis list {response_list_key} and channel {response_channel}")
-        last_processed_index = -1
-        pubsub_response = None
-        pubsub_control = None
-        listener_task = None
-        terminate_stream = False
+        logger.debug(f"Streaming responses for {agent_run_id} from Redis stream {stream_key} after id {resume_id}")
+        last_id = resume_id
         initial_yield_complete = False
 
+        async def read_entries(block: Optional[int] = None):
+            nonlocal last_id
+            batches = await redis.xread({stream_key: last_id}, count=STREAM_READ_COUNT, block=block)
+            entries = batches[0][1] if batches else []
+            if entries:
+                last_id = entries[-1][0]
+            return entries
+
         try:
-            # 1. Fetch and yield initial responses from Redis list
-            initial_responses_json = await redis.lrange(response_list_key, 0, -1)
-            initial_responses = []
-            if initial_responses_json:
-                initial_responses = [json.loads(r) for r in initial_responses_json]
-                logger.debug(f"Sending {len(initial_responses)} initial responses for {agent_run_id}")
-                for response in initial_responses:
-                    yield f"data: {json.dumps(response)}\n\n"
-                last_processed_index = len(initial_responses) - 1
+            # 1. Send the backlog after the resume id
+            while True:
+                entries = await read_entries()
+                for entry_id, fields in entries:
+                    event, is_terminal = _stream_event(entry_id, fields)
+                    yield event
+                    if is_terminal:
+                        logger.info(f"Agent run {agent_run_id} already ended, closing stream after backlog")
+                        return
+                if len(entries) < STREAM_READ_COUNT:
+                    break
             initial_yield_complete = True
 
             # 2. Check run status *after* yielding initial data
@@ -503,138 +677,32 @@ async def stream_agent_run(
             current_status = run_status.data.get('status') if run_status.data else None
 
             if current_status != 'running':
+                # Send anything written while the status was being checked
+                for entry_id, fields in await read_entries():
+                    yield _stream_event(entry_id, fields)[0]
                 logger.info(f"Agent run {agent_run_id} is not running (status: {current_status}). Ending stream.")
                 yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
                 return
 
-            # 3. Set up Pub/Sub listeners for new responses and control signals
-            pubsub_response = await redis.create_pubsub()
-            await pubsub_response.subscribe(response_channel)
-            logger.debug(f"Subscribed to response channel: {response_channel}")
-
-            pubsub_control = await redis.create_pubsub()
-            await pubsub_control.subscribe(control_channel)
-            logger.debug(f"Subscribed to control channel: {control_channel}")
-
-            # Queue to communicate between listeners and the main generator loop
-            message_queue = asyncio.Queue()
-
-            async def listen_messages():
-                response_reader = pubsub_response.listen()
-                control_reader = pubsub_control.listen()
-                tasks = [asyncio.create_task(response_reader.__anext__()), asyncio.create_task(control_reader.__anext__())]
-
-                while not terminate_stream:
-                    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
-                    for task in done:
-                        try:
-                            message = task.result()
-                            if message and isinstance(message, dict) and message.get("type") == "message":
-                                channel = message.get("channel")
-                                data = message.get("data")
-                                if isinstance(data, bytes): data = data.decode('utf-8')
-
-                                if channel == response_channel and data == "new":
-                                    await message_queue.put({"type": "new_response"})
-                                elif channel == control_channel and data in ["STOP", "END_STREAM", "ERROR"]:
-                                    logger.info(f"Received control signal '{data}' for {agent_run_id}")
-                                    await message_queue.put({"type": "control", "data": data})
-                                    return # Stop listening on control signal
-
-                        except StopAsyncIteration:
-                            logger.warning(f"Listener {task} stopped.")
-                            # Decide how to handle listener stopping, maybe terminate?
-                            await message_queue.put({"type": "error", "data": "Listener stopped unexpectedly"})
-                            return
-                        except Exception as e:
-                            logger.error(f"Error in listener for {agent_run_id}: {e}")
-                            await message_queue.put({"type": "error", "data": "Listener failed"})
-                            return
-                        finally:
-                            # Reschedule the completed listener task
-                            if task in tasks:
-                                tasks.remove(task)
-                                if message and isinstance(message, dict) and message.get("channel") == response_channel:
-                                     tasks.append(asyncio.create_task(response_reader.__anext__()))
-                                elif message and isinstance(message, dict) and message.get("channel") == control_channel:
-                                     tasks.append(asyncio.create_task(control_reader.__anext__()))
-
-                # Cancel pending listener tasks on exit
-                for p_task in pending: p_task.cancel()
-                for task in tasks: task.cancel()
-
-
-            listener_task = asyncio.create_task(listen_messages())
-
-            # 4. Main loop to process messages from the queue
-            while not terminate_stream:
-                try:
-                    queue_item = await message_queue.get()
-
-                    if queue_item["type"] == "new_response":
-                        # Fetch new responses from Redis list starting after the last processed index
-                        new_start_index = last_processed_index + 1
-                        new_responses_json = await redis.lrange(response_list_key, new_start_index, -1)
-
-                        if new_responses_json:
-                            new_responses = [json.loads(r) for r in new_responses_json]
-                            num_new = len(new_responses)
-                            logger.debug(f"Received {num_new} new responses for {agent_run_id} (index {new_start_index} onwards)")
-                            for response in new_responses:
-                                yield f"data: {json.dumps(response)}\n\n"
-                                # Check if this response signals completion
-                                if response.get('type') == 'status' and response.get('status') in ['completed', 'failed', 'stopped']:
-                                    logger.info(f"Detected run completion via status message in stream: {response.get('status')}")
-                                    terminate_stream = True
-                                    break # Stop processing further new responses
-                            last_processed_index += num_new
-                        if terminate_stream: break
-
-                    elif queue_item["type"] == "control":
-                        control_signal = queue_item["data"]
-                        terminate_stream = True # Stop the stream on any control signal
-                        yield f"data: {json.dumps({'type': 'status', 'status': control_signal})}\n\n"
-                        break
-
-                    elif queue_item["type"] == "error":
-                        logger.error(f"Listener error for {agent_run_id}: {queue_item['data']}")
-                        terminate_stream = True
-                        yield f"data: {json.dumps({'type': 'status', 'status': 'error'})}\n\n"
-                        break
-
-                except asyncio.CancelledError:
-                     logger.info(f"Stream generator main loop cancelled for {agent_run_id}")
-                     terminate_stream = True
-                     break
-                except Exception as loop_err:
-                    logger.error(f"Error in stream generator main loop for {agent_run_id}: {loop_err}", exc_info=True)
-                    terminate_stream = True
-                    yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {loop_err}'})}\n\n"
-                    break
+            # 3. Wait for new entries; responses and control signals share the stream
+            while True:
+                for entry_id, fields in await read_entries(block=STREAM_READ_BLOCK_MS):
+                    event, is_terminal = _stream_event(entry_id, fields)
+                    yield event
+                    if is_terminal:
+                        logger.info(f"Detected end of agent run {agent_run_id} in stream")
+                        return
 
+        except asyncio.CancelledError:
+            logger.info(f"Stream generator cancelled for {agent_run_id}")
+            raise
         except Exception as e:
-            logger.error(f"Error setting up stream for agent run {agent_run_id}: {e}", exc_info=True)
-            # Only yield error if initial yield didn't happen
+            logger.error(f"Error streaming agent run {agent_run_id}: {e}", exc_info=True)
             if not initial_yield_complete:
-                 yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
+                yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Failed to start stream: {e}'})}\n\n"
+            else:
+                yield f"data: {json.dumps({'type': 'status', 'status': 'error', 'message': f'Stream failed: {e}'})}\n\n"
         finally:
-            terminate_stream = True
-            # Graceful shutdown order: unsubscribe → close → cancel
-            if pubsub_response: await pubsub_response.unsubscribe(response_channel)
-            if pubsub_control: await pubsub_control.unsubscribe(control_channel)
-            if pubsub_response: await pubsub_response.close()
-            if pubsub_control: await pubsub_control.close()
-
-            if listener_task:
-                listener_task.cancel()
-                try:
-                    await listener_task  # Reap inner tasks & swallow their errors
-                except asyncio.CancelledError:
-                    pass
-                except Exception as e:
-                    logger.debug(f"listener_task ended with: {e}")
-            # Wait briefly for tasks to cancel
-            await asyncio.sleep(0.1)
             logger.debug(f"Streaming cleanup complete for agent run: {agent_run_id}")
 
     return StreamingResponse(stream_generator(), media_type="text/event-stream", headers={
@@ -653,90 +721,89 @@ async def run_agent_background(
     enable_thinking: Optional[bool],
     reasoning_effort: Optional[str],
     stream: bool,
-    enable_context_manager: bool
+    enable_context_manager: bool,
+    parallel_tool_calls: bool = False
 ):
     """Run the agent in the background using Redis for state."""
     logger.debug(f"Starting background agent run: {agent_run_id} for thread: {thread_id} (Instance: {instance_id})")
     client = await db.client
     start_time = datetime.now(timezone.utc)
     total_responses = 0
-    pubsub = None
+    response_types = Counter()
+    last_entry_id = None
+    run_signal = None
     stop_checker = None
     stop_signal_received = False
 
     # Define Redis keys and channels
-    response_list_key = f"agent_run:{agent_run_id}:responses"
-    response_channel = f"agent_run:{agent_run_id}:new_response"
     instance_control_channel = f"agent_run:{agent_run_id}:control:{instance_id}"
     global_control_channel = f"agent_run:{agent_run_id}:control"
-    instance_active_key = f"active_run:{instance_id}:{agent_run_id}"
 
-    async def check_for_stop_signal():
+    async def wait_for_stop_signal():
         nonlocal stop_signal_received
-        if not pubsub: return
         try:
-            while not stop_signal_received:
-                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
-                if message and message.get("type") == "message":
-                    data = message.get("data")
-                    if isinstance(data, bytes): data = data.decode('utf-8')
-                    if data == "STOP":
-                        logger.info(f"Received STOP signal for agent run {agent_run_id} (Instance: {instance_id})")
-                        stop_signal_received = True
-                        break
-                # Periodically refresh the active run key TTL
-                if total_responses % 50 == 0: # Refresh every 50 responses or so
-                    try: await redis.expire(instance_active_key, redis.REDIS_KEY_TTL)
-                    except Exception as ttl_err: logger.warning(f"Failed to refresh TTL for {instance_active_key}: {ttl_err}")
-                await asyncio.sleep(0.1) # Short sleep to prevent tight loop
+            signal = await run_signal.wait()
+            logger.info(f"Received {signal} signal for agent run {agent_run_id} (Instance: {instance_id})")
+            stop_signal_received = True
+            # Kill commands still running in the sandbox so the current tool call returns
+            if sandbox is not None:
+                try: await sandbox.cancel_execs()
+                except Exception as e: logger.warning(f"Failed to cancel sandbox commands for {agent_run_id}: {e}")
         except asyncio.CancelledError:
-            logger.info(f"Stop signal checker cancelled for {agent_run_id} (Instance: {instance_id})")
-        except Exception as e:
-            logger.error(f"Error in stop signal checker for {agent_run_id}: {e}", exc_info=True)
-            stop_signal_received = True # Stop the run if the checker fails
+            logger.debug(f"Stop signal waiter cancelled for {agent_run_id} (Instance: {instance_id})")
 
     try:
-        # Setup Pub/Sub listener for control signals
-        pubsub = await redis.create_pubsub()
-        await pubsub.subscribe(instance_control_channel, global_control_channel)
-        logger.debug(f"Subscribed to control channels: {instance_control_channel}, {global_control_channel}")
-        stop_checker = asyncio.create_task(check_for_stop_signal())
+        # Receive control signals through the instance's shared subscriber
+        run_signal = await control_watcher.watch(agent_run_id, [instance_control_channel, global_control_channel])
+        stop_checker = asyncio.create_task(wait_for_stop_signal())
 
-        # Ensure active run key exists and has TTL
-        await redis.set(instance_active_key, "running", ex=redis.REDIS_KEY_TTL)
+        # Ensure active run key and index entries exist and have TTL
+        await _register_active_run(agent_run_id)
 
         # Initialize agent generator
         agent_gen = run_agent(
             thread_id=thread_id, project_id=project_id, stream=stream,
             thread_manager=thread_manager, model_name=model_name,
             enable_thinking=enable_thinking, reasoning_effort=reasoning_effort,
-            enable_context_manager=enable_context_manager
+            enable_context_manager=enable_context_manager,
+            parallel_tool_calls=parallel_tool_calls
         )
 
         final_status = "running"
         error_message = None
 
-        async for response in agent_gen:
-            if stop_signal_received:
-                logger.info(f"Agent run {agent_run_id} stopped by signal.")
-                final_status = "stopped"
-                break
-
-            # Store response in Redis list and publish notification
-            response_json = json.dumps(response)
-            await redis.rpush(response_list_key, response_json)
-            await redis.publish(response_channel, "new")
-            total_responses += 1
+        # Streamed chunks are merged per time window and written in pipelined batches
+        response_batches = coalesce_responses(
+            agent_gen, window_ms=config.STREAM_CHUNK_WINDOW_MS, max_bytes=config.STREAM_CHUNK_MAX_BYTES
+        )
+        try:
+            async for batch in response_batches:
+                if stop_signal_received:
+                    logger.info(f"Agent run {agent_run_id} stopped by signal.")
+                    final_status = "stopped"
+                    break
 
-            # Check for agent-signaled completion or error
-            if response.get('type') == 'status':
-                 status_val = response.get('status')
-                 if status_val in ['completed', 'failed', 'stopped']:
-                     logger.info(f"Agent run {agent_run_id} finished via status message: {status_val}")
-                     final_status = status_val
-                     if status_val == 'failed' or status_val == 'stopped':
-                         error_message = response.get('message', f"Run ended with status: {status_val}")
-                     break
+                # Check for agent-signaled completion or error; nothing after it belongs to the run
+                for position, response in enumerate(batch):
+                    if response.get('type') == 'status':
+                        status_val = response.get('status')
+                        if status_val in ['completed', 'failed', 'stopped']:
+                            logger.info(f"Agent run {agent_run_id} finished via status message: {status_val}")
+                            final_status = status_val
+                            if status_val == 'failed' or status_val == 'stopped':
+                                error_message = response.get('message', f"Run ended with status: {status_val}")
+                            batch = batch[:position + 1]
+                            break
+
+                # Append responses to the Redis stream; viewers blocked on XREAD pick them up
+                last_entry_id = await _append_responses(agent_run_id, batch)
+                total_responses += len(batch)
+                response_types.update(response.get('type', 'unknown') for response in batch)
+
+                if final_status != "running":
+                    break
+        finally:
+            await response_batches.aclose()
 
         # If loop finished without explicit completion/error/stop signal, mark as completed
         if final_status == "running":
@@ -744,24 +811,20 @@ async def run_agent_background(
              duration = (datetime.now(timezone.utc) - start_time).total_seconds()
              logger.info(f"Agent run {agent_run_id} completed normally (duration: {duration:.2f}s, responses: {total_responses})")
              completion_message = {"type": "status", "status": "completed", "message": "Agent run completed successfully"}
-             await redis.rpush(response_list_key, json.dumps(completion_message))
-             await redis.publish(response_channel, "new") # Notify about the completion message
-
-        # Fetch final responses from Redis for DB update
-        all_responses_json = await redis.lrange(response_list_key, 0, -1)
-        all_responses = [json.loads(r) for r in all_responses_json]
-
-        # Update DB status
-        await update_agent_run_status(client, agent_run_id, final_status, error=error_message, responses=all_responses)
+             last_entry_id = await _append_response(agent_run_id, completion_message)
+             total_responses += 1
+             response_types['status'] += 1
+
+        # Update DB status with a summary; the responses stay in the Redis stream
+        await update_agent_run_status(
+            client, agent_run_id, final_status, error=error_message,
+            summary=_run_summary(agent_run_id, final_status, total_responses, error_message, dict(response_types), last_entry_id)
+        )
 
         # Publish final control signal (END_STREAM or ERROR)
+        # No need to publish to instance channel as the run is ending on this instance
         control_signal = "END_STREAM" if final_status == "completed" else "ERROR" if final_status == "failed" else "STOP"
-        try:
-            await redis.publish(global_control_channel, control_signal)
-            # No need to publish to instance channel as the run is ending on this instance
-            logger.debug(f"Published final control signal '{control_signal}' to {global_control_channel}")
-        except Exception as e:
-            logger.warning(f"Failed to publish final control signal {control_signal}: {str(e)}")
+        await _publish_control_signal(agent_run_id, control_signal)
 
     except Exception as e:
         error_message = str(e)
@@ -770,34 +833,32 @@ async def run_agent_background(
         logger.error(f"Error in agent run {agent_run_id} after {duration:.2f}s: {error_message}\n{traceback_str} (Instance: {instance_id})")
         final_status = "failed"
 
-        # Push error message to Redis list
+        # Push error message to the Redis stream
         error_response = {"type": "status", "status": "error", "message": error_message}
         try:
-            await redis.rpush(response_list_key, json.dumps(error_response))
-            await redis.publish(response_channel, "new")
+            last_entry_id = await _append_response(agent_run_id, error_response)
+            total_responses += 1
+            response_types['status'] += 1
         except Exception as redis_err:
              logger.error(f"Failed to push error response to Redis for {agent_run_id}: {redis_err}")
 
-        # Fetch final responses (including the error)
-        all_responses = []
-        try:
-             all_responses_json = await redis.lrange(response_list_key, 0, -1)
-             all_responses = [json.loads(r) for r in all_responses_json]
-        except Exception as fetch_err:
-             logger.error(f"Failed to fetch responses from Redis after error for {agent_run_id}: {fetch_err}")
-             all_responses = [error_response] # Use the error message we tried to push
-
         # Update DB status
-        await update_agent_run_status(client, agent_run_id, "failed", error=f"{error_message}\n{traceback_str}", responses=all_responses)
+        await update_agent_run_status(
+            client, agent_run_id, "failed", error=f"{error_message}\n{traceback_str}",
+            summary=_run_summary(agent_run_id, "failed", total_responses, error_message, dict(response_types), last_entry_id)
+        )
 
         # Publish ERROR signal
+        await _publish_control_signal(agent_run_id, "ERROR")
+
+    finally:
+        # Persist any write-behind status messages produced by this run
         try:
-            await redis.publish(global_control_channel, "ERROR")
-            logger.debug(f"Published ERROR signal to {global_control_channel}")
+            flushed = await thread_manager.flush_messages()
+            logger.debug(f"Flushed {flushed} buffered messages at end of agent run {agent_run_id}")
         except Exception as e:
-            logger.warning(f"Failed to publish ERROR signal: {str(e)}")
+            logger.warning(f"Failed to flush buffered messages for {agent_run_id}: {str(e)}")
 
-    finally:
         # Cleanup stop checker task
         if stop_checker and not stop_checker.done():
             stop_checker.cancel()
@@ -805,17 +866,15 @@ async def run_agent_background(
             except asyncio.CancelledError: pass
             except Exception as e: logger.warning(f"Error during stop_checker cancellation: {e}")
 
-        # Close pubsub connection
-        if pubsub:
-            try:
-                await pubsub.unsubscribe()
-                await pubsub.close()
-                logger.debug(f"Closed pubsub connection for {agent_run_id}")
-            except Exception as e:
-                logger.warning(f"Error closing pubsub for {agent_run_id}: {str(e)}")
+        # Stop receiving control signals for this run
+        if run_signal:
+            await control_watcher.unwatch(agent_run_id)
+
+        # Set TTL on the response stream in Redis
+        await _cleanup_redis_response_stream(agent_run_id)
 
-        # Set TTL on the response list in Redis
-        await _cleanup_redis_response_list(agent_run_id)
+        # Archive the response stream in the background if retention is enabled
+        schedule_archive(client, agent_run_id, _response_stream_key(agent_run_id))
 
         # Remove the instance-specific active run key
         await _cleanup_redis_instance_key(agent_run_id)
@@ -872,6 +931,7 @@ async def initiate_agent_with_files(
     reasoning_effort: Optional[str] = Form("low"),
     stream: Optional[bool] = Form(True),
     enable_context_manager: Optional[bool] = Form(False),
+    parallel_tool_calls: Optional[bool] = Form(False),
     files: List[UploadFile] = File(default=[]),
     user_id: str = Depends(get_current_user_id)
 ):
@@ -989,11 +1049,10 @@ async def initiate_agent_with_files(
         logger.info(f"Created new agent run: {agent_run_id}")
 
         # Register run in Redis
-        instance_key = f"active_run:{instance_id}:{agent_run_id}"
         try:
-            await redis.set(instance_key, "running", ex=redis.REDIS_KEY_TTL)
+            await _register_active_run(agent_run_id)
         except Exception as e:
-            logger.warning(f"Failed to register agent run in Redis ({instance_key}): {str(e)}")
+            logger.warning(f"Failed to register agent run {agent_run_id} in Redis: {str(e)}")
 
         # Run agent in background
         task = asyncio.create_task(
@@ -1002,7 +1061,8 @@ async def initiate_agent_with_files(
                 project_id=project_id, sandbox=sandbox,
                 model_name=MODEL_NAME_ALIASES.get(model_name, model_name),
                 enable_thinking=enable_thinking, reasoning_effort=reasoning_effort,
-                stream=stream, enable_context_manager=enable_context_manager
+                stream=stream, enable_context_manager=enable_context_manager,
+                parallel_tool_calls=parallel_tool_calls
             )
         )
         task.add_done_callback(lambda _: asyncio.create_task(_cleanup_redis_instance_key(agent_run_id)))
@@ -369,7 +369,7 @@ Your approach is deliberately methodical and persistent:
 
 ## 5.4 TASK MANAGEMENT CYCLE
 1. STATE EVALUATION: Examine Todo.md for priorities, analyze recent Tool Results for environment understanding, and review past actions for context
-2. TOOL SELECTION: Choose exactly one tool that advances the current todo item
+2. TOOL SELECTION: {{tool_selection}}
 3. EXECUTION: Wait for tool execution and observe results
 4. **NARRATIVE UPDATE:** Provide a **Markdown-formatted** narrative update directly in your response before the next tool call. Include explanations of what you've done, what you're about to do, and why. Use headers, brief paragraphs, and formatting to enhance readability.
 5. PROGRESS TRACKING: Update todo.md with completed items and new tasks
@@ -497,11 +497,28 @@ For casual conversation and social interactions:
   * The system will continue running in a loop if completion is not signaled
   * Additional commands after completion are considered errors
   * Redundant verifications after completion are prohibited
+{{parallel_tool_calls}}"""
+
+SINGLE_TOOL_SELECTION = "Choose exactly one tool that advances the current todo item"
+PARALLEL_TOOL_SELECTION = "Choose the tools that advance the current todo item; independent calls may be issued together in one response (see PARALLEL TOOL CALLS)"
+
+PARALLEL_TOOL_CALLS_PROMPT = """
+
+# PARALLEL TOOL CALLS
+- You may issue up to {max_calls} tool calls in one response when they do not depend on each other's results
+- Batch independent lookups, e.g. several web-search or data provider calls, instead of spending a turn on each
+- Calls that change files or run commands are executed in the order you write them; browser actions run one at a time
+- Never issue a call whose input depends on the output of another call in the same response
 """
 
 
-def get_system_prompt():
+def get_system_prompt(parallel_tool_calls: bool = False, max_tool_calls: int = 1):
     '''
-    Returns the system prompt
+    Returns the system prompt, with instructions for issuing several tool calls per response if enabled
     '''
-    return SYSTEM_PROMPT 
\ No newline at end of file
+    if parallel_tool_calls:
+        return SYSTEM_PROMPT.format(
+            tool_selection=PARALLEL_TOOL_SELECTION,
+            parallel_tool_calls=PARALLEL_TOOL_CALLS_PROMPT.format(max_calls=max_tool_calls),
+        )
+    return SYSTEM_PROMPT.format(tool_selection=SINGLE_TOOL_SELECTION, parallel_tool_calls="") 
\ No newline at end of file
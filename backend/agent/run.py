@@ -16,11 +16,14 @@ from agentpress.thread_manager import ThreadManager
 from agentpress.response_processor import ProcessorConfig
 from agent.tools.sb_shell_tool import SandboxShellTool
 from agent.tools.sb_files_tool import SandboxFilesTool
-from agent.tools.sb_browser_tool import SandboxBrowserTool
+from agent.tools.sb_browser_tool import FULL_STATE_EVERY, SandboxBrowserTool
 from agent.tools.data_providers_tool import DataProvidersTool
 from agent.prompt import get_system_prompt
+from sandbox.browser_client import resolve_browser_state
+from sandbox.sandbox import get_or_start_sandbox_async
+from sandbox.screenshots import load_screenshot
 from utils import logger
-from utils.billing import check_billing_status, get_account_id_from_thread
+from utils.billing import RunBillingCheck, get_account_id_from_thread
 
 load_dotenv()
 
@@ -34,9 +37,14 @@ async def run_agent(
     model_name: str = "anthropic/claude-3-7-sonnet-latest",
     enable_thinking: Optional[bool] = False,
     reasoning_effort: Optional[str] = 'low',
-    enable_context_manager: bool = True
+    enable_context_manager: bool = True,
+    parallel_tool_calls: bool = False
 ):
-    """Run the development agent with specified configuration."""
+    """Run the development agent with specified configuration.
+
+    With parallel_tool_calls, the LLM may issue several tool calls per response;
+    independent ones run concurrently while conflicting ones keep their order.
+    """
     
     thread_manager = ThreadManager()
 
@@ -74,17 +82,19 @@ async def run_agent(
     if config.RAPID_API_KEY:
         thread_manager.add_tool(DataProvidersTool)
 
-    system_message = { "role": "system", "content": get_system_prompt() }
+    max_xml_tool_calls = config.AGENT_MAX_PARALLEL_TOOL_CALLS if parallel_tool_calls else 1
+    system_message = { "role": "system", "content": get_system_prompt(parallel_tool_calls, max_xml_tool_calls) }
 
     iteration_count = 0
     continue_execution = True
+    billing_check = RunBillingCheck(client, account_id)
     
     while continue_execution and iteration_count < max_iterations:
         iteration_count += 1
         # logger.debug(f"Running iteration {iteration_count}...")
 
-        # Billing check on each iteration - still needed within the iterations
-        can_run, message, subscription = await check_billing_status(client, account_id)
+        # Billing check at the start of the run and then periodically
+        can_run, message, subscription = await billing_check.check()
         if not can_run:
             error_msg = f"Billing limit reached: {message}"
             # Yield a special message to indicate billing limit reached
@@ -104,17 +114,26 @@ async def run_agent(
                 break
             
         # Get the latest message from messages table that its type is browser_state
-        latest_browser_state = await client.table('messages').select('*').eq('thread_id', thread_id).eq('type', 'browser_state').order('created_at', desc=True).limit(1).execute()
+        latest_browser_state = await client.table('messages').select('content').eq('thread_id', thread_id).eq('type', 'browser_state').order('created_at', desc=True).limit(1).execute()
         temporary_message = None
         if latest_browser_state.data and len(latest_browser_state.data) > 0:
             try:
                 content = json.loads(latest_browser_state.data[0]["content"])
-                screenshot_base64 = content["screenshot_base64"]
+                if content.get('elements_diff'):
+                    # Only the element changes were stored, read back to the last full state
+                    recent_states = await client.table('messages').select('content').eq('thread_id', thread_id).eq('type', 'browser_state').order('created_at', desc=True).limit(FULL_STATE_EVERY + 1).execute()
+                    content = resolve_browser_state([json.loads(row["content"]) for row in recent_states.data])
+                screenshot_base64 = content.get("screenshot_base64")
+                if not screenshot_base64 and content.get("screenshot_path"):
+                    # Screenshot stored in the workspace, the message only holds a reference
+                    sandbox = await get_or_start_sandbox_async(sandbox_info['id'])
+                    screenshot_base64 = await load_screenshot(sandbox, content)
                 # Create a copy of the browser state without screenshot
                 browser_state = content.copy()
-                browser_state.pop('screenshot_base64', None)
-                browser_state.pop('screenshot_url', None) 
-                browser_state.pop('screenshot_url_base64', None)
+                for key in ('screenshot_base64', 'screenshot_url', 'screenshot_url_base64', 'screenshot_hash',
+                            'screenshot_id', 'screenshot_path', 'screenshot_phash', 'screenshot_reused',
+                            'screenshot_phash_distance', 'dom_version', 'elements_diff'):
+                    browser_state.pop(key, None)
                 temporary_message = { "role": "user", "content": [] }
                 if browser_state:
                     temporary_message["content"].append({
@@ -144,7 +163,7 @@ async def run_agent(
             llm_temperature=0,
             llm_max_tokens=max_tokens,
             tool_choice="auto",
-            max_xml_tool_calls=1,
+            max_xml_tool_calls=max_xml_tool_calls,
             temporary_message=temporary_message,
             processor_config=ProcessorConfig(
                 xml_tool_calling=True,
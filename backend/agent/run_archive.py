@@ -0,0 +1,109 @@
+"""
+Compressed archives of agent run response streams.
+
+Finished runs used to read every response of their Redis stream, decode it
+and copy the whole list into agent_runs.responses on the exit path. The run
+record now only carries a compact summary, and when retention is enabled the
+stream is archived in the background instead:
+- Entries are read from the stream in pages and stored without decoding them
+- The archive is gzip-compressed JSON lines, compressed in a worker thread
+- Archives go to a private Supabase storage bucket, one object per run
+- The run's summary marks the archive as pending until the upload is done; the
+  archive task then records it as archived (with its location) or failed
+"""
+
+import asyncio
+import gzip
+from typing import Any, Dict, Optional
+
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+ARCHIVE_READ_COUNT = 1000  # Stream entries read per XRANGE call
+ARCHIVE_ERROR_CHARS = 500  # Length of the upload error kept in the summary
+
+_archive_tasks = set()  # Keeps running archive tasks referenced until they finish
+
+
+def archive_path(agent_run_id: str) -> str:
+    """Storage path of a run's archive within the archive bucket."""
+    return f"{agent_run_id}.jsonl.gz"
+
+
+def pending_archive(agent_run_id: str) -> Dict[str, Any]:
+    """Archive entry of a run summary written before the archive is uploaded."""
+    return {"status": "pending", "bucket": config.AGENT_RUN_ARCHIVE_BUCKET, "path": archive_path(agent_run_id)}
+
+
+async def set_archive(client, agent_run_id: str, archive: Optional[Dict[str, Any]]) -> None:
+    """Set the archive entry of a run's summary, leaving the rest of the summary as is."""
+    try:
+        await client.rpc('set_agent_run_archive', {'p_agent_run_id': agent_run_id, 'p_archive': archive}).execute()
+    except Exception as e:
+        logger.error(f"Failed to record archive of agent run {agent_run_id}: {str(e)}")
+
+
+async def read_stream_data(stream_key: str) -> list:
+    """Read the stored JSON of every response in a stream, skipping control entries."""
+    lines = []
+    start = "-"
+    while True:
+        entries = await redis.xrange(stream_key, min=start, count=ARCHIVE_READ_COUNT)
+        lines.extend(fields["data"] for _, fields in entries if "data" in fields)
+        if len(entries) < ARCHIVE_READ_COUNT:
+            return lines
+        start = f"({entries[-1][0]}"  # Exclusive start after the last entry read
+
+
+async def archive_response_stream(client, agent_run_id: str, stream_key: str) -> Optional[str]:
+    """Store a run's response stream as a compressed archive.
+
+    Args:
+        client: Supabase client
+        agent_run_id: ID of the agent run
+        stream_key: Redis stream holding the run's responses
+
+    The run's summary gets the archive's location once the upload succeeded,
+    is marked failed if it did not, and has no archive if there was nothing
+    to store.
+
+    Returns:
+        The archive's storage path, or None if nothing was archived
+    """
+    try:
+        lines = await read_stream_data(stream_key)
+        if not lines:
+            logger.debug(f"No responses to archive for agent run {agent_run_id}")
+            await set_archive(client, agent_run_id, None)
+            return None
+
+        data = await asyncio.to_thread(gzip.compress, "\n".join(lines).encode())
+        path = archive_path(agent_run_id)
+        await client.storage.from_(config.AGENT_RUN_ARCHIVE_BUCKET).upload(
+            path, data, {"content-type": "application/gzip", "upsert": "true"}
+        )
+        logger.info(f"Archived {len(lines)} responses of agent run {agent_run_id} ({len(data)} bytes)")
+    except Exception as e:
+        logger.error(f"Failed to archive responses of agent run {agent_run_id}: {str(e)}")
+        await set_archive(client, agent_run_id, {"status": "failed", "error": str(e)[:ARCHIVE_ERROR_CHARS]})
+        return None
+
+    await set_archive(client, agent_run_id, {
+        "status": "archived",
+        "bucket": config.AGENT_RUN_ARCHIVE_BUCKET,
+        "path": path,
+        "responses": len(lines),
+        "bytes": len(data),
+    })
+    return path
+
+
+def schedule_archive(client, agent_run_id: str, stream_key: str) -> Optional[asyncio.Task]:
+    """Archive a run's response stream in the background if retention is enabled."""
+    if not config.AGENT_RUN_ARCHIVE_ENABLED:
+        return None
+    task = asyncio.create_task(archive_response_stream(client, agent_run_id, stream_key))
+    _archive_tasks.add(task)
+    task.add_done_callback(_archive_tasks.discard)
+    return task
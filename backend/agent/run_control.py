@@ -0,0 +1,127 @@
+"""
+Control signals and liveness for the agent runs executing on this instance.
+
+Each background run used to open its own pubsub connection, poll it every
+100 ms and refresh its active run key from the same loop, so every running
+agent issued Redis commands several times per second even when idle. One
+watcher per instance now:
+- Subscribes to the control channels of all its runs on the shared pub/sub
+  connection of services.redis
+- Dispatches STOP/END_STREAM/ERROR to a per-run asyncio Event
+- Refreshes the keys of all its runs in one batched heartbeat
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from services import redis
+from utils.logger import logger
+
+CONTROL_SIGNALS = ('STOP', 'END_STREAM', 'ERROR')
+HEARTBEAT_INTERVAL_SECONDS = 60  # Far below redis.REDIS_KEY_TTL
+
+
+class RunSignal:
+    """Control signal received for one agent run."""
+
+    def __init__(self, agent_run_id: str, channels: List[str]):
+        self.agent_run_id = agent_run_id
+        self.channels = channels
+        self.signal: Optional[str] = None
+        self.event = asyncio.Event()
+
+    def set(self, signal: str):
+        if self.signal is None:
+            self.signal = signal
+        self.event.set()
+
+    async def wait(self) -> str:
+        """Wait for a control signal and return it."""
+        await self.event.wait()
+        return self.signal
+
+
+class RunControlWatcher:
+    """Shared control-channel subscriber and heartbeat for an instance's runs."""
+
+    def __init__(
+        self,
+        heartbeat: Callable[[List[str]], Awaitable[None]],
+        heartbeat_interval: float = HEARTBEAT_INTERVAL_SECONDS
+    ):
+        """
+        Args:
+            heartbeat: Called with the ids of all watched runs to refresh their keys
+            heartbeat_interval: Seconds between heartbeats
+        """
+        self.heartbeat = heartbeat
+        self.heartbeat_interval = heartbeat_interval
+        self._runs: Dict[str, RunSignal] = {}
+        self._channels: Dict[str, str] = {}  # channel -> agent_run_id
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def watch(self, agent_run_id: str, channels: List[str]) -> RunSignal:
+        """Start receiving control signals for a run.
+
+        Args:
+            agent_run_id: The run to watch
+            channels: Control channels on which signals for the run are published
+
+        Returns:
+            RunSignal whose event is set when a control signal arrives
+        """
+        run_signal = RunSignal(agent_run_id, channels)
+        self._runs[agent_run_id] = run_signal
+        for channel in channels:
+            self._channels[channel] = agent_run_id
+        await redis.subscribe(channels, self._dispatch)
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        logger.debug(f"Watching control channels for agent run {agent_run_id}: {channels}")
+        return run_signal
+
+    async def unwatch(self, agent_run_id: str):
+        """Stop receiving control signals for a run."""
+        run_signal = self._runs.pop(agent_run_id, None)
+        if run_signal is None:
+            return
+        for channel in run_signal.channels:
+            self._channels.pop(channel, None)
+        try:
+            await redis.unsubscribe(run_signal.channels, self._dispatch)
+        except Exception as e:
+            logger.warning(f"Failed to unsubscribe control channels for {agent_run_id}: {str(e)}")
+
+    def active_runs(self) -> List[str]:
+        """Ids of the runs currently watched."""
+        return list(self._runs)
+
+    async def close(self):
+        """Stop the heartbeat and unsubscribe from the control channels of all runs."""
+        if self._heartbeat_task and not self._heartbeat_task.done():
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+        self._heartbeat_task = None
+        for agent_run_id in self.active_runs():
+            await self.unwatch(agent_run_id)
+
+    def _dispatch(self, channel: str, data: str):
+        run_signal = self._runs.get(self._channels.get(channel))
+        if run_signal is None or data not in CONTROL_SIGNALS:
+            return
+        logger.info(f"Received {data} signal for agent run {run_signal.agent_run_id} on {channel}")
+        run_signal.set(data)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            agent_run_ids = self.active_runs()
+            if not agent_run_ids:
+                continue
+            try:
+                await self.heartbeat(agent_run_ids)
+            except Exception as e:
+                logger.warning(f"Failed to refresh TTLs for {len(agent_run_ids)} agent runs: {str(e)}")
@@ -7,7 +7,7 @@ import logging
 from typing import Optional, Dict, Any, Union
 from PIL import Image
 
-from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
+from agentpress.tool import Tool, ToolAccess, ToolResult, openapi_schema, xml_schema
 from sandbox.sandbox import SandboxToolsBase
 
 KEYBOARD_KEYS = [
@@ -24,6 +24,9 @@ KEYBOARD_KEYS = [
 
 class ComputerUseTool(SandboxToolsBase):
     """Computer automation tool for controlling the sandbox browser and GUI."""
+
+    # Mouse and keyboard actions depend on the screen left by the previous one
+    default_tool_access = ToolAccess.EXCLUSIVE_SANDBOX
     
     def __init__(self, project_id: str, thread_manager=None):
         super().__init__(project_id, thread_manager)
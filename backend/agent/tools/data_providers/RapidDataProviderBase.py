@@ -1,6 +1,37 @@
+"""
+Async HTTP transport for RapidAPI data providers.
+
+Provider calls used to go through blocking requests.get/post without a timeout,
+so one slow endpoint stalled the event loop for every run on the instance.
+Calls are now async and share one pooled HTTP client:
+- Keep-alive connections to the RapidAPI hosts are reused across calls and runs
+- Each provider sets its own timeouts and a cap on its concurrent requests
+- 429, 5xx and transport errors are retried with jittered exponential backoff,
+  honouring Retry-After
+- Response bodies are streamed in chunks and rejected above a size limit
+"""
+
+import asyncio
+import json
 import os
-import requests
-from typing import Dict, Any, Optional, TypedDict, Literal
+import random
+from typing import Any, Dict, Literal, Optional, TypedDict
+
+import httpx
+
+from utils.logger import logger
+
+RAPID_API_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+RAPID_API_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0)
+RAPID_API_MAX_CONCURRENCY = 8           # Concurrent requests per provider
+RAPID_API_MAX_RETRIES = 3               # Retries after the first attempt
+RAPID_API_BACKOFF_BASE = 0.5            # Seconds; doubled on every retry
+RAPID_API_BACKOFF_MAX = 8.0             # Upper bound of a single backoff or Retry-After wait
+RAPID_API_MAX_RESPONSE_BYTES = 10 * 1024 * 1024
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+_SEMAPHORES: Dict[str, asyncio.Semaphore] = {}
 
 
 class EndpointSchema(TypedDict):
@@ -11,29 +42,72 @@ class EndpointSchema(TypedDict):
     payload: Dict[str, Any]
 
 
+def get_rapid_api_client() -> httpx.AsyncClient:
+    """Get the pooled HTTP client shared by all data providers."""
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(timeout=RAPID_API_TIMEOUT, limits=RAPID_API_LIMITS)
+    return _CLIENT
+
+
+async def close_rapid_api_client():
+    """Close the pooled client, e.g. on shutdown."""
+    global _CLIENT
+    client, _CLIENT = _CLIENT, None
+    _SEMAPHORES.clear()
+    if client is not None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing RapidAPI client: {e}")
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+    """Seconds to wait before a retry: Retry-After if given, else full-jitter exponential backoff."""
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), RAPID_API_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(RAPID_API_BACKOFF_MAX, RAPID_API_BACKOFF_BASE * 2 ** attempt))
+
+
 class RapidDataProviderBase:
+    """Base class of data providers served through RapidAPI.
+
+    Subclasses pass their base URL and endpoints, and can override the class
+    attributes below to tune their timeout and concurrency.
+    """
+
+    timeout: httpx.Timeout = RAPID_API_TIMEOUT
+    max_concurrency: int = RAPID_API_MAX_CONCURRENCY
+
     def __init__(self, base_url: str, endpoints: Dict[str, EndpointSchema]):
         self.base_url = base_url
         self.endpoints = endpoints
-    
+
     def get_endpoints(self):
         return self.endpoints
-    
-    def call_endpoint(
+
+    async def call_endpoint(
             self,
             route: str,
             payload: Optional[Dict[str, Any]] = None
     ):
         """
         Call an API endpoint with the given parameters and data.
-        
+
         Args:
-            endpoint (EndpointSchema): The endpoint configuration dictionary
-            params (dict, optional): Query parameters for GET requests
-            payload (dict, optional): JSON payload for POST requests
-            
+            route (str): Key of the endpoint in the provider's endpoints
+            payload (dict, optional): Query parameters for GET requests, JSON body for POST requests
+
         Returns:
             dict: The JSON response from the API
+
+        Raises:
+            ValueError: If the endpoint is unknown, the API keeps failing or the
+                response is too large or not JSON
         """
         if route.startswith("/"):
             route = route[1:]
@@ -41,21 +115,66 @@ class RapidDataProviderBase:
         endpoint = self.endpoints.get(route)
         if not endpoint:
             raise ValueError(f"Endpoint {route} not found")
-        
+
         url = f"{self.base_url}{endpoint['route']}"
-        
+
         headers = {
-            "x-rapidapi-key": os.getenv("RAPID_API_KEY"),
+            "x-rapidapi-key": os.getenv("RAPID_API_KEY", ""),
             "x-rapidapi-host": url.split("//")[1].split("/")[0],
             "Content-Type": "application/json"
         }
 
         method = endpoint.get('method', 'GET').upper()
-        
+
         if method == 'GET':
-            response = requests.get(url, params=payload, headers=headers)
+            request_kwargs = {'params': payload}
         elif method == 'POST':
-            response = requests.post(url, json=payload, headers=headers)
+            request_kwargs = {'json': payload}
         else:
             raise ValueError(f"Unsupported HTTP method: {method}")
-        return response.json()
+
+        async with self._semaphore():
+            status, body = await self._request_with_retries(method, url, headers, request_kwargs)
+
+        if status >= 400:
+            raise ValueError(f"{route} returned HTTP {status}: {body[:500].decode(errors='replace')}")
+        return json.loads(body)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        """Semaphore capping this provider's concurrent requests across all instances."""
+        semaphore = _SEMAPHORES.get(self.base_url)
+        if semaphore is None:
+            semaphore = _SEMAPHORES[self.base_url] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def _request_with_retries(self, method: str, url: str, headers: Dict[str, str], request_kwargs: Dict[str, Any]):
+        """Send a request, retrying throttled, failed and unreachable attempts.
+
+        Returns:
+            Tuple of (status_code, body) of the last attempt
+        """
+        client = get_rapid_api_client()
+        for attempt in range(RAPID_API_MAX_RETRIES + 1):
+            retries_left = attempt < RAPID_API_MAX_RETRIES
+            try:
+                async with client.stream(method, url, headers=headers, timeout=self.timeout, **request_kwargs) as response:
+                    if response.status_code not in RETRY_STATUS_CODES or not retries_left:
+                        return response.status_code, await self._read_body(response)
+                    delay = _retry_delay(attempt, response)
+                    logger.warning(f"RapidAPI {url} returned HTTP {response.status_code}, retrying in {delay:.2f}s")
+            except httpx.TransportError as e:
+                if not retries_left:
+                    raise ValueError(f"Request to {url} failed: {type(e).__name__}: {e}") from e
+                delay = _retry_delay(attempt, None)
+                logger.warning(f"RapidAPI request to {url} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+            # The connection is released before waiting
+            await asyncio.sleep(delay)
+
+    async def _read_body(self, response: httpx.Response) -> bytes:
+        """Read a streamed response body, stopping at the size limit."""
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+            if len(body) > RAPID_API_MAX_RESPONSE_BYTES:
+                raise ValueError(f"Response larger than {RAPID_API_MAX_RESPONSE_BYTES} bytes")
+        return bytes(body)
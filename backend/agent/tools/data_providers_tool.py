@@ -1,12 +1,25 @@
 import json
 
-from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
+from agentpress.tool import Tool, ToolAccess, ToolResult, openapi_schema, tool_access, xml_schema
+from agentpress.tool_cache import cached_tool_result
 from agent.tools.data_providers.LinkedinProvider import LinkedinProvider
 from agent.tools.data_providers.YahooFinanceProvider import YahooFinanceProvider
 from agent.tools.data_providers.AmazonProvider import AmazonProvider
 from agent.tools.data_providers.ZillowProvider import ZillowProvider
 from agent.tools.data_providers.TwitterProvider import TwitterProvider
 
+ENDPOINTS_CACHE_TTL = 3600  # Seconds endpoint listings are reused
+PROVIDER_CALL_CACHE_TTL = 600  # Seconds a provider response is reused for the same request
+
+
+def _normalize_provider_call(args: dict) -> dict:
+    """Key provider calls by their parsed payload, so JSON formatting and key order do not matter."""
+    try:
+        return {**args, "payload": json.loads(args["payload"])}
+    except (TypeError, ValueError):
+        return args
+
+
 class DataProvidersTool(Tool):
     """Tool for making requests to various data providers."""
 
@@ -21,6 +34,7 @@ class DataProvidersTool(Tool):
             "twitter": TwitterProvider()
         }
 
+    @tool_access(ToolAccess.READ_ONLY)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -54,6 +68,7 @@ Use this tool when you need to discover what endpoints are available.
 </get-data-provider-endpoints>
         '''
     )
+    @cached_tool_result(ttl=ENDPOINTS_CACHE_TTL)
     async def get_data_provider_endpoints(
         self,
         service_name: str
@@ -81,6 +96,7 @@ Use this tool when you need to discover what endpoints are available.
                 simplified_message += "..."
             return self.fail_response(simplified_message)
 
+    @tool_access(ToolAccess.READ_ONLY)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -126,6 +142,7 @@ Use this tool when you need to discover what endpoints are available.
         </execute-data-provider-call>
         '''
     )
+    @cached_tool_result(ttl=PROVIDER_CALL_CACHE_TTL, normalize=_normalize_provider_call)
     async def execute_data_provider_call(
         self,
         service_name: str,
@@ -160,7 +177,7 @@ Use this tool when you need to discover what endpoints are available.
                 return self.fail_response(f"Endpoint '{route}' not found in {service_name} data provider.")
             
             
-            result = data_provider.call_endpoint(route, payload)
+            result = await data_provider.call_endpoint(route, payload)
             return self.success_response(result)
             
         except Exception as e:
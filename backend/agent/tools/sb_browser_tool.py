@@ -1,18 +1,32 @@
 import traceback
 import json
+from typing import Optional, Tuple
+from urllib.parse import urlencode
 
-from agentpress.tool import ToolResult, openapi_schema, xml_schema
+import httpx
+
+from agentpress.tool import ToolAccess, ToolResult, openapi_schema, xml_schema
 from agentpress.thread_manager import ThreadManager
 from sandbox.sandbox import SandboxToolsBase
+from sandbox.browser_client import BROWSER_API_PORT, BROWSER_API_TIMEOUT, get_browser_api_client, request_browser_api
+from sandbox.screenshots import store_screenshot
 from utils.logger import logger
 
+FULL_STATE_EVERY = 10  # Store a full element list after this many diffs, bounding the chain readers replay
+
 
 class SandboxBrowserTool(SandboxToolsBase):
     """Tool for executing tasks in a Daytona sandbox with browser-use capabilities."""
+
+    # Every action works on the page state left by the previous one
+    default_tool_access = ToolAccess.EXCLUSIVE_SANDBOX
     
     def __init__(self, project_id: str, thread_id: str, thread_manager: ThreadManager):
         super().__init__(project_id, thread_manager)
         self.thread_id = thread_id
+        self._last_screenshot = None  # Reference to the last stored screenshot, for reuse
+        self._dom_version = None  # dom_version of the last stored state, sent as `since`
+        self._diffs_since_full = 0
 
     async def _execute_browser_action(self, endpoint: str, params: dict = None, method: str = "POST") -> ToolResult:
         """Execute a browser automation action through the API
@@ -29,29 +43,17 @@ class SandboxBrowserTool(SandboxToolsBase):
             # Ensure sandbox is initialized
             await self._ensure_sandbox()  # 内部已确保用 get_or_start_sandbox
             
-            # Build the curl command
-            url = f"http://localhost:8002/api/automation/{endpoint}"
-            
-            if method == "GET" and params:
-                query_params = "&".join([f"{k}={v}" for k, v in params.items()])
-                url = f"{url}?{query_params}"
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-            else:
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-                if params:
-                    json_data = json.dumps(params)
-                    curl_cmd += f" -d '{json_data}'"
-            
-            logger.debug("\033[95mExecuting curl command:\033[0m")
-            logger.debug(f"{curl_cmd}")
-            
-            exit_code, response = self.sandbox.exec_cmd(curl_cmd)
-
-            # response 可能为 bytes 或 str，需先 decode
-            if isinstance(response, bytes):
-                response_str = response.decode(errors="replace")
-            else:
-                response_str = str(response)
+            # 页面元素只返回相对上一次状态的增量
+            query = None
+            if method != "GET" and self._dom_version and self._diffs_since_full < FULL_STATE_EVERY:
+                query = {"since": self._dom_version}
+
+            try:
+                exit_code, response_str = await self._request_browser_api(endpoint, params, method, query)
+            except httpx.TransportError as e:
+                # 请求可能已送达并执行（读写超时、连接中断），不能重放
+                logger.error(f"Browser action {endpoint} failed after the request was sent: {e!r}")
+                return self.fail_response(f"Browser action {endpoint} failed after it was sent and may have run: {type(e).__name__}")
 
             if exit_code == 0:
                 try:
@@ -65,6 +67,25 @@ class SandboxBrowserTool(SandboxToolsBase):
 
                     logger.info("Browser automation request completed successfully")
 
+                    # 截图按内容哈希存到工作区，消息里只保留引用
+                    screenshot_base64 = result.pop("screenshot_base64", None)
+                    if screenshot_base64:
+                        reference = await store_screenshot(self.sandbox, screenshot_base64, previous=self._last_screenshot)
+                        if reference:
+                            self._last_screenshot = reference
+                            result.update(reference)
+                        else:
+                            result["screenshot_base64"] = screenshot_base64
+
+                    # 页面主要由图片/canvas 构成时，DOM 文本不足以描述页面，补充 OCR 文本
+                    if result.pop("ocr_pending", False) and result.get("screenshot_hash") and not result.get("ocr_text"):
+                        ocr_text = await self._fetch_ocr_text(result["screenshot_hash"])
+                        if ocr_text:
+                            result["ocr_text"] = ocr_text
+
+                    self._dom_version = result.get("dom_version")
+                    self._diffs_since_full = self._diffs_since_full + 1 if result.get("elements_diff") else 0
+
                     # Add full result to thread messages for state tracking
                     added_message = await self.thread_manager.add_message(
                         thread_id=self.thread_id,
@@ -110,6 +131,65 @@ class SandboxBrowserTool(SandboxToolsBase):
             logger.debug(traceback.format_exc())
             return self.fail_response(f"Error executing browser action: {e}")
 
+    async def _request_browser_api(self, endpoint: str, params: dict = None, method: str = "POST", query: dict = None) -> Tuple[int, str]:
+        """Send a request to the sandbox's automation API.
+
+        Uses the pooled HTTP client, or curl inside the container when the API
+        port is not published or cannot be connected to.
+
+        Returns:
+            Tuple of (exit_code, response): 0 on success, else the HTTP status or curl exit code
+
+        Raises:
+            httpx.TransportError: If the request failed after it was sent; it is not retried
+        """
+        client = get_browser_api_client(self.sandbox)
+        if client is not None:
+            try:
+                # 直接通过映射端口调用容器内的 browser_api（连接复用，带超时）
+                status_code, response = await request_browser_api(client, endpoint, params, method, query=query)
+                return (0 if status_code < 400 else status_code), response.decode(errors="replace")
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                # 请求未送达，换用 exec 不会重复执行动作
+                logger.warning(f"Browser API unreachable over HTTP ({e!r}), falling back to exec")
+
+        # 旧容器没有映射 8002 端口：在容器内执行 curl。参数以列表传递，不经过 shell 引号转义
+        url = f"http://localhost:{BROWSER_API_PORT}/api/automation/{endpoint}"
+        if method == "GET" and params:
+            url = f"{url}?{urlencode(params)}"
+        elif query:
+            url = f"{url}?{urlencode(query)}"
+        curl_cmd = ["curl", "-s", "-X", method, url, "-H", "Content-Type: application/json",
+                    "--max-time", str(int(BROWSER_API_TIMEOUT.read))]
+        if method != "GET" and params:
+            curl_cmd += ["-d", json.dumps(params)]
+
+        logger.debug("\033[95mExecuting curl command:\033[0m")
+        logger.debug(f"{curl_cmd}")
+        exit_code, response = await self.sandbox.exec_cmd_async(curl_cmd)
+
+        # response 可能为 bytes 或 str，需先 decode
+        if isinstance(response, bytes):
+            return exit_code, response.decode(errors="replace")
+        return exit_code, str(response)
+
+    async def _fetch_ocr_text(self, screenshot_hash: str) -> Optional[str]:
+        """Get the OCR text of a screenshot the automation API is already reading in the background.
+
+        Returns:
+            The text, or None if OCR failed or the screenshot has expired
+        """
+        try:
+            exit_code, response_str = await self._request_browser_api("ocr", {"screenshot_hash": screenshot_hash})
+            result = json.loads(response_str) if exit_code == 0 else {}
+        except Exception as e:
+            logger.warning(f"Failed to fetch OCR text for screenshot {screenshot_hash[:12]}: {e}")
+            return None
+        if not result.get("success"):
+            logger.warning(f"OCR text for screenshot {screenshot_hash[:12]} unavailable: {result.get('error') or response_str[:200]}")
+            return None
+        return result.get("ocr_text")
+
     @openapi_schema({
         "type": "function",
         "function": {
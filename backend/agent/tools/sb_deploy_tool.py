@@ -103,7 +103,7 @@ class SandboxDeployTool(SandboxToolsBase):
                     npx wrangler pages deploy {full_path} --project-name {project_name}))'''
 
                 # Execute the command directly using the sandbox's process.exec method
-                exit_code, response = self.sandbox.exec_cmd(deploy_cmd)
+                exit_code, response = await self.sandbox.exec_cmd_async(deploy_cmd)
                 
                 # 兼容 bytes 类型输出
                 result_val = response.result
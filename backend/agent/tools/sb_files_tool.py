@@ -2,7 +2,7 @@
 from typing import Optional
 
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
-from sandbox.sandbox import SandboxToolsBase, DockerSandbox, get_or_start_sandbox
+from sandbox.sandbox import SandboxToolsBase, DockerSandbox, get_or_start_sandbox_async
 from utils.files_utils import EXCLUDED_FILES, EXCLUDED_DIRS, EXCLUDED_EXT, should_exclude_file, clean_path
 from agentpress.thread_manager import ThreadManager
 import os
@@ -91,7 +91,7 @@ class SandboxFilesTool(SandboxToolsBase):
                 self._sandbox_url = sandbox_info.get('sandbox_url')
                 
                 # Get or start the sandbox
-                self._sandbox = get_or_start_sandbox(self._sandbox_id)
+                self._sandbox = await get_or_start_sandbox_async(self._sandbox_id)
                 
             except Exception as e:
                 logger.error(f"Error retrieving sandbox for project {self.project_id}: {str(e)}", exc_info=True)
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Optional, Dict, List
 from uuid import uuid4
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
@@ -148,7 +149,11 @@ class SandboxShellTool(SandboxToolsBase):
             command = f"cd {cwd} && {command}"
             
             # 用 shell 执行，支持 shell 内置命令（如 cd、&&、| 等）
-            result = self.sandbox.exec_cmd(["/bin/sh", "-c", command])
+            # 异步执行，长命令不会阻塞事件循环
+            try:
+                result = await self.sandbox.exec_cmd_async(["/bin/sh", "-c", command], timeout=float(timeout) if timeout else None)
+            except asyncio.TimeoutError:
+                return self.fail_response(f"Command timed out after {timeout} seconds. Use background execution (& or nohup) for long-running commands.")
             exit_code, output = None, None
             if isinstance(result, tuple):
                 exit_code, output = result
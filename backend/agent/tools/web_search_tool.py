@@ -1,13 +1,51 @@
 from tavily import AsyncTavilyClient
+import asyncio
 import httpx
-from typing import List, Optional
+import re
+from typing import List, Optional, Union
 from datetime import datetime
 import os
 from dotenv import load_dotenv
-from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
+from agentpress.tool import Tool, ToolAccess, ToolResult, openapi_schema, tool_access, xml_schema
+from agentpress.tool_cache import cached_tool_result
 from utils.config import config
+from utils.logger import logger
 import json
 
+SEARCH_CACHE_TTL = 600  # Seconds a search result is reused for the same query
+CRAWL_CACHE_TTL = 1800  # Seconds a crawled page is reused for the same URL
+CRAWL_MAX_URLS = 20  # URLs accepted by one bulk crawl
+CRAWL_MAX_CONCURRENCY = 5  # Pages of a bulk crawl extracted at the same time
+TAVILY_EXTRACT_URL = "https://api.tavily.com/extract"
+TAVILY_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+TAVILY_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120.0)
+
+_TAVILY_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def get_tavily_http_client() -> httpx.AsyncClient:
+    """Get the long-lived pooled client for Tavily's HTTP API.
+
+    Connections (and their TLS sessions) are reused across calls and runs, and
+    HTTP/2 lets concurrent extracts share one connection.
+    """
+    global _TAVILY_CLIENT
+    if _TAVILY_CLIENT is None or _TAVILY_CLIENT.is_closed:
+        _TAVILY_CLIENT = httpx.AsyncClient(timeout=TAVILY_TIMEOUT, limits=TAVILY_LIMITS, http2=True)
+    return _TAVILY_CLIENT
+
+
+async def close_tavily_http_client():
+    """Close the pooled client, e.g. on shutdown."""
+    global _TAVILY_CLIENT
+    client, _TAVILY_CLIENT = _TAVILY_CLIENT, None
+    if client is not None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing Tavily client: {e}")
+
+
 # TODO: add subpages, etc... in filters as sometimes its necessary 
 
 class WebSearchTool(Tool):
@@ -25,6 +63,7 @@ class WebSearchTool(Tool):
         # Tavily asynchronous search client
         self.tavily_client = AsyncTavilyClient(api_key=self.api_key)
 
+    @tool_access(ToolAccess.READ_ONLY)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -86,6 +125,7 @@ class WebSearchTool(Tool):
         </web-search>
         '''
     )
+    @cached_tool_result(ttl=SEARCH_CACHE_TTL, normalize=lambda args: {**args, "query": str(args["query"]).lower()})
     async def web_search(
         self, 
         query: str, 
@@ -159,6 +199,7 @@ class WebSearchTool(Tool):
                 simplified_message += "..."
             return self.fail_response(simplified_message)
 
+    @tool_access(ToolAccess.READ_ONLY)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -193,6 +234,7 @@ class WebSearchTool(Tool):
         </crawl-webpage>
         '''
     )
+    @cached_tool_result(ttl=CRAWL_CACHE_TTL, normalize=lambda args: {"url": str(args["url"]).strip().rstrip("/")})
     async def crawl_webpage(
         self,
         url: str
@@ -230,27 +272,22 @@ class WebSearchTool(Tool):
                 return self.fail_response("URL must be a string.")
                 
             # ---------- Tavily extract endpoint ----------
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                }
-                payload = {
-                    "urls": url,
-                    "include_images": False,
-                    "extract_depth": "basic",
-                }
-                response = await client.post(
-                    "https://api.tavily.com/extract",
-                    json=payload,
-                    headers=headers,
-                    timeout=60,
-                )
-                response.raise_for_status()
-                data = response.json()
-                # print(f"--- Raw Tavily Response ---")
-                # print(data)
-                # print(f"--------------------------")
+            headers = {
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+            }
+            payload = {
+                "urls": url,
+                "include_images": False,
+                "extract_depth": "basic",
+            }
+            response = await get_tavily_http_client().post(
+                TAVILY_EXTRACT_URL,
+                json=payload,
+                headers=headers,
+            )
+            response.raise_for_status()
+            data = response.json()
 
             # Normalise Tavily extract output to a list of dicts
             extracted = []
@@ -285,6 +322,90 @@ class WebSearchTool(Tool):
                 simplified_message += "..."
             return self.fail_response(simplified_message)
 
+    @tool_access(ToolAccess.READ_ONLY)
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "crawl_webpages",
+            "description": f"Retrieve the complete text content of several webpages at once. Use this instead of repeated crawl_webpage calls when you already know multiple URLs to read, e.g. the most relevant results of a web search. Pages are extracted concurrently; pages that cannot be crawled are reported individually without failing the others. Accepts up to {CRAWL_MAX_URLS} URLs.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "urls": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "The complete URLs of the webpages to crawl, including the protocol (http:// or https://)."
+                    }
+                },
+                "required": ["urls"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="crawl-webpages",
+        mappings=[
+            {"param_name": "urls", "node_type": "content", "path": "."}
+        ],
+        example='''
+        <!-- 
+        The crawl-webpages tool extracts the text content of several web pages in one call.
+        List one URL per line.
+        -->
+        <crawl-webpages>
+        https://example.com/article/technology-trends
+        https://example.org/blog/ai-research-roundup
+        </crawl-webpages>
+        '''
+    )
+    async def crawl_webpages(
+        self,
+        urls: Union[List[str], str]
+    ) -> ToolResult:
+        """
+        Retrieve the text content of several webpages concurrently.
+        
+        Each page goes through crawl_webpage, so pages crawled recently are served
+        from the result cache, and at most CRAWL_MAX_CONCURRENCY extracts run at
+        the same time over the pooled client. Pages are collected as they
+        complete and returned in the order of the given URLs.
+        
+        Parameters:
+        - urls: List of URLs, or a string of URLs separated by whitespace or commas
+        """
+        if isinstance(urls, str):
+            try:
+                parsed = json.loads(urls)
+                urls = parsed if isinstance(parsed, list) else [urls]
+            except json.JSONDecodeError:
+                urls = re.split(r"[\s,]+", urls)
+        if not isinstance(urls, list):
+            return self.fail_response("urls must be a list of URLs.")
+        urls = list(dict.fromkeys(str(u).strip() for u in urls if str(u).strip()))
+        if not urls:
+            return self.fail_response("At least one URL is required.")
+        if len(urls) > CRAWL_MAX_URLS:
+            return self.fail_response(f"At most {CRAWL_MAX_URLS} URLs can be crawled at once, got {len(urls)}.")
+
+        semaphore = asyncio.Semaphore(CRAWL_MAX_CONCURRENCY)
+
+        async def crawl(index: int, url: str):
+            async with semaphore:
+                return index, url, await self.crawl_webpage(url)
+
+        pages = [None] * len(urls)
+        for completed in asyncio.as_completed([crawl(i, url) for i, url in enumerate(urls)]):
+            index, url, result = await completed
+            if result.success:
+                pages[index] = json.loads(result.output)
+            else:
+                pages[index] = [{"URL": url, "Error": result.output}]
+            logger.debug(f"Crawled {url} ({sum(p is not None for p in pages)}/{len(urls)}, success={result.success})")
+
+        formatted_results = [item for page in pages for item in page]
+        if all("Error" in item for item in formatted_results):
+            return self.fail_response(f"Error crawling webpages: {json.dumps(formatted_results)[:500]}")
+        return self.success_response(formatted_results)
+
 
 if __name__ == "__main__":
     import asyncio
@@ -0,0 +1,170 @@
+"""
+Coalescing of streamed assistant chunks for AgentPress responses.
+
+The response processor yields one `stream_status: chunk` response per LLM
+delta, often thousands per answer. Persisting and publishing each of them
+costs a Redis round trip per token. This module sits between the response
+generator and the writer:
+- Consecutive chunks are merged into one chunk per time window or byte budget
+- Other responses pass through unchanged and in order, closing any open chunk
+- Responses are handed out in batches so the writer can pipeline them
+- The response generator runs ahead in its own task while a batch is written
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncGenerator, AsyncIterable, Dict, List, Optional
+
+from utils.logger import logger
+
+DEFAULT_WINDOW_MS = 30      # A chunk is held at most this long before it is sent
+DEFAULT_MAX_BYTES = 512     # ...or until this much content has been merged
+MAX_BATCH_SIZE = 100        # Responses handed to the writer at once
+QUEUE_SIZE = 1000           # Responses read ahead of the writer
+
+_END = object()
+
+
+def _chunk_text(response: Dict[str, Any]) -> Optional[str]:
+    """Get the text of a streamed assistant chunk, or None for other responses."""
+    if response.get('type') != 'assistant':
+        return None
+    try:
+        metadata = response.get('metadata')
+        metadata = json.loads(metadata) if isinstance(metadata, str) else (metadata or {})
+        if metadata.get('stream_status') != 'chunk':
+            return None
+        content = response.get('content')
+        content = json.loads(content) if isinstance(content, str) else content
+        return content.get('content') if isinstance(content, dict) else None
+    except (TypeError, ValueError):
+        return None
+
+
+class _OpenChunk:
+    """Chunks merged so far in the current window."""
+
+    def __init__(self, response: Dict[str, Any], text: str):
+        self.first = response
+        self.last = response
+        self.parts = [text]
+        self.size = len(text.encode())
+
+    def add(self, response: Dict[str, Any], text: str):
+        self.last = response
+        self.parts.append(text)
+        self.size += len(text.encode())
+
+    def close(self) -> Dict[str, Any]:
+        if len(self.parts) == 1:
+            return self.first
+        merged = dict(self.first)
+        merged['content'] = json.dumps({"role": "assistant", "content": "".join(self.parts)})
+        merged['updated_at'] = self.last.get('updated_at', merged.get('updated_at'))
+        return merged
+
+
+async def coalesce_responses(
+    responses: AsyncIterable[Dict[str, Any]],
+    window_ms: int = DEFAULT_WINDOW_MS,
+    max_bytes: int = DEFAULT_MAX_BYTES
+) -> AsyncGenerator[List[Dict[str, Any]], None]:
+    """Merge streamed chunks and yield responses in batches.
+
+    Args:
+        responses: Response generator, e.g. from run_agent
+        window_ms: Longest time a chunk or batch is held back; 0 disables merging
+        max_bytes: Merged chunk content size at which the chunk is closed early
+
+    Yields:
+        Lists of responses in their original order. A batch is yielded as soon
+        as no further response is waiting and no chunk is open, or when the
+        window of its oldest response has elapsed.
+
+    Close the generator (aclose) when stopping early; this cancels the task
+    reading the response generator.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    window = window_ms / 1000
+
+    async def read_ahead():
+        try:
+            async for response in responses:
+                await queue.put(response)
+            await queue.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            await queue.put(e)
+
+    reader = asyncio.create_task(read_ahead())
+    getter: Optional[asyncio.Task] = None  # Kept across timeouts so no response is lost
+    batch: List[Dict[str, Any]] = []
+    chunk: Optional[_OpenChunk] = None
+    deadline: Optional[float] = None
+
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            if getter is None:
+                getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+            item = None
+            if done:
+                item = getter.result()
+                getter = None
+
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                # Hand out what was produced before the failure first
+                if chunk is not None:
+                    batch.append(chunk.close())
+                if batch:
+                    yield batch
+                raise item
+
+            if item is not None:
+                text = _chunk_text(item) if window > 0 else None
+                if text is not None:
+                    if chunk is None:
+                        chunk = _OpenChunk(item, text)
+                    else:
+                        chunk.add(item, text)
+                    if chunk.size >= max_bytes:
+                        batch.append(chunk.close())
+                        chunk = None
+                else:
+                    if chunk is not None:
+                        batch.append(chunk.close())
+                        chunk = None
+                    batch.append(item)
+                if deadline is None:
+                    deadline = loop.time() + window
+
+            expired = deadline is not None and loop.time() >= deadline
+            if expired and chunk is not None:
+                batch.append(chunk.close())
+                chunk = None
+            if batch and (expired or len(batch) >= MAX_BATCH_SIZE or (chunk is None and queue.empty())):
+                yield batch
+                batch = []
+            if not batch and chunk is None:
+                deadline = None
+
+        if chunk is not None:
+            batch.append(chunk.close())
+        if batch:
+            yield batch
+    finally:
+        if getter is not None:
+            getter.cancel()
+        if not reader.done():
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.debug(f"Response reader ended with: {e}")
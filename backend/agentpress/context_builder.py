@@ -0,0 +1,141 @@
+"""
+Token-budgeted context window for AgentPress LLM calls.
+
+run_thread used to send the last 10 messages of a thread whatever their size,
+so one large tool result could blow the budget while ten short messages wasted
+it, and the cut could separate tool results from the assistant message that
+called them. The context is now packed to a token budget:
+- Messages are taken newest-first until the model's budget is used up
+- An assistant message and the tool results that follow it are kept or dropped together
+- Oversized tool outputs keep their head and tail, eliding the middle
+- The latest summary, if any, is always kept at the top
+- Budgets are configured per model (or model prefix) with CONTEXT_TOKEN_BUDGETS
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.config import config
+from utils.logger import logger
+
+DEFAULT_CONTEXT_BUDGET = 32000
+# Matched by exact model name first, then by the longest matching prefix
+MODEL_CONTEXT_BUDGETS: Dict[str, int] = {
+    "anthropic/": 64000,
+    "bedrock/": 64000,
+    "openai/gpt-4o": 48000,
+    "gpt-4o": 48000,
+    "openai/gpt-4.1": 64000,
+    "openrouter/deepseek/": 32000,
+    "groq/": 16000,
+}
+CHARS_PER_TOKEN = 4  # Estimate used to size elided tool outputs
+
+
+def summarize_long_text(text: str, max_length: int = 1000) -> str:
+    """
+    对过长的工具输出或历史消息进行摘要，只保留前后部分内容。
+    """
+    if not isinstance(text, str):
+        text = str(text)
+    if len(text) > max_length:
+        head = text[:max_length // 2]
+        tail = text[-max_length // 2:]
+        return f"{head}\n...（已省略）...\n{tail}"
+    return text
+
+
+def get_context_budget(model: str) -> int:
+    """Get the token budget for the messages sent to a model.
+
+    Budgets from the CONTEXT_TOKEN_BUDGETS setting (a JSON object of model
+    name or prefix to tokens) take precedence over the defaults.
+    """
+    budgets = dict(MODEL_CONTEXT_BUDGETS)
+    if config.CONTEXT_TOKEN_BUDGETS:
+        try:
+            budgets.update({name: int(tokens) for name, tokens in json.loads(config.CONTEXT_TOKEN_BUDGETS).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Invalid CONTEXT_TOKEN_BUDGETS, using default budgets: {e}")
+
+    if model in budgets:
+        return budgets[model]
+    prefixes = [name for name in budgets if model.startswith(name)]
+    if prefixes:
+        return budgets[max(prefixes, key=len)]
+    return DEFAULT_CONTEXT_BUDGET
+
+
+def is_tool_result(message: Dict[str, Any], type: Optional[str] = None) -> bool:
+    """Whether a message is a tool result (native role 'tool', or an XML result row of type 'tool')."""
+    return message.get('role') == 'tool' or type == 'tool'
+
+
+def build_context_window(
+    rows: List[Dict[str, Any]],
+    max_tokens: int,
+    count_tokens: Callable[[Dict[str, Any]], int],
+    max_tool_output_tokens: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Pack the newest messages of a thread into a token budget.
+
+    Args:
+        rows: Messages in creation order, as dicts with ``message``, ``type`` and ``tokens``
+        max_tokens: Token budget for the returned messages
+        count_tokens: Counts the tokens of a message; used for elided tool outputs
+        max_tool_output_tokens: Tool outputs above this size have their middle
+            elided. Defaults to the CONTEXT_MAX_TOOL_OUTPUT_TOKENS setting.
+
+    Returns:
+        The messages to send, in creation order. The newest message is always
+        included, even if it does not fit.
+    """
+    if max_tool_output_tokens is None:
+        max_tool_output_tokens = config.CONTEXT_MAX_TOOL_OUTPUT_TOKENS
+
+    budget = max_tokens
+    summary = None
+    if rows and rows[0].get('type') == 'summary':
+        summary, rows = rows[0], rows[1:]
+        budget -= summary['tokens']
+
+    # Group each message with the tool results that follow it
+    groups: List[List[Dict[str, Any]]] = []
+    for row in rows:
+        message, tokens = row['message'], row['tokens']
+        if is_tool_result(message, row.get('type')) and tokens > max_tool_output_tokens:
+            message, tokens = _elide_tool_output(message, tokens, max_tool_output_tokens, count_tokens)
+        item = {'message': message, 'tokens': tokens}
+        if groups and is_tool_result(message, row.get('type')):
+            groups[-1].append(item)
+        else:
+            groups.append([item])
+
+    used = 0
+    start = len(groups)
+    while start > 0:
+        tokens = sum(item['tokens'] for item in groups[start - 1])
+        if used + tokens > budget and start < len(groups):
+            break
+        used += tokens
+        start -= 1
+
+    messages = [item['message'] for group in groups[start:] for item in group]
+    # A native tool result without its assistant message is rejected by the LLM APIs
+    while messages and messages[0].get('role') == 'tool':
+        messages.pop(0)
+    if summary is not None:
+        messages.insert(0, summary['message'])
+        used += summary['tokens']
+
+    logger.debug(f"Context window: {len(messages)} of {len(rows) + (summary is not None)} messages, ~{used}/{max_tokens} tokens")
+    return messages
+
+
+def _elide_tool_output(message: Dict[str, Any], tokens: int, max_tokens: int, count_tokens: Callable[[Dict[str, Any]], int]):
+    """Elide the middle of a tool output, returning the new message and its token count."""
+    content = message.get('content')
+    if not isinstance(content, str):
+        return message, tokens
+    elided = {**message, 'content': summarize_long_text(content, max_length=max_tokens * CHARS_PER_TOKEN)}
+    return elided, count_tokens(elided)
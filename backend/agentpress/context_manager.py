@@ -2,13 +2,19 @@
 Context Management for AgentPress Threads.
 
 This module handles token counting and thread summarization to prevent
-reaching the context window limitations of LLM models.
+reaching the context window limitations of LLM models. Summaries are
+generated in a background task once a thread reaches a soft threshold, so
+a turn never waits for the summarization call.
 """
 
+import asyncio
 import json
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
 
 from litellm import token_counter, completion, completion_cost
+from agentpress.message_cache import ThreadMessageCache
+from agentpress.token_counting import DEFAULT_TOKEN_MODEL
 from services.supabase import DBConnection
 from services.llm import make_llm_api_call
 from utils.logger import logger
@@ -17,6 +23,10 @@ from utils.logger import logger
 DEFAULT_TOKEN_THRESHOLD = 120000  # 80k tokens threshold for summarization
 SUMMARY_TARGET_TOKENS = 10000    # Target ~10k tokens for the summary message
 RESERVE_TOKENS = 5000            # Reserve tokens for new messages
+SOFT_THRESHOLD_RATIO = 0.7       # Start summarizing in the background at 70% of the threshold
+
+# Background summarization tasks by thread, shared by every ContextManager in the process
+_summary_tasks: Dict[str, asyncio.Task] = {}
 
 class ContextManager:
     """Manages thread context including token counting and summarization."""
@@ -29,12 +39,17 @@ class ContextManager:
         """
         self.db = DBConnection()
         self.token_threshold = token_threshold
+        self.soft_token_threshold = int(token_threshold * SOFT_THRESHOLD_RATIO)
     
-    async def get_thread_token_count(self, thread_id: str) -> int:
-        """Get the current token count for a thread using LiteLLM.
+    async def get_thread_token_count(self, thread_id: str, model: str = DEFAULT_TOKEN_MODEL) -> int:
+        """Get the current token count for a thread.
+        
+        Uses the per-message counts stored at insert time, summed incrementally
+        by the thread message cache, so the thread is not re-tokenized.
         
         Args:
             thread_id: ID of the thread to analyze
+            model: Model whose tokenizer the count is for
             
         Returns:
             The total token count for relevant messages in the thread
@@ -42,18 +57,8 @@ class ContextManager:
         logger.debug(f"Getting token count for thread {thread_id}")
         
         try:
-            # Get messages for the thread
-            messages = await self.get_messages_for_summarization(thread_id)
-            
-            if not messages:
-                logger.debug(f"No messages found for thread {thread_id}")
-                return 0
-            
-            # Use litellm's token_counter for accurate model-specific counting
-            # This is much more accurate than the SQL-based estimation
-            token_count = token_counter(model="gpt-4", messages=messages)
-            
-            logger.info(f"Thread {thread_id} has {token_count} tokens (calculated with litellm)")
+            token_count = await ThreadMessageCache().get_token_count(thread_id, model)
+            logger.info(f"Thread {thread_id} has {token_count} tokens")
             return token_count
                 
         except Exception as e:
@@ -73,6 +78,11 @@ class ContextManager:
         Returns:
             List of message objects to summarize
         """
+        messages, _ = await self._get_messages_and_cutoff(thread_id)
+        return messages
+    
+    async def _get_messages_and_cutoff(self, thread_id: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get the messages to summarize and the created_at of the last one."""
         logger.debug(f"Getting messages for summarization for thread {thread_id}")
         client = await self.db.client
         
@@ -109,6 +119,7 @@ class ContextManager:
             
             # Parse the message content if needed
             messages = []
+            cutoff = None
             for msg in messages_result.data:
                 # Skip existing summary messages - we don't want to summarize summaries
                 if msg.get('type') == 'summary':
@@ -131,13 +142,14 @@ class ContextManager:
                         content = {'role': role, 'content': content}
                 
                 messages.append(content)
+                cutoff = msg.get('created_at')
             
             logger.info(f"Got {len(messages)} messages to summarize for thread {thread_id}")
-            return messages
+            return messages, cutoff
             
         except Exception as e:
             logger.error(f"Error getting messages for summarization: {str(e)}", exc_info=True)
-            return []
+            return [], None
     
     async def create_summary(
         self, 
@@ -267,7 +279,7 @@ The above is a summary of the conversation history. The conversation continues b
                 logger.info(f"Thread {thread_id} exceeds token threshold ({token_count} >= {self.token_threshold}), summarizing...")
             
             # Get messages to summarize
-            messages = await self.get_messages_for_summarization(thread_id)
+            messages, cutoff = await self._get_messages_and_cutoff(thread_id)
             
             # If there are too few messages, don't summarize
             if len(messages) < 3:
@@ -278,13 +290,15 @@ The above is a summary of the conversation history. The conversation continues b
             summary = await self.create_summary(thread_id, messages, model)
             
             if summary:
-                # Add summary message to thread
+                # Add summary message to thread, ordered right after the messages it covers
+                # so messages written while it was generated stay in the context
                 await add_message_callback(
                     thread_id=thread_id,
                     type="summary",
                     content=summary,
                     is_llm_message=True,
-                    metadata={"token_count": token_count}
+                    metadata={"token_count": token_count},
+                    created_at=summary_created_at(cutoff)
                 )
                 
                 logger.info(f"Successfully added summary to thread {thread_id}")
@@ -295,4 +309,58 @@ The above is a summary of the conversation history. The conversation continues b
                 
         except Exception as e:
             logger.error(f"Error in check_and_summarize_if_needed: {str(e)}", exc_info=True)
-            return False 
\ No newline at end of file
+            return False 
+
+    def is_summarizing(self, thread_id: str) -> bool:
+        """Whether a background summarization of the thread is running."""
+        task = _summary_tasks.get(thread_id)
+        return task is not None and not task.done()
+
+    def schedule_summarization(
+        self,
+        thread_id: str,
+        add_message_callback,
+        model: str = "gpt-4o-mini"
+    ) -> bool:
+        """Summarize a thread in a background task, unless one is already running.
+        
+        The summary is written as a message when ready and replaces the older
+        history from the next turn on.
+        
+        Args:
+            thread_id: ID of the thread to summarize
+            add_message_callback: Callback to add the summary message to the thread
+            model: LLM model to use for summarization
+            
+        Returns:
+            True if a summarization task was started
+        """
+        if self.is_summarizing(thread_id):
+            logger.debug(f"Summarization of thread {thread_id} already running")
+            return False
+
+        task = asyncio.create_task(self.check_and_summarize_if_needed(
+            thread_id=thread_id,
+            add_message_callback=add_message_callback,
+            model=model,
+            force=True
+        ))
+        _summary_tasks[thread_id] = task
+
+        def _forget(_):
+            if _summary_tasks.get(thread_id) is task:
+                del _summary_tasks[thread_id]
+        task.add_done_callback(_forget)
+        logger.info(f"Started background summarization of thread {thread_id}")
+        return True
+
+
+def summary_created_at(cutoff: Optional[str]) -> Optional[str]:
+    """Timestamp placing a summary right after the last message it covers."""
+    if not cutoff:
+        return None
+    try:
+        return (datetime.fromisoformat(cutoff) + timedelta(microseconds=1)).isoformat()
+    except ValueError:
+        logger.warning(f"Could not parse message timestamp {cutoff}, summary uses its insert time")
+        return None
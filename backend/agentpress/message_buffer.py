@@ -0,0 +1,148 @@
+"""
+Write-behind buffering of non-LLM messages for AgentPress threads.
+
+Status and cost messages (thread_run_start, tool_started, finish, ...) are only
+used for display and bookkeeping, so they do not need their own database round
+trip. This module queues them and persists them in multi-row inserts when:
+- The queue reaches a size threshold
+- A short flush interval has elapsed
+- An LLM-visible message is about to be written (preserving insertion order)
+- The agent run ends or the server shuts down
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from services.supabase import DBConnection
+from utils.logger import logger
+
+# Message types eligible for write-behind when is_llm_message is False
+WRITE_BEHIND_MESSAGE_TYPES = ("status", "cost")
+
+DEFAULT_MAX_BATCH_SIZE = 50       # Flush as soon as this many rows are queued
+DEFAULT_FLUSH_INTERVAL = 0.5      # Seconds a row may wait before being flushed
+MAX_FLUSH_ATTEMPTS = 2            # Rows are dropped after this many failed inserts
+
+
+class MessageWriteBuffer:
+    """Singleton queue that persists buffered messages in batched inserts.
+
+    The buffer is shared by every ThreadManager in the process, so a flush from
+    the API layer also covers messages queued by per-run thread managers.
+    """
+
+    _instance: Optional['MessageWriteBuffer'] = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        """Initialize buffer state once for the singleton."""
+        self.db = DBConnection()
+        self.max_batch_size = DEFAULT_MAX_BATCH_SIZE
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL
+        self._pending: List[Dict[str, Any]] = []
+        self._attempts: Dict[str, int] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        self._timer: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def should_buffer(type: str, is_llm_message: bool) -> bool:
+        """Whether a message of this type can be written behind."""
+        return not is_llm_message and type in WRITE_BEHIND_MESSAGE_TYPES
+
+    @property
+    def pending_count(self) -> int:
+        """Number of rows waiting to be flushed."""
+        return len(self._pending)
+
+    async def enqueue(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a row for insertion and return it as if it had been saved.
+
+        The message_id and timestamps are generated client-side so callers can
+        link to the message immediately, and so the row keeps its position in
+        the thread ordering even though it is inserted later.
+
+        Args:
+            data: Row to insert (thread_id, type, content, is_llm_message, metadata)
+
+        Returns:
+            The full message object, matching the database representation
+            (metadata as a dict, like the jsonb column)
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        row = {
+            **data,
+            'message_id': str(uuid.uuid4()),
+            'created_at': now,
+            'updated_at': now,
+        }
+        self._pending.append(row)
+
+        if len(self._pending) >= self.max_batch_size:
+            await self.flush()
+        else:
+            self._schedule_flush()
+
+        saved = dict(row)
+        if isinstance(saved.get('metadata'), str):
+            saved['metadata'] = json.loads(saved['metadata'])
+        return saved
+
+    def _schedule_flush(self):
+        """Start the interval timer if one is not already running."""
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_after_interval())
+
+    async def _flush_after_interval(self):
+        try:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error in timed message flush: {str(e)}", exc_info=True)
+
+    async def flush(self) -> int:
+        """Insert all queued rows in a single multi-row insert.
+
+        Returns:
+            Number of rows written
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, []
+            try:
+                client = await self.db.client
+                await client.table('messages').insert(batch, returning='minimal').execute()
+                for row in batch:
+                    self._attempts.pop(row['message_id'], None)
+                logger.debug(f"Flushed {len(batch)} buffered messages")
+                return len(batch)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(batch)} buffered messages: {str(e)}", exc_info=True)
+                retry = []
+                for row in batch:
+                    attempts = self._attempts.get(row['message_id'], 0) + 1
+                    if attempts < MAX_FLUSH_ATTEMPTS:
+                        self._attempts[row['message_id']] = attempts
+                        retry.append(row)
+                    else:
+                        self._attempts.pop(row['message_id'], None)
+                        logger.error(f"Dropping buffered message {row['message_id']} for thread {row.get('thread_id')} after {attempts} failed inserts")
+                # Re-queue ahead of anything added meanwhile to keep insertion order
+                self._pending = retry + self._pending
+                if self._pending:
+                    self._schedule_flush()
+                return 0
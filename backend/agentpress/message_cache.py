@@ -0,0 +1,362 @@
+"""
+Per-thread cache of LLM-formatted messages for AgentPress.
+
+Building the LLM context used to re-fetch and re-parse the whole post-summary
+history of a thread on every turn. This module keeps that history per thread:
+- Only messages newer than the last cached created_at are fetched from the database
+- Messages written through ThreadManager.add_message are appended after such a
+  fetch, so the cursor never moves past rows other workers added in between
+- A cold thread loads just the last N messages via a windowed RPC
+- Writing a summary invalidates the thread, since it resets the LLM context
+- Entries can optionally be mirrored to Redis so other instances start warm
+- Per-message token counts are summed into a running total per tokenizer and
+  used to pack the context window to a token budget
+"""
+
+import copy
+import json
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from agentpress.context_builder import build_context_window
+from agentpress.token_counting import DEFAULT_TOKEN_MODEL, count_message_tokens, stored_token_counts, tokenizer_key
+from services import redis
+from services.supabase import DBConnection
+from utils.config import config
+from utils.logger import logger
+
+DEFAULT_MAX_THREADS = 256               # Threads kept in memory (least recently used are evicted)
+DEFAULT_MAX_MESSAGES_PER_THREAD = 200   # Older messages are dropped and the entry marked partial
+REDIS_KEY_PREFIX = "thread_messages:"
+REDIS_CACHE_TTL = 3600                  # Seconds a mirrored entry lives in Redis
+
+
+def format_llm_message(content: Any) -> Optional[Dict[str, Any]]:
+    """Parse stored message content into an LLM message dict.
+
+    Content may come back from the database as a JSON string. Tool call
+    arguments are normalized to strings, as the LLM APIs expect.
+
+    Args:
+        content: Raw content column value
+
+    Returns:
+        The message dict, or None if the content could not be parsed
+    """
+    if isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse message: {content}")
+            return None
+    if not isinstance(content, dict):
+        return None
+
+    if content.get('tool_calls'):
+        for tool_call in content['tool_calls']:
+            if isinstance(tool_call, dict) and 'function' in tool_call:
+                # Ensure function.arguments is a string
+                if 'arguments' in tool_call['function'] and not isinstance(tool_call['function']['arguments'], str):
+                    tool_call['function']['arguments'] = json.dumps(tool_call['function']['arguments'])
+    return content
+
+
+class ThreadMessageCache:
+    """Singleton cache of post-summary LLM messages, keyed by thread.
+
+    Each entry holds rows of the form ``{message_id, type, created_at, message, tokens}``
+    in creation order, plus a ``complete`` flag telling whether the entry covers
+    the whole post-summary history or only its most recent window. Token totals
+    per tokenizer cover the rows, and the rows dropped on overflow if the entry
+    was ``counted`` from the start of the post-summary history. The cache is
+    shared by every ThreadManager in the process, since a new manager is created
+    for each agent run.
+    """
+
+    _instance: Optional['ThreadMessageCache'] = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        """Initialize cache state once for the singleton."""
+        self.db = DBConnection()
+        self.max_threads = DEFAULT_MAX_THREADS
+        self.max_messages_per_thread = DEFAULT_MAX_MESSAGES_PER_THREAD
+        self.use_redis = config.THREAD_MESSAGE_CACHE_REDIS
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def get_messages(self, thread_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the LLM messages of a thread, refreshing the cache incrementally.
+
+        Args:
+            thread_id: The ID of the thread
+            limit: Return only the last ``limit`` messages (None for the whole post-summary history)
+
+        Returns:
+            List of message dicts. They are copies, so callers may modify them.
+        """
+        entry = await self._current(thread_id, limit)
+        rows = entry['rows'] if limit is None else entry['rows'][-limit:]
+        return copy.deepcopy([row['message'] for row in rows])
+
+    async def get_context_window(
+        self,
+        thread_id: str,
+        max_tokens: int,
+        model: str = DEFAULT_TOKEN_MODEL
+    ) -> List[Dict[str, Any]]:
+        """Get the newest messages of a thread that fit in a token budget.
+
+        Packing is done by context_builder.build_context_window, using the
+        per-message token counts held by the cache. Messages older than the
+        cached window (max_messages_per_thread) are not considered.
+
+        Args:
+            thread_id: The ID of the thread
+            max_tokens: Token budget for the returned messages
+            model: Model whose tokenizer the budget is for
+
+        Returns:
+            List of message dicts in creation order (copies)
+        """
+        # Only the cached window can be packed; don't force a full reload of a partial entry
+        entry = await self._current(thread_id, self.max_messages_per_thread)
+        key = tokenizer_key(model)
+        rows = [
+            {'message': row['message'], 'type': row['type'], 'tokens': self._row_tokens(row, key, model)}
+            for row in entry['rows']
+        ]
+        messages = build_context_window(rows, max_tokens, lambda message: count_message_tokens(message, model))
+        return copy.deepcopy(messages)
+
+    async def get_token_count(self, thread_id: str, model: str = DEFAULT_TOKEN_MODEL) -> int:
+        """Get the token count of a thread's post-summary history.
+
+        Messages are counted once each (usually when written) and kept in a
+        running total, so this only fetches and counts messages new since the
+        last call.
+
+        Args:
+            thread_id: The ID of the thread
+            model: Model whose tokenizer the count is for
+
+        Returns:
+            Sum of the per-message token counts
+        """
+        entry = await self._get_entry(thread_id)
+        if entry is None or not entry.get('counted'):
+            entry = await self._load(thread_id, None)
+        else:
+            entry = await self._refresh(thread_id, entry)
+        return self._token_total(entry, model)
+
+    async def append(self, thread_id: str, row: Dict[str, Any]) -> None:
+        """Record a message that was just inserted into the thread.
+
+        The entry is refreshed first: merging the row moves the created_at
+        cursor to it, and rows another worker inserted before it (e.g. a user
+        message added through the API during a run) would otherwise never be
+        fetched.
+
+        Args:
+            thread_id: The ID of the thread
+            row: The inserted database row (message_id, type, content, created_at, is_llm_message, metadata)
+        """
+        if not row.get('is_llm_message'):
+            return
+        if row.get('type') == 'summary':
+            # A summary replaces the context; reload it on next access
+            await self.invalidate(thread_id)
+            return
+
+        entry = self._entries.get(thread_id)
+        if entry is None:
+            return
+        entry = await self._refresh(thread_id, entry)
+        if entry['rows'] and not entry['rows'][-1]['created_at']:
+            return  # Reloaded from the full history, which already holds the row
+        self._merge(entry, [row])  # Usually fetched by the refresh already; merge skips it then
+        await self._store(thread_id, entry)
+
+    async def invalidate(self, thread_id: str) -> None:
+        """Drop the cached messages of a thread."""
+        self._entries.pop(thread_id, None)
+        if self.use_redis:
+            try:
+                await redis.delete(f"{REDIS_KEY_PREFIX}{thread_id}")
+            except Exception as e:
+                logger.warning(f"Failed to delete cached messages for thread {thread_id} from Redis: {str(e)}")
+
+    async def _get_entry(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a thread in memory, then in Redis if enabled."""
+        entry = self._entries.get(thread_id)
+        if entry is not None:
+            self._entries.move_to_end(thread_id)
+            return entry
+
+        if self.use_redis:
+            try:
+                cached = await redis.get(f"{REDIS_KEY_PREFIX}{thread_id}")
+                if cached:
+                    entry = json.loads(cached)
+                    self._remember(thread_id, entry)
+                    return entry
+            except Exception as e:
+                logger.warning(f"Failed to read cached messages for thread {thread_id} from Redis: {str(e)}")
+        return None
+
+    async def _load(self, thread_id: str, limit: Optional[int]) -> Dict[str, Any]:
+        """Load the last ``limit`` post-summary messages of a thread into a fresh entry."""
+        params = {'p_thread_id': thread_id}
+        if limit is not None:
+            params['p_limit'] = limit
+
+        rows = await self._fetch_window(params)
+        if rows is None:
+            entry = {'rows': await self._fetch_all(thread_id), 'complete': True, 'counted': True}
+        else:
+            complete = limit is None or len(rows) < limit
+            entry = {'rows': [], 'complete': complete, 'counted': complete}
+            self._merge(entry, rows)
+
+        logger.debug(f"Loaded {len(entry['rows'])} messages into cache for thread {thread_id}")
+        await self._store(thread_id, entry)
+        return entry
+
+    async def _refresh(self, thread_id: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch messages created after the newest cached one and merge them in."""
+        last_created_at = entry['rows'][-1]['created_at'] if entry['rows'] else None
+        if entry['rows'] and not last_created_at:
+            # Entry came from the full-history fallback and cannot be diffed
+            return await self._load(thread_id, None)
+
+        params = {'p_thread_id': thread_id}
+        if last_created_at:
+            params['p_after'] = last_created_at
+
+        rows = await self._fetch_window(params)
+        if rows is None:
+            entry = {'rows': await self._fetch_all(thread_id), 'complete': True, 'counted': True}
+            await self._store(thread_id, entry)
+            return entry
+        if not rows:
+            return entry
+
+        if any(row['type'] == 'summary' and row['message_id'] != entry.get('summary_id') for row in rows):
+            # Summarized elsewhere. The summary is ordered right after the messages it
+            # covers, which may be older than the newest cached row, so reload from it.
+            return await self._load(thread_id, None)
+        self._merge(entry, rows)
+        logger.debug(f"Fetched {len(rows)} new messages for thread {thread_id}")
+        await self._store(thread_id, entry)
+        return entry
+
+    async def _fetch_window(self, params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Call the windowed RPC; returns None if it is unavailable."""
+        client = await self.db.client
+        try:
+            result = await client.rpc('get_llm_formatted_messages_window', params).execute()
+        except Exception as e:
+            logger.warning(f"Windowed message fetch failed for thread {params['p_thread_id']}, falling back to full history: {str(e)}")
+            return None
+        return result.data or []
+
+    async def _fetch_all(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Fetch the whole post-summary history with get_llm_formatted_messages.
+
+        This RPC returns message content only, so rows get no message_id or
+        created_at and the next refresh falls back to a full fetch as well.
+        """
+        client = await self.db.client
+        result = await client.rpc('get_llm_formatted_messages', {'p_thread_id': thread_id}).execute()
+        rows = []
+        for item in result.data or []:
+            message = format_llm_message(item)
+            if message is not None:
+                rows.append({'message_id': None, 'type': None, 'created_at': None, 'message': message, 'tokens': {}})
+        return rows
+
+    def _merge(self, entry: Dict[str, Any], rows: List[Dict[str, Any]]) -> None:
+        """Append database rows to an entry, skipping messages it already holds."""
+        seen = {row['message_id'] for row in entry['rows'] if row['message_id']}
+        totals = entry.setdefault('token_totals', {})
+        models = entry.get('token_models') or {}
+        for row in rows:
+            if row.get('message_id') in seen:
+                continue
+            message = format_llm_message(row.get('content'))
+            if message is None:
+                continue
+            cached_row = {
+                'message_id': row.get('message_id'),
+                'type': row.get('type'),
+                'created_at': row.get('created_at'),
+                'message': message,
+                'tokens': stored_token_counts(row.get('metadata')),
+            }
+            entry['rows'].append(cached_row)
+            if cached_row['type'] == 'summary':
+                entry['summary_id'] = cached_row['message_id']
+            for key in totals:
+                totals[key] += self._row_tokens(cached_row, key, models.get(key))
+
+        overflow = len(entry['rows']) - self.max_messages_per_thread
+        if overflow > 0:
+            # Dropped rows still belong to the post-summary history, keep their tokens in the total.
+            # On a cold load no totals exist yet, so count the stored per-tokenizer counts as well.
+            dropped = entry.setdefault('dropped_tokens', {})
+            for row in entry['rows'][:overflow]:
+                keys = set(totals) | set(row['tokens']) or {tokenizer_key(DEFAULT_TOKEN_MODEL)}
+                for key in keys:
+                    count = self._row_tokens(row, key, models.get(key))
+                    if key in totals:
+                        totals[key] -= count
+                    dropped[key] = dropped.get(key, 0) + count
+            del entry['rows'][:overflow]
+            entry['complete'] = False
+
+    async def _current(self, thread_id: str, limit: Optional[int]) -> Dict[str, Any]:
+        """Get an up-to-date entry holding at least the last ``limit`` messages."""
+        entry = await self._get_entry(thread_id)
+        if entry is None or (limit is None and not entry['complete']) or \
+                (limit is not None and not entry['complete'] and len(entry['rows']) < limit):
+            return await self._load(thread_id, limit)
+        return await self._refresh(thread_id, entry)
+
+    def _token_total(self, entry: Dict[str, Any], model: str) -> int:
+        """Token total of an entry for a model's tokenizer."""
+        key = tokenizer_key(model)
+        totals = entry.setdefault('token_totals', {})
+        if key not in totals:
+            entry.setdefault('token_models', {})[key] = model
+            totals[key] = sum(self._row_tokens(row, key, model) for row in entry['rows'])
+        dropped = entry.get('dropped_tokens') or {}
+        # Rows dropped before this tokenizer was first asked for are estimated with another tokenizer's count
+        return totals[key] + dropped.get(key, next(iter(dropped.values()), 0))
+
+    @staticmethod
+    def _row_tokens(row: Dict[str, Any], key: str, model: Optional[str] = None) -> int:
+        """Token count of a cached row, counting it on first use for a tokenizer."""
+        tokens = row.setdefault('tokens', {})
+        if key not in tokens:
+            tokens[key] = count_message_tokens(row['message'], model or DEFAULT_TOKEN_MODEL)
+        return tokens[key]
+
+    async def _store(self, thread_id: str, entry: Dict[str, Any]) -> None:
+        """Keep an entry in memory and mirror it to Redis if enabled."""
+        self._remember(thread_id, entry)
+        if self.use_redis:
+            try:
+                await redis.set(f"{REDIS_KEY_PREFIX}{thread_id}", json.dumps(entry), ex=REDIS_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f"Failed to write cached messages for thread {thread_id} to Redis: {str(e)}")
+
+    def _remember(self, thread_id: str, entry: Dict[str, Any]) -> None:
+        self._entries[thread_id] = entry
+        self._entries.move_to_end(thread_id)
+        while len(self._entries) > self.max_threads:
+            self._entries.popitem(last=False)
@@ -0,0 +1,109 @@
+"""
+Cache of the combined system prompts sent with every AgentPress LLM call.
+
+run_thread used to append the XML tool examples to the (very large) system
+prompt and count its tokens again on every call. The combined prompt is now
+built once per base prompt and tool set:
+- Keyed by a hash of the base prompt and the registry's XML example signature
+- The cached message is byte-identical between calls, so the provider's
+  prompt cache keeps matching the system prefix
+- Token counts are kept per model alongside the prompt
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from agentpress.tool_registry import ToolRegistry
+from utils.logger import logger
+
+PROMPT_CACHE_SIZE = 32
+
+XML_TOOL_CALLING_INSTRUCTIONS = """
+--- XML TOOL CALLING ---
+
+In this environment you have access to a set of tools you can use to answer the user's question. The tools are specified in XML format.
+Format your tool calls using the specified XML tags. Place parameters marked as 'attribute' within the opening tag (e.g., `<tag attribute='value'>`). Place parameters marked as 'content' between the opening and closing tags. Place parameters marked as 'element' within their own child tags (e.g., `<tag><element>value</element></tag>`). Refer to the examples provided below for the exact structure of each tool.
+String and scalar parameters should be specified as attributes, while content goes between tags.
+Note that spaces for string values are not stripped. The output is parsed with regular expressions.
+
+Here are the XML tools available with examples:
+"""
+
+
+class CachedSystemPrompt:
+    """A combined system prompt and its token count per model."""
+
+    def __init__(self, message: Dict[str, Any]):
+        self.message = message
+        self._token_counts: Dict[str, int] = {}
+
+    def token_count(self, model: str) -> int:
+        """Count the prompt's tokens for a model, once."""
+        if model not in self._token_counts:
+            from litellm import token_counter
+            self._token_counts[model] = token_counter(model=model, messages=[self.message])
+        return self._token_counts[model]
+
+
+_cache: "OrderedDict[str, CachedSystemPrompt]" = OrderedDict()
+
+
+def get_system_prompt(
+    system_prompt: Dict[str, Any],
+    tool_registry: Optional[ToolRegistry] = None,
+    include_xml_examples: bool = False
+) -> CachedSystemPrompt:
+    """Get the system prompt with the registry's XML examples appended, from cache if possible.
+
+    Args:
+        system_prompt: Base system message
+        tool_registry: Registry whose XML examples are appended
+        include_xml_examples: Whether to append the XML examples
+
+    Returns:
+        CachedSystemPrompt; its message must not be modified
+    """
+    signature = tool_registry.get_xml_examples_signature() if include_xml_examples and tool_registry else "none"
+    prompt_hash = hashlib.sha256(json.dumps(system_prompt, sort_keys=True).encode()).hexdigest()
+    key = f"{prompt_hash}:{signature}"
+
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+        return cached
+
+    message = json.loads(json.dumps(system_prompt))  # Never share structure with the caller's prompt
+    if include_xml_examples and tool_registry:
+        _append_xml_examples(message, tool_registry.get_xml_examples())
+
+    cached = CachedSystemPrompt(message)
+    _cache[key] = cached
+    while len(_cache) > PROMPT_CACHE_SIZE:
+        _cache.popitem(last=False)
+    logger.debug(f"Built system prompt for tool set {signature[:12]}")
+    return cached
+
+
+def _append_xml_examples(message: Dict[str, Any], xml_examples: Dict[str, str]):
+    if not xml_examples:
+        return
+    examples_content = XML_TOOL_CALLING_INSTRUCTIONS
+    for tag_name, example in xml_examples.items():
+        examples_content += f"<{tag_name}> Example: {example}\\n"
+
+    system_content = message.get('content')
+    if isinstance(system_content, str):
+        message['content'] += examples_content
+        logger.debug("Appended XML examples to string system prompt content.")
+    elif isinstance(system_content, list):
+        for item in system_content:
+            if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
+                item['text'] += examples_content
+                logger.debug("Appended XML examples to the first text block in list system prompt content.")
+                break
+        else:
+            logger.warning("System prompt content is a list but no text block found to append XML examples.")
+    else:
+        logger.warning(f"System prompt content is of unexpected type ({type(system_content)}), cannot add XML examples.")
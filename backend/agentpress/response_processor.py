@@ -20,6 +20,10 @@ from litellm import completion_cost, token_counter
 
 from agentpress.tool import Tool, ToolResult
 from agentpress.tool_registry import ToolRegistry
+from agentpress.tool_scheduler import ToolCallScheduler
+from agentpress.context_builder import summarize_long_text
+from agentpress.xml_tool_parser import XmlToolCallStreamParser
+from services.llm import prompt_cache_metrics
 from utils.logger import logger
 
 # Type alias for XML result adding strategy
@@ -78,18 +82,6 @@ class ProcessorConfig:
         if self.max_xml_tool_calls < 0:
             raise ValueError("max_xml_tool_calls must be a non-negative integer (0 = no limit)")
 
-def summarize_long_text(text: str, max_length: int = 1000) -> str:
-    """
-    对过长的工具输出或历史消息进行摘要，只保留前后部分内容。
-    """
-    if not isinstance(text, str):
-        text = str(text)
-    if len(text) > max_length:
-        head = text[:max_length // 2]
-        tail = text[-max_length // 2:]
-        return f"{head}\n...（已省略）...\n{tail}"
-    return text
-
 class ResponseProcessor:
     """Processes LLM responses, extracting and executing tool calls."""
     
@@ -126,9 +118,10 @@ class ResponseProcessor:
         """
         accumulated_content = ""
         tool_calls_buffer = {}
-        current_xml_content = ""
+        xml_parser = self._create_xml_parser()
         xml_chunks_buffer = []
         pending_tool_executions = []
+        tool_scheduler = self._create_tool_scheduler(config.tool_execution_strategy)
         yielded_tool_indices = set() # Stores indices of tools whose *status* has been yielded
         tool_index = 0
         xml_tool_call_count = 0
@@ -136,6 +129,7 @@ class ResponseProcessor:
         last_assistant_message_object = None # Store the final saved assistant message object
         tool_result_message_objects = {} # tool_index -> full saved message object
         has_printed_thinking_prefix = False # Flag for printing thinking prefix only once
+        stream_usage = None # Usage reported in the last chunk, if the provider sends it
 
         logger.info(f"Streaming Config: XML={config.xml_tool_calling}, Native={config.native_tool_calling}, "
                    f"Execute on stream={config.execute_on_stream}, Strategy={config.tool_execution_strategy}")
@@ -160,6 +154,9 @@ class ResponseProcessor:
             # --- End Start Events ---
 
             async for chunk in llm_response:
+                if getattr(chunk, 'usage', None):
+                    stream_usage = chunk.usage
+
                 if hasattr(chunk, 'choices') and chunk.choices and hasattr(chunk.choices[0], 'finish_reason') and chunk.choices[0].finish_reason:
                     finish_reason = chunk.choices[0].finish_reason
                     logger.debug(f"Detected finish_reason: {finish_reason}")
@@ -181,7 +178,6 @@ class ResponseProcessor:
                         chunk_content = delta.content
                         # print(chunk_content, end='', flush=True)
                         accumulated_content += chunk_content
-                        current_xml_content += chunk_content
 
                         if not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
                             # Yield ONLY content chunk (don't save)
@@ -198,9 +194,9 @@ class ResponseProcessor:
 
                         # --- Process XML Tool Calls (if enabled and limit not reached) ---
                         if config.xml_tool_calling and not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
-                            xml_chunks = self._extract_xml_chunks(current_xml_content)
+                            # Only the newly appended text is scanned; completed calls are emitted immediately
+                            xml_chunks = xml_parser.feed(chunk_content)
                             for xml_chunk in xml_chunks:
-                                current_xml_content = current_xml_content.replace(xml_chunk, "", 1)
                                 xml_chunks_buffer.append(xml_chunk)
                                 result = self._parse_xml_tool_call(xml_chunk)
                                 if result:
@@ -217,7 +213,7 @@ class ResponseProcessor:
                                         if started_msg_obj: yield started_msg_obj
                                         yielded_tool_indices.add(tool_index) # Mark status as yielded
 
-                                        execution_task = asyncio.create_task(self._execute_tool(tool_call))
+                                        execution_task = tool_scheduler.submit(tool_call)
                                         pending_tool_executions.append({
                                             "task": execution_task, "tool_call": tool_call,
                                             "tool_index": tool_index, "context": context
@@ -287,7 +283,7 @@ class ResponseProcessor:
                                 if started_msg_obj: yield started_msg_obj
                                 yielded_tool_indices.add(tool_index) # Mark status as yielded
 
-                                execution_task = asyncio.create_task(self._execute_tool(tool_call_data))
+                                execution_task = tool_scheduler.submit(tool_call_data)
                                 pending_tool_executions.append({
                                     "task": execution_task, "tool_call": tool_call_data,
                                     "tool_index": tool_index, "context": context
@@ -425,9 +421,10 @@ class ResponseProcessor:
                  # Gather XML tool calls from buffer (up to limit)
                 parsed_xml_data = []
                 if config.xml_tool_calling:
-                    # Reparse remaining content just in case (should be empty if processed correctly)
-                    xml_chunks = self._extract_xml_chunks(current_xml_content)
-                    xml_chunks_buffer.extend(xml_chunks)
+                    # The incremental parser has already emitted every complete chunk;
+                    # anything still buffered is an unterminated tag and is not executable
+                    if xml_parser.in_tool_call:
+                        logger.debug("Stream ended inside an unterminated XML tool call, ignoring it")
                     # Process only chunks not already handled in the stream loop
                     remaining_limit = config.max_xml_tool_calls - xml_tool_call_count if config.max_xml_tool_calls > 0 else len(xml_chunks_buffer)
                     xml_chunks_to_process = xml_chunks_buffer[:remaining_limit] # Ensure limit is respected
@@ -529,6 +526,8 @@ class ResponseProcessor:
                              logger.error(f"Failed to save tool result for index {tool_idx}, not yielding result message.")
                              # Optionally yield error status for saving failure?
 
+            prompt_cache_metrics.record(llm_model, stream_usage)
+
             # --- Calculate and Store Cost ---
             if last_assistant_message_object: # Only calculate if assistant message was saved
                 try:
@@ -679,6 +678,8 @@ class ResponseProcessor:
                  )
                  if err_msg_obj: yield err_msg_obj
 
+            prompt_cache_metrics.record(llm_model, getattr(llm_response, 'usage', None))
+
             # --- Calculate and Store Cost ---
             if assistant_message_object: # Only calculate if assistant message was saved
                 try:
@@ -858,70 +859,18 @@ class ResponseProcessor:
             logger.error(f"Error extracting attribute: {e}")
             return None
 
+    def _create_xml_parser(self) -> XmlToolCallStreamParser:
+        """Create an incremental XML tool call parser for the registered tags."""
+        return XmlToolCallStreamParser(self.tool_registry.get_xml_tag_matcher())
+
     def _extract_xml_chunks(self, content: str) -> List[str]:
-        """Extract complete XML chunks using start and end pattern matching."""
-        chunks = []
-        pos = 0
-        
+        """Extract complete XML chunks from a full (non-streamed) content string."""
         try:
-            while pos < len(content):
-                # Find the next tool tag
-                next_tag_start = -1
-                current_tag = None
-                
-                # Find the earliest occurrence of any registered tag
-                for tag_name in self.tool_registry.xml_tools.keys():
-                    start_pattern = f'<{tag_name}'
-                    tag_pos = content.find(start_pattern, pos)
-                    
-                    if tag_pos != -1 and (next_tag_start == -1 or tag_pos < next_tag_start):
-                        next_tag_start = tag_pos
-                        current_tag = tag_name
-                
-                if next_tag_start == -1 or not current_tag:
-                    break
-                
-                # Find the matching end tag
-                end_pattern = f'</{current_tag}>'
-                tag_stack = []
-                chunk_start = next_tag_start
-                current_pos = next_tag_start
-                
-                while current_pos < len(content):
-                    # Look for next start or end tag of the same type
-                    next_start = content.find(f'<{current_tag}', current_pos + 1)
-                    next_end = content.find(end_pattern, current_pos)
-                    
-                    if next_end == -1:  # No closing tag found
-                        break
-                    
-                    if next_start != -1 and next_start < next_end:
-                        # Found nested start tag
-                        tag_stack.append(next_start)
-                        current_pos = next_start + 1
-                    else:
-                        # Found end tag
-                        if not tag_stack:  # This is our matching end tag
-                            chunk_end = next_end + len(end_pattern)
-                            chunk = content[chunk_start:chunk_end]
-                            chunks.append(chunk)
-                            pos = chunk_end
-                            break
-                        else:
-                            # Pop nested tag
-                            tag_stack.pop()
-                            current_pos = next_end + 1
-                
-                if current_pos >= len(content):  # Reached end without finding closing tag
-                    break
-                
-                pos = max(pos + 1, current_pos)
-        
+            return self._create_xml_parser().feed(content)
         except Exception as e:
             logger.error(f"Error extracting XML chunks: {e}")
             logger.error(f"Content was: {content}")
-        
-        return chunks
+            return []
 
     def _parse_xml_tool_call(self, xml_chunk: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
         """Parse XML chunk into tool call format and return parsing details.
@@ -1054,6 +1003,18 @@ class ResponseProcessor:
         return parsed_data
 
     # Tool execution methods
+    def _create_tool_scheduler(self, execution_strategy: ToolExecutionStrategy) -> ToolCallScheduler:
+        """Create a scheduler for the tool calls of one response.
+        
+        With the parallel strategy, calls run concurrently unless their ToolAccess
+        conflicts; with any other strategy each call waits for all earlier ones.
+        """
+        return ToolCallScheduler(
+            self._execute_tool,
+            self.tool_registry.get_tool_access,
+            sequential=execution_strategy != "parallel"
+        )
+
     async def _execute_tool(self, tool_call: Dict[str, Any]) -> ToolResult:
         """Execute a single tool call and return the result."""
         try:
@@ -1099,7 +1060,8 @@ class ResponseProcessor:
             tool_calls: List of tool calls to execute
             execution_strategy: Strategy for executing tools:
                 - "sequential": Execute tools one after another, waiting for each to complete
-                - "parallel": Execute all tools simultaneously for better performance 
+                - "parallel": Execute tools simultaneously, serializing only calls
+                  whose ToolAccess conflicts
                 
         Returns:
             List of tuples containing the original tool call and its result
@@ -1165,8 +1127,9 @@ class ResponseProcessor:
     async def _execute_tools_in_parallel(self, tool_calls: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], ToolResult]]:
         """Execute tool calls in parallel and return results.
         
-        This method executes all tool calls simultaneously using asyncio.gather, which
-        can significantly improve performance when executing multiple independent tools.
+        This method starts all tool calls at once and gathers them with asyncio.gather.
+        Calls whose ToolAccess conflicts with an earlier call wait for it, so only
+        independent tools actually overlap.
         
         Args:
             tool_calls: List of tool calls to execute
@@ -1181,8 +1144,9 @@ class ResponseProcessor:
             tool_names = [t.get('function_name', 'unknown') for t in tool_calls]
             logger.info(f"Executing {len(tool_calls)} tools in parallel: {tool_names}")
             
-            # Create tasks for all tool calls
-            tasks = [self._execute_tool(tool_call) for tool_call in tool_calls]
+            # Create tasks for all tool calls, ordered only where their access conflicts
+            scheduler = self._create_tool_scheduler("parallel")
+            tasks = [scheduler.submit(tool_call) for tool_call in tool_calls]
             
             # Execute all tasks concurrently with error handling
             results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -1246,6 +1210,10 @@ class ResponseProcessor:
                 metadata["parsing_details"] = parsing_details
                 logger.info("Adding parsing_details to tool result metadata")
             # ---
+
+            # Execution details reported by the tool (e.g. result cache hits)
+            if getattr(result, 'metadata', None):
+                metadata.update(result.metadata)
             
             # Check if this is a native function call (has id field)
             if "id" in tool_call:
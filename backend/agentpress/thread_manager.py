@@ -16,7 +16,12 @@ from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Liter
 from services.llm import make_llm_api_call
 from agentpress.tool import Tool
 from agentpress.tool_registry import ToolRegistry
-from agentpress.context_manager import ContextManager
+from agentpress.context_builder import get_context_budget
+from agentpress.context_manager import ContextManager, RESERVE_TOKENS
+from agentpress.message_buffer import MessageWriteBuffer
+from agentpress.message_cache import ThreadMessageCache, format_llm_message
+from agentpress.prompt_cache import get_system_prompt
+from agentpress.token_counting import token_metadata
 from agentpress.response_processor import (
     ResponseProcessor, 
     ProcessorConfig    
@@ -35,19 +40,17 @@ class ThreadManager:
     XML-based tool execution patterns.
     """
 
-    def get_recent_llm_messages(self, messages, max_messages=10):
-        """
-        裁剪历史消息，只保留最近max_messages条（不包括system prompt）。
-        """
-        if len(messages) > max_messages:
-            return messages[-max_messages:]
-        return messages
-
-    def __init__(self):
+    def __init__(self, enable_write_behind: bool = True):
         """Initialize ThreadManager.
     
+        Args:
+            enable_write_behind: Buffer non-LLM status/cost messages and persist them
+                in batched inserts instead of one round trip per message.
         """
         self.db = DBConnection()
+        self.enable_write_behind = enable_write_behind
+        self.message_buffer = MessageWriteBuffer()
+        self.message_cache = ThreadMessageCache()
         self.tool_registry = ToolRegistry()
         self.response_processor = ResponseProcessor(
             tool_registry=self.tool_registry,
@@ -65,7 +68,8 @@ class ThreadManager:
         type: str, 
         content: Union[Dict[str, Any], List[Any], str], 
         is_llm_message: bool = False,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        created_at: Optional[str] = None
     ):
         """Add a message to the thread in the database.
 
@@ -78,9 +82,21 @@ class ThreadManager:
                             Defaults to False (user message).
             metadata: Optional dictionary for additional message metadata.
                       Defaults to None, stored as an empty JSONB object if None.
+            created_at: Optional ISO timestamp to order the message by instead of the
+                        insert time (used to place summaries after the messages they cover).
+
+        Non-LLM status and cost messages are written behind when enabled: they get a
+        client-generated message_id and are returned immediately, then persisted in
+        batches. LLM messages flush any buffered rows first and are inserted directly,
+        so their ordering and durability are unchanged.
         """
         logger.debug(f"Adding message of type '{type}' to thread {thread_id}")
-        client = await self.db.client
+
+        if is_llm_message:
+            # Count once here so the context threshold check never re-tokenizes the thread
+            llm_message = format_llm_message(content)
+            if llm_message is not None:
+                metadata = {**(metadata or {}), **token_metadata(llm_message)}
         
         # Prepare data for insertion
         data_to_insert = {
@@ -90,6 +106,17 @@ class ThreadManager:
             'is_llm_message': is_llm_message,
             'metadata': json.dumps(metadata or {}), # Ensure metadata is always a JSON object
         }
+        if created_at:
+            data_to_insert['created_at'] = created_at
+
+        if self.enable_write_behind and MessageWriteBuffer.should_buffer(type, is_llm_message):
+            return await self.message_buffer.enqueue(data_to_insert)
+
+        # Persist buffered rows first so they keep their place ahead of this message
+        if self.message_buffer.pending_count:
+            await self.message_buffer.flush()
+
+        client = await self.db.client
         
         try:
             # Add returning='representation' to get the inserted row data including the id
@@ -97,6 +124,7 @@ class ThreadManager:
             logger.info(f"Successfully added message to thread {thread_id}")
             
             if result.data and len(result.data) > 0 and isinstance(result.data[0], dict) and 'message_id' in result.data[0]:
+                await self.message_cache.append(thread_id, result.data[0])
                 return result.data[0]
             else:
                 logger.error(f"Insert operation failed or did not return expected data structure for thread {thread_id}. Result data: {result.data}")
@@ -105,55 +133,58 @@ class ThreadManager:
             logger.error(f"Failed to add message to thread {thread_id}: {str(e)}", exc_info=True)
             raise
 
-    async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
+    async def flush_messages(self) -> int:
+        """Persist any write-behind messages that are still buffered.
+        
+        Returns:
+            Number of messages written
+        """
+        return await self.message_buffer.flush()
+
+    async def get_llm_messages(self, thread_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get all messages for a thread.
         
-        This method uses the SQL function which handles context truncation
-        by considering summary messages.
+        Messages come from the per-thread message cache, which only asks the
+        database for messages newer than the ones it already holds. The SQL
+        functions behind it handle context truncation by considering summary
+        messages.
         
         Args:
             thread_id: The ID of the thread to get messages for.
+            limit: Only return the last `limit` messages. None returns the whole
+                post-summary history.
             
         Returns:
             List of message objects.
         """
         logger.debug(f"Getting messages for thread {thread_id}")
-        client = await self.db.client
         
         try:
-            result = await client.rpc('get_llm_formatted_messages', {'p_thread_id': thread_id}).execute()
-            
-            # Parse the returned data which might be stringified JSON
-            if not result.data:
-                return []
-                
-            # Return properly parsed JSON objects
-            messages = []
-            for item in result.data:
-                if isinstance(item, str):
-                    try:
-                        parsed_item = json.loads(item)
-                        messages.append(parsed_item)
-                    except json.JSONDecodeError:
-                        logger.error(f"Failed to parse message: {item}")
-                else:
-                    messages.append(item)
-
-            # Ensure tool_calls have properly formatted function arguments
-            for message in messages:
-                if message.get('tool_calls'):
-                    for tool_call in message['tool_calls']:
-                        if isinstance(tool_call, dict) and 'function' in tool_call:
-                            # Ensure function.arguments is a string
-                            if 'arguments' in tool_call['function'] and not isinstance(tool_call['function']['arguments'], str):
-                                tool_call['function']['arguments'] = json.dumps(tool_call['function']['arguments'])
-
-            return messages
-            
+            return await self.message_cache.get_messages(thread_id, limit=limit)
         except Exception as e:
             logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
             return []
 
+    async def get_context_messages(self, thread_id: str, max_tokens: int, model: str) -> List[Dict[str, Any]]:
+        """Get the newest messages of a thread that fit in a token budget.
+        
+        Assistant messages are kept together with their tool results, and
+        oversized tool outputs are shortened (see context_builder).
+        
+        Args:
+            thread_id: The ID of the thread to get messages for.
+            max_tokens: Token budget for the messages.
+            model: Model whose tokenizer the budget is for.
+            
+        Returns:
+            List of message objects.
+        """
+        try:
+            return await self.message_cache.get_context_window(thread_id, max_tokens, model)
+        except Exception as e:
+            logger.error(f"Failed to build context window for thread {thread_id}, using the last 10 messages: {str(e)}", exc_info=True)
+            return await self.get_llm_messages(thread_id, limit=10)
+
     async def run_thread(
         self,
         thread_id: str,
@@ -208,43 +239,13 @@ class ThreadManager:
         if max_xml_tool_calls > 0 and not processor_config.max_xml_tool_calls:
             processor_config.max_xml_tool_calls = max_xml_tool_calls
             
-        # Create a working copy of the system prompt to potentially modify
-        working_system_prompt = system_prompt.copy()
-
-        # Add XML examples to system prompt if requested, do this only ONCE before the loop
-        if include_xml_examples and processor_config.xml_tool_calling:
-            xml_examples = self.tool_registry.get_xml_examples()
-            if xml_examples:
-                examples_content = """
---- XML TOOL CALLING ---
-
-In this environment you have access to a set of tools you can use to answer the user's question. The tools are specified in XML format.
-Format your tool calls using the specified XML tags. Place parameters marked as 'attribute' within the opening tag (e.g., `<tag attribute='value'>`). Place parameters marked as 'content' between the opening and closing tags. Place parameters marked as 'element' within their own child tags (e.g., `<tag><element>value</element></tag>`). Refer to the examples provided below for the exact structure of each tool.
-String and scalar parameters should be specified as attributes, while content goes between tags.
-Note that spaces for string values are not stripped. The output is parsed with regular expressions.
-
-Here are the XML tools available with examples:
-"""
-                for tag_name, example in xml_examples.items():
-                    examples_content += f"<{tag_name}> Example: {example}\\n"
-
-                system_content = working_system_prompt.get('content')
-
-                if isinstance(system_content, str):
-                    working_system_prompt['content'] += examples_content
-                    logger.debug("Appended XML examples to string system prompt content.")
-                elif isinstance(system_content, list):
-                    appended = False
-                    for item in working_system_prompt['content']: # Modify the copy
-                        if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
-                            item['text'] += examples_content
-                            logger.debug("Appended XML examples to the first text block in list system prompt content.")
-                            appended = True
-                            break
-                    if not appended:
-                        logger.warning("System prompt content is a list but no text block found to append XML examples.")
-                else:
-                    logger.warning(f"System prompt content is of unexpected type ({type(system_content)}), cannot add XML examples.")
+        # Combined system prompt (with XML examples if requested), built once per tool set and reused
+        cached_system_prompt = get_system_prompt(
+            system_prompt,
+            tool_registry=self.tool_registry,
+            include_xml_examples=include_xml_examples and processor_config.xml_tool_calling
+        )
+        working_system_prompt = cached_system_prompt.message
         
         # Control whether we need to auto-continue due to tool_calls finish reason
         auto_continue = True
@@ -257,41 +258,33 @@ Here are the XML tools available with examples:
                 nonlocal processor_config 
                 # Note: processor_config is now guaranteed to exist due to check above
                 
-                # 1. Get messages from thread for LLM call
-                messages = await self.get_llm_messages(thread_id)
-                # 只保留最近10条消息，减少token消耗
-                messages = self.get_recent_llm_messages(messages, max_messages=10)
-                
-                # 2. Check token count before proceeding
+                # 1. Check token count before proceeding
                 token_count = 0
+                token_threshold = self.context_manager.token_threshold
                 try:
-                    from litellm import token_counter
-                    # Use the potentially modified working_system_prompt for token counting
-                    token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages) 
-                    token_threshold = self.context_manager.token_threshold
+                    # The system prompt's count is cached with it, message counts are kept per thread
+                    token_count = cached_system_prompt.token_count(llm_model)
+                    token_count += await self.message_cache.get_token_count(thread_id, llm_model)
                     logger.info(f"Thread {thread_id} token count: {token_count}/{token_threshold} ({(token_count/token_threshold)*100:.1f}%)")
                     
-                    if token_count >= token_threshold and enable_context_manager:
-                        logger.info(f"Thread token count ({token_count}) exceeds threshold ({token_threshold}), summarizing...")
-                        summarized = await self.context_manager.check_and_summarize_if_needed(
+                    if not enable_context_manager:
+                        logger.info("Automatic summarization disabled. Skipping token count check and summarization.")
+                    elif token_count >= self.context_manager.soft_token_threshold:
+                        # Summarize ahead of time; the summary is picked up by a later turn
+                        self.context_manager.schedule_summarization(
                             thread_id=thread_id,
                             add_message_callback=self.add_message,
-                            model=llm_model,
-                            force=True
+                            model=llm_model
                         )
-                        if summarized:
-                            logger.info("Summarization complete, fetching updated messages with summary")
-                            messages = await self.get_llm_messages(thread_id)
-                            # Recount tokens after summarization, using the modified prompt
-                            new_token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages) 
-                            logger.info(f"After summarization: token count reduced from {token_count} to {new_token_count}")
-                        else:
-                            logger.warning("Summarization failed or wasn't needed - proceeding with original messages")
-                    elif not enable_context_manager: # Added condition for clarity
-                        logger.info("Automatic summarization disabled. Skipping token count check and summarization.")
 
                 except Exception as e:
                     logger.error(f"Error counting tokens or summarizing: {str(e)}")
+
+                # 2. Get the newest messages that fit the model's token budget. Until a
+                # summary is ready this also keeps the context under the threshold.
+                budget = min(get_context_budget(llm_model), token_threshold - RESERVE_TOKENS)
+                budget -= cached_system_prompt.token_count(llm_model)
+                messages = await self.get_context_messages(thread_id, budget, llm_model)
                 
                 # 3. Prepare messages for LLM call + add temporary message if it exists
                 # Use the working_system_prompt which may contain the XML examples
@@ -0,0 +1,82 @@
+"""
+Token counting for AgentPress thread context.
+
+Checking a thread against its token threshold used to re-tokenize the whole
+post-summary history on every turn. Counts are now computed per message:
+- Each LLM message is counted once when it is written and the count is stored
+  in its metadata, keyed by tokenizer
+- Models that share a tokenizer share counts, so switching between them costs nothing
+- A bounded cache keyed by message content avoids recounting messages that
+  are read back without a stored count
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Dict
+
+from litellm import token_counter
+
+from utils.logger import logger
+
+DEFAULT_TOKEN_MODEL = "gpt-4"       # Tokenizer used for counts stored at insert time
+TOKEN_METADATA_KEY = "llm_tokens"   # metadata: {"llm_tokens": {"<tokenizer>": count}}
+COUNT_CACHE_SIZE = 10000
+
+_tokenizer_keys: Dict[str, str] = {}
+_counts: "OrderedDict[str, int]" = OrderedDict()
+
+
+def tokenizer_key(model: str) -> str:
+    """Identify the tokenizer litellm uses for a model.
+
+    Models counted with the default OpenAI tokenizer share one key; models with
+    their own (Hugging Face) tokenizer are keyed by model name.
+    """
+    key = _tokenizer_keys.get(model)
+    if key is None:
+        try:
+            from litellm.utils import _select_tokenizer
+            tokenizer_type = _select_tokenizer(model=model).get("type")
+            key = "openai_tokenizer" if tokenizer_type == "openai_tokenizer" else f"{tokenizer_type}:{model}"
+        except Exception as e:
+            logger.debug(f"Could not determine tokenizer for {model}, keying counts by model: {e}")
+            key = model
+        _tokenizer_keys[model] = key
+    return key
+
+
+def count_message_tokens(message: Dict[str, Any], model: str = DEFAULT_TOKEN_MODEL) -> int:
+    """Count the tokens of one LLM message, reusing earlier counts of identical messages.
+
+    The count includes litellm's per-message overhead, so the sum over a thread
+    slightly overestimates a single count of all its messages.
+    """
+    digest = hashlib.sha1(json.dumps(message, sort_keys=True, default=str).encode()).hexdigest()
+    cache_key = f"{tokenizer_key(model)}:{digest}"
+    count = _counts.get(cache_key)
+    if count is not None:
+        _counts.move_to_end(cache_key)
+        return count
+
+    count = token_counter(model=model, messages=[message])
+    _counts[cache_key] = count
+    while len(_counts) > COUNT_CACHE_SIZE:
+        _counts.popitem(last=False)
+    return count
+
+
+def stored_token_counts(metadata: Any) -> Dict[str, int]:
+    """Get the counts stored in a message's metadata, keyed by tokenizer."""
+    if isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except json.JSONDecodeError:
+            return {}
+    counts = metadata.get(TOKEN_METADATA_KEY) if isinstance(metadata, dict) else None
+    return dict(counts) if isinstance(counts, dict) else {}
+
+
+def token_metadata(message: Dict[str, Any], model: str = DEFAULT_TOKEN_MODEL) -> Dict[str, Dict[str, int]]:
+    """Metadata entry recording a message's token count, to store when it is written."""
+    return {TOKEN_METADATA_KEY: {tokenizer_key(model): count_message_tokens(message, model)}}
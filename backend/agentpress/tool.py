@@ -4,6 +4,7 @@ Core tool system providing the foundation for creating and managing tools.
 This module defines the base classes and decorators for creating tools in AgentPress:
 - Tool base class for implementing tool functionality
 - Schema decorators for OpenAPI and XML tool definitions
+- Access levels that tell the response processor which tool calls may run concurrently
 - Result containers for standardized tool outputs
 """
 
@@ -21,6 +22,20 @@ class SchemaType(Enum):
     XML = "xml"
     CUSTOM = "custom"
 
+class ToolAccess(str, Enum):
+    """How a tool method interacts with state shared by other tool calls.
+
+    - READ_ONLY: Neither changes nor depends on state other tools change (e.g. web
+      searches); runs alongside any call except exclusive ones
+    - SIDE_EFFECTING: Changes the sandbox or the conversation; runs after earlier
+      side-effecting calls, in the order the LLM issued them
+    - EXCLUSIVE_SANDBOX: Drives stateful sandbox sessions (browser, desktop); runs
+      alone, after every earlier call and before every later one
+    """
+    READ_ONLY = "read_only"
+    SIDE_EFFECTING = "side_effecting"
+    EXCLUSIVE_SANDBOX = "exclusive_sandbox"
+
 @dataclass
 class XMLNodeMapping:
     """Maps an XML node to a function parameter.
@@ -89,9 +104,12 @@ class ToolResult:
     Attributes:
         success (bool): Whether the tool execution succeeded
         output (str): Output message or error description
+        metadata (Dict[str, Any]): Execution details stored with the tool result message
+            (e.g. cache status); left out of the repr the LLM sees
     """
     success: bool
     output: str
+    metadata: Dict[str, Any] = field(default_factory=dict, repr=False, compare=False)
 
 class Tool(ABC):
     """Abstract base class for all tools.
@@ -101,12 +119,16 @@ class Tool(ABC):
     
     Attributes:
         _schemas (Dict[str, List[ToolSchema]]): Registered schemas for tool methods
+        default_tool_access (ToolAccess): Access level of methods without a tool_access decorator
         
     Methods:
         get_schemas: Get all registered tool schemas
+        get_tool_access: Get the access level of a tool method
         success_response: Create a successful result
         fail_response: Create a failed result
     """
+
+    default_tool_access: ToolAccess = ToolAccess.SIDE_EFFECTING
     
     def __init__(self):
         """Initialize tool with empty schema registry."""
@@ -129,6 +151,18 @@ class Tool(ABC):
         """
         return self._schemas
 
+    def get_tool_access(self, method_name: str) -> ToolAccess:
+        """Get the access level of a tool method.
+        
+        Args:
+            method_name: Name of the tool method
+            
+        Returns:
+            The level set with @tool_access, or the class default
+        """
+        method = getattr(self, method_name, None)
+        return getattr(method, 'tool_access', self.default_tool_access)
+
     def success_response(self, data: Union[Dict[str, Any], str]) -> ToolResult:
         """Create a successful tool result.
         
@@ -238,3 +272,10 @@ def custom_schema(schema: Dict[str, Any]):
             schema=schema
         ))
     return decorator
+
+def tool_access(access: ToolAccess):
+    """Decorator declaring how a tool method interacts with other tool calls."""
+    def decorator(func):
+        func.tool_access = access
+        return func
+    return decorator
@@ -0,0 +1,207 @@
+"""
+Result cache for idempotent AgentPress tools.
+
+Searches, crawls and data provider calls return the same result for the same
+arguments over a short window, yet agents repeat them within and across
+threads, paying the provider's latency and quota every time. Tool methods
+decorated with @cached_tool_result are served from a cache instead:
+- Keys are built from the tool name and its normalized arguments, so calls that
+  differ only in defaults, whitespace, case or JSON key order share a result
+- An in-memory LRU tier per process, and optionally a Redis tier shared by workers
+- Each decorated method declares its own TTL; only successful results are cached
+- Identical calls made concurrently share a single execution
+- Per-tool hit/miss counters are added to the result's metadata under "cache"
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from agentpress.tool import ToolResult
+from services import redis
+from utils.config import config
+from utils.logger import logger
+
+DEFAULT_MAX_ENTRIES = 1024  # Results kept in memory (least recently used are evicted)
+REDIS_KEY_PREFIX = "tool_result:"
+
+
+def normalize_value(value: Any) -> Any:
+    """Normalize an argument value for use in a cache key.
+
+    Strings have their whitespace collapsed, and numbers or booleans passed as
+    strings (as XML tool calls do) are converted, so both call formats share
+    keys. Containers are normalized recursively.
+    """
+    if isinstance(value, str):
+        value = re.sub(r"\s+", " ", value).strip()
+        if value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        if re.fullmatch(r"-?\d+", value):
+            return int(value)
+        return value
+    if isinstance(value, dict):
+        return {str(k): normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    return value
+
+
+def cache_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """Build the cache key of a tool call from its normalized arguments."""
+    serialized = json.dumps(normalize_value(arguments), sort_keys=True, default=str)
+    return hashlib.sha256(f"{tool_name}:{serialized}".encode()).hexdigest()
+
+
+class ToolResultCache:
+    """Singleton cache of tool results, shared by every tool instance in the process."""
+
+    _instance: Optional['ToolResultCache'] = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        """Initialize cache state once for the singleton."""
+        self.enabled = config.TOOL_RESULT_CACHE_ENABLED
+        self.use_redis = config.TOOL_RESULT_CACHE_REDIS
+        self.max_entries = DEFAULT_MAX_ENTRIES
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Get the hit and miss counters of every cached tool."""
+        return {tool: dict(counters) for tool, counters in self._stats.items()}
+
+    async def get_or_call(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        ttl: int,
+        call: Callable[[], Any]
+    ) -> ToolResult:
+        """Get a tool result from the cache, or execute the call and cache its result.
+
+        Args:
+            tool_name: Name the tool's counters and keys are grouped under
+            arguments: Normalized call arguments
+            ttl: Seconds a successful result stays cached
+            call: Executes the tool; awaited only on a miss
+
+        Returns:
+            The ToolResult, with this call's cache status in metadata["cache"]
+        """
+        if not self.enabled:
+            return await call()
+
+        key = cache_key(tool_name, arguments)
+        cached, tier = await self._lookup(key)
+        if cached is None and key in self._inflight:
+            cached, tier = await asyncio.shield(self._inflight[key]), "inflight"
+
+        if cached is not None:
+            result = ToolResult(success=cached['success'], output=cached['output'])
+            return self._count(tool_name, result, tier)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await call()
+            if result.success:
+                # Results read back from Redis keep their original expiry in memory
+                stored = {'success': result.success, 'output': result.output, 'expires_at': time.time() + ttl}
+                future.set_result(stored)
+                await self._store(key, stored, ttl)
+            else:
+                future.set_result(None)
+        except BaseException:
+            future.set_result(None)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        return self._count(tool_name, result, None)
+
+    async def _lookup(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Find an unexpired result in memory, then in Redis."""
+        stored = self._entries.get(key)
+        if stored is not None:
+            if stored['expires_at'] > time.time():
+                self._entries.move_to_end(key)
+                return stored, "memory"
+            del self._entries[key]
+
+        if self.use_redis:
+            try:
+                cached = await redis.get(f"{REDIS_KEY_PREFIX}{key}")
+                if cached:
+                    stored = json.loads(cached)
+                    self._remember(key, stored)
+                    return stored, "redis"
+            except Exception as e:
+                logger.warning(f"Failed to read cached tool result from Redis: {str(e)}")
+        return None, None
+
+    async def _store(self, key: str, stored: Dict[str, Any], ttl: int) -> None:
+        """Keep a result in memory and in Redis if enabled."""
+        self._remember(key, stored)
+        if self.use_redis:
+            try:
+                await redis.set(f"{REDIS_KEY_PREFIX}{key}", json.dumps(stored), ex=ttl)
+            except Exception as e:
+                logger.warning(f"Failed to write cached tool result to Redis: {str(e)}")
+
+    def _remember(self, key: str, stored: Dict[str, Any]) -> None:
+        self._entries[key] = stored
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _count(self, tool_name: str, result: ToolResult, tier: Optional[str]) -> ToolResult:
+        """Update the tool's counters and record them in the result's metadata."""
+        counters = self._stats.setdefault(tool_name, {'hits': 0, 'misses': 0})
+        counters['hits' if tier else 'misses'] += 1
+        result.metadata['cache'] = {'hit': tier is not None, 'tier': tier, **counters}
+        logger.debug(f"Tool result cache {'hit (' + tier + ')' if tier else 'miss'} for {tool_name}: {counters}")
+        return result
+
+
+def cached_tool_result(ttl: int, normalize: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None):
+    """Decorator caching the results of an idempotent tool method.
+
+    Args:
+        ttl: Seconds a successful result stays cached
+        normalize: Optional function mapping the call's arguments (with defaults
+            applied) to the arguments the key is built from, for tool-specific
+            equivalences such as case-insensitive queries
+
+    Example:
+        @cached_tool_result(ttl=600, normalize=lambda args: {**args, "query": args["query"].lower()})
+        async def web_search(self, query: str, num_results: int = 20) -> ToolResult:
+            ...
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(list(bound.arguments.items())[1:])  # Without self
+            if normalize:
+                arguments = normalize(arguments)
+            tool_name = f"{type(self).__name__}.{func.__name__}"
+            return await ToolResultCache().get_or_call(
+                tool_name, arguments, ttl, lambda: func(self, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
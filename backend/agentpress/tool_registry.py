@@ -1,5 +1,8 @@
+import hashlib
+import json
 from typing import Dict, Type, Any, List, Optional, Callable
-from agentpress.tool import Tool, SchemaType, ToolSchema
+from agentpress.tool import Tool, SchemaType, ToolSchema, ToolAccess
+from agentpress.xml_tool_parser import XmlTagMatcher
 from utils.logger import logger
 
 
@@ -17,14 +20,19 @@ class ToolRegistry:
         register_tool: Register a tool with optional function filtering
         get_tool: Get a specific tool by name
         get_xml_tool: Get a tool by XML tag name
+        get_tool_access: Get the access level of a tool function
         get_openapi_schemas: Get OpenAPI schemas for function calling
         get_xml_examples: Get examples of XML tool usage
+        get_xml_examples_signature: Get a hash identifying the registered XML examples
+        get_xml_tag_matcher: Get the precompiled matcher for registered XML tags
     """
     
     def __init__(self):
         """Initialize a new ToolRegistry instance."""
         self.tools = {}
         self.xml_tools = {}
+        self._xml_tag_matcher = None
+        self._xml_examples_signature = None
         logger.debug("Initialized new ToolRegistry instance")
     
     def register_tool(self, tool_class: Type[Tool], function_names: Optional[List[str]] = None, **kwargs):
@@ -66,6 +74,8 @@ class ToolRegistry:
                             "schema": schema
                         }
                         registered_xml += 1
+                        self._xml_tag_matcher = None
+                        self._xml_examples_signature = None
                         logger.debug(f"Registered XML tag {schema.xml_schema.tag_name} -> {func_name} from {tool_class.__name__}")
         
         logger.debug(f"Tool registration complete for {tool_class.__name__}: {registered_openapi} OpenAPI functions, {registered_xml} XML tags")
@@ -123,6 +133,23 @@ class ToolRegistry:
             logger.warning(f"XML tool not found for tag: {tag_name}")
         return tool
 
+    def get_tool_access(self, function_name: str) -> ToolAccess:
+        """Get the access level of a tool function.
+        
+        Args:
+            function_name: Name of the tool function (the method name for XML tools)
+            
+        Returns:
+            The function's ToolAccess; unknown functions are treated as side-effecting
+        """
+        tool_info = self.tools.get(function_name)
+        if tool_info:
+            return tool_info['instance'].get_tool_access(function_name)
+        for tool_info in self.xml_tools.values():
+            if tool_info['method'] == function_name:
+                return tool_info['instance'].get_tool_access(function_name)
+        return ToolAccess.SIDE_EFFECTING
+
     def get_openapi_schemas(self) -> List[Dict[str, Any]]:
         """Get OpenAPI schemas for function calling.
         
@@ -150,3 +177,30 @@ class ToolRegistry:
                 examples[schema.xml_schema.tag_name] = schema.xml_schema.example
         logger.debug(f"Retrieved {len(examples)} XML examples")
         return examples
+
+    def get_xml_examples_signature(self) -> str:
+        """Get a hash identifying the registered XML examples.
+        
+        Registries with the same XML tools and examples share a signature, so
+        prompts built from their examples can be cached across runs.
+        
+        Returns:
+            Hex digest of the XML examples in registration order
+        """
+        if self._xml_examples_signature is None:
+            examples = json.dumps(list(self.get_xml_examples().items()))
+            self._xml_examples_signature = hashlib.sha256(examples.encode()).hexdigest()
+        return self._xml_examples_signature
+
+    def get_xml_tag_matcher(self) -> XmlTagMatcher:
+        """Get the precompiled matcher for all registered XML tags.
+        
+        The matcher is built once and reused until another XML tool is registered.
+        
+        Returns:
+            XmlTagMatcher covering every registered XML tag name
+        """
+        if self._xml_tag_matcher is None:
+            self._xml_tag_matcher = XmlTagMatcher.build(self.xml_tools.keys())
+            logger.debug(f"Built XML tag matcher for {len(self.xml_tools)} tags")
+        return self._xml_tag_matcher
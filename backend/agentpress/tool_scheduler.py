@@ -0,0 +1,80 @@
+"""
+Access-aware scheduling of the tool calls of one LLM response.
+
+With several tool calls allowed per turn, independent calls such as a batch of
+web searches should not wait for each other, while calls touching the same
+sandbox state must keep the order the LLM issued them in. Each call is started
+as soon as it is parsed (also while the response is still streaming) and waits
+only for the earlier calls it conflicts with, based on its ToolAccess:
+- READ_ONLY calls wait for the last earlier exclusive call
+- SIDE_EFFECTING calls wait for the last earlier side-effecting or exclusive call
+- EXCLUSIVE_SANDBOX calls wait for every earlier call, and every later call waits for them
+- In sequential mode every call is treated as exclusive
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agentpress.tool import ToolAccess, ToolResult
+from utils.logger import logger
+
+
+class ToolCallScheduler:
+    """Starts the tool calls of one response, ordering only conflicting calls."""
+
+    def __init__(
+        self,
+        execute: Callable[[Dict[str, Any]], Awaitable[ToolResult]],
+        get_access: Callable[[str], ToolAccess],
+        sequential: bool = False
+    ):
+        """Initialize the scheduler.
+
+        Args:
+            execute: Executes a single tool call
+            get_access: Looks up the ToolAccess of a tool function by name
+            sequential: Run every call after all earlier ones
+        """
+        self._execute = execute
+        self._get_access = get_access
+        self._sequential = sequential
+        self._last_exclusive: Optional[asyncio.Task] = None
+        self._last_write: Optional[asyncio.Task] = None  # Last side-effecting or exclusive call
+        self._since_exclusive: List[asyncio.Task] = []  # Calls started since (and including) the last exclusive one
+
+    def submit(self, tool_call: Dict[str, Any]) -> asyncio.Task:
+        """Start a tool call once the earlier calls it conflicts with are done.
+
+        Args:
+            tool_call: Tool call with 'function_name' and 'arguments'
+
+        Returns:
+            Task resolving to the call's ToolResult
+        """
+        function_name = tool_call.get('function_name', 'unknown')
+        access = ToolAccess.EXCLUSIVE_SANDBOX if self._sequential else self._get_access(function_name)
+
+        if access == ToolAccess.EXCLUSIVE_SANDBOX:
+            waits_for = list(self._since_exclusive)
+        elif access == ToolAccess.SIDE_EFFECTING:
+            waits_for = [self._last_write] if self._last_write else []
+        else:
+            waits_for = [self._last_exclusive] if self._last_exclusive else []
+
+        task = asyncio.create_task(self._run(tool_call, waits_for))
+        if access == ToolAccess.EXCLUSIVE_SANDBOX:
+            self._last_exclusive = self._last_write = task
+            self._since_exclusive = [task]
+        else:
+            if access == ToolAccess.SIDE_EFFECTING:
+                self._last_write = task
+            self._since_exclusive.append(task)
+
+        logger.debug(f"Scheduled tool {function_name} ({access.value}) after {len(waits_for)} earlier calls")
+        return task
+
+    async def _run(self, tool_call: Dict[str, Any], waits_for: List[asyncio.Task]) -> ToolResult:
+        """Execute a tool call after the given calls finish, whatever their outcome."""
+        if waits_for:
+            await asyncio.wait(waits_for)
+        return await self._execute(tool_call)
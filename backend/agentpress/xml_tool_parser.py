@@ -0,0 +1,204 @@
+"""
+Incremental XML tool call parsing for AgentPress.
+
+This module provides a streaming parser that detects complete XML tool calls
+(e.g. ``<create-file ...>...</create-file>``) in LLM output as it arrives:
+- Only newly appended text is scanned on each feed
+- Scanned text of a tool call is set aside in a list and joined once, when the
+  call closes, so a multi-megabyte call is never copied per chunk
+- Open tag and nesting state is kept across chunks
+- Tag detection uses a matcher compiled once per tool registry
+- Each tool call is emitted as soon as its closing tag (or ``/>``) arrives
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Pattern
+
+
+@dataclass
+class XmlTagMatcher:
+    """Precompiled patterns for detecting registered XML tool tags.
+
+    Attributes:
+        tag_names: The registered XML tag names the matcher was built from
+        open_pattern: Alternation automaton matching any registered opening tag
+        max_tag_length: Length of the longest registered tag name
+        tag_patterns: Per-tag patterns matching nested opening or closing tags
+    """
+    tag_names: List[str]
+    open_pattern: Optional[Pattern]
+    max_tag_length: int
+    tag_patterns: Dict[str, Pattern] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, tag_names: Iterable[str]) -> 'XmlTagMatcher':
+        """Build a matcher for the given tag names.
+
+        Longer names are tried first so that a tag which is a prefix of
+        another (e.g. ``wait`` and ``wait-sequence``) never shadows it.
+        """
+        names = sorted(set(tag_names), key=len, reverse=True)
+        if not names:
+            return cls(tag_names=[], open_pattern=None, max_tag_length=0)
+
+        alternation = "|".join(re.escape(name) for name in names)
+        open_pattern = re.compile(rf"<({alternation})(?=[\s/>])")
+        tag_patterns = {
+            name: re.compile(rf"<{re.escape(name)}(?=[\s/>])|</{re.escape(name)}>")
+            for name in names
+        }
+        return cls(
+            tag_names=names,
+            open_pattern=open_pattern,
+            max_tag_length=len(names[0]),
+            tag_patterns=tag_patterns
+        )
+
+
+class XmlToolCallStreamParser:
+    """Stateful parser that extracts complete XML tool call chunks from a stream.
+
+    Text is passed in with ``feed`` as it arrives. Each call only scans the
+    newly appended text plus a small look-behind window for tags split across
+    chunk boundaries, so total work is linear in the length of the response.
+    Text outside of tool calls is discarded as soon as it can no longer be
+    the start of a tag. Inside a tool call, text that has been scanned is
+    moved from the buffer to a list of parts, which keeps the buffer (and the
+    cost of appending to it) bounded by the look-behind window plus one chunk.
+    """
+
+    def __init__(self, matcher: XmlTagMatcher):
+        """Initialize the parser.
+
+        Args:
+            matcher: Precompiled tag matcher, usually from ToolRegistry.get_xml_tag_matcher()
+        """
+        self.matcher = matcher
+        self._buffer = ""
+        self._parts: List[str] = []  # Scanned text of the current tool call, before _buffer
+        self._scan_pos = 0
+        self._open_tag: Optional[str] = None
+        self._depth = 0
+        self._in_opening_tag = False
+
+    @property
+    def in_tool_call(self) -> bool:
+        """Whether the parser is currently inside an unfinished tool call."""
+        return self._open_tag is not None
+
+    def reset(self) -> None:
+        """Discard all buffered text and parsing state."""
+        self._buffer = ""
+        self._parts = []
+        self._scan_pos = 0
+        self._open_tag = None
+        self._depth = 0
+        self._in_opening_tag = False
+
+    def feed(self, text: str) -> List[str]:
+        """Append text to the stream and return any newly completed tool call chunks.
+
+        Args:
+            text: Newly received content
+
+        Returns:
+            List of complete XML chunks, in the order they were closed
+        """
+        if not text or self.matcher.open_pattern is None:
+            return []
+
+        self._buffer += text
+        chunks = []
+
+        while True:
+            if self._open_tag is None:
+                if not self._find_opening_tag():
+                    break
+            elif self._in_opening_tag:
+                chunk = self._finish_opening_tag()
+                if chunk is not None:
+                    chunks.append(chunk)
+                elif self._in_opening_tag:
+                    break
+            else:
+                chunk = self._find_closing_tag()
+                if chunk is not None:
+                    chunks.append(chunk)
+                elif self._open_tag is not None:
+                    break
+
+        return chunks
+
+    def _find_opening_tag(self) -> bool:
+        """Look for the next registered opening tag; returns True if one was found."""
+        match = self.matcher.open_pattern.search(self._buffer, self._scan_pos)
+        if match is None:
+            # Keep only a tail long enough to hold a partial '<tag' plus its boundary character
+            keep = self.matcher.max_tag_length + 1
+            if len(self._buffer) > keep:
+                self._buffer = self._buffer[-keep:]
+            self._scan_pos = 0
+            return False
+
+        # Drop the plain text preceding the tool call
+        self._buffer = self._buffer[match.start():]
+        self._open_tag = match.group(1)
+        self._depth = 1
+        self._in_opening_tag = True
+        self._scan_pos = match.end() - match.start()
+        return True
+
+    def _finish_opening_tag(self) -> Optional[str]:
+        """Wait for the end of the opening tag and emit it if the tag is self-closing."""
+        tag_end = self._buffer.find('>', self._scan_pos)
+        if tag_end == -1:
+            # Keep the last character to tell whether a following '>' ends '/>'
+            self._set_aside(len(self._buffer) - 1)
+            self._scan_pos = len(self._buffer)
+            return None
+
+        self._in_opening_tag = False
+        self._scan_pos = tag_end + 1
+        if self._buffer[tag_end - 1] == '/':
+            return self._emit(tag_end + 1)
+        return None
+
+    def _find_closing_tag(self) -> Optional[str]:
+        """Track same-name nesting until the matching closing tag is found."""
+        pattern = self.matcher.tag_patterns[self._open_tag]
+        while True:
+            match = pattern.search(self._buffer, self._scan_pos)
+            if match is None:
+                # Rewind enough to re-detect a '</tag>' split across chunks
+                lookbehind = len(self._open_tag) + 3
+                self._scan_pos = max(self._scan_pos, len(self._buffer) - lookbehind)
+                self._set_aside(self._scan_pos)
+                return None
+
+            if match.group(0).startswith('</'):
+                self._depth -= 1
+                if self._depth == 0:
+                    return self._emit(match.end())
+            else:
+                self._depth += 1
+            self._scan_pos = match.end()
+
+    def _set_aside(self, end: int) -> None:
+        """Move scanned text before ``end`` from the buffer to the tool call's parts."""
+        if end <= 0:
+            return
+        self._parts.append(self._buffer[:end])
+        self._buffer = self._buffer[end:]
+        self._scan_pos -= end
+
+    def _emit(self, end: int) -> str:
+        """Cut a complete chunk off the front of the buffer and reset the tag state."""
+        self._parts.append(self._buffer[:end])
+        chunk = "".join(self._parts)
+        self._parts = []
+        self._buffer = self._buffer[end:]
+        self._scan_pos = 0
+        self._open_tag = None
+        self._depth = 0
+        return chunk
@@ -62,6 +62,16 @@ async def lifespan(app: FastAPI):
         
         # Start background tasks
         asyncio.create_task(agent_api.restore_running_agent_runs())
+        # Index active run keys written before the run index sets existed
+        asyncio.create_task(agent_api.migrate_active_run_keys())
+        
+        # Drop registered sandboxes whose containers are gone
+        from sandbox import registry as sandbox_registry
+        asyncio.create_task(sandbox_registry.reconcile())
+        
+        # Start keeping pre-warmed sandbox containers
+        from sandbox.pool import sandbox_pool
+        await sandbox_pool.start()
         
         yield
         
@@ -69,6 +79,24 @@ async def lifespan(app: FastAPI):
         logger.info("Cleaning up agent resources")
         await agent_api.cleanup()
         
+        # Close pooled HTTP clients to sandbox browser APIs
+        from sandbox.browser_client import close_browser_api_clients
+        await close_browser_api_clients()
+        
+        # Close the pooled HTTP client to RapidAPI data providers
+        from agent.tools.data_providers.RapidDataProviderBase import close_rapid_api_client
+        await close_rapid_api_client()
+        
+        # Close the pooled HTTP client to Tavily
+        from agent.tools.web_search_tool import close_tavily_http_client
+        await close_tavily_http_client()
+        
+        # Remove unassigned pre-warmed sandboxes
+        try:
+            await sandbox_pool.shutdown()
+        except Exception as e:
+            logger.error(f"Error shutting down sandbox pool: {e}")
+        
         # Clean up Redis connection
         try:
             await redis.close()
@@ -181,6 +209,18 @@ async def health_check():
         "instance_id": instance_id
     }
 
+@app.get("/api/health/redis")
+async def redis_metrics():
+    """Redis connection pool and command latency metrics of this instance."""
+    from services import redis
+    return {"instance_id": instance_id, **redis.get_metrics()}
+
+@app.get("/api/health/llm")
+async def llm_metrics():
+    """Prompt cache hit rates of this instance's LLM calls, per model."""
+    from services.llm import prompt_cache_metrics
+    return {"instance_id": instance_id, "prompt_cache": prompt_cache_metrics.snapshot()}
+
 if __name__ == "__main__":
     import uvicorn
     import sys
@@ -7,7 +7,8 @@ from pydantic import BaseModel
 
 from utils.logger import logger
 from utils.auth_utils import get_current_user_id, get_user_id_from_stream_auth, get_optional_user_id
-from sandbox.sandbox import get_or_start_sandbox
+from sandbox.sandbox import get_or_start_sandbox_async
+from sandbox.screenshots import SCREENSHOT_DIR
 from services.supabase import DBConnection
 from agent.api import get_or_create_project_sandbox
 
@@ -103,16 +104,19 @@ async def get_sandbox_by_id_safely(client, sandbox_id: str):
         if retrieved_sandbox_id != sandbox_id:
             logger.warning(f"Retrieved sandbox ID {retrieved_sandbox_id} doesn't match requested ID {sandbox_id} for project {project_id}")
             # Fall back to the direct method if IDs don't match (shouldn't happen but just in case)
-            # 保证返回 awaitable
-            async def dummy_return():
-                return get_or_start_sandbox(sandbox_id)
-            return await dummy_return()
+            return await get_or_start_sandbox_async(sandbox_id)
         
         return sandbox
     except Exception as e:
         logger.error(f"Error retrieving sandbox {sandbox_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve sandbox: {str(e)}")
 
+@router.get("/sandboxes/pool/metrics")
+async def get_sandbox_pool_metrics():
+    """Pre-warmed sandbox pool size, hit/miss counts and claim latency for this worker."""
+    from sandbox.pool import sandbox_pool
+    return sandbox_pool.get_metrics()
+
 @router.post("/sandboxes/{sandbox_id}/files")
 async def create_file(
     sandbox_id: str, 
@@ -131,8 +135,8 @@ async def create_file(
     try:
         # Get sandbox using the safer method
         # sandbox = await get_sandbox_by_id_safely(client, sandbox_id)
-        from sandbox.sandbox import get_or_start_sandbox
-        sandbox = get_or_start_sandbox(sandbox_id)
+        from sandbox.sandbox import get_or_start_sandbox_async
+        sandbox = await get_or_start_sandbox_async(sandbox_id)
 
         # Read file content directly from the uploaded file
         content = await file.read()
@@ -164,8 +168,8 @@ async def create_file_json(
     try:
         # Get sandbox using the safer method
         # sandbox = await get_sandbox_by_id_safely(client, sandbox_id)
-        from sandbox.sandbox import get_or_start_sandbox
-        sandbox = get_or_start_sandbox(sandbox_id)
+        from sandbox.sandbox import get_or_start_sandbox_async
+        sandbox = await get_or_start_sandbox_async(sandbox_id)
 
         # Get file path and content
         path = file_request.get("path")
@@ -210,11 +214,11 @@ async def list_files(
     try:
         # Get sandbox using the safer method
         # sandbox = await get_sandbox_by_id_safely(client, sandbox_id)
-        from sandbox.sandbox import get_or_start_sandbox
-        sandbox = get_or_start_sandbox(sandbox_id)
+        from sandbox.sandbox import get_or_start_sandbox_async
+        sandbox = await get_or_start_sandbox_async(sandbox_id)
         # 日志打印 attach 结果（容器状态、挂载点）
         try:
-            container_status = getattr(sandbox, 'status', lambda: None)()
+            container_status = await sandbox.status_async()
         except Exception as cs_e:
             container_status = f"ERROR: {cs_e}"
         host_workspace = getattr(sandbox, 'host_workspace', None)
@@ -225,6 +229,8 @@ async def list_files(
         logger.info(f"[list_files] list_files调用: sandbox_id={sandbox_id}, path={path}, files_count={len(files)}")
         result = []
         for file in files:
+            if file.is_dir and file.name == SCREENSHOT_DIR:
+                continue  # Browser screenshots are internal to the browser tool
             # Convert file information to our model
             # Ensure forward slashes are used for paths, regardless of OS
             full_path = f"{path.rstrip('/')}/{file.name}" if path != '/' else f"/{file.name}"
@@ -260,8 +266,8 @@ async def read_file(
     try:
         # Get sandbox using the safer method
         # sandbox = await get_sandbox_by_id_safely(client, sandbox_id)
-        from sandbox.sandbox import get_or_start_sandbox
-        sandbox = get_or_start_sandbox(sandbox_id)
+        from sandbox.sandbox import get_or_start_sandbox_async
+        sandbox = await get_or_start_sandbox_async(sandbox_id)
 
         # Read file
         content = sandbox.fs.download_file(path)
@@ -0,0 +1,175 @@
+"""
+HTTP transport for the browser automation API running inside sandboxes.
+
+The automation API (browser_api.py) listens on port 8002 inside the container.
+Instead of running curl through a docker exec for every action, this module
+keeps one pooled async HTTP client per sandbox that talks to the port's host
+mapping directly:
+- Keep-alive connections are reused across actions
+- Connect and read timeouts are applied to every request
+- Response bodies (which carry base64 screenshots) are streamed in chunks
+- Clients are rebuilt when a sandbox's port mapping changes
+
+It also applies the element diffs the API returns when a request passes the
+dom_version the caller already has (`since`).
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from utils.logger import logger
+
+BROWSER_API_PORT = 8002
+BROWSER_API_TIMEOUT = httpx.Timeout(120.0, connect=5.0)  # Page loads can be slow; connecting should not be
+BROWSER_API_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60.0)
+
+_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_browser_api_client(sandbox) -> Optional[httpx.AsyncClient]:
+    """Get the pooled HTTP client for a sandbox's automation API.
+
+    Args:
+        sandbox: The DockerSandbox to talk to
+
+    Returns:
+        The client, or None if the container does not publish the automation
+        API port (containers created before it was mapped)
+    """
+    try:
+        base_url = f"{sandbox.get_preview_link(BROWSER_API_PORT)}/api/automation/"
+    except ValueError:
+        return None
+
+    client = _CLIENTS.get(sandbox.sandbox_id)
+    if client is not None and not client.is_closed and str(client.base_url) == base_url:
+        return client
+
+    if client is not None and not client.is_closed:
+        # 端口映射变化（容器重建或重新绑定），旧连接已无效
+        logger.debug(f"Browser API address changed for sandbox {sandbox.sandbox_id}, recreating client")
+        _schedule_close(client)
+
+    client = httpx.AsyncClient(base_url=base_url, timeout=BROWSER_API_TIMEOUT, limits=BROWSER_API_LIMITS)
+    _CLIENTS[sandbox.sandbox_id] = client
+    return client
+
+
+async def request_browser_api(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    params: Optional[Dict[str, Any]] = None,
+    method: str = "POST",
+    query: Optional[Dict[str, Any]] = None
+) -> Tuple[int, bytes]:
+    """Call an automation endpoint and read the streamed response body.
+
+    Args:
+        client: Client from get_browser_api_client
+        endpoint: Endpoint path under /api/automation (e.g. "navigate_to")
+        params: Query parameters for GET, JSON body otherwise
+        method: HTTP method
+        query: Extra query parameters for POST requests (e.g. since)
+
+    Returns:
+        Tuple of (status_code, body)
+
+    Raises:
+        httpx.TransportError: If the API cannot be reached or times out
+    """
+    if method == "GET":
+        request_kwargs = {'params': params} if params else {}
+    else:
+        request_kwargs = {'json': params} if params else {}
+        if query:
+            request_kwargs['params'] = query
+
+    async with client.stream(method, endpoint, **request_kwargs) as response:
+        body = bytearray()
+        async for chunk in response.aiter_bytes():
+            body.extend(chunk)
+        return response.status_code, bytes(body)
+
+
+async def close_browser_api_clients():
+    """Close all pooled clients, e.g. on shutdown."""
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing browser API client: {e}")
+
+
+def _schedule_close(client: httpx.AsyncClient):
+    try:
+        asyncio.get_running_loop().create_task(client.aclose())
+    except RuntimeError:
+        pass
+
+
+def apply_elements_diff(base: List[Dict[str, Any]], diff: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rebuild an interactive element list from its base and an elements_diff.
+
+    Args:
+        base: interactive_elements of the state the diff was taken against
+        diff: elements_diff from the automation API
+
+    Returns:
+        The full element list, ordered by index
+    """
+    by_index = {element['index']: element for element in base}
+    for index in diff.get('removed', []):
+        by_index.pop(index, None)
+    for element in diff.get('added', []):
+        by_index[element['index']] = element
+    return [by_index[index] for index in sorted(by_index)]
+
+
+def resolve_browser_state(states: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Get the full latest browser state from a sequence of stored states.
+
+    States stored with an elements_diff only hold the changes since the
+    previous state, so the element list is rebuilt from the most recent full
+    state forward.
+
+    Args:
+        states: browser_state message contents, newest first
+
+    Returns:
+        Copy of the newest state with interactive_elements filled in. If the
+        chain of diffs is incomplete, only the elements of the newest diff are
+        included.
+    """
+    latest = dict(states[0])
+    if not latest.get('elements_diff'):
+        return latest
+
+    chain = []
+    for state in states:
+        chain.append(state)
+        if not state.get('elements_diff'):
+            break
+    else:
+        latest['interactive_elements'] = latest['elements_diff'].get('added', [])
+        return latest
+
+    full = chain.pop()
+    elements = full.get('interactive_elements') or []
+    version = full.get('dom_version')
+    for state in reversed(chain):
+        diff = state['elements_diff']
+        if diff.get('base') != version:
+            logger.warning(f"Browser state diff base {diff.get('base')} does not match {version}")
+            latest['interactive_elements'] = latest['elements_diff'].get('added', [])
+            return latest
+        elements = apply_elements_diff(elements, diff)
+        version = state.get('dom_version')
+
+    latest['interactive_elements'] = elements
+    if not latest.get('elements'):
+        latest['elements'] = full.get('elements')
+    return latest
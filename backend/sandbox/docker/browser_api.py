@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Body
+from fastapi import FastAPI, APIRouter, HTTPException, Body, Depends, Query
 from playwright.async_api import async_playwright, Browser, Page, ElementHandle
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any, Union
@@ -11,6 +11,10 @@ from dataclasses import dataclass, field
 from datetime import datetime
 import os
 import random
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextvars import ContextVar
 from functools import cached_property
 import traceback
 import pytesseract
@@ -72,6 +76,9 @@ class DragDropAction(BaseModel):
     steps: Optional[int] = 10
     delay_ms: Optional[int] = 5
 
+class OCRAction(BaseModel):
+    screenshot_hash: Optional[str] = None  # Screenshot from an earlier action; None takes a new one
+
 class DoneAction(BaseModel):
     success: bool = True
     text: str = ""
@@ -246,6 +253,7 @@ class DOMState:
     title: str = ""
     pixels_above: int = 0
     pixels_below: int = 0
+    dom_version: Optional[str] = None
 
 #######################################################
 # Browser Action Result Model
@@ -264,7 +272,9 @@ class BrowserActionResult(BaseModel):
     pixels_above: int = 0
     pixels_below: int = 0
     content: Optional[str] = None
-    ocr_text: Optional[str] = None  # Added field for OCR text
+    ocr_text: Optional[str] = None  # Only filled when the request asks for OCR (include_ocr=true)
+    screenshot_hash: Optional[str] = None  # Key for fetching OCR text later via /automation/ocr
+    ocr_pending: bool = False  # The DOM text does not cover the viewport; OCR of the screenshot is running
     
     # Additional metadata
     element_count: int = 0  # Number of interactive elements found
@@ -272,16 +282,105 @@ class BrowserActionResult(BaseModel):
     viewport_width: Optional[int] = None
     viewport_height: Optional[int] = None
     
+    # Change tracking
+    dom_version: Optional[str] = None  # Changes whenever the page's DOM, scroll position or layout changes
+    elements_diff: Optional[Dict[str, Any]] = None  # Replaces interactive_elements when the request passes since
+    
     class Config:
         arbitrary_types_allowed = True
 
+#######################################################
+# Request options
+#######################################################
+
+# Set per request from query parameters accepted by every automation endpoint
+_include_ocr: ContextVar[bool] = ContextVar("include_ocr", default=False)
+_elements_since: ContextVar[Optional[str]] = ContextVar("elements_since", default=None)
+
+async def request_options(
+    include_ocr: bool = Query(False, description="Wait for OCR text of the screenshot in the response"),
+    since: Optional[str] = Query(None, description="dom_version the caller already has; elements are then returned as a diff against it")
+):
+    _include_ocr.set(include_ocr)
+    _elements_since.set(since)
+
+#######################################################
+# DOM change tracking
+#######################################################
+
+DOM_SNAPSHOT_CACHE_SIZE = 8  # Element lists kept by dom_version as diff bases
+
+# 在页面中安装 MutationObserver：DOM 变化、滚动、窗口缩放和资源加载都会让版本号递增。
+# 版本号不变时上次的 selector map 仍然有效，无需再次读取布局。
+# token 在每个新文档中重新生成，导航后版本不会与旧页面混淆
+DOM_TRACKER_JS = """
+() => {
+    if (!window.__heliosDomTracker) {
+        const tracker = { token: Math.random().toString(36).slice(2, 10), version: 0 };
+        const bump = () => { tracker.version++; };
+        new MutationObserver(bump).observe(document, {
+            subtree: true, childList: true, attributes: true, characterData: true
+        });
+        window.addEventListener('scroll', bump, { passive: true, capture: true });
+        window.addEventListener('resize', bump, { passive: true });
+        document.addEventListener('load', bump, true);
+        window.__heliosDomTracker = tracker;
+    }
+    return window.__heliosDomTracker.token + ':' + window.__heliosDomTracker.version;
+}
+"""
+
+def diff_elements(base: List[Dict[str, Any]], current: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Diff two interactive element lists by index
+    
+    Returns a dict with `added` (new or changed elements, replacing the base
+    element at the same index) and `removed` (indices no longer present)
+    """
+    base_by_index = {element['index']: element for element in base}
+    current_indices = set()
+    added = []
+    for element in current:
+        current_indices.add(element['index'])
+        if base_by_index.get(element['index']) != element:
+            added.append(element)
+    removed = [index for index in base_by_index if index not in current_indices]
+    return {'added': added, 'removed': removed}
+
+#######################################################
+# OCR
+#######################################################
+
+# OCR 是 CPU 密集型操作，放在独立进程中执行，避免阻塞事件循环
+OCR_WORKERS = int(os.getenv("BROWSER_OCR_WORKERS", "1"))
+OCR_CACHE_SIZE = 64  # OCR results kept, keyed by screenshot hash
+OCR_SCREENSHOT_CACHE_SIZE = 16  # Screenshots kept for lazy OCR requests
+OCR_DOM_TEXT_MIN_CHARS = 200  # Visible DOM text above this covers the viewport
+OCR_MAX_MEDIA_RATIO = 0.5  # ...unless canvas/img/video cover more of the viewport than this
+
+def run_ocr(image_bytes: bytes) -> str:
+    """Run tesseract on an image. Executed in the OCR process pool."""
+    image = Image.open(io.BytesIO(image_bytes))
+    return pytesseract.image_to_string(image).strip()
+
+def screenshot_hash(screenshot_base64: str) -> str:
+    return hashlib.sha256(screenshot_base64.encode()).hexdigest()
+
+def text_covers_viewport(coverage: Dict[str, Any]) -> bool:
+    """Whether measured DOM text coverage describes the viewport well enough to skip OCR
+
+    Args:
+        coverage: {textChars: visible text characters, mediaRatio: viewport share of canvas/img/video}
+    """
+    return (coverage.get('textChars', 0) >= OCR_DOM_TEXT_MIN_CHARS
+            and coverage.get('mediaRatio', 0) <= OCR_MAX_MEDIA_RATIO)
+
 #######################################################
 # Browser Automation Implementation 
 #######################################################
 
 class BrowserAutomation:
     def __init__(self):
-        self.router = APIRouter()
+        self.router = APIRouter(dependencies=[Depends(request_options)])
         self.browser: Browser = None
         self.pages: List[Page] = []
         self.current_page_index: int = 0
@@ -290,6 +389,16 @@ class BrowserAutomation:
         self.screenshot_dir = os.path.join(os.getcwd(), "screenshots")
         os.makedirs(self.screenshot_dir, exist_ok=True)
         
+        # OCR runs lazily in a process pool, cached by screenshot hash
+        self.ocr_executor: Optional[ProcessPoolExecutor] = None
+        self.ocr_results: OrderedDict[str, str] = OrderedDict()
+        self.ocr_tasks: Dict[str, asyncio.Future] = {}
+        self.recent_screenshots: OrderedDict[str, str] = OrderedDict()
+        
+        # Selector maps are reused until the page's dom_version changes
+        self.dom_cache: Dict[int, tuple] = {}  # id(page) -> ((url, dom_version), selector_map)
+        self.element_snapshots: OrderedDict[str, List[Dict[str, Any]]] = OrderedDict()
+        
         # Register routes
         self.router.on_startup.append(self.startup)
         self.router.on_shutdown.append(self.shutdown)
@@ -326,6 +435,9 @@ class BrowserAutomation:
         
         # Drag and drop
         self.router.post("/automation/drag_drop")(self.drag_drop)
+        
+        # OCR
+        self.router.post("/automation/ocr")(self.ocr)
 
     async def startup(self):
         """Initialize the browser instance on startup"""
@@ -375,6 +487,9 @@ class BrowserAutomation:
         """Clean up browser instance on shutdown"""
         if self.browser:
             await self.browser.close()
+        if self.ocr_executor:
+            self.ocr_executor.shutdown(wait=False, cancel_futures=True)
+            self.ocr_executor = None
     
     async def get_current_page(self) -> Page:
         """Get the current active page"""
@@ -382,10 +497,28 @@ class BrowserAutomation:
             raise HTTPException(status_code=500, detail="No browser pages available")
         return self.pages[self.current_page_index]
     
+    async def get_dom_version(self, page: Page) -> Optional[str]:
+        """Get the page's DOM version, installing the change tracker on first use"""
+        try:
+            return await page.evaluate(DOM_TRACKER_JS)
+        except Exception as e:
+            print(f"Error reading DOM version: {e}")
+            return None
+    
     async def get_selector_map(self) -> Dict[int, DOMElementNode]:
-        """Get a map of selectable elements on the page"""
+        """Get a map of selectable elements on the page
+        
+        The map is cached per page and reused while the page's DOM version is
+        unchanged, which skips the style and layout reads of every element.
+        """
         page = await self.get_current_page()
         
+        dom_version = await self.get_dom_version(page)
+        cache_key = (page.url, dom_version)
+        cached = self.dom_cache.get(id(page))
+        if dom_version and cached and cached[0] == cache_key:
+            return cached[1]
+        
         # Create a selector map for interactive elements
         selector_map = {}
         
@@ -507,6 +640,9 @@ class BrowserAutomation:
                 selector_map[el.get('index', idx + 1)] = element_node
                 root.children.append(element_node)
                 element_node.parent = root
+            
+            if dom_version:
+                self.dom_cache[id(page)] = (cache_key, selector_map)
                 
         except Exception as e:
             print(f"Error getting selector map: {e}")
@@ -581,13 +717,17 @@ class BrowserAutomation:
                 pixels_above = 0
                 pixels_below = 0
             
+            cached = self.dom_cache.get(id(page))
+            dom_version = cached[0][1] if cached and cached[1] is selector_map else None
+            
             return DOMState(
                 element_tree=root,
                 selector_map=selector_map,
                 url=url,
                 title=title,
                 pixels_above=pixels_above,
-                pixels_below=pixels_below
+                pixels_below=pixels_below,
+                dom_version=dom_version
             )
         except Exception as e:
             print(f"Error getting DOM state: {e}")
@@ -636,26 +776,88 @@ class BrowserAutomation:
             return ""
     
     async def extract_ocr_text_from_screenshot(self, screenshot_base64: str) -> str:
-        """Extract text from screenshot using OCR"""
+        """Extract text from screenshot using OCR
+        
+        Runs in the OCR process pool. Results are cached by screenshot hash and
+        concurrent requests for the same screenshot share one OCR run.
+        """
         if not screenshot_base64:
             return ""
-            
+        
+        key = screenshot_hash(screenshot_base64)
+        if key in self.ocr_results:
+            self.ocr_results.move_to_end(key)
+            return self.ocr_results[key]
+        
+        task = self.ocr_tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_ocr(key, screenshot_base64))
+            self.ocr_tasks[key] = task
+        return await asyncio.shield(task)
+    
+    async def _run_ocr(self, key: str, screenshot_base64: str) -> str:
         try:
-            # Decode base64 to image
+            if self.ocr_executor is None:
+                self.ocr_executor = ProcessPoolExecutor(max_workers=OCR_WORKERS)
             image_bytes = base64.b64decode(screenshot_base64)
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Extract text using pytesseract
-            ocr_text = pytesseract.image_to_string(image)
-            
-            # Clean up the text
-            ocr_text = ocr_text.strip()
+            ocr_text = await asyncio.get_running_loop().run_in_executor(self.ocr_executor, run_ocr, image_bytes)
             
+            self.ocr_results[key] = ocr_text
+            while len(self.ocr_results) > OCR_CACHE_SIZE:
+                self.ocr_results.popitem(last=False)
             return ocr_text
         except Exception as e:
             print(f"Error performing OCR: {e}")
             traceback.print_exc()
             return ""
+        finally:
+            self.ocr_tasks.pop(key, None)
+    
+    def remember_screenshot(self, screenshot_base64: str) -> str:
+        """Keep a screenshot so its OCR text can be requested later; returns its hash"""
+        key = screenshot_hash(screenshot_base64)
+        self.recent_screenshots[key] = screenshot_base64
+        self.recent_screenshots.move_to_end(key)
+        while len(self.recent_screenshots) > OCR_SCREENSHOT_CACHE_SIZE:
+            self.recent_screenshots.popitem(last=False)
+        return key
+    
+    async def dom_text_covers_viewport(self) -> bool:
+        """Whether the visible DOM text already describes the viewport, making OCR redundant"""
+        try:
+            page = await self.get_current_page()
+            coverage = await page.evaluate("""
+            () => {
+                const vw = window.innerWidth, vh = window.innerHeight;
+                const inViewport = (r) => r.width > 0 && r.height > 0 &&
+                    r.bottom > 0 && r.right > 0 && r.top < vh && r.left < vw;
+                
+                let textChars = 0;
+                const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+                const range = document.createRange();
+                while (walker.nextNode() && textChars < 10000) {
+                    const node = walker.currentNode;
+                    const text = node.textContent.trim();
+                    if (!text || !node.parentElement) continue;
+                    range.selectNodeContents(node);
+                    if (inViewport(range.getBoundingClientRect())) textChars += text.length;
+                }
+                
+                let mediaArea = 0;
+                for (const el of document.querySelectorAll('canvas, img, video, svg, embed, object, iframe')) {
+                    const r = el.getBoundingClientRect();
+                    if (!inViewport(r)) continue;
+                    const w = Math.min(r.right, vw) - Math.max(r.left, 0);
+                    const h = Math.min(r.bottom, vh) - Math.max(r.top, 0);
+                    mediaArea += Math.max(0, w) * Math.max(0, h);
+                }
+                return { textChars: textChars, mediaRatio: mediaArea / Math.max(1, vw * vh) };
+            }
+            """)
+            return text_covers_viewport(coverage)
+        except Exception as e:
+            print(f"Error measuring DOM text coverage: {e}")
+            return False
     
     async def get_updated_browser_state(self, action_name: str) -> tuple:
         """Helper method to get updated browser state after any action
@@ -700,6 +902,21 @@ class BrowserAutomation:
             
             metadata['interactive_elements'] = interactive_elements
             
+            # With since, send only what changed relative to an element list the caller already has
+            metadata['dom_version'] = dom_state.dom_version
+            if dom_state.dom_version:
+                self.element_snapshots[dom_state.dom_version] = interactive_elements
+                self.element_snapshots.move_to_end(dom_state.dom_version)
+                while len(self.element_snapshots) > DOM_SNAPSHOT_CACHE_SIZE:
+                    self.element_snapshots.popitem(last=False)
+            since = _elements_since.get()
+            base_elements = self.element_snapshots.get(since) if since else None
+            if base_elements is not None:
+                diff = diff_elements(base_elements, interactive_elements)
+                if len(diff['added']) + len(diff['removed']) < len(interactive_elements):
+                    metadata['elements_diff'] = {'base': since, **diff}
+                    metadata['interactive_elements'] = None
+            
             # Get viewport dimensions - Fix syntax error in JavaScript
             try:
                 viewport = await page.evaluate("""
@@ -717,11 +934,17 @@ class BrowserAutomation:
                 metadata['viewport_width'] = 0
                 metadata['viewport_height'] = 0
             
-            # Extract OCR text from screenshot if available
-            ocr_text = ""
+            # OCR is only awaited when the request asks for it. Otherwise it is
+            # started in the background when the DOM text does not describe the
+            # viewport (canvas, images) and the result is flagged ocr_pending, so
+            # the caller fetches the text with /automation/ocr.
             if screenshot:
-                ocr_text = await self.extract_ocr_text_from_screenshot(screenshot)
-                metadata['ocr_text'] = ocr_text
+                metadata['screenshot_hash'] = self.remember_screenshot(screenshot)
+                if _include_ocr.get():
+                    metadata['ocr_text'] = await self.extract_ocr_text_from_screenshot(screenshot)
+                elif not await self.dom_text_covers_viewport():
+                    asyncio.ensure_future(self.extract_ocr_text_from_screenshot(screenshot))
+                    metadata['ocr_pending'] = True
             
             print(f"Got updated state after {action_name}: {len(dom_state.selector_map)} elements")
             return dom_state, screenshot, elements, metadata
@@ -750,11 +973,15 @@ class BrowserAutomation:
             pixels_above=dom_state.pixels_above if dom_state else 0,
             pixels_below=dom_state.pixels_below if dom_state else 0,
             content=content,
-            ocr_text=metadata.get('ocr_text', ""),
+            ocr_text=metadata.get('ocr_text'),
+            screenshot_hash=metadata.get('screenshot_hash'),
+            ocr_pending=metadata.get('ocr_pending', False),
             element_count=metadata.get('element_count', 0),
             interactive_elements=metadata.get('interactive_elements', []),
             viewport_width=metadata.get('viewport_width', 0),
-            viewport_height=metadata.get('viewport_height', 0)
+            viewport_height=metadata.get('viewport_height', 0),
+            dom_version=metadata.get('dom_version'),
+            elements_diff=metadata.get('elements_diff')
         )
 
     # Basic Navigation Actions
@@ -1791,6 +2018,39 @@ class BrowserAutomation:
                 content=None
             )
 
+    # OCR
+    
+    async def ocr(self, action: OCRAction = Body(...)):
+        """Get the OCR text of a screenshot from an earlier action, or of the current page"""
+        try:
+            if action.screenshot_hash:
+                screenshot = self.recent_screenshots.get(action.screenshot_hash)
+                if screenshot is None and action.screenshot_hash not in self.ocr_results:
+                    return BrowserActionResult(
+                        success=False,
+                        message="Screenshot is no longer available",
+                        error=f"Unknown or expired screenshot hash: {action.screenshot_hash}",
+                        screenshot_hash=action.screenshot_hash
+                    )
+                key = action.screenshot_hash
+            else:
+                screenshot = await self.take_screenshot()
+                key = self.remember_screenshot(screenshot) if screenshot else None
+            
+            if key in self.ocr_results:
+                ocr_text = self.ocr_results[key]
+            else:
+                ocr_text = await self.extract_ocr_text_from_screenshot(screenshot)
+            
+            return BrowserActionResult(
+                success=True,
+                message="Extracted OCR text",
+                ocr_text=ocr_text,
+                screenshot_hash=key
+            )
+        except Exception as e:
+            return BrowserActionResult(success=False, message=str(e), error=str(e))
+
 # Create singleton instance
 automation_service = BrowserAutomation()
 
@@ -1843,6 +2103,7 @@ async def test_browser_api():
         
         # Test OCR extraction from screenshot
         print("\n--- Testing OCR Text Extraction ---")
+        result = await automation_service.ocr(OCRAction(screenshot_hash=result.screenshot_hash))
         if result.ocr_text:
             print("OCR text extracted from screenshot:")
             print("=== OCR TEXT START ===")
@@ -1866,6 +2127,7 @@ async def test_browser_api():
             print(f"Page title: {result.title}")
             
             # Test OCR extraction from search results
+            result = await automation_service.ocr(OCRAction(screenshot_hash=result.screenshot_hash))
             if result.ocr_text:
                 print("\nOCR text from search results:")
                 print("=== OCR TEXT START ===")
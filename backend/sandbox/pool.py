@@ -0,0 +1,216 @@
+"""
+Pre-warmed Docker sandbox pool.
+
+Starting a sandbox container means waiting for supervisord, Chromium and VNC,
+which delays the first agent response of every project. This module keeps a
+few started, unassigned containers ready:
+- A container is claimed when a sandbox would otherwise be created or restarted
+- A claimed container is bound to the sandbox's workspace at assignment time
+- The pool refills in the background after each claim
+- Containers idle for longer than the max idle time are removed
+- Hit/miss counts and claim latency are tracked for monitoring
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from sandbox.sandbox import DockerSandbox, _SANDBOXES, run_in_docker_executor
+from utils.config import config
+from utils.logger import logger
+
+
+class SandboxPool:
+    """Singleton pool of started, unassigned DockerSandbox containers.
+
+    The pool is per process, so with several uvicorn workers each worker
+    keeps SANDBOX_POOL_SIZE containers warm.
+    """
+
+    _instance: Optional['SandboxPool'] = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        """Initialize pool state once for the singleton."""
+        self.size = config.SANDBOX_POOL_SIZE
+        self.max_idle_seconds = config.SANDBOX_POOL_MAX_IDLE_SECONDS
+        self.refill_interval = 10.0
+        self._idle: Deque[Tuple[DockerSandbox, float]] = deque()
+        self._creating = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._metrics = {
+            'hits': 0,
+            'misses': 0,
+            'created': 0,
+            'create_failures': 0,
+            'evicted': 0,
+            'claim_latency_total': 0.0,
+            'claim_latency_max': 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    async def start(self):
+        """Start the background refill loop."""
+        if not self.enabled or self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._maintain())
+        logger.info(f"Started sandbox pool with target size {self.size}")
+
+    async def shutdown(self):
+        """Stop refilling and remove all unassigned containers."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while self._idle:
+            sandbox, _ = self._idle.popleft()
+            await self._remove(sandbox)
+        logger.info("Sandbox pool shut down")
+
+    async def claim(self, sandbox_id: Optional[str] = None) -> Optional[DockerSandbox]:
+        """Take a warm container from the pool.
+
+        Args:
+            sandbox_id: Existing sandbox to bind the container to. When None the
+                container keeps its own new sandbox_id.
+
+        Returns:
+            The running, registered sandbox, or None if the pool is empty
+        """
+        if not self.enabled:
+            return None
+
+        start = time.perf_counter()
+        sandbox = None
+        while self._idle:
+            candidate, _ = self._idle.popleft()
+            try:
+                if await candidate.status_async() == "running":
+                    sandbox = candidate
+                    break
+            except Exception as e:
+                logger.warning(f"Discarding pooled sandbox {candidate.sandbox_id}: {e}")
+            await self._remove(candidate)
+        self._notify()
+
+        if sandbox is None:
+            self._metrics['misses'] += 1
+            logger.info("Sandbox pool miss, falling back to a cold start")
+            return None
+
+        try:
+            if sandbox_id:
+                await run_in_docker_executor(sandbox.rebind, sandbox_id)
+        except Exception as e:
+            logger.error(f"Failed to bind pooled sandbox {sandbox.sandbox_id} to {sandbox_id}: {e}", exc_info=True)
+            await self._remove(sandbox)
+            self._metrics['misses'] += 1
+            return None
+
+        _SANDBOXES[sandbox.sandbox_id] = sandbox
+        latency = time.perf_counter() - start
+        self._metrics['hits'] += 1
+        self._metrics['claim_latency_total'] += latency
+        self._metrics['claim_latency_max'] = max(self._metrics['claim_latency_max'], latency)
+        logger.info(f"Claimed pooled sandbox {sandbox.sandbox_id} in {latency * 1000:.0f}ms")
+        return sandbox
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Pool size, hit/miss counts and claim latency."""
+        hits = self._metrics['hits']
+        claims = hits + self._metrics['misses']
+        return {
+            'target_size': self.size,
+            'idle': len(self._idle),
+            'creating': self._creating,
+            'hits': hits,
+            'misses': self._metrics['misses'],
+            'hit_rate': hits / claims if claims else None,
+            'created': self._metrics['created'],
+            'create_failures': self._metrics['create_failures'],
+            'evicted': self._metrics['evicted'],
+            'claim_latency_avg_ms': self._metrics['claim_latency_total'] / hits * 1000 if hits else None,
+            'claim_latency_max_ms': self._metrics['claim_latency_max'] * 1000,
+        }
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _maintain(self):
+        """Evict idle containers and refill the pool until cancelled."""
+        while True:
+            try:
+                await self._evict_expired()
+                await self._refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error maintaining sandbox pool: {e}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _evict_expired(self):
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.max_idle_seconds:
+            sandbox, _ = self._idle.popleft()
+            logger.info(f"Evicting pooled sandbox {sandbox.sandbox_id} after {self.max_idle_seconds}s idle")
+            self._metrics['evicted'] += 1
+            await self._remove(sandbox)
+
+    async def _refill(self):
+        missing = self.size - len(self._idle) - self._creating
+        if missing <= 0:
+            return
+        self._creating += missing
+        results = await asyncio.gather(*(self._create_one() for _ in range(missing)), return_exceptions=True)
+        self._creating -= missing
+        for result in results:
+            if isinstance(result, BaseException):
+                self._metrics['create_failures'] += 1
+                logger.error(f"Failed to create pooled sandbox: {result}")
+            else:
+                self._idle.append((result, time.monotonic()))
+                self._metrics['created'] += 1
+
+    async def _create_one(self) -> DockerSandbox:
+        """Create and start an unassigned sandbox container."""
+        def _create():
+            sandbox = DockerSandbox()
+            sandbox.start()
+            return sandbox
+        return await run_in_docker_executor(_create)
+
+    async def _remove(self, sandbox: DockerSandbox):
+        """Remove an unassigned container and its (empty) workspace directory."""
+        try:
+            await sandbox.stop_async()
+        except Exception as e:
+            logger.warning(f"Failed to remove pooled sandbox {sandbox.sandbox_id}: {e}")
+        try:
+            os.rmdir(sandbox.host_workspace)
+        except OSError:
+            pass
+
+
+sandbox_pool = SandboxPool()
@@ -0,0 +1,144 @@
+"""
+Shared sandbox registry backed by Redis.
+
+`_SANDBOXES` only knows the containers started by the current process. This
+registry records every sandbox container in a Redis hash keyed by sandbox_id,
+so any API worker, including one that just restarted, can find it:
+- Entries hold the container id and name, host port map, workspace and last-used time
+- A lookup attaches to the existing container in O(1) with containers.get
+- Stopped containers are restarted in place rather than replaced
+- A reconciliation pass at startup drops entries whose container is gone
+
+Redis errors are logged and treated as a registry miss, so sandboxes keep
+working (per process) when Redis is unavailable.
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import docker
+
+from services import redis
+from sandbox.sandbox import DockerSandbox, _SANDBOXES, host_port, run_in_docker_executor
+from utils.logger import logger
+
+REGISTRY_KEY = "sandbox_registry"
+
+
+async def register(sandbox: DockerSandbox) -> None:
+    """Record a sandbox's container in the registry and mark it as used now."""
+    if sandbox is None or sandbox.container is None:
+        return
+    entry = {
+        'container_id': sandbox.container.id,
+        'container_name': f"helios_sandbox_{sandbox.sandbox_id[:8]}",
+        'ports': {port: host_port(binding) for port, binding in sandbox.ports.items()},
+        'host_workspace': sandbox.host_workspace,
+        'last_used': datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        await redis.hset(REGISTRY_KEY, sandbox.sandbox_id, json.dumps(entry))
+    except Exception as e:
+        logger.warning(f"Failed to register sandbox {sandbox.sandbox_id}: {e}")
+
+
+async def lookup(sandbox_id: str) -> Optional[Dict[str, Any]]:
+    """Get the registry entry of a sandbox, or None."""
+    try:
+        value = await redis.hget(REGISTRY_KEY, sandbox_id)
+        return json.loads(value) if value else None
+    except Exception as e:
+        logger.warning(f"Failed to look up sandbox {sandbox_id} in registry: {e}")
+        return None
+
+
+async def unregister(sandbox_id: str) -> None:
+    """Remove a sandbox from the registry."""
+    try:
+        await redis.hdel(REGISTRY_KEY, sandbox_id)
+    except Exception as e:
+        logger.warning(f"Failed to unregister sandbox {sandbox_id}: {e}")
+
+
+async def attach(sandbox_id: str) -> Optional[DockerSandbox]:
+    """Attach to the registered container of a sandbox.
+
+    A stopped container is started again. The sandbox is added to this
+    process's _SANDBOXES on success.
+
+    Returns:
+        The running sandbox, or None if it is not registered or its container is gone
+    """
+    entry = await lookup(sandbox_id)
+    if not entry:
+        return None
+
+    def _attach() -> DockerSandbox:
+        sandbox = DockerSandbox.attach(sandbox_id, entry['container_id'])
+        if sandbox.container.status != "running":
+            logger.info(f"Registered container for sandbox {sandbox_id} is {sandbox.container.status}, starting it")
+            sandbox.container.start()
+            sandbox.container.reload()
+        return sandbox
+
+    try:
+        sandbox = await run_in_docker_executor(_attach)
+    except docker.errors.NotFound:
+        logger.info(f"Registered container for sandbox {sandbox_id} no longer exists")
+        await unregister(sandbox_id)
+        return None
+    except Exception as e:
+        logger.warning(f"Failed to attach to registered container for sandbox {sandbox_id}: {e}")
+        return None
+
+    _SANDBOXES[sandbox_id] = sandbox
+    return sandbox
+
+
+async def reconcile() -> Dict[str, int]:
+    """Drop registry entries whose container no longer exists.
+
+    Run at startup. Containers are not attached here; that happens lazily on
+    first use.
+
+    Returns:
+        Counts of running, stopped and removed entries
+    """
+    counts = {'running': 0, 'stopped': 0, 'removed': 0}
+    try:
+        entries = await redis.hgetall(REGISTRY_KEY)
+    except Exception as e:
+        logger.warning(f"Skipping sandbox registry reconciliation: {e}")
+        return counts
+
+    def _statuses() -> Dict[str, Optional[str]]:
+        client = docker.from_env()
+        statuses = {}
+        for sandbox_id, value in entries.items():
+            try:
+                statuses[sandbox_id] = client.containers.get(json.loads(value)['container_id']).status
+            except docker.errors.NotFound:
+                statuses[sandbox_id] = None
+            except Exception as e:
+                logger.warning(f"Could not check container for sandbox {sandbox_id}: {e}")
+                statuses[sandbox_id] = "unknown"
+        return statuses
+
+    try:
+        statuses = await run_in_docker_executor(_statuses)
+    except Exception as e:
+        logger.warning(f"Skipping sandbox registry reconciliation, Docker unavailable: {e}")
+        return counts
+
+    for sandbox_id, status in statuses.items():
+        if status is None:
+            await unregister(sandbox_id)
+            counts['removed'] += 1
+        elif status == "running":
+            counts['running'] += 1
+        else:
+            counts['stopped'] += 1
+
+    logger.info(f"Reconciled sandbox registry: {counts['running']} running, {counts['stopped']} stopped, {counts['removed']} removed")
+    return counts
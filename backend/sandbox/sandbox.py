@@ -1,8 +1,12 @@
 import os
-from typing import Optional
+import asyncio
+import functools
+import shlex
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
 
 import docker
-from docker.models.containers import Container
+from docker.models.containers import Container, ExecResult
 import uuid
 from agentpress.tool import Tool
 from utils.logger import logger
@@ -14,6 +18,40 @@ from agentpress.thread_manager import ThreadManager
 
 # Docker 沙箱管理
 _SANDBOXES = {}
+# 每个 sandbox_id 一把锁，避免并发请求重复创建同名容器
+_SANDBOX_LOCKS: Dict[str, asyncio.Lock] = {}
+
+# docker SDK 是同步的，所有阻塞调用都放到这个有界线程池中执行，避免阻塞事件循环
+_DOCKER_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+# exec 命令包装：记录 shell 的 PID，便于取消时杀掉其子进程树
+_EXEC_PIDFILE = "/tmp/.helios-exec-{token}.pid"
+_EXEC_WRAPPER = 'echo $$ > {pidfile}; "$@"; rc=$?; rm -f {pidfile}; exit $rc'
+_EXEC_KILL = (
+    'kt() { for c in $(pgrep -P "$1"); do kt "$c"; done; kill -TERM "$1" 2>/dev/null; }; '
+    'p=$(cat {pidfile} 2>/dev/null) && for c in $(pgrep -P "$p"); do kt "$c"; done'
+)
+
+
+async def run_in_docker_executor(func, *args, **kwargs):
+    """Run a blocking docker SDK call in the bounded sandbox executor.
+
+    Args:
+        func: The blocking callable
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The callable's return value
+    """
+    global _DOCKER_EXECUTOR
+    if _DOCKER_EXECUTOR is None:
+        _DOCKER_EXECUTOR = ThreadPoolExecutor(
+            max_workers=config.SANDBOX_EXECUTOR_WORKERS,
+            thread_name_prefix="docker-sandbox"
+        )
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_DOCKER_EXECUTOR, functools.partial(func, *args, **kwargs))
 
 import socket
 
@@ -43,6 +81,13 @@ class WorkspaceFileSystem:
         with open(path, "wb") as f:
             f.write(content)
 
+    def delete_file(self, rel_path: str):
+        os.remove(self._full_path(rel_path))
+
+    def touch_file(self, rel_path: str):
+        """更新文件的修改时间"""
+        os.utime(self._full_path(rel_path))
+
     def download_file(self, rel_path: str) -> bytes:
         path = self._full_path(rel_path)
         with open(path, "rb") as f:
@@ -75,6 +120,23 @@ class WorkspaceFileSystem:
             'permissions': oct(stat.st_mode)[-3:],
         })
 
+def workspace_dir(sandbox_id: str) -> str:
+    """宿主机上 sandbox 工作区目录：backend/workspace/{sandbox_id}"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(backend_dir, f"../workspace/{sandbox_id}"))
+
+def container_ports(container: Container) -> dict:
+    """从容器信息中读取端口映射，格式与 DockerSandbox.ports 相同：{"8000/tcp": host_port}"""
+    ports = {}
+    for container_port, bindings in (container.attrs.get('NetworkSettings', {}).get('Ports') or {}).items():
+        if bindings:
+            ports[container_port] = int(bindings[0]['HostPort'])
+    return ports
+
+def host_port(binding) -> int:
+    """端口映射中的主机端口：binding 可以是 host_port，也可以是 (host_ip, host_port)"""
+    return int(binding[1]) if isinstance(binding, (tuple, list)) else int(binding)
+
 def find_free_port():
     s = socket.socket()
     s.bind(('', 0))
@@ -82,18 +144,25 @@ def find_free_port():
     s.close()
     return port
 
+# 容器默认启动参数，预热池中的容器也用它们启动
+DEFAULT_SANDBOX_COMMAND = "/usr/bin/supervisord -c /etc/supervisor/conf.d/supervisord.conf"
+DEFAULT_SANDBOX_ENV = {
+    "VNC_PASSWORD": "vncpassword",
+    "DISPLAY": ":99"
+}
+
 class DockerSandbox:
     def get_preview_link(self, port: int) -> str:
         """
         返回主机实际映射端口的URL（如 http://127.0.0.1:host_port ）。
         """
         # 查找端口映射
-        for container_port, host_port in self.ports.items():
+        for container_port, binding in self.ports.items():
             if container_port.endswith(f"{port}/tcp"):
-                return f"http://127.0.0.1:{host_port}"
+                return f"http://127.0.0.1:{host_port(binding)}"
         raise ValueError(f"未找到容器端口 {port} 的主机映射")
 
-    def __init__(self, command: str = "/usr/bin/supervisord -c /etc/supervisor/conf.d/supervisord.conf", ports: dict = None, env: dict = None, sandbox_id: str = None):
+    def __init__(self, command: str = DEFAULT_SANDBOX_COMMAND, ports: dict = None, env: dict = None, sandbox_id: str = None):
         self.client = docker.from_env()
         self.image = "helios-sandbox:latest"
         self.command = command
@@ -112,13 +181,12 @@ class DockerSandbox:
                 "5901/tcp": find_free_port(),
                 "8000/tcp": find_free_port(),
                 "8080/tcp": find_free_port(),
+                # browser_api 自动化接口没有鉴权，只绑定到主机回环地址，供后端直接 HTTP 调用
+                "8002/tcp": ("127.0.0.1", find_free_port()),
             }
         else:
             self.ports = ports
-        self.env = env or {
-            "VNC_PASSWORD": "vncpassword",
-            "DISPLAY": ":99"
-        }
+        self.env = env or dict(DEFAULT_SANDBOX_ENV)
         if sandbox_id:
             self.sandbox_id = sandbox_id
         else:
@@ -129,17 +197,39 @@ class DockerSandbox:
             self.sandbox_id = sandbox_id
         else:
             self.sandbox_id = str(uuid.uuid4())
-        backend_dir = os.path.dirname(os.path.abspath(__file__))
-        self.host_workspace = os.path.abspath(os.path.join(backend_dir, f"../workspace/{self.sandbox_id}"))
+        self.host_workspace = workspace_dir(self.sandbox_id)
         os.makedirs(self.host_workspace, exist_ok=True)
         self.volumes = {
             self.host_workspace: {'bind': '/workspace', 'mode': 'rw'}
         }
         self.container: Container = None
+        # 异步 exec 的并发限制与正在运行的 exec（用于取消）
+        self._exec_semaphore: Optional[asyncio.Semaphore] = None
+        self._running_execs: set = set()
         # 初始化文件系统代理
         self.fs = WorkspaceFileSystem(self.host_workspace)
         logger.info(f"DockerSandbox initialized with sandbox_id={self.sandbox_id}")
 
+    @classmethod
+    def attach(cls, sandbox_id: str, container_id: str) -> 'DockerSandbox':
+        """Wrap an existing container, e.g. one found in the sandbox registry.
+
+        Args:
+            sandbox_id: The sandbox ID the container belongs to
+            container_id: Docker container ID
+
+        Returns:
+            The sandbox, with its port map read from the container
+
+        Raises:
+            docker.errors.NotFound: If the container no longer exists
+        """
+        sandbox = cls(sandbox_id=sandbox_id, ports={})
+        sandbox.container = sandbox.client.containers.get(container_id)
+        sandbox.ports = container_ports(sandbox.container)
+        logger.info(f"Attached to existing container {container_id[:12]} for sandbox {sandbox_id}")
+        return sandbox
+
     def start(self):
         container_name = f"helios_sandbox_{self.sandbox_id[:8]}"
         try:
@@ -160,6 +250,12 @@ class DockerSandbox:
                 logger.warning(f"Container name conflict for {container_name}, attempting to remove existing container...")
                 try:
                     existing = self.client.containers.get(container_name)
+                    if existing.status == "running":
+                        # 另一个 worker 或重启前的进程启动的容器仍在运行，直接接管而不是删除
+                        self.container = existing
+                        self.ports = container_ports(existing)
+                        logger.info(f"Attached to running container {container_name} instead of replacing it")
+                        return self.container
                     existing.remove(force=True)
                     logger.info(f"Removed existing container {container_name}, retrying...")
                 except Exception as remove_exc:
@@ -199,6 +295,144 @@ class DockerSandbox:
         if self.container:
             return self.container.exec_run(cmd)
 
+    def rebind(self, sandbox_id: str):
+        """Bind this running container to another sandbox_id and its workspace.
+
+        Used when a pre-warmed container is claimed for an existing sandbox.
+        Files already in that sandbox's workspace are moved into the directory
+        mounted at /workspace, and the directory is then renamed to the
+        sandbox's workspace path. A bind mount follows the directory rather
+        than its path, so the running container keeps seeing it.
+
+        An existing container with the sandbox's name is removed only if it has
+        exited or is dead.
+
+        Raises:
+            RuntimeError: If a container named after sandbox_id exists and is not
+                exited or dead; nothing has been moved or renamed then
+        """
+        if sandbox_id == self.sandbox_id:
+            return
+        container_name = f"helios_sandbox_{sandbox_id[:8]}"
+        try:
+            existing = self.client.containers.get(container_name)
+        except docker.errors.NotFound:
+            existing = None
+        if existing is not None and existing.status not in ("exited", "dead"):
+            # 仍在运行（或正在启动）的同名容器属于该沙箱，不能删除替换
+            raise RuntimeError(f"Container {container_name} of sandbox {sandbox_id} is {existing.status}")
+
+        target = workspace_dir(sandbox_id)
+        if os.path.isdir(target):
+            # 同一文件系统内 rename，不复制数据
+            for entry in os.listdir(target):
+                os.replace(os.path.join(target, entry), os.path.join(self.host_workspace, entry))
+            os.rmdir(target)
+        os.rename(self.host_workspace, target)
+
+        if existing is not None:
+            # 旧的同名容器（已停止）需要先删除才能重命名
+            existing.remove(force=True)
+        self.container.rename(container_name)
+
+        logger.info(f"Rebound Docker sandbox {self.sandbox_id} to {sandbox_id}")
+        self.sandbox_id = sandbox_id
+        self.host_workspace = target
+        self.volumes = {target: {'bind': '/workspace', 'mode': 'rw'}}
+        self.fs = WorkspaceFileSystem(target)
+
+    async def start_async(self):
+        """Start the container without blocking the event loop."""
+        return await run_in_docker_executor(self.start)
+
+    async def stop_async(self):
+        """Stop and remove the container without blocking the event loop."""
+        return await run_in_docker_executor(self.stop)
+
+    async def status_async(self) -> str:
+        """Get the container status without blocking the event loop."""
+        return await run_in_docker_executor(self.status)
+
+    async def exec_cmd_async(self, cmd: Union[str, List[str]], timeout: Optional[float] = None) -> Optional[ExecResult]:
+        """Run a command in the container without blocking the event loop.
+
+        At most SANDBOX_MAX_CONCURRENT_EXECS commands run at once per sandbox;
+        further calls wait for a slot. If the command times out, is cancelled,
+        or cancel_execs() is called, its processes inside the container are killed.
+
+        Args:
+            cmd: Command as a string or argument list, as for exec_run
+            timeout: Optional timeout in seconds
+
+        Returns:
+            ExecResult(exit_code, output), same as exec_run
+
+        Raises:
+            asyncio.TimeoutError: If the command did not finish within timeout
+        """
+        if not self.container:
+            return None
+        if self._exec_semaphore is None:
+            self._exec_semaphore = asyncio.Semaphore(config.SANDBOX_MAX_CONCURRENT_EXECS)
+
+        token = uuid.uuid4().hex[:12]
+        async with self._exec_semaphore:
+            exec_info = await run_in_docker_executor(
+                self.client.api.exec_create, self.container.id, self._wrap_exec_cmd(cmd, token)
+            )
+            exec_id = exec_info['Id']
+            self._running_execs.add(token)
+            try:
+                output = await asyncio.wait_for(
+                    run_in_docker_executor(self.client.api.exec_start, exec_id), timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Command in sandbox {self.sandbox_id} timed out after {timeout}s, killing it")
+                await self._kill_exec(token)
+                raise
+            except asyncio.CancelledError:
+                # 不能在已取消的任务里等待，交给后台任务清理
+                asyncio.create_task(self._kill_exec(token))
+                raise
+            finally:
+                self._running_execs.discard(token)
+
+            inspect = await run_in_docker_executor(self.client.api.exec_inspect, exec_id)
+            return ExecResult(inspect.get('ExitCode'), output)
+
+    async def cancel_execs(self) -> int:
+        """Kill all commands currently running through exec_cmd_async.
+
+        The waiting calls return with the killed command's exit code.
+
+        Returns:
+            Number of commands that were cancelled
+        """
+        tokens = list(self._running_execs)
+        if tokens:
+            logger.info(f"Cancelling {len(tokens)} running commands in sandbox {self.sandbox_id}")
+            await asyncio.gather(*(self._kill_exec(token) for token in tokens))
+        return len(tokens)
+
+    @staticmethod
+    def _wrap_exec_cmd(cmd: Union[str, List[str]], token: str) -> List[str]:
+        """Wrap a command so its PID is recorded for cancellation."""
+        args = shlex.split(cmd) if isinstance(cmd, str) else list(cmd)
+        pidfile = _EXEC_PIDFILE.format(token=token)
+        return ["/bin/sh", "-c", _EXEC_WRAPPER.format(pidfile=pidfile), "sh", *args]
+
+    async def _kill_exec(self, token: str):
+        """Kill the process tree started by a wrapped exec."""
+        if not self.container:
+            return
+        pidfile = _EXEC_PIDFILE.format(token=token)
+        try:
+            await run_in_docker_executor(
+                self.container.exec_run, ["/bin/sh", "-c", _EXEC_KILL.replace("{pidfile}", pidfile)]
+            )
+        except Exception as e:
+            logger.warning(f"Failed to kill command {token} in sandbox {self.sandbox_id}: {e}")
+
 def get_or_start_sandbox(sandbox_id: str):
     logger.info(f"[get_or_start_sandbox] 查找沙箱: sandbox_id={sandbox_id}")
     sandbox = _SANDBOXES.get(sandbox_id)
@@ -229,6 +463,62 @@ def get_or_start_sandbox(sandbox_id: str):
         return sandbox
 
 
+async def get_or_start_sandbox_async(sandbox_id: str) -> DockerSandbox:
+    """Async version of get_or_start_sandbox that does not block the event loop.
+
+    Lookup order: this process's _SANDBOXES, the shared Redis registry
+    (attaching to the existing container), a running container with the
+    sandbox's name, the pre-warmed pool, and finally a cold start. Concurrent calls for the same sandbox_id are serialized so
+    only one container gets created.
+    """
+    from sandbox.pool import sandbox_pool
+    from sandbox import registry
+
+    lock = _SANDBOX_LOCKS.setdefault(sandbox_id, asyncio.Lock())
+    async with lock:
+        sandbox = _SANDBOXES.get(sandbox_id)
+        if sandbox is None or await _safe_status(sandbox) != "running":
+            # 其他 worker 或重启前创建的容器：按注册表中的容器 ID 直接接管
+            sandbox = await registry.attach(sandbox_id)
+            if sandbox is None:
+                # 未登记但仍在运行的同名容器（如注册表数据丢失）：接管而不是替换
+                sandbox = await run_in_docker_executor(adopt_running_container, sandbox_id)
+            if sandbox is None:
+                # 需要新容器时优先从预热池领取
+                sandbox = await sandbox_pool.claim(sandbox_id)
+            if sandbox is None:
+                sandbox = await run_in_docker_executor(get_or_start_sandbox, sandbox_id)
+        # 同时刷新 last_used
+        await registry.register(sandbox)
+        return sandbox
+
+
+def adopt_running_container(sandbox_id: str) -> Optional[DockerSandbox]:
+    """Attach to the running container named after a sandbox, if there is one.
+
+    Returns:
+        The sandbox, added to _SANDBOXES, or None if no such container is running
+    """
+    container_name = f"helios_sandbox_{sandbox_id[:8]}"
+    try:
+        container = docker.from_env().containers.get(container_name)
+    except docker.errors.NotFound:
+        return None
+    if container.status != "running":
+        return None
+    sandbox = DockerSandbox.attach(sandbox_id, container.id)
+    _SANDBOXES[sandbox_id] = sandbox
+    logger.info(f"Adopted running container {container_name} for sandbox {sandbox_id}")
+    return sandbox
+
+
+async def _safe_status(sandbox: DockerSandbox) -> Optional[str]:
+    try:
+        return await sandbox.status_async()
+    except Exception:
+        return None
+
+
 def start_supervisord_session(sandbox: DockerSandbox):
     """Start supervisord in a session."""
     session_id = "supervisord-session"
@@ -246,7 +536,7 @@ def start_supervisord_session(sandbox: DockerSandbox):
         logger.error(f"Error starting supervisord session: {str(e)}")
         raise e
 
-def create_sandbox(command: str = "/usr/bin/supervisord -c /etc/supervisor/conf.d/supervisord.conf", ports: dict = None, env: dict = None, sandbox_id: str = None):
+def create_sandbox(command: str = DEFAULT_SANDBOX_COMMAND, ports: dict = None, env: dict = None, sandbox_id: str = None):
     sandbox = DockerSandbox(command, ports, env, sandbox_id=sandbox_id)
     sandbox.start()
     _SANDBOXES[sandbox.sandbox_id] = sandbox
@@ -254,6 +544,26 @@ def create_sandbox(command: str = "/usr/bin/supervisord -c /etc/supervisor/conf.
     return sandbox
 
 
+async def create_sandbox_async(command: str = DEFAULT_SANDBOX_COMMAND, ports: dict = None, env: dict = None, sandbox_id: str = None):
+    """Async version of create_sandbox that does not block the event loop.
+
+    A pre-warmed container is used when the pool has one available and the
+    default ports, command and environment are requested, since pooled
+    containers were started with those. Any other command or env gets a new
+    container.
+    """
+    from sandbox.pool import sandbox_pool
+    from sandbox import registry
+
+    sandbox = None
+    if ports is None and command == DEFAULT_SANDBOX_COMMAND and env in (None, DEFAULT_SANDBOX_ENV):
+        sandbox = await sandbox_pool.claim(sandbox_id)
+    if sandbox is None:
+        sandbox = await run_in_docker_executor(create_sandbox, command, ports, env, sandbox_id=sandbox_id)
+    await registry.register(sandbox)
+    return sandbox
+
+
 class SandboxToolsBase(Tool):
     """Base class for all sandbox tools that provides project-based sandbox access."""
     
@@ -293,7 +603,7 @@ class SandboxToolsBase(Tool):
                 logger.info(f"[_ensure_sandbox] 项目 {self.project_id} 使用沙箱 id: {self._sandbox_id}")
                 
                 # Get or start the sandbox
-                self._sandbox = get_or_start_sandbox(self._sandbox_id)
+                self._sandbox = await get_or_start_sandbox_async(self._sandbox_id)
                 logger.info(f"[_ensure_sandbox] 项目 {self.project_id} 成功获取沙箱实例: {self._sandbox_id}")
                 
                 # # Log URLs if not already printed
@@ -0,0 +1,164 @@
+"""
+Content-addressed storage for browser screenshots.
+
+Browser actions used to store the full base64 JPEG in every browser_state
+message. Screenshots are now written once to the sandbox workspace and
+messages only hold a reference:
+- Files are named by the SHA-256 of their bytes, so identical screenshots are stored once
+- Only the MAX_STORED_SCREENSHOTS most recently used files are kept; the
+  directory is hidden from file listings and file operations
+- A screenshot identical to the previous one reuses its reference
+- A perceptual hash (dHash) and its distance to the previous screenshot are
+  recorded as metrics only; near-identical screenshots are still stored, so
+  small UI changes (a toggled checkbox, a new badge) are never hidden
+- Loaded screenshots are kept in a small in-memory cache for prompt building
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from utils.logger import logger
+
+SCREENSHOT_DIR = ".browser_screenshots"  # Relative to the sandbox workspace
+MAX_STORED_SCREENSHOTS = 100  # Files kept per sandbox; well above the FULL_STATE_EVERY states prompts read back
+_CACHE_SIZE = 32
+
+_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def perceptual_hash(image_bytes: bytes, hash_size: int = 8) -> str:
+    """Compute the difference hash (dHash) of an image as a hex string.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale thumbnail
+    and each bit records whether a pixel is brighter than its right neighbour,
+    so small changes (cursor blink, compression noise) barely move the hash.
+    """
+    image = Image.open(io.BytesIO(image_bytes)).convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = image.tobytes()  # One byte per pixel in "L" mode
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def phash_distance(a: str, b: str) -> int:
+    """Number of differing bits between two perceptual hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+async def store_screenshot(sandbox, screenshot_base64: str, previous: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Store a screenshot in the sandbox workspace and return a reference to it.
+
+    Args:
+        sandbox: The DockerSandbox whose workspace holds the screenshot
+        screenshot_base64: Base64 encoded JPEG
+        previous: Reference returned for the previous screenshot of the same
+            browser; reused when the new screenshot has the same content hash
+
+    Returns:
+        Dict with screenshot_id (content hash), screenshot_path, screenshot_phash and,
+        given a previous screenshot, screenshot_phash_distance to it; or None if the
+        screenshot could not be stored
+    """
+    if not screenshot_base64:
+        return None
+
+    def _store() -> Dict[str, Any]:
+        image_bytes = base64.b64decode(screenshot_base64)
+        content_hash = hashlib.sha256(image_bytes).hexdigest()
+        phash = perceptual_hash(image_bytes)
+
+        if previous and previous.get('screenshot_id') == content_hash:
+            return {**previous, 'screenshot_reused': True, 'screenshot_phash_distance': 0}
+
+        path = f"{SCREENSHOT_DIR}/{content_hash}.jpg"
+        try:
+            sandbox.fs.touch_file(path)  # Already stored: now the most recently used
+        except FileNotFoundError:
+            sandbox.fs.upload_file(path, image_bytes)
+            prune_screenshots(sandbox, MAX_STORED_SCREENSHOTS)
+        reference = {'screenshot_id': content_hash, 'screenshot_path': path, 'screenshot_phash': phash}
+        if previous and previous.get('screenshot_phash'):
+            # 仅作指标：相邻截图的视觉差异，不用于判定复用
+            reference['screenshot_phash_distance'] = phash_distance(previous['screenshot_phash'], phash)
+        return reference
+
+    try:
+        reference = await asyncio.to_thread(_store)
+    except Exception as e:
+        logger.warning(f"Failed to store screenshot: {e}")
+        return None
+
+    if not reference.get('screenshot_reused'):
+        _remember(reference['screenshot_id'], screenshot_base64)
+    return reference
+
+
+def prune_screenshots(sandbox, keep: int) -> int:
+    """Delete all but the `keep` most recently used screenshots of a sandbox.
+
+    Returns:
+        Number of files deleted
+    """
+    try:
+        files = [f for f in sandbox.fs.list_files(SCREENSHOT_DIR) if not f.is_dir]
+    except FileNotFoundError:
+        return 0
+    if len(files) <= keep:
+        return 0
+    files.sort(key=lambda f: f.mod_time, reverse=True)
+    deleted = 0
+    for f in files[keep:]:
+        try:
+            sandbox.fs.delete_file(f"{SCREENSHOT_DIR}/{f.name}")
+            deleted += 1
+        except FileNotFoundError:
+            pass  # Already pruned by a concurrent store
+    return deleted
+
+
+async def load_screenshot(sandbox, reference: Dict[str, Any]) -> Optional[str]:
+    """Load a stored screenshot as base64.
+
+    Args:
+        sandbox: The DockerSandbox whose workspace holds the screenshot
+        reference: Dict with screenshot_id and screenshot_path
+
+    Returns:
+        Base64 encoded JPEG, or None if it is missing
+    """
+    content_hash = reference.get('screenshot_id')
+    if content_hash in _cache:
+        _cache.move_to_end(content_hash)
+        return _cache[content_hash]
+
+    path = reference.get('screenshot_path')
+    if not path:
+        return None
+    try:
+        image_bytes = await asyncio.to_thread(sandbox.fs.download_file, path)
+    except Exception as e:
+        logger.warning(f"Failed to load screenshot {path}: {e}")
+        return None
+
+    screenshot_base64 = base64.b64encode(image_bytes).decode()
+    _remember(content_hash, screenshot_base64)
+    return screenshot_base64
+
+
+def _remember(content_hash: Optional[str], screenshot_base64: str):
+    if not content_hash:
+        return
+    _cache[content_hash] = screenshot_base64
+    _cache.move_to_end(content_hash)
+    while len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
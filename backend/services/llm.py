@@ -29,6 +29,49 @@ MAX_RETRIES = 3
 RATE_LIMIT_DELAY = 30
 RETRY_DELAY = 5
 
+class PromptCacheMetrics:
+    """Prompt cache usage reported by the providers, per model."""
+
+    def __init__(self):
+        self.models: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, usage: Any):
+        """Record the usage of one LLM call.
+
+        Args:
+            model: Model name the call was made with
+            usage: litellm Usage object or dict
+        """
+        if usage is None:
+            return
+        get = usage.get if isinstance(usage, dict) else lambda name, default=None: getattr(usage, name, default)
+        prompt_tokens = get("prompt_tokens") or 0
+        cache_read = get("cache_read_input_tokens") or 0
+        if not cache_read:
+            details = get("prompt_tokens_details")
+            cache_read = (details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", 0)) or 0
+        cache_write = get("cache_creation_input_tokens") or 0
+
+        stats = self.models.setdefault(model, {"requests": 0, "hits": 0, "prompt_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0})
+        stats["requests"] += 1
+        stats["hits"] += 1 if cache_read else 0
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cache_read_tokens"] += cache_read
+        stats["cache_write_tokens"] += cache_write
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Totals per model with request and token hit rates."""
+        snapshot = {}
+        for model, stats in self.models.items():
+            snapshot[model] = {
+                **stats,
+                "request_hit_rate": round(stats["hits"] / stats["requests"], 4) if stats["requests"] else 0.0,
+                "token_hit_rate": round(stats["cache_read_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else 0.0,
+            }
+        return snapshot
+
+prompt_cache_metrics = PromptCacheMetrics()
+
 class LLMError(Exception):
     """Base exception for LLM-related errors."""
     pass
@@ -73,6 +116,15 @@ async def handle_error(error: Exception, attempt: int, max_attempts: int) -> Non
     logger.debug(f"Waiting {delay} seconds before retry...")
     await asyncio.sleep(delay)
 
+def _copy_message(message: Any) -> Any:
+    """Copy a message and its content blocks so cache_control can be added without touching the original."""
+    if not isinstance(message, dict):
+        return message
+    message = dict(message)
+    if isinstance(message.get("content"), list):
+        message["content"] = [dict(item) if isinstance(item, dict) else item for item in message["content"]]
+    return message
+
 def prepare_params(
     messages: List[Dict[str, Any]],
     model_name: str,
@@ -161,12 +213,13 @@ def prepare_params(
     # Check model name *after* potential modifications (like adding bedrock/ prefix)
     effective_model_name = params.get("model", model_name) # Use model from params if set, else original
     if "claude" in effective_model_name.lower() or "anthropic" in effective_model_name.lower():
-        messages = params["messages"] # Direct reference, modification affects params
-
         # Ensure messages is a list
-        if not isinstance(messages, list):
+        if not isinstance(params["messages"], list):
             return params # Return early if messages format is unexpected
 
+        # Mark copies, so cached prompts and messages stay byte-identical between calls
+        messages = params["messages"] = [_copy_message(message) for message in params["messages"]]
+
         # 1. Process the first message if it's a system prompt with string content
         if messages and messages[0].get("role") == "system":
             content = messages[0].get("content")
@@ -230,6 +283,10 @@ def prepare_params(
     use_thinking = enable_thinking if enable_thinking is not None else False
     is_anthropic = "anthropic" in effective_model_name.lower() or "claude" in effective_model_name.lower()
 
+    # Report usage (including prompt cache reads) in the last streamed chunk
+    if is_anthropic and stream:
+        params["stream_options"] = {"include_usage": True}
+
     if is_anthropic and use_thinking:
         effort_level = reasoning_effort if reasoning_effort else 'low'
         params["reasoning_effort"] = effort_level
@@ -1,21 +1,139 @@
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
 import os
 from dotenv import load_dotenv
 import asyncio
+import bisect
+import time
 from utils.logger import logger
-from typing import List, Any
+from typing import List, Any, Callable, Dict, Iterable, Optional, Set
 
-# Redis client
+# Redis clients
 client = None
+blocking_client = None  # Blocking stream reads only, so they cannot starve other commands
 _initialized = False
 _init_lock = asyncio.Lock()
 
 # Constants
 REDIS_KEY_TTL = 3600 * 24  # 24 hour TTL as safety mechanism
+DEFAULT_MAX_CONNECTIONS = 50
+DEFAULT_POOL_TIMEOUT = 5.0  # Seconds to wait for a free connection before failing
+# Cap of concurrent blocking stream reads per process, i.e. of SSE viewers of agent
+# runs: each viewer holds a connection for the whole XREAD BLOCK. Viewers beyond
+# the cap wait for a free connection (up to the pool timeout); writers never do.
+DEFAULT_MAX_BLOCKING_CONNECTIONS = 200
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+PUBSUB_LISTEN_TIMEOUT = 1.0  # Read timeout of the shared pub/sub socket; not a Redis command
+PUBSUB_RECONNECT_DELAY = 1.0
+
+# Metrics
+class Histogram:
+    """Fixed-bucket histogram of durations in milliseconds."""
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cumulative bucket counts keyed by upper bound, like Prometheus histograms."""
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count": self.count, "sum_ms": round(self.sum, 3), "buckets": buckets}
+
+class RedisMetrics:
+    """Connection pool and command metrics of this process's Redis client."""
+
+    def __init__(self):
+        self.connections_in_use = 0
+        self.max_connections_in_use = 0
+        self.connection_wait = Histogram()
+        self.commands: Dict[str, Histogram] = {}
+
+    def observe_command(self, name: str, duration_ms: float):
+        histogram = self.commands.get(name)
+        if histogram is None:
+            histogram = self.commands[name] = Histogram()
+        histogram.observe(duration_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "connections_in_use": self.connections_in_use,
+            "max_connections_in_use": self.max_connections_in_use,
+            "connection_wait_ms": self.connection_wait.snapshot(),
+            "command_latency_ms": {name: h.snapshot() for name, h in sorted(self.commands.items())},
+        }
+
+metrics = RedisMetrics()
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """Bounded pool that records connections in use and the wait for a free one."""
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        connection = await super().get_connection(command_name, *keys, **options)
+        metrics.connection_wait.observe((time.perf_counter() - start) * 1000)
+        self._record_in_use()
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        self._record_in_use()
+
+    def _record_in_use(self):
+        metrics.connections_in_use = len(self._in_use_connections)
+        metrics.max_connections_in_use = max(metrics.max_connections_in_use, metrics.connections_in_use)
+
+class InstrumentedPipeline(Pipeline):
+    """Pipeline recording the latency of each round trip as PIPELINE or MULTI."""
+
+    async def execute(self, raise_on_error: bool = True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            metrics.observe_command("MULTI" if self.is_transaction else "PIPELINE", (time.perf_counter() - start) * 1000)
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client recording the latency of each command."""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            metrics.observe_command(str(args[0]).upper(), (time.perf_counter() - start) * 1000)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+def get_metrics() -> Dict[str, Any]:
+    """Get pool and command metrics for export."""
+    snapshot = metrics.snapshot()
+    pool = client.connection_pool if client else None
+    snapshot["max_connections"] = pool.max_connections if pool else None
+    blocking_pool = blocking_client.connection_pool if blocking_client else None
+    snapshot["blocking_connections_in_use"] = len(blocking_pool._in_use_connections) if blocking_pool else 0
+    snapshot["max_blocking_connections"] = blocking_pool.max_connections if blocking_pool else None
+    snapshot["pubsub_channels"] = len(_multiplexer.handlers)
+    return snapshot
 
 def initialize():
-    """Initialize Redis connection using environment variables."""
-    global client
+    """Initialize Redis connection using environment variables.
+
+    Blocking stream reads get their own pool (REDIS_MAX_BLOCKING_CONNECTIONS),
+    so viewers waiting on XREAD BLOCK never hold the connections that the
+    agent's writes need.
+    """
+    global client, blocking_client
     
     # Load environment variables if not already loaded
     load_dotenv()
@@ -24,11 +142,14 @@ def initialize():
     redis_host = os.getenv('REDIS_HOST', 'redis')
     redis_port = int(os.getenv('REDIS_PORT', 6379))
     redis_password = os.getenv('REDIS_PASSWORD', '')
+    max_connections = int(os.getenv('REDIS_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS))
+    max_blocking_connections = int(os.getenv('REDIS_MAX_BLOCKING_CONNECTIONS', DEFAULT_MAX_BLOCKING_CONNECTIONS))
+    pool_timeout = float(os.getenv('REDIS_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT))
     
-    logger.info(f"Initializing Redis connection to {redis_host}:{redis_port}")
+    logger.info(f"Initializing Redis connection to {redis_host}:{redis_port} "
+                f"(max {max_connections} connections, {max_blocking_connections} for blocking reads)")
     
-    # Create Redis client with basic configuration
-    client = redis.Redis(
+    connection_kwargs = dict(
         host=redis_host,
         port=redis_port,
         password=redis_password,
@@ -36,14 +157,20 @@ def initialize():
         socket_timeout=5.0,
         socket_connect_timeout=5.0,
         retry_on_timeout=True,
-        health_check_interval=30
+        health_check_interval=30,
+        timeout=pool_timeout
     )
+    # Create Redis client on a bounded, instrumented connection pool
+    pool = InstrumentedConnectionPool(max_connections=max_connections, **connection_kwargs)
+    client = InstrumentedRedis(connection_pool=pool)
+    blocking_pool = redis.BlockingConnectionPool(max_connections=max_blocking_connections, **connection_kwargs)
+    blocking_client = InstrumentedRedis(connection_pool=blocking_pool)
     
     return client
 
 async def initialize_async():
     """Initialize Redis connection asynchronously."""
-    global client, _initialized
+    global client, blocking_client, _initialized
     
     async with _init_lock:
         if not _initialized:
@@ -57,16 +184,21 @@ async def initialize_async():
             except Exception as e:
                 logger.error(f"Failed to connect to Redis: {e}")
                 client = None
+                blocking_client = None
                 raise
     
     return client
 
 async def close():
     """Close Redis connection."""
-    global client, _initialized
+    global client, blocking_client, _initialized
+    await _multiplexer.close()
+    if blocking_client:
+        await blocking_client.aclose(close_connection_pool=True)
+        blocking_client = None
     if client:
         logger.info("Closing Redis connection")
-        await client.aclose()
+        await client.aclose(close_connection_pool=True)
         client = None
         _initialized = False
         logger.info("Redis connection closed")
@@ -78,6 +210,11 @@ async def get_client():
         await initialize_async()
     return client
 
+async def get_blocking_client():
+    """Get the client for blocking reads, initializing if necessary."""
+    await get_client()
+    return blocking_client
+
 # Basic Redis operations
 async def set(key: str, value: str, ex: int = None):
     """Set a Redis key."""
@@ -101,10 +238,153 @@ async def publish(channel: str, message: str):
     return await redis_client.publish(channel, message)
 
 async def create_pubsub():
-    """Create a Redis pubsub object."""
+    """Create a Redis pubsub object on its own connection.
+
+    Prefer subscribe(), which shares one connection among all subscribers.
+    """
     redis_client = await get_client()
     return redis_client.pubsub()
 
+async def pipeline(transaction: bool = False):
+    """Create a pipeline that sends its queued commands in one round trip.
+
+    Commands are queued with the client's methods (without await) and sent
+    with `await pipe.execute()`. With transaction=True they are wrapped in
+    MULTI/EXEC and applied atomically.
+    """
+    redis_client = await get_client()
+    return redis_client.pipeline(transaction=transaction)
+
+async def execute_pipeline(*commands: tuple, transaction: bool = False) -> List[Any]:
+    """Run several commands in one round trip.
+
+    Args:
+        commands: (method name, *args) tuples, e.g. ("rpush", key, value), ("expire", key, ttl)
+        transaction: Apply the commands atomically with MULTI/EXEC
+
+    Returns:
+        The result of each command, in order
+    """
+    pipe = await pipeline(transaction=transaction)
+    for name, *args in commands:
+        getattr(pipe, name)(*args)
+    return await pipe.execute()
+
+# Pub/sub
+class PubSubMultiplexer:
+    """Shares one pub/sub connection among all channel subscribers of this process.
+
+    Handlers are called with (channel, message) from a single listener task and
+    must not block. The connection is re-established and all channels
+    resubscribed if it fails.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Callable[[str, str], None]]] = {}
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, channels: List[str], handler: Callable[[str, str], None]):
+        async with self._lock:
+            new_channels = [channel for channel in channels if channel not in self.handlers]
+            for channel in channels:
+                self.handlers.setdefault(channel, []).append(handler)
+            if self._pubsub is None:
+                self._pubsub = await create_pubsub()
+            if new_channels:
+                await self._pubsub.subscribe(*new_channels)
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, channels: List[str], handler: Callable[[str, str], None]):
+        async with self._lock:
+            unused_channels = []
+            for channel in channels:
+                handlers = self.handlers.get(channel, [])
+                if handler in handlers:
+                    handlers.remove(handler)
+                if not handlers and self.handlers.pop(channel, None) is not None:
+                    unused_channels.append(channel)
+            if unused_channels and self._pubsub is not None:
+                try:
+                    await self._pubsub.unsubscribe(*unused_channels)
+                except Exception as e:
+                    logger.warning(f"Failed to unsubscribe from {len(unused_channels)} channels: {e}")
+
+    async def close(self):
+        if self._listener and not self._listener.done():
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing shared pubsub connection: {e}")
+            self._pubsub = None
+        self.handlers.clear()
+
+    def _dispatch(self, message: dict):
+        channel = message.get("channel")
+        data = message.get("data")
+        if isinstance(channel, bytes): channel = channel.decode('utf-8')
+        if isinstance(data, bytes): data = data.decode('utf-8')
+        for handler in list(self.handlers.get(channel, [])):
+            try:
+                handler(channel, data)
+            except Exception as e:
+                logger.error(f"Pub/sub handler for {channel} failed: {e}", exc_info=True)
+
+    async def _listen(self):
+        while True:
+            try:
+                if self._pubsub is None:
+                    # Nothing subscribed since a reconnect; subscribe() opens a new connection
+                    await asyncio.sleep(PUBSUB_LISTEN_TIMEOUT)
+                    continue
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=PUBSUB_LISTEN_TIMEOUT)
+                if message and message.get("type") == "message":
+                    self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Shared pubsub connection failed, reconnecting: {e}")
+                await asyncio.sleep(PUBSUB_RECONNECT_DELAY)
+                try:
+                    await self._reconnect()
+                except Exception as reconnect_err:
+                    logger.error(f"Failed to resubscribe shared pubsub channels: {reconnect_err}")
+
+    async def _reconnect(self):
+        async with self._lock:
+            try:
+                if self._pubsub is not None:
+                    await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+            channels = list(self.handlers)
+            if channels:
+                self._pubsub = await create_pubsub()
+                await self._pubsub.subscribe(*channels)
+
+_multiplexer = PubSubMultiplexer()
+
+async def subscribe(channels: List[str], handler: Callable[[str, str], None]):
+    """Call handler(channel, message) for messages published to the channels.
+
+    All subscriptions of this process share one pub/sub connection.
+    """
+    await _multiplexer.subscribe(channels, handler)
+
+async def unsubscribe(channels: List[str], handler: Callable[[str, str], None]):
+    """Stop calling handler for the channels."""
+    await _multiplexer.unsubscribe(channels, handler)
+
 # List operations
 async def rpush(key: str, *values: Any):
     """Append one or more values to a list."""
@@ -130,4 +410,78 @@ async def expire(key: str, time: int):
 async def keys(pattern: str) -> List[str]:
     """Get keys matching a pattern."""
     redis_client = await get_client()
-    return await redis_client.keys(pattern) 
\ No newline at end of file
+    return await redis_client.keys(pattern) 
+
+async def scan_keys(pattern: str, count: int = 1000):
+    """Iterate over keys matching a pattern with SCAN, without blocking Redis like KEYS."""
+    redis_client = await get_client()
+    async for key in redis_client.scan_iter(match=pattern, count=count):
+        yield key
+
+# Set operations
+async def sadd(key: str, *members: str):
+    """Add one or more members to a set."""
+    redis_client = await get_client()
+    return await redis_client.sadd(key, *members)
+
+async def srem(key: str, *members: str):
+    """Remove one or more members from a set."""
+    redis_client = await get_client()
+    return await redis_client.srem(key, *members)
+
+async def smembers(key: str) -> Set[str]:
+    """Get all members of a set."""
+    redis_client = await get_client()
+    return await redis_client.smembers(key)
+
+# Hash operations
+async def hset(key: str, field: str, value: str):
+    """Set a field in a hash."""
+    redis_client = await get_client()
+    return await redis_client.hset(key, field, value)
+
+async def hget(key: str, field: str):
+    """Get a field from a hash."""
+    redis_client = await get_client()
+    return await redis_client.hget(key, field)
+
+async def hdel(key: str, *fields: str):
+    """Delete one or more fields from a hash."""
+    redis_client = await get_client()
+    return await redis_client.hdel(key, *fields)
+
+async def hgetall(key: str) -> dict:
+    """Get all fields and values of a hash."""
+    redis_client = await get_client()
+    return await redis_client.hgetall(key)
+
+# Stream operations
+async def xadd(key: str, fields: dict, maxlen: int = None, approximate: bool = True) -> str:
+    """Append an entry to a stream, optionally trimming it to about maxlen entries."""
+    redis_client = await get_client()
+    return await redis_client.xadd(key, fields, maxlen=maxlen, approximate=approximate)
+
+async def xrange(key: str, min: str = "-", max: str = "+", count: int = None) -> List[Any]:
+    """Get stream entries with ids between min and max, as (id, fields) pairs."""
+    redis_client = await get_client()
+    return await redis_client.xrange(key, min=min, max=max, count=count)
+
+async def xlen(key: str) -> int:
+    """Get the number of entries in a stream."""
+    redis_client = await get_client()
+    return await redis_client.xlen(key)
+
+async def xread(streams: dict, count: int = None, block: int = None) -> List[Any]:
+    """Read entries after the given ids from one or more streams.
+
+    Args:
+        streams: Mapping of stream key to the last id already read ("0" for all)
+        count: Maximum entries per stream
+        block: Milliseconds to wait for new entries; must stay below the socket timeout.
+            Blocking reads use the separate blocking pool.
+
+    Returns:
+        List of [key, [(id, fields), ...]] pairs, empty if nothing arrived in time
+    """
+    redis_client = await (get_client() if block is None else get_blocking_client())
+    return await redis_client.xread(streams, count=count, block=block)
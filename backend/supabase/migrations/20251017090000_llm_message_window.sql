@@ -0,0 +1,95 @@
+-- Windowed variant of get_llm_formatted_messages.
+-- Returns one row per LLM message (instead of a single aggregated JSONB blob) so callers can:
+--   * ask for only the last p_limit messages after the latest summary
+--   * ask for only the messages created after p_after (incremental refresh)
+-- Both parameters are optional; with neither set the result matches get_llm_formatted_messages.
+
+-- Speeds up both the summary lookup and the ordered per-thread scan
+CREATE INDEX IF NOT EXISTS idx_messages_thread_llm_created_at
+    ON messages(thread_id, is_llm_message, created_at);
+
+CREATE OR REPLACE FUNCTION get_llm_formatted_messages_window(
+    p_thread_id UUID,
+    p_limit INTEGER DEFAULT NULL,
+    p_after TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE (
+    message_id UUID,
+    type TEXT,
+    content JSONB,
+    created_at TIMESTAMP WITH TIME ZONE
+)
+SECURITY DEFINER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    has_access BOOLEAN;
+    current_role TEXT;
+    latest_summary_id UUID;
+    latest_summary_time TIMESTAMP WITH TIME ZONE;
+    is_project_public BOOLEAN;
+BEGIN
+    -- Get current role
+    SELECT current_user INTO current_role;
+
+    -- Check if associated project is public
+    SELECT p.is_public INTO is_project_public
+    FROM threads t
+    LEFT JOIN projects p ON t.project_id = p.project_id
+    WHERE t.thread_id = p_thread_id;
+
+    -- Skip access check for service_role or public projects
+    IF current_role = 'authenticated' AND NOT is_project_public THEN
+        SELECT EXISTS (
+            SELECT 1 FROM threads t
+            LEFT JOIN projects p ON t.project_id = p.project_id
+            WHERE t.thread_id = p_thread_id
+            AND (
+                basejump.has_role_on_account(t.account_id) = true OR
+                basejump.has_role_on_account(p.account_id) = true
+            )
+        ) INTO has_access;
+
+        IF NOT has_access THEN
+            RAISE EXCEPTION 'Thread not found or access denied';
+        END IF;
+    END IF;
+
+    -- Find the latest summary message if it exists
+    SELECT m.message_id, m.created_at
+    INTO latest_summary_id, latest_summary_time
+    FROM messages m
+    WHERE m.thread_id = p_thread_id
+    AND m.type = 'summary'
+    AND m.is_llm_message = TRUE
+    ORDER BY m.created_at DESC
+    LIMIT 1;
+
+    RETURN QUERY
+    SELECT w.message_id, w.type, w.content, w.created_at
+    FROM (
+        SELECT
+            m.message_id,
+            m.type,
+            CASE
+                WHEN jsonb_typeof(m.content) = 'string' THEN m.content::text::jsonb
+                ELSE m.content
+            END AS content,
+            m.created_at
+        FROM messages m
+        WHERE m.thread_id = p_thread_id
+        AND m.is_llm_message = TRUE
+        AND (
+            latest_summary_id IS NULL
+            OR m.message_id = latest_summary_id
+            OR m.created_at > latest_summary_time
+        )
+        AND (p_after IS NULL OR m.created_at > p_after)
+        ORDER BY m.created_at DESC
+        LIMIT p_limit -- LIMIT NULL means no limit
+    ) w
+    ORDER BY w.created_at;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION get_llm_formatted_messages_window TO authenticated, anon, service_role;
@@ -0,0 +1,80 @@
+-- Materialized per-account monthly agent run usage.
+-- Billing checks used to sum the durations of every agent run of the month across all of an
+-- account's threads. The total is now kept in account_monthly_usage:
+--   * a trigger adds a run's duration when its completed_at is first set
+--   * runs count towards the month they started in, as before
+--   * existing completed runs are backfilled below
+
+CREATE TABLE IF NOT EXISTS account_monthly_usage (
+    account_id UUID NOT NULL REFERENCES basejump.accounts(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL,
+    PRIMARY KEY (account_id, month)
+);
+
+ALTER TABLE account_monthly_usage ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY account_monthly_usage_select_policy ON account_monthly_usage
+    FOR SELECT
+    USING (basejump.has_role_on_account(account_id) = true);
+
+GRANT SELECT ON TABLE account_monthly_usage TO authenticated;
+GRANT ALL PRIVILEGES ON TABLE account_monthly_usage TO service_role;
+
+CREATE OR REPLACE FUNCTION add_agent_run_usage()
+RETURNS TRIGGER
+SECURITY DEFINER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    run_account_id UUID;
+BEGIN
+    SELECT account_id INTO run_account_id FROM threads WHERE thread_id = NEW.thread_id;
+    IF run_account_id IS NULL THEN
+        RETURN NEW;
+    END IF;
+
+    INSERT INTO account_monthly_usage (account_id, month, seconds)
+    VALUES (
+        run_account_id,
+        date_trunc('month', NEW.started_at AT TIME ZONE 'utc')::date,
+        GREATEST(EXTRACT(EPOCH FROM (NEW.completed_at - NEW.started_at)), 0)
+    )
+    ON CONFLICT (account_id, month) DO UPDATE
+    SET seconds = account_monthly_usage.seconds + EXCLUDED.seconds,
+        updated_at = TIMEZONE('utc'::text, NOW());
+
+    RETURN NEW;
+END;
+$$;
+
+-- A run is only counted the first time its completed_at is set
+DROP TRIGGER IF EXISTS add_agent_run_usage_on_insert ON agent_runs;
+CREATE TRIGGER add_agent_run_usage_on_insert
+    AFTER INSERT ON agent_runs
+    FOR EACH ROW
+    WHEN (NEW.completed_at IS NOT NULL)
+    EXECUTE FUNCTION add_agent_run_usage();
+
+DROP TRIGGER IF EXISTS add_agent_run_usage_on_completion ON agent_runs;
+CREATE TRIGGER add_agent_run_usage_on_completion
+    AFTER UPDATE OF completed_at ON agent_runs
+    FOR EACH ROW
+    WHEN (OLD.completed_at IS NULL AND NEW.completed_at IS NOT NULL)
+    EXECUTE FUNCTION add_agent_run_usage();
+
+-- Backfill from completed runs
+INSERT INTO account_monthly_usage (account_id, month, seconds)
+SELECT
+    t.account_id,
+    date_trunc('month', r.started_at AT TIME ZONE 'utc')::date,
+    SUM(GREATEST(EXTRACT(EPOCH FROM (r.completed_at - r.started_at)), 0))
+FROM agent_runs r
+JOIN threads t ON t.thread_id = r.thread_id
+WHERE r.completed_at IS NOT NULL
+AND t.account_id IS NOT NULL
+GROUP BY 1, 2
+ON CONFLICT (account_id, month) DO UPDATE
+SET seconds = EXCLUDED.seconds,
+    updated_at = TIMEZONE('utc'::text, NOW());
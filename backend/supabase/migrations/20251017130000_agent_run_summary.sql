@@ -0,0 +1,11 @@
+-- Compact summary of a finished agent run's responses.
+-- Finished runs used to copy their whole Redis response log into agent_runs.responses (unused,
+-- to be removed). They now store a summary instead: response counts, final status, last error
+-- and pointers to the response stream and, when retention is enabled, its archive.
+
+ALTER TABLE agent_runs ADD COLUMN IF NOT EXISTS summary JSONB;
+
+-- Compressed response stream archives (gzip JSON lines), written by the backend only
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('agent_run_archives', 'agent_run_archives', false)
+ON CONFLICT (id) DO NOTHING; -- Avoid error if bucket already exists
@@ -0,0 +1,23 @@
+-- Record the outcome of a run's response stream archive in agent_runs.summary.
+-- The summary is written when the run ends, before the archive is uploaded in the background, so
+-- it marks the archive as pending. The archive task then sets summary.archive through this
+-- function once the upload succeeded (or failed), changing only that key so a concurrent
+-- update of the rest of the summary is not overwritten.
+
+CREATE OR REPLACE FUNCTION set_agent_run_archive(
+    p_agent_run_id UUID,
+    p_archive JSONB
+)
+RETURNS VOID
+SECURITY DEFINER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE agent_runs
+    SET summary = jsonb_set(COALESCE(summary, '{}'::jsonb), '{archive}', COALESCE(p_archive, 'null'::jsonb))
+    WHERE id = p_agent_run_id;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION set_agent_run_archive(UUID, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION set_agent_run_archive(UUID, JSONB) TO service_role;
@@ -0,0 +1,40 @@
+-- Monthly usage including runs still in progress.
+-- account_monthly_usage only grows when a run completes, so billing checks that read the counter
+-- alone did not see the time of an account's other running agents. get_account_monthly_usage
+-- adds the time so far of every run of the account that started this month and has not
+-- completed, as the old per-run sum did.
+
+-- Runs in progress are few, so this index stays small
+CREATE INDEX IF NOT EXISTS idx_agent_runs_in_progress ON agent_runs(thread_id, started_at) WHERE completed_at IS NULL;
+
+CREATE OR REPLACE FUNCTION get_account_monthly_usage(
+    p_account_id UUID,
+    p_month DATE
+)
+RETURNS DOUBLE PRECISION
+SECURITY DEFINER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    completed_seconds DOUBLE PRECISION;
+    running_seconds DOUBLE PRECISION;
+    month_start TIMESTAMP WITH TIME ZONE := p_month::timestamp AT TIME ZONE 'utc';
+BEGIN
+    SELECT seconds INTO completed_seconds
+    FROM account_monthly_usage
+    WHERE account_id = p_account_id AND month = p_month;
+
+    SELECT SUM(GREATEST(EXTRACT(EPOCH FROM (NOW() - r.started_at)), 0)) INTO running_seconds
+    FROM agent_runs r
+    JOIN threads t ON t.thread_id = r.thread_id
+    WHERE t.account_id = p_account_id
+    AND r.completed_at IS NULL
+    AND r.started_at >= month_start
+    AND r.started_at < month_start + INTERVAL '1 month';
+
+    RETURN COALESCE(completed_seconds, 0) + COALESCE(running_seconds, 0);
+END;
+$$;
+
+REVOKE ALL ON FUNCTION get_account_monthly_usage(UUID, DATE) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_account_monthly_usage(UUID, DATE) TO service_role;
@@ -0,0 +1,198 @@
+"""
+Tests for background context summarization.
+
+An in-memory messages table serves the queries of ContextManager and the
+windowed RPC of ThreadMessageCache. The tests check that only one summary
+task runs per thread, that the turn does not wait for the summarization
+call, that messages written while the summary is generated stay in the
+context after it is swapped in (also for a cache that already read past the
+summary's position), and that the context window respects its budget.
+
+Run with:
+    python -m pytest -q tests/test_background_summary.py
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from agentpress import context_manager
+from agentpress.context_manager import ContextManager
+from agentpress.message_cache import ThreadMessageCache
+from agentpress.thread_manager import ThreadManager
+
+THREAD_ID = "summary-thread"
+
+
+def parse(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) and value[:2] == "20" else value
+
+
+class FakeQuery:
+    def __init__(self, client):
+        self.client = client
+        self.filters = []
+        self.descending = False
+        self.row_limit = None
+        self.data = None
+
+    def select(self, *columns):
+        return self
+
+    def eq(self, key, value):
+        self.filters.append(lambda row: row[key] == value)
+        return self
+
+    def gt(self, key, value):
+        self.filters.append(lambda row: parse(row[key]) > parse(value))
+        return self
+
+    def order(self, key, desc=False):
+        self.descending = desc
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def insert(self, data, returning=None):
+        self.data = data
+        return self
+
+    async def execute(self):
+        if self.data is not None:
+            return type('obj', (object,), {'data': [self.client.insert(self.data)]})
+        rows = sorted((row for row in self.client.rows if all(f(row) for f in self.filters)),
+                      key=lambda row: parse(row['created_at']), reverse=self.descending)
+        return type('obj', (object,), {'data': rows[:self.row_limit]})
+
+
+class FakeClient:
+    """Messages table plus get_llm_formatted_messages_window, as in the migrations."""
+
+    def __init__(self):
+        self.rows = []
+        self._clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def insert(self, data):
+        self._clock += timedelta(seconds=1)
+        now = self._clock.isoformat()
+        row = {**data, 'message_id': str(uuid.uuid4()), 'created_at': data.get('created_at') or now, 'updated_at': now}
+        self.rows.append(row)
+        return row
+
+    def table(self, name):
+        return FakeQuery(self)
+
+    def rpc(self, name, params):
+        rows = sorted((row for row in self.rows if row['is_llm_message']), key=lambda row: parse(row['created_at']))
+        summaries = [row for row in rows if row['type'] == 'summary']
+        summary = summaries[-1] if summaries else None
+        if summary:
+            rows = [row for row in rows if parse(row['created_at']) >= parse(summary['created_at'])]
+        after = parse(params.get('p_after'))
+        if after:
+            rows = [row for row in rows if parse(row['created_at']) > after
+                    or (row is summary and parse(row['updated_at']) > after)]
+        if params.get('p_limit'):
+            rows = rows[-params['p_limit']:]
+        data = [{k: row[k] for k in ('message_id', 'type', 'content', 'created_at', 'metadata')} for row in rows]
+
+        class _Query:
+            async def execute(self):
+                return type('obj', (object,), {'data': data})
+        return _Query()
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture
+def thread_manager(client):
+    async def _client():
+        return client
+    db = type('obj', (object,), {'client': property(lambda self: _client())})()
+
+    cache = ThreadMessageCache()
+    cache._entries.clear()
+    cache.use_redis = False
+    cache.db = db
+
+    manager = ThreadManager(enable_write_behind=False)
+    manager.db = db
+    manager.message_cache = cache
+    manager.context_manager = ContextManager(token_threshold=1000)
+    manager.context_manager.db = db
+    return manager
+
+
+@pytest.fixture
+def slow_llm(monkeypatch):
+    """Summarization call that returns once released."""
+    release = asyncio.Event()
+    calls = []
+
+    async def make_llm_api_call(**kwargs):
+        calls.append(kwargs)
+        await release.wait()
+        message = type('obj', (object,), {'content': "the story so far"})
+        return type('obj', (object,), {'choices': [type('obj', (object,), {'message': message})]})
+    monkeypatch.setattr(context_manager, "make_llm_api_call", make_llm_api_call)
+    return release, calls
+
+
+def user(i):
+    return {'role': 'user', 'content': f"message {i}"}
+
+
+@pytest.mark.asyncio
+async def test_summary_runs_in_background_and_keeps_newer_messages(thread_manager, client, slow_llm):
+    release, calls = slow_llm
+    for i in range(10):
+        await thread_manager.add_message(THREAD_ID, 'user', user(i), is_llm_message=True)
+    manager = thread_manager.context_manager
+    cache = thread_manager.message_cache
+    assert len(await cache.get_messages(THREAD_ID)) == 10
+
+    # Another instance's cache, warm and about to read past the summary's position
+    other = object.__new__(ThreadMessageCache)
+    other._setup()
+    other.use_redis = False
+    other.db = cache.db
+    await other.get_messages(THREAD_ID)
+
+    assert manager.schedule_summarization(THREAD_ID, thread_manager.add_message)
+    assert not manager.schedule_summarization(THREAD_ID, thread_manager.add_message)
+    await asyncio.sleep(0)
+    assert len(calls) == 1 and manager.is_summarizing(THREAD_ID)
+
+    # The conversation goes on while the summary is generated
+    await thread_manager.add_message(THREAD_ID, 'user', user(10), is_llm_message=True)
+    await thread_manager.add_message(THREAD_ID, 'user', user(11), is_llm_message=True)
+    assert len(await other.get_messages(THREAD_ID)) == 12
+
+    release.set()
+    await context_manager._summary_tasks[THREAD_ID]
+    assert not manager.is_summarizing(THREAD_ID)
+
+    for reader in (cache, other):
+        messages = await reader.get_messages(THREAD_ID)
+        assert "the story so far" in messages[0]['content']
+        assert [m['content'] for m in messages[1:]] == ["message 10", "message 11"]
+    assert await cache.get_token_count(THREAD_ID) == await other.get_token_count(THREAD_ID)
+
+
+@pytest.mark.asyncio
+async def test_context_window_fits_the_budget(thread_manager):
+    for i in range(10):
+        await thread_manager.add_message(THREAD_ID, 'user', {'role': 'user', 'content': "word " * 100}, is_llm_message=True)
+    cache = thread_manager.message_cache
+    per_message = (await cache.get_token_count(THREAD_ID)) // 10
+
+    assert len(await cache.get_context_window(THREAD_ID, per_message * 3 + 1)) == 3
+    assert len(await cache.get_context_window(THREAD_ID, per_message * 30)) == 10
+    assert len(await cache.get_context_window(THREAD_ID, 1)) == 1  # The newest message is always sent
@@ -0,0 +1,126 @@
+"""
+Tests for billing checks backed by the monthly usage counter.
+
+A fake Supabase client records the tables and functions each check queries.
+The tests check that usage is read with one get_account_monthly_usage call,
+which adds the time of every run of the account still in progress to the
+counter, that subscription lookups are cached, that a run re-checks billing
+only once the interval has passed, and that the old per-run sum is used when
+the counter cannot be read.
+
+Run with:
+    python -m pytest -q tests/test_billing_usage.py
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils import billing
+from utils.config import EnvMode
+
+BASE_TIER = 'price_1RGJ9LG6l1KZGqIrd9pwzeNW'  # 300 minutes
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        self.client.queries.append(self.table)
+        return type("Result", (), {"data": self.client.tables.get(self.table, [])})()
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client, self.name, self.params = client, name, params
+
+    async def execute(self):
+        self.client.queries.append(self.name)
+        if self.client.counter_error:
+            raise RuntimeError('function get_account_monthly_usage does not exist')
+        # Counter of completed runs plus the time so far of the account's runs in progress
+        now = datetime.now(timezone.utc)
+        seconds = self.client.completed_seconds + sum(
+            (now - started).total_seconds() for started in self.client.running_since)
+        return type("Result", (), {"data": seconds})()
+
+
+class FakeClient:
+    def __init__(self, tables, counter_error=False):
+        self.tables = tables
+        self.counter_error = counter_error
+        self.completed_seconds = 0.0
+        self.running_since = []
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def schema(self, name):
+        return self
+
+    def from_(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+
+@pytest.fixture(autouse=True)
+def production(monkeypatch):
+    monkeypatch.setattr(billing.config, "ENV_MODE", EnvMode.PRODUCTION)
+    billing._subscription_cache.clear()
+
+
+def make_client(used_minutes, **kwargs):
+    client = FakeClient({'billing_subscriptions': [{'price_id': BASE_TIER}]}, **kwargs)
+    client.completed_seconds = used_minutes * 60
+    return client
+
+
+@pytest.mark.asyncio
+async def test_usage_includes_every_run_in_progress():
+    client = make_client(used_minutes=290)
+    can_run, message, _ = await billing.check_billing_status(client, "account")
+    assert can_run and message == "OK"
+    assert client.queries == ['billing_subscriptions', 'get_account_monthly_usage']
+
+    # Two concurrent runs, 5 minutes in each: neither has completed, yet the limit is reached
+    now = datetime.now(timezone.utc)
+    client.running_since = [now - timedelta(minutes=5), now - timedelta(minutes=5)]
+    can_run, message, _ = await billing.check_billing_status(client, "account")
+    assert not can_run and "300 minutes" in message
+    # Subscription lookup was cached, the thread and agent run tables are never read
+    assert client.queries == ['billing_subscriptions', 'get_account_monthly_usage', 'get_account_monthly_usage']
+
+
+@pytest.mark.asyncio
+async def test_run_check_repeats_only_after_the_interval(monkeypatch):
+    client = make_client(used_minutes=10)
+    check = billing.RunBillingCheck(client, "account", interval=60)
+    for _ in range(150):
+        assert (await check.check())[0]
+    assert client.queries.count('get_account_monthly_usage') == 1
+
+    monkeypatch.setattr(billing.time, "monotonic", lambda: check._checked_at + 61)
+    await check.check()
+    assert client.queries.count('get_account_monthly_usage') == 2
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_summing_runs_without_the_counter():
+    started = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    client = make_client(used_minutes=0, counter_error=True)
+    client.tables['threads'] = [{'thread_id': 't1'}]
+    client.tables['agent_runs'] = [{
+        'started_at': started.isoformat(),
+        'completed_at': (started + timedelta(minutes=301)).isoformat(),
+    }]
+    can_run, message, _ = await billing.check_billing_status(client, "account")
+    assert not can_run
+    assert client.queries[-2:] == ['threads', 'agent_runs']
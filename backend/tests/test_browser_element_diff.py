@@ -0,0 +1,116 @@
+"""
+Tests for browser state element diffs.
+
+The automation API returns only the added and removed interactive elements
+when a request passes the dom_version the caller already has. These tests
+check that the browser tool sends that version, stores a full state
+periodically, and that the latest full state is rebuilt from stored diffs.
+
+Run with:
+    python -m pytest -q tests/test_browser_element_diff.py
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from agent.tools import sb_browser_tool
+from sandbox.browser_client import apply_elements_diff, resolve_browser_state
+
+
+def element(index, text):
+    return {'index': index, 'tag_name': 'a', 'text': text, 'is_in_viewport': True}
+
+
+def test_resolve_browser_state_replays_diffs():
+    full = {'dom_version': 'v1', 'elements': 'placeholder',
+            'interactive_elements': [element(1, 'Home'), element(2, 'Docs'), element(3, 'Blog')]}
+    first = {'dom_version': 'v2', 'elements_diff': {'base': 'v1', 'added': [element(2, 'Guides')], 'removed': [3]}}
+    second = {'dom_version': 'v3', 'elements_diff': {'base': 'v2', 'added': [element(4, 'Login')], 'removed': []}}
+
+    state = resolve_browser_state([second, first, full])
+    assert state['dom_version'] == 'v3'
+    assert state['interactive_elements'] == [element(1, 'Home'), element(2, 'Guides'), element(4, 'Login')]
+    assert state['elements'] == 'placeholder'
+
+    # A full state is returned as is
+    assert resolve_browser_state([full]) == full
+
+    # Without the base, only the newest changes are known
+    broken = resolve_browser_state([second, full])
+    assert broken['interactive_elements'] == [element(4, 'Login')]
+
+
+def test_apply_elements_diff_orders_by_index():
+    base = [element(1, 'a'), element(2, 'b')]
+    assert apply_elements_diff(base, {'added': [element(0, 'z')], 'removed': [2]}) == [element(0, 'z'), element(1, 'a')]
+
+
+class DiffingApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    versions = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        since = parse_qs(urlparse(self.path).query).get('since', [None])[0]
+        DiffingApiHandler.versions.append(since)
+        version = f"v{len(DiffingApiHandler.versions)}"
+        result = {"success": True, "dom_version": version, "element_count": 1}
+        if since:
+            result["elements_diff"] = {"base": since, "added": [], "removed": []}
+        else:
+            result["interactive_elements"] = [element(1, 'Home')]
+        body = json.dumps(result).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSandbox:
+    def __init__(self, port):
+        self.sandbox_id = f"diff-{port}"
+        self.port = port
+
+    def get_preview_link(self, port):
+        return f"http://127.0.0.1:{self.port}"
+
+
+class FakeThreadManager:
+    def __init__(self):
+        self.messages = []
+
+    async def add_message(self, thread_id, type, content, is_llm_message=False, metadata=None):
+        self.messages.append(content)
+        return {"message_id": f"msg-{len(self.messages)}"}
+
+
+@pytest.mark.asyncio
+async def test_tool_requests_diffs_and_stores_full_state_periodically(monkeypatch):
+    monkeypatch.setattr(sb_browser_tool, 'FULL_STATE_EVERY', 2)
+    DiffingApiHandler.versions = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DiffingApiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        thread_manager = FakeThreadManager()
+        tool = sb_browser_tool.SandboxBrowserTool("project", "thread", thread_manager)
+        tool._sandbox = FakeSandbox(server.server_port)
+        tool._sandbox_id = tool._sandbox.sandbox_id
+        for _ in range(4):
+            result = await tool._execute_browser_action("scroll_down", {})
+            assert result.success, result.output
+
+        # full, diff, diff, then full again after FULL_STATE_EVERY diffs
+        assert DiffingApiHandler.versions == [None, 'v1', 'v2', None]
+        assert 'elements_diff' in thread_manager.messages[1]
+        state = resolve_browser_state(list(reversed(thread_manager.messages[:3])))
+        assert state['interactive_elements'] == [element(1, 'Home')]
+    finally:
+        server.shutdown()
@@ -0,0 +1,144 @@
+"""
+Tests for OCR of browser screenshots.
+
+The automation API starts OCR in the background when the visible DOM text
+does not describe the viewport (canvas, images) and flags the result as
+ocr_pending. A local stand-in for the API checks that the browser tool then
+fetches the text from /automation/ocr, only for those pages, and that a
+failed OCR fetch does not fail the action. The coverage heuristic itself is
+checked against browser_api when its dependencies (playwright, pytesseract)
+are installed.
+
+Run with:
+    python -m pytest -q tests/test_browser_ocr.py
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agent.tools.sb_browser_tool import SandboxBrowserTool
+
+
+class OcrApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def do_POST(self):
+        params = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        endpoint = self.path.split("?")[0].rsplit("/", 1)[-1]
+        OcrApiHandler.requests.append((endpoint, params))
+        if endpoint == "ocr":
+            if params.get("screenshot_hash") == "expired":
+                result = {"success": False, "error": "Unknown or expired screenshot hash: expired"}
+            else:
+                result = {"success": True, "ocr_text": f"Chart title (OCR of {params['screenshot_hash']})"}
+        else:
+            canvas = "canvas" in params.get("url", "")
+            result = {"success": True, "url": params.get("url"), "title": "Page",
+                      "screenshot_hash": params.get("hash", "h1"), "ocr_pending": canvas}
+        body = json.dumps(result).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSandbox:
+    def __init__(self, port):
+        self.sandbox_id = f"ocr-{port}"
+        self.port = port
+
+    def get_preview_link(self, port):
+        return f"http://127.0.0.1:{self.port}"
+
+
+class FakeThreadManager:
+    def __init__(self):
+        self.messages = []
+
+    async def add_message(self, thread_id, type, content, is_llm_message=False, metadata=None):
+        self.messages.append(content)
+        return {"message_id": f"msg-{len(self.messages)}"}
+
+
+@pytest.fixture
+def tool():
+    OcrApiHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OcrApiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    thread_manager = FakeThreadManager()
+    tool = SandboxBrowserTool("project", "thread", thread_manager)
+    tool._sandbox = FakeSandbox(server.server_port)
+    tool._sandbox_id = tool._sandbox.sandbox_id
+    yield tool, thread_manager
+    server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_ocr_is_fetched_only_when_the_dom_text_falls_short(tool):
+    tool, thread_manager = tool
+    result = await tool._execute_browser_action("navigate_to", {"url": "https://example.com/article"})
+    assert result.success and "ocr_text" not in json.loads(result.output)
+    assert [endpoint for endpoint, _ in OcrApiHandler.requests] == ["navigate_to"]
+
+    result = await tool._execute_browser_action("navigate_to", {"url": "https://example.com/canvas", "hash": "h2"})
+    assert json.loads(result.output)["ocr_text"] == "Chart title (OCR of h2)"
+    assert OcrApiHandler.requests[-1] == ("ocr", {"screenshot_hash": "h2"})
+    state = thread_manager.messages[-1]
+    assert state["ocr_text"] == "Chart title (OCR of h2)" and "ocr_pending" not in state
+
+
+@pytest.mark.asyncio
+async def test_failed_ocr_fetch_keeps_the_action_result(tool):
+    tool, thread_manager = tool
+    result = await tool._execute_browser_action("navigate_to", {"url": "https://example.com/canvas", "hash": "expired"})
+    assert result.success and "ocr_text" not in json.loads(result.output)
+    assert "ocr_text" not in thread_manager.messages[-1]
+
+
+@pytest.fixture
+def browser_api():
+    pytest.importorskip("playwright")
+    pytest.importorskip("pytesseract")
+    from sandbox.docker import browser_api
+    return browser_api
+
+
+class FakePage:
+    def __init__(self, coverage):
+        self.coverage = coverage
+
+    async def evaluate(self, script):
+        if isinstance(self.coverage, Exception):
+            raise self.coverage
+        return self.coverage
+
+
+def test_coverage_heuristic(browser_api):
+    enough = browser_api.OCR_DOM_TEXT_MIN_CHARS
+    assert browser_api.text_covers_viewport({'textChars': enough, 'mediaRatio': 0.1})
+    assert not browser_api.text_covers_viewport({'textChars': enough - 1, 'mediaRatio': 0.0})
+    # Plenty of text, but most of the viewport is a canvas or image
+    assert not browser_api.text_covers_viewport({'textChars': 5000, 'mediaRatio': browser_api.OCR_MAX_MEDIA_RATIO + 0.1})
+    assert not browser_api.text_covers_viewport({})
+
+
+@pytest.mark.asyncio
+async def test_dom_text_covers_viewport_measures_the_current_page(browser_api):
+    automation = browser_api.BrowserAutomation.__new__(browser_api.BrowserAutomation)
+    automation.current_page_index = 0
+
+    automation.pages = [FakePage({'textChars': 1200, 'mediaRatio': 0.2})]
+    assert await automation.dom_text_covers_viewport()
+    automation.pages = [FakePage({'textChars': 40, 'mediaRatio': 0.9})]
+    assert not await automation.dom_text_covers_viewport()
+    # A page that cannot be measured gets OCR
+    automation.pages = [FakePage(RuntimeError("Execution context was destroyed"))]
+    assert not await automation.dom_text_covers_viewport()
@@ -0,0 +1,185 @@
+"""
+Benchmark of the browser automation transport: direct HTTP vs exec + curl.
+
+A local stand-in for the sandbox's browser_api returns a response with a
+~300 KB base64 screenshot. SandboxBrowserTool calls it either through the
+pooled HTTP client or through the exec fallback. The fallback runs curl in a
+local shell process, which reproduces the process spawn and curl startup but
+not the docker exec round trip, so the measured gap is a lower bound. The
+tests also check that only requests which never reached the API fall back to
+exec, so an action that may already have run is not replayed.
+
+Run the benchmark directly with:
+    python -m tests.test_browser_transport
+"""
+
+import asyncio
+import base64
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agent.tools.sb_browser_tool import SandboxBrowserTool
+from sandbox import browser_client
+from docker.models.containers import ExecResult
+
+SCREENSHOT = base64.b64encode(os.urandom(225_000)).decode()
+
+
+class FakeBrowserApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like uvicorn
+    requests = []
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        params = json.loads(self.rfile.read(length) or b"{}")
+        FakeBrowserApiHandler.requests.append(self.path)
+        if "slow" in self.path:
+            time.sleep(0.5)  # The client has given up by now
+            self.close_connection = True
+            return
+        body = json.dumps({
+            "success": True,
+            "message": f"Navigated to {params.get('url')}",
+            "url": params.get('url'),
+            "title": "Test page",
+            "screenshot_base64": SCREENSHOT,
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSandbox:
+    """Sandbox whose browser API is the local server and whose exec runs locally."""
+
+    def __init__(self, port: int, publish_port: bool = True, published_port: int = None):
+        self.sandbox_id = f"bench-{port}-{publish_port}-{published_port}"
+        self.port = port
+        self.publish_port = publish_port
+        self.published_port = published_port or port
+        self.execs = 0
+
+    def get_preview_link(self, port: int) -> str:
+        if not self.publish_port:
+            raise ValueError("port not published")
+        return f"http://127.0.0.1:{self.published_port}"
+
+    async def exec_cmd_async(self, cmd, timeout=None):
+        self.execs += 1
+        # The container's localhost:8002 is the local server here
+        cmd = [arg.replace("localhost:8002", f"127.0.0.1:{self.port}") for arg in cmd]
+        proc = await asyncio.create_subprocess_exec(
+            "/bin/sh", "-c", '"$@"', "sh", *cmd,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        output, _ = await proc.communicate()
+        return ExecResult(proc.returncode, output)
+
+
+class FakeThreadManager:
+    def __init__(self):
+        self.messages = []
+
+    async def add_message(self, thread_id, type, content, is_llm_message=False, metadata=None):
+        self.messages.append(content)
+        return {"message_id": f"msg-{len(self.messages)}"}
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBrowserApiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_tool(sandbox):
+    thread_manager = FakeThreadManager()
+    tool = SandboxBrowserTool(project_id="bench-project", thread_id="bench-thread", thread_manager=thread_manager)
+    tool._sandbox = sandbox
+    tool._sandbox_id = sandbox.sandbox_id
+    return tool, thread_manager
+
+
+async def time_actions(tool, count: int):
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        result = await tool._execute_browser_action("navigate_to", {"url": f"https://example.com/it's-{i}"})
+        latencies.append(time.perf_counter() - start)
+        assert result.success, result.output
+    return latencies
+
+
+@pytest.mark.asyncio
+async def test_http_and_exec_transports_agree():
+    """Both transports deliver the same state, including arguments with quotes."""
+    server = start_server()
+    try:
+        for publish_port in (True, False):
+            tool, thread_manager = make_tool(FakeSandbox(server.server_port, publish_port))
+            result = await tool._execute_browser_action("navigate_to", {"url": "https://example.com/it's"})
+            assert result.success, result.output
+            state = thread_manager.messages[-1]
+            assert state["url"] == "https://example.com/it's"
+            assert state["screenshot_base64"] == SCREENSHOT
+    finally:
+        server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_only_unsent_requests_fall_back_to_exec(monkeypatch):
+    """Connection failures fall back to exec; a read timeout fails instead of replaying the action."""
+    server = start_server()
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()  # Nothing listens here, connecting is refused
+    try:
+        sandbox = FakeSandbox(server.server_port, published_port=closed_port)
+        tool, _ = make_tool(sandbox)
+        result = await tool._execute_browser_action("navigate_to", {"url": "https://example.com"})
+        assert result.success, result.output
+        assert sandbox.execs == 1
+
+        monkeypatch.setattr(browser_client, "BROWSER_API_TIMEOUT", browser_client.httpx.Timeout(0.1, connect=5.0))
+        sandbox = FakeSandbox(server.server_port)
+        tool, thread_manager = make_tool(sandbox)
+        FakeBrowserApiHandler.requests = []
+        result = await tool._execute_browser_action("slow_action", {"url": "https://example.com"})
+        assert not result.success and "may have run" in result.output
+        assert sandbox.execs == 0 and thread_manager.messages == []
+        assert FakeBrowserApiHandler.requests == ["/api/automation/slow_action"]  # Sent exactly once
+    finally:
+        server.shutdown()
+
+
+async def run_benchmark(actions: int = 50):
+    server = start_server()
+    try:
+        print(f"\n📊 {actions} browser actions, {len(SCREENSHOT) // 1024} KB screenshot payload")
+        for label, publish_port in (("HTTP (pooled)", True), ("exec + curl", False)):
+            tool, _ = make_tool(FakeSandbox(server.server_port, publish_port))
+            await time_actions(tool, 3)  # warm up
+            latencies = await time_actions(tool, actions)
+            print(f"   {label:14s} mean {statistics.mean(latencies) * 1000:6.1f} ms, "
+                  f"p95 {sorted(latencies)[int(actions * 0.95) - 1] * 1000:6.1f} ms")
+        print("   (exec + curl excludes the docker exec round trip, which adds more in a real sandbox)")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_http_and_exec_transports_agree())
+    print("✅ Transport checks passed")
+    asyncio.run(run_benchmark())
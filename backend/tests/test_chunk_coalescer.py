@@ -0,0 +1,127 @@
+"""
+Tests for coalescing streamed assistant chunks before they are written to Redis.
+
+A fake LLM stream produces small chunks every millisecond, with status
+responses in between. The tests check that chunk text and response order are
+preserved, that the number of batches (one pipelined Redis write each) drops
+by more than an order of magnitude, and that no chunk is held back for more
+than 50 ms.
+
+Run with:
+    python -m pytest -q tests/test_chunk_coalescer.py -s
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from agentpress.chunk_coalescer import coalesce_responses
+
+
+def chunk(text):
+    return {
+        "type": "assistant", "message_id": None,
+        "content": json.dumps({"role": "assistant", "content": text}),
+        "metadata": json.dumps({"stream_status": "chunk", "thread_run_id": "run"}),
+    }
+
+
+def status(name):
+    return {"type": "status", "status": name}
+
+
+async def fake_llm_stream(chunks: int, interval: float, produced: list):
+    yield status("thread_run_start")
+    for i in range(chunks):
+        await asyncio.sleep(interval)
+        produced.append(time.perf_counter())
+        yield chunk(f"tok{i} ")
+        if i == chunks // 2:
+            yield status("tool_started")
+    yield status("completed")
+
+
+def chunk_text(response):
+    return json.loads(response["content"])["content"]
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_merged_in_order_with_bounded_delay():
+    produced, delivered = [], []
+    responses, batches = [], 0
+    async for batch in coalesce_responses(fake_llm_stream(400, 0.001, produced), window_ms=30, max_bytes=512):
+        now = time.perf_counter()
+        batches += 1
+        for response in batch:
+            responses.append(response)
+            if response["type"] == "assistant":
+                delivered.append((now, chunk_text(response).count("tok")))
+
+    text = "".join(chunk_text(r) for r in responses if r["type"] == "assistant")
+    assert text == "".join(f"tok{i} " for i in range(400))
+    statuses = [r["status"] for r in responses if r["type"] == "status"]
+    assert statuses == ["thread_run_start", "tool_started", "completed"]
+    # tool_started stays between the chunks it was produced between
+    position = next(i for i, r in enumerate(responses) if r.get("status") == "tool_started")
+    assert chunk_text(responses[position - 1]).endswith("tok200 ")
+
+    writes_before, writes_after = len(produced) + len(statuses), batches
+    print(f"\n📊 {writes_before} responses -> {writes_after} pipelined writes")
+    assert writes_after * 10 <= writes_before
+
+    # Delay between producing a chunk and handing it to the writer
+    delays, index = [], 0
+    for delivered_at, count in delivered:
+        delays.extend(delivered_at - produced[index + k] for k in range(count))
+        index += count
+    print(f"   max chunk delay {max(delays) * 1000:.1f} ms")
+    assert max(delays) < 0.05
+
+
+@pytest.mark.asyncio
+async def test_non_chunk_responses_are_not_delayed():
+    async def slow_statuses():
+        for name in ("a", "b"):
+            yield status(name)
+            await asyncio.sleep(0.2)
+
+    start = time.perf_counter()
+    arrivals = []
+    async for batch in coalesce_responses(slow_statuses(), window_ms=30):
+        arrivals.append((time.perf_counter() - start, [r["status"] for r in batch]))
+    assert arrivals[0][1] == ["a"] and arrivals[0][0] < 0.02
+    assert arrivals[1][1] == ["b"]
+
+
+@pytest.mark.asyncio
+async def test_closing_early_cancels_the_reader():
+    cancelled = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                yield status("tick")
+                await asyncio.sleep(0.001)
+        finally:
+            cancelled.set()
+
+    batches = coalesce_responses(endless())
+    async for _ in batches:
+        break
+    await batches.aclose()
+    await asyncio.wait_for(cancelled.wait(), 1)
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_after_earlier_responses():
+    async def failing():
+        yield status("thread_run_start")
+        raise RuntimeError("llm failed")
+
+    received = []
+    with pytest.raises(RuntimeError, match="llm failed"):
+        async for batch in coalesce_responses(failing()):
+            received.extend(batch)
+    assert received == [status("thread_run_start")]
@@ -0,0 +1,87 @@
+"""
+Tests for the token-budgeted context window.
+
+Messages are given fixed token counts so the tests can check exactly which
+ones are packed: the newest messages that fit the budget, assistant messages
+together with their tool results, oversized tool outputs shortened in the
+middle, the summary kept at the top, and budgets looked up per model.
+
+Run with:
+    python -m pytest -q tests/test_context_builder.py
+"""
+
+import json
+
+from agentpress import context_builder
+from agentpress.context_builder import build_context_window, get_context_budget
+
+
+def row(message, tokens, type=None):
+    return {'message': message, 'tokens': tokens, 'type': type or message['role']}
+
+
+def user(text, tokens=10):
+    return row({'role': 'user', 'content': text}, tokens)
+
+
+def tool_call(call_id, tokens=10):
+    return row({'role': 'assistant', 'content': '', 'tool_calls': [{'id': call_id, 'type': 'function',
+                'function': {'name': 'run', 'arguments': '{}'}}]}, tokens)
+
+
+def tool_result(call_id, tokens=10, content="ok"):
+    return row({'role': 'tool', 'tool_call_id': call_id, 'content': content}, tokens, type='tool')
+
+
+def count_by_length(message):
+    return len(message['content']) // 4
+
+
+def test_newest_messages_fill_the_budget():
+    rows = [user(f"m{i}", tokens=10 * (i + 1)) for i in range(5)]  # 10, 20, 30, 40, 50 tokens
+    window = build_context_window(rows, 120, count_by_length)
+    assert [m['content'] for m in window] == ["m2", "m3", "m4"]
+    # A single huge message no longer hides the rest; the newest one is always sent
+    assert [m['content'] for m in build_context_window(rows, 10, count_by_length)] == ["m4"]
+
+
+def test_tool_results_stay_with_their_assistant_message():
+    rows = [user("question"), tool_call("a"), tool_result("a"), tool_result("a2"), user("next", tokens=10)]
+    window = build_context_window(rows, 35, count_by_length)
+    # The assistant message and both results do not fit together, so all three are left out
+    assert [m['role'] for m in window] == ['user']
+
+    window = build_context_window(rows, 40, count_by_length)
+    assert [m['role'] for m in window] == ['assistant', 'tool', 'tool', 'user']
+
+    # A result whose assistant message is gone is never sent first
+    orphaned = [tool_result("x"), user("hi")]
+    assert [m['role'] for m in build_context_window(orphaned, 100, count_by_length)] == ['user']
+
+
+def test_oversized_tool_outputs_are_elided_in_the_middle():
+    output = "HEAD" + "x" * 40000 + "TAIL"
+    rows = [user("run it"), tool_call("a"), tool_result("a", tokens=10000, content=output)]
+    window = build_context_window(rows, 2000, count_by_length, max_tool_output_tokens=500)
+    content = window[-1]['content']
+    assert len(window) == 3
+    assert content.startswith("HEAD") and content.endswith("TAIL") and len(content) < 2100
+    assert rows[-1]['message']['content'] == output  # Stored message untouched
+
+
+def test_summary_is_kept_at_the_top():
+    rows = [row({'role': 'user', 'content': "summary"}, 30, type='summary')] + [user(f"m{i}") for i in range(10)]
+    window = build_context_window(rows, 60, count_by_length)
+    assert [m['content'] for m in window] == ["summary", "m7", "m8", "m9"]
+
+
+def test_budgets_per_model(monkeypatch):
+    assert get_context_budget("anthropic/claude-3-7-sonnet-latest") == 64000
+    assert get_context_budget("gpt-4o-mini") == 48000
+    assert get_context_budget("some/unknown-model") == context_builder.DEFAULT_CONTEXT_BUDGET
+
+    monkeypatch.setattr(context_builder.config, "CONTEXT_TOKEN_BUDGETS",
+                        json.dumps({"anthropic/claude-3-7-sonnet-latest": 90000, "some/": 8000}))
+    assert get_context_budget("anthropic/claude-3-7-sonnet-latest") == 90000
+    assert get_context_budget("anthropic/claude-3-5-haiku") == 64000
+    assert get_context_budget("some/unknown-model") == 8000
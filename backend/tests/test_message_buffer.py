@@ -0,0 +1,166 @@
+"""
+Tests for write-behind buffering of non-LLM messages.
+
+The messages table is replaced by an in-memory fake that records each insert
+and can be made to fail. The tests check that queued rows are flushed in one
+multi-row insert when the batch size is reached or the flush interval
+elapses, that a failed insert is retried and its rows dropped after
+MAX_FLUSH_ATTEMPTS, that buffered rows are flushed ahead of an LLM message so
+the table keeps their order, and that queued rows are returned like saved ones.
+
+Run with:
+    python -m pytest -q tests/test_message_buffer.py
+"""
+
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+
+from agentpress import message_buffer
+from agentpress.message_buffer import MessageWriteBuffer
+from agentpress.thread_manager import ThreadManager
+
+THREAD_ID = "buffer-thread"
+
+
+class FakeClient:
+    """messages table recording every insert; fails the next `failures` inserts."""
+
+    def __init__(self):
+        self.inserts = []
+        self.rows = []
+        self.failures = 0
+
+    def table(self, name):
+        assert name == 'messages'
+        client = self
+
+        class _Insert:
+            def __init__(self, data, returning):
+                self.data = data
+                self.returning = returning
+
+            async def execute(self):
+                if client.failures:
+                    client.failures -= 1
+                    raise ConnectionError("database unavailable")
+                rows = self.data if isinstance(self.data, list) else [{**self.data, 'message_id': f"db-{len(client.rows)}"}]
+                client.inserts.append(rows)
+                client.rows.extend(rows)
+                return type('obj', (object,), {'data': rows if self.returning == 'representation' else []})
+
+        return type('obj', (object,), {'insert': lambda self, data, returning=None: _Insert(data, returning)})()
+
+
+class FakeMessageCache:
+    async def append(self, thread_id, row):
+        pass
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest_asyncio.fixture
+async def buffer(client, monkeypatch):
+    buffer = object.__new__(MessageWriteBuffer)
+    buffer._setup()
+    buffer.max_batch_size = 3
+    buffer.flush_interval = 0.05
+
+    async def _client():
+        return client
+    buffer.db = type('obj', (object,), {'client': property(lambda self: _client())})()
+    monkeypatch.setattr(MessageWriteBuffer, "_instance", buffer)
+    yield buffer
+    if buffer._timer is not None:
+        buffer._timer.cancel()
+        await asyncio.gather(buffer._timer, return_exceptions=True)
+
+
+def status(i):
+    return {'thread_id': THREAD_ID, 'type': 'status', 'content': json.dumps({'status_type': f"step {i}"}),
+            'is_llm_message': False, 'metadata': json.dumps({'step': i})}
+
+
+def statuses(rows):
+    return [json.loads(row['content'])['status_type'] for row in rows if row['type'] == 'status']
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_flushed_at_once(buffer, client):
+    for i in range(2):
+        await buffer.enqueue(status(i))
+    assert client.inserts == [] and buffer.pending_count == 2
+
+    await buffer.enqueue(status(2))
+    assert [statuses(rows) for rows in client.inserts] == [["step 0", "step 1", "step 2"]]
+    assert buffer.pending_count == 0
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_is_flushed_after_the_interval(buffer, client):
+    await buffer.enqueue(status(0))
+    await buffer.enqueue(status(1))
+    await asyncio.sleep(buffer.flush_interval / 5)
+    assert client.inserts == []
+
+    await asyncio.sleep(buffer.flush_interval * 2)
+    assert [statuses(rows) for rows in client.inserts] == [["step 0", "step 1"]]
+    assert buffer.pending_count == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_insert_is_retried_then_dropped(buffer, client, monkeypatch):
+    monkeypatch.setattr(buffer, "flush_interval", 60)  # Flush by hand only
+
+    # A single failure: rows are re-queued ahead of newer ones and written next time
+    client.failures = 1
+    await buffer.enqueue(status(0))
+    assert await buffer.flush() == 0 and buffer.pending_count == 1
+    await buffer.enqueue(status(1))
+    assert await buffer.flush() == 2
+    assert statuses(client.rows) == ["step 0", "step 1"]
+    assert buffer._attempts == {}
+
+    # Failing every attempt: rows are dropped after MAX_FLUSH_ATTEMPTS inserts
+    client.failures = message_buffer.MAX_FLUSH_ATTEMPTS
+    await buffer.enqueue(status(2))
+    for _ in range(message_buffer.MAX_FLUSH_ATTEMPTS):
+        assert await buffer.flush() == 0
+    assert buffer.pending_count == 0 and buffer._attempts == {}
+    assert await buffer.flush() == 0
+    assert statuses(client.rows) == ["step 0", "step 1"]
+
+
+@pytest.mark.asyncio
+async def test_buffered_rows_are_written_before_llm_messages(buffer, client, monkeypatch):
+    monkeypatch.setattr(buffer, "flush_interval", 60)
+    manager = ThreadManager()
+    manager.db = buffer.db
+    manager.message_buffer = buffer
+    manager.message_cache = FakeMessageCache()
+
+    started = await manager.add_message(THREAD_ID, 'status', {'status_type': "tool_started"})
+    assert client.inserts == [] and buffer.pending_count == 1
+    await manager.add_message(THREAD_ID, 'assistant', {'role': 'assistant', 'content': "done"}, is_llm_message=True)
+    await manager.add_message(THREAD_ID, 'status', {'status_type': "finish"})
+    await manager.flush_messages()
+
+    assert [row['type'] for row in client.rows] == ['status', 'assistant', 'status']
+    assert client.rows[0]['message_id'] == started['message_id']
+    assert client.rows[0]['created_at'] < client.rows[2]['created_at']
+
+
+@pytest.mark.asyncio
+async def test_queued_rows_are_returned_like_saved_rows(buffer, client):
+    row = await buffer.enqueue(status(0))
+    assert row['metadata'] == {'step': 0}
+    assert row['message_id'] and row['created_at'] == row['updated_at']
+    # The row still goes to the database with metadata serialized as JSON
+    await buffer.flush()
+    assert client.rows[0]['metadata'] == json.dumps({'step': 0})
+    assert client.rows[0]['message_id'] == row['message_id']
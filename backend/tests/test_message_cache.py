@@ -0,0 +1,164 @@
+"""
+Tests for the per-thread LLM message cache.
+
+A small in-memory stand-in for the windowed RPC checks that the cache only
+fetches messages newer than the ones it holds, trims to the requested window,
+picks up appended messages without skipping rows written elsewhere in between,
+and reloads after a summary.
+
+Run directly with:
+    python -m tests.test_message_cache
+"""
+
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from agentpress.message_cache import ThreadMessageCache
+
+THREAD_ID = "test-thread"
+
+
+class FakeRpcClient:
+    """Implements get_llm_formatted_messages_window over a list of rows."""
+
+    def __init__(self):
+        self.rows = []
+        self.calls = []
+        self._clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def add(self, type, content):
+        self._clock += timedelta(seconds=1)
+        row = {
+            'message_id': str(uuid.uuid4()),
+            'thread_id': THREAD_ID,
+            'type': type,
+            'content': json.dumps(content),
+            'is_llm_message': True,
+            'created_at': self._clock.isoformat(),
+        }
+        self.rows.append(row)
+        return row
+
+    def rpc(self, name, params):
+        assert name == 'get_llm_formatted_messages_window'
+        self.calls.append(params)
+        rows = self.rows
+        summaries = [i for i, row in enumerate(rows) if row['type'] == 'summary']
+        if summaries:
+            rows = rows[summaries[-1]:]
+        if params.get('p_after'):
+            rows = [row for row in rows if row['created_at'] > params['p_after']]
+        if params.get('p_limit'):
+            rows = rows[-params['p_limit']:]
+        data = [{k: row[k] for k in ('message_id', 'type', 'content', 'created_at')} for row in rows]
+
+        class _Query:
+            async def execute(self):
+                return type('obj', (object,), {'data': data})
+        return _Query()
+
+
+def make_cache(client):
+    cache = ThreadMessageCache()
+    cache._entries.clear()
+    cache.use_redis = False
+
+    async def _client():
+        return client
+    cache.db = type('obj', (object,), {'client': property(lambda self: _client())})()
+    return cache
+
+
+def user(i):
+    return {'role': 'user', 'content': f"message {i}"}
+
+
+@pytest.mark.asyncio
+async def test_incremental_fetch():
+    """Warm reads ask only for newer rows, including rows appended through the cache."""
+    client = FakeRpcClient()
+    for i in range(30):
+        client.add('user', user(i))
+    cache = make_cache(client)
+
+    messages = await cache.get_messages(THREAD_ID, limit=10)
+    assert [m['content'] for m in messages] == [f"message {i}" for i in range(20, 30)]
+    assert client.calls[-1] == {'p_thread_id': THREAD_ID, 'p_limit': 10}
+
+    # Written through add_message: appended after a delta query, never a full refetch
+    await cache.append(THREAD_ID, client.add('assistant', {'role': 'assistant', 'content': "reply"}))
+    # Written elsewhere (e.g. the API): picked up by the delta query
+    client.add('user', user(30))
+
+    messages = await cache.get_messages(THREAD_ID, limit=10)
+    assert messages[-2]['content'] == "reply"
+    assert messages[-1]['content'] == "message 30"
+    assert len(messages) == 10
+    assert 'p_after' in client.calls[-1] and 'p_limit' not in client.calls[-1]
+
+    # Returned messages are copies
+    messages[-1]['content'] = "mutated"
+    assert (await cache.get_messages(THREAD_ID, limit=1))[0]['content'] == "message 30"
+
+
+@pytest.mark.asyncio
+async def test_append_keeps_rows_written_elsewhere():
+    """A row written by another worker before an appended one is not skipped."""
+    client = FakeRpcClient()
+    for i in range(3):
+        client.add('user', user(i))
+    cache = make_cache(client)
+    await cache.get_messages(THREAD_ID)
+
+    client.add('user', user(3))  # e.g. the API adding a user message during a run
+    await cache.append(THREAD_ID, client.add('assistant', {'role': 'assistant', 'content': "reply"}))
+    await cache.append(THREAD_ID, client.add('assistant', {'role': 'assistant', 'content': "reply 2"}))
+
+    messages = await cache.get_messages(THREAD_ID)
+    assert [m['content'] for m in messages] == [f"message {i}" for i in range(4)] + ["reply", "reply 2"]
+    assert all('p_limit' not in call for call in client.calls[1:])
+
+
+@pytest.mark.asyncio
+async def test_summary_invalidates():
+    """A summary written through the cache or elsewhere resets the thread window."""
+    client = FakeRpcClient()
+    for i in range(5):
+        client.add('user', user(i))
+    cache = make_cache(client)
+    await cache.get_messages(THREAD_ID)
+
+    await cache.append(THREAD_ID, client.add('summary', {'role': 'user', 'content': "summary 1"}))
+    client.add('user', user(5))
+    messages = await cache.get_messages(THREAD_ID)
+    assert [m['content'] for m in messages] == ["summary 1", "message 5"]
+
+    client.add('summary', {'role': 'user', 'content': "summary 2"})
+    client.add('user', user(6))
+    messages = await cache.get_messages(THREAD_ID)
+    assert [m['content'] for m in messages] == ["summary 2", "message 6"]
+
+
+@pytest.mark.asyncio
+async def test_partial_entry_reloads_for_full_history():
+    """An entry loaded with a window is reloaded when the full history is asked for."""
+    client = FakeRpcClient()
+    for i in range(15):
+        client.add('user', user(i))
+    cache = make_cache(client)
+
+    assert len(await cache.get_messages(THREAD_ID, limit=5)) == 5
+    assert len(await cache.get_messages(THREAD_ID)) == 15
+    assert client.calls[-1] == {'p_thread_id': THREAD_ID}
+
+
+if __name__ == "__main__":
+    asyncio.run(test_incremental_fetch())
+    asyncio.run(test_append_keeps_rows_written_elsewhere())
+    asyncio.run(test_summary_invalidates())
+    asyncio.run(test_partial_entry_reloads_for_full_history())
+    print("✅ Message cache checks passed")
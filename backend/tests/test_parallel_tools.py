@@ -0,0 +1,124 @@
+"""
+Tests for access-aware parallel tool execution.
+
+A fake tool records when each of its calls starts and ends. The tests check
+that read-only calls overlap, that side-effecting calls keep the order the LLM
+issued them in while reads run alongside, that exclusive sandbox calls run
+alone, that the sequential strategy runs calls one at a time, and that the
+system prompt only asks for exactly one tool per response when multi-call mode
+is off.
+
+Run with:
+    python -m pytest -q tests/test_parallel_tools.py
+"""
+
+import asyncio
+
+import pytest
+
+from agent.prompt import get_system_prompt
+from agentpress.response_processor import ResponseProcessor
+from agentpress.tool import Tool, ToolAccess, openapi_schema, tool_access, xml_schema
+from agentpress.tool_registry import ToolRegistry
+
+
+def schema(name):
+    return openapi_schema({"type": "function", "function": {"name": name, "parameters": {"type": "object", "properties": {}}}})
+
+
+class RecordingTool(Tool):
+    events = []
+
+    async def _record(self, label):
+        self.events.append(("start", label))
+        await asyncio.sleep(0.01)
+        self.events.append(("end", label))
+        return self.success_response(label)
+
+    @tool_access(ToolAccess.READ_ONLY)
+    @schema("search")
+    async def search(self, label: str):
+        return await self._record(label)
+
+    @schema("write")
+    async def write(self, label: str):
+        return await self._record(label)
+
+    @tool_access(ToolAccess.EXCLUSIVE_SANDBOX)
+    @xml_schema(tag_name="browse", mappings=[{"param_name": "label", "node_type": "attribute"}])
+    async def browse(self, label: str):
+        return await self._record(label)
+
+
+def call(function_name, label):
+    return {"function_name": function_name, "arguments": {"label": label}}
+
+
+def running_together(events):
+    """Pairs of labels whose executions overlapped."""
+    running, pairs = set(), set()
+    for kind, label in events:
+        if kind == "start":
+            pairs.update(frozenset((label, other)) for other in running)
+            running.add(label)
+        else:
+            running.discard(label)
+    return pairs
+
+
+@pytest.fixture
+def processor():
+    RecordingTool.events = []
+    registry = ToolRegistry()
+    registry.register_tool(RecordingTool)
+    return ResponseProcessor(registry, add_message_callback=None)
+
+
+def test_access_levels_are_looked_up_per_function(processor):
+    registry = processor.tool_registry
+    assert registry.get_tool_access("search") == ToolAccess.READ_ONLY
+    assert registry.get_tool_access("write") == ToolAccess.SIDE_EFFECTING  # Default
+    assert registry.get_tool_access("browse") == ToolAccess.EXCLUSIVE_SANDBOX  # XML tool
+    assert registry.get_tool_access("unknown") == ToolAccess.SIDE_EFFECTING
+
+
+@pytest.mark.asyncio
+async def test_reads_overlap_and_writes_keep_their_order(processor):
+    calls = [call("search", "s1"), call("write", "w1"), call("search", "s2"), call("write", "w2"), call("search", "s3")]
+    results = await processor._execute_tools(calls, "parallel")
+
+    assert [result.output for _, result in results] == ["s1", "w1", "s2", "w2", "s3"]
+    overlapping = running_together(RecordingTool.events)
+    assert {frozenset(("s1", "s2")), frozenset(("s2", "s3")), frozenset(("s1", "w1"))} <= overlapping
+    assert frozenset(("w1", "w2")) not in overlapping
+    assert RecordingTool.events.index(("start", "w2")) > RecordingTool.events.index(("end", "w1"))
+
+
+@pytest.mark.asyncio
+async def test_exclusive_calls_run_alone(processor):
+    calls = [call("search", "s1"), call("write", "w1"), call("browse", "b1"), call("search", "s2"), call("browse", "b2")]
+    await processor._execute_tools(calls, "parallel")
+
+    overlapping = running_together(RecordingTool.events)
+    assert not any(label in pair for pair in overlapping for label in ("b1", "b2"))
+    assert frozenset(("s1", "w1")) in overlapping
+    assert RecordingTool.events.index(("start", "s2")) > RecordingTool.events.index(("end", "b1"))
+
+
+@pytest.mark.asyncio
+async def test_sequential_strategy_runs_one_call_at_a_time(processor):
+    scheduler = processor._create_tool_scheduler("sequential")
+    tasks = [scheduler.submit(call("search", f"s{i}")) for i in range(3)]
+    await asyncio.gather(*tasks)
+
+    assert not running_together(RecordingTool.events)
+    assert [label for kind, label in RecordingTool.events if kind == "start"] == ["s0", "s1", "s2"]
+
+
+def test_system_prompt_matches_the_tool_call_mode():
+    single = get_system_prompt()
+    assert "Choose exactly one tool" in single and "PARALLEL TOOL CALLS" not in single
+
+    parallel = get_system_prompt(parallel_tool_calls=True, max_tool_calls=5)
+    assert "Choose exactly one tool" not in parallel
+    assert "up to 5 tool calls in one response" in parallel
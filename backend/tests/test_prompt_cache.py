@@ -0,0 +1,106 @@
+"""
+Tests for the cached system prompt and prompt cache metrics.
+
+The tests check that the combined system prompt is built and token-counted
+once per base prompt and tool set, that registering another XML tool yields a
+new prompt, that prepare_params marks cache breakpoints on copies so the
+system prefix sent to the provider stays byte-identical between calls, and
+that prompt cache hit rates are derived from litellm usage fields.
+
+Run with:
+    python -m pytest -q tests/test_prompt_cache.py
+"""
+
+import json
+
+import litellm
+import pytest
+
+from agentpress import prompt_cache
+from agentpress.tool import Tool, ToolResult, xml_schema
+from agentpress.tool_registry import ToolRegistry
+from services.llm import PromptCacheMetrics, prepare_params
+
+BASE_PROMPT = {"role": "system", "content": "You are a helpful agent. " * 2000}
+
+
+class ShellTool(Tool):
+    @xml_schema(tag_name="run-command", example="<run-command>ls</run-command>")
+    async def run_command(self, command: str) -> ToolResult:
+        return self.success_response(command)
+
+
+class SearchTool(Tool):
+    @xml_schema(tag_name="web-search", example="<web-search query='x'></web-search>")
+    async def web_search(self, query: str) -> ToolResult:
+        return self.success_response(query)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    prompt_cache._cache.clear()
+
+
+def make_registry(*tools):
+    registry = ToolRegistry()
+    for tool in tools:
+        registry.register_tool(tool)
+    return registry
+
+
+def test_prompt_is_built_and_counted_once_per_tool_set(monkeypatch):
+    counted = []
+    original = litellm.token_counter
+
+    def counting_token_counter(**kwargs):
+        counted.append(kwargs["model"])
+        return original(**kwargs)
+    monkeypatch.setattr(litellm, "token_counter", counting_token_counter)
+
+    # Each run creates its own ThreadManager and registry with the same tools
+    first = prompt_cache.get_system_prompt(BASE_PROMPT, make_registry(ShellTool), include_xml_examples=True)
+    second = prompt_cache.get_system_prompt(BASE_PROMPT, make_registry(ShellTool), include_xml_examples=True)
+    assert first is second
+    assert "<run-command> Example: <run-command>ls</run-command>" in first.message["content"]
+    assert BASE_PROMPT["content"].count("XML TOOL CALLING") == 0  # Caller's prompt untouched
+
+    tokens = first.token_count("gpt-4o")
+    assert second.token_count("gpt-4o") == tokens
+    assert counted == ["gpt-4o"]
+
+    other = prompt_cache.get_system_prompt(BASE_PROMPT, make_registry(ShellTool, SearchTool), include_xml_examples=True)
+    assert other is not first and "<web-search>" in other.message["content"]
+    plain = prompt_cache.get_system_prompt(BASE_PROMPT, make_registry(ShellTool), include_xml_examples=False)
+    assert plain.message == BASE_PROMPT
+
+
+def test_prepare_params_keeps_the_cached_prefix_byte_identical():
+    system = prompt_cache.get_system_prompt(BASE_PROMPT, make_registry(ShellTool), include_xml_examples=True)
+    snapshot = json.dumps(system.message)
+    history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+
+    sent = []
+    for turn in range(3):
+        history = history + [{"role": "user", "content": f"turn {turn}"}]
+        params = prepare_params([system.message] + history, "anthropic/claude-3-7-sonnet-latest", stream=True)
+        sent.append(json.dumps(params["messages"][0]))
+        assert params["stream_options"] == {"include_usage": True}
+
+    assert json.dumps(system.message) == snapshot
+    assert all(isinstance(message["content"], str) for message in history)
+    assert sent[0] == sent[1] == sent[2]
+    assert json.loads(sent[0])["content"][0]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_cache_hit_rates_from_usage():
+    metrics = PromptCacheMetrics()
+    metrics.record("claude", {"prompt_tokens": 10000, "cache_creation_input_tokens": 9000})
+    metrics.record("claude", {"prompt_tokens": 10500, "cache_read_input_tokens": 9000})
+    metrics.record("gpt-4o", {"prompt_tokens": 4000, "prompt_tokens_details": {"cached_tokens": 3072}})
+    metrics.record("gpt-4o", None)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["claude"]["requests"] == 2 and snapshot["claude"]["request_hit_rate"] == 0.5
+    assert snapshot["claude"]["cache_write_tokens"] == 9000
+    assert snapshot["claude"]["token_hit_rate"] == round(9000 / 20500, 4)
+    assert snapshot["gpt-4o"]["token_hit_rate"] == 0.768
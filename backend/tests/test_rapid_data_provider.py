@@ -0,0 +1,153 @@
+"""
+Tests for the async RapidAPI data provider transport.
+
+A local stand-in for RapidAPI serves endpoints that echo requests, fail a
+few times before succeeding, throttle, respond slowly or return large bodies.
+The tests check that calls no longer block the event loop, that failed and
+throttled attempts are retried, that a provider's concurrent requests are
+capped, and that oversized responses are rejected.
+
+Run with:
+    python -m pytest -q tests/test_rapid_data_provider.py
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import pytest_asyncio
+
+from agent.tools.data_providers import RapidDataProviderBase as base
+from agent.tools.data_providers.RapidDataProviderBase import RapidDataProviderBase
+
+
+class FakeRapidApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = {}
+
+    def _send(self, status, payload, headers=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        state = self.state
+        state.setdefault("hits", {}).setdefault(url.path, 0)
+        state["hits"][url.path] += 1
+
+        if url.path == "/items":
+            self._send(200, {"query": parse_qs(url.query), "host": self.headers.get("x-rapidapi-host")})
+        elif url.path == "/flaky":
+            if state["hits"][url.path] <= 2:
+                self._send(503, {"message": "unavailable"})
+            else:
+                self._send(200, {"ok": True})
+        elif url.path == "/throttled":
+            self._send(429, {"message": "Too many requests"}, {"Retry-After": "0"})
+        elif url.path == "/slow":
+            with state["lock"]:
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+            time.sleep(0.2)
+            with state["lock"]:
+                state["active"] -= 1
+            self._send(200, {"ok": True})
+        elif url.path == "/large":
+            self._send(200, json.dumps({"data": "x" * 50_000}).encode())
+        else:
+            self._send(404, {"message": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self._send(200, {"body": json.loads(self.rfile.read(length) or b"{}")})
+
+    def log_message(self, *args):
+        pass
+
+
+ENDPOINTS = {
+    name: {"route": f"/{name}", "method": "GET", "name": name, "description": "", "payload": {}}
+    for name in ("items", "flaky", "throttled", "slow", "large")
+}
+ENDPOINTS["echo"] = {"route": "/echo", "method": "POST", "name": "echo", "description": "", "payload": {}}
+
+
+class FakeProvider(RapidDataProviderBase):
+    max_concurrency = 2
+
+    def __init__(self, port):
+        super().__init__(f"http://127.0.0.1:{port}", ENDPOINTS)
+
+
+@pytest.fixture
+def server():
+    FakeRapidApiHandler.state = {"lock": threading.Lock(), "active": 0, "max_active": 0}
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeRapidApiHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest_asyncio.fixture
+async def provider(server, monkeypatch):
+    monkeypatch.setattr(base, "RAPID_API_BACKOFF_BASE", 0.01)
+    yield FakeProvider(server.server_address[1])
+    await base.close_rapid_api_client()
+
+
+@pytest.mark.asyncio
+async def test_get_and_post_calls(provider, server):
+    result = await provider.call_endpoint("/items", {"q": "python"})
+    assert result == {"query": {"q": ["python"]}, "host": f"127.0.0.1:{server.server_address[1]}"}
+    assert await provider.call_endpoint("echo", {"a": 1}) == {"body": {"a": 1}}
+
+    with pytest.raises(ValueError, match="not found"):
+        await provider.call_endpoint("missing")
+
+
+@pytest.mark.asyncio
+async def test_failures_and_throttling_are_retried(provider):
+    assert await provider.call_endpoint("flaky") == {"ok": True}
+    assert FakeRapidApiHandler.state["hits"]["/flaky"] == 3
+
+    with pytest.raises(ValueError, match="HTTP 429"):
+        await provider.call_endpoint("throttled")
+    assert FakeRapidApiHandler.state["hits"]["/throttled"] == base.RAPID_API_MAX_RETRIES + 1
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_do_not_block_and_are_capped(provider):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticking = asyncio.create_task(ticker())
+    results = await asyncio.gather(*(provider.call_endpoint("slow") for _ in range(4)))
+    ticking.cancel()
+
+    assert results == [{"ok": True}] * 4
+    assert ticks > 20  # The loop kept running during the ~0.4s of requests
+    assert FakeRapidApiHandler.state["max_active"] == FakeProvider.max_concurrency
+
+
+@pytest.mark.asyncio
+async def test_oversized_responses_are_rejected(provider, monkeypatch):
+    monkeypatch.setattr(base, "RAPID_API_MAX_RESPONSE_BYTES", 10_000)
+    with pytest.raises(ValueError, match="larger than"):
+        await provider.call_endpoint("large")
@@ -0,0 +1,123 @@
+"""
+Tests for the Redis connection pool, pipeline helper and metrics.
+
+The client runs on the real instrumented pool, but its connections are
+replaced by fakes that answer every command with OK after a fixed server
+latency. The tests check that the pool never opens more than its maximum
+connections and records the wait for a free one, that execute_pipeline sends
+several commands in one round trip, that command latencies end up in
+cumulative histograms, and that blocking stream reads (SSE viewers) run on
+their own pool so writers get through while every reader is blocked.
+
+Run with:
+    python -m pytest -q tests/test_redis_pool.py -s
+"""
+
+import asyncio
+
+import pytest
+from redis.asyncio.connection import Connection
+
+from services import redis
+
+SERVER_LATENCY = 0.02
+BLOCK_SECONDS = 0.5
+
+
+class FakeConnection(Connection):
+    """Connection that answers every command with OK after SERVER_LATENCY."""
+
+    round_trips = 0
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self, nowait: bool = False):
+        pass
+
+    async def can_read_destructive(self):
+        return False
+
+    async def send_packed_command(self, command, check_health=True):
+        FakeConnection.round_trips += 1
+        self.pending = True
+        self.blocking = b"BLOCK" in (command if isinstance(command, bytes) else b"".join(command))
+
+    async def read_response(self, *args, **kwargs):
+        if self.pending:
+            self.pending = False
+            if self.blocking:
+                # XREAD BLOCK with no new entries: the server answers nil after the block time
+                await asyncio.sleep(BLOCK_SECONDS)
+                return None
+            await asyncio.sleep(SERVER_LATENCY)
+        return "OK"
+
+
+@pytest.fixture
+def pool_client(monkeypatch):
+    FakeConnection.round_trips = 0
+    monkeypatch.setattr(redis, "metrics", redis.RedisMetrics())
+    pool = redis.InstrumentedConnectionPool(connection_class=FakeConnection, max_connections=4, timeout=5)
+    fake_client = redis.InstrumentedRedis(connection_pool=pool)
+    blocking_pool = redis.redis.BlockingConnectionPool(connection_class=FakeConnection, max_connections=10, timeout=5)
+    monkeypatch.setattr(redis, "client", fake_client)
+    monkeypatch.setattr(redis, "blocking_client", redis.InstrumentedRedis(connection_pool=blocking_pool))
+    monkeypatch.setattr(redis, "_initialized", True)
+    return fake_client
+
+
+@pytest.mark.asyncio
+async def test_pool_is_bounded_and_records_waits(pool_client):
+    await asyncio.gather(*(redis.set(f"key-{i}", "value") for i in range(20)))
+
+    metrics = redis.get_metrics()
+    print(f"\n📊 20 concurrent SETs on 4 connections: "
+          f"waited {metrics['connection_wait_ms']['sum_ms']:.0f} ms in total for a free connection")
+    assert metrics["max_connections"] == 4
+    assert metrics["max_connections_in_use"] == 4
+    assert metrics["connections_in_use"] == 0
+    # 20 commands in waves of 4: later waves wait for the earlier ones
+    assert metrics["connection_wait_ms"]["sum_ms"] >= SERVER_LATENCY * 1000 * 4
+    assert metrics["command_latency_ms"]["SET"]["count"] == 20
+
+
+@pytest.mark.asyncio
+async def test_execute_pipeline_uses_one_round_trip(pool_client):
+    results = await redis.execute_pipeline(
+        ("set", "key", "value"), ("expire", "key", 60), ("publish", "channel", "message")
+    )
+    assert len(results) == 3
+    assert FakeConnection.round_trips == 1
+
+    metrics = redis.get_metrics()
+    assert metrics["command_latency_ms"]["PIPELINE"]["count"] == 1
+    assert "SET" not in metrics["command_latency_ms"]
+
+
+@pytest.mark.asyncio
+async def test_blocked_readers_do_not_starve_writers(pool_client):
+    """Ten viewers blocked on XREAD, more than the 4 regular connections, do not delay writes."""
+    readers = [asyncio.create_task(redis.xread({f"stream-{i}": "$"}, block=int(BLOCK_SECONDS * 1000)))
+               for i in range(10)]
+    await asyncio.sleep(0.05)
+    assert redis.get_metrics()["blocking_connections_in_use"] == 10
+
+    start = asyncio.get_running_loop().time()
+    await asyncio.gather(*(redis.set(f"key-{i}", "value") for i in range(8)))
+    await redis.execute_pipeline(("xadd", "stream-0", {"data": "x"}), ("expire", "stream-0", 60))
+    elapsed = asyncio.get_running_loop().time() - start
+
+    assert elapsed < BLOCK_SECONDS / 2
+    assert not any(reader.done() for reader in readers)
+    assert await asyncio.gather(*readers) == [[]] * 10
+    assert redis.get_metrics()["max_connections_in_use"] <= 4
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = redis.Histogram(buckets=(1, 10, 100))
+    for value in (0.5, 5, 5, 50, 500):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 1, "10": 3, "100": 4, "+Inf": 5}
+    assert snapshot["count"] == 5 and snapshot["sum_ms"] == 560.5
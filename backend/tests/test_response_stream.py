@@ -0,0 +1,158 @@
+"""
+Tests for the Redis Streams based agent run response log.
+
+Redis stream commands are replaced by an in-memory fake with blocking reads.
+The tests check that a viewer receives the backlog and live entries with
+their stream ids, that a reconnecting viewer resumes after Last-Event-ID
+without replaying earlier entries, and that control signals end the stream.
+
+Run with:
+    python -m pytest -q tests/test_response_stream.py
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from agent import api
+
+
+class FakeStreams:
+    """Append-only streams with XADD/XRANGE/XREAD semantics."""
+
+    def __init__(self):
+        self.entries = {}
+        self.sequence = 0
+        self.changed = asyncio.Event()
+        self.commands = 0
+
+    async def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.commands += 1
+        self.sequence += 1
+        entry_id = f"{self.sequence}-0"
+        stream = self.entries.setdefault(key, [])
+        stream.append((entry_id, dict(fields)))
+        if maxlen is not None:
+            del stream[:-maxlen]
+        self.changed.set()
+        return entry_id
+
+    async def xrange(self, key, min="-", max="+", count=None):
+        self.commands += 1
+        return list(self.entries.get(key, []))
+
+    async def xread(self, streams, count=None, block=None):
+        self.commands += 1
+        (key, last_id), = streams.items()
+
+        def after():
+            last = int(str(last_id).split("-")[0])
+            return [e for e in self.entries.get(key, []) if int(e[0].split("-")[0]) > last][:count]
+
+        entries = after()
+        if not entries and block:
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), block / 1000)
+            except asyncio.TimeoutError:
+                pass
+            entries = after()
+        return [[key, entries]] if entries else []
+
+    async def publish(self, channel, message):
+        self.commands += 1
+
+    async def expire(self, key, seconds):
+        self.commands += 1
+
+
+class FakeQuery:
+    def __init__(self, status):
+        self.status = status
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        return type("Result", (), {"data": {"status": self.status}})()
+
+
+class FakeDB:
+    def __init__(self, status="running"):
+        self.status = status
+
+    @property
+    async def client(self):
+        status = self.status
+        return type("Client", (), {"table": lambda self, name: FakeQuery(status)})()
+
+
+class FakeRequest:
+    def __init__(self, last_event_id=None):
+        self.headers = {"last-event-id": last_event_id} if last_event_id else {}
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    fake = FakeStreams()
+    for name in ("xadd", "xrange", "xread", "publish", "expire"):
+        monkeypatch.setattr(api.redis, name, getattr(fake, name))
+
+    async def allow(*args, **kwargs):
+        return {"thread_id": "thread"}
+    monkeypatch.setattr(api, "get_user_id_from_stream_auth", allow)
+    monkeypatch.setattr(api, "get_agent_run_with_access_check", allow)
+    monkeypatch.setattr(api, "db", FakeDB())
+    return fake
+
+
+async def collect(response, limit=100):
+    events = []
+    async for event in response.body_iterator:
+        lines = dict(line.split(": ", 1) for line in event.strip().split("\n"))
+        events.append((lines.get("id"), json.loads(lines["data"])))
+        if len(events) >= limit:
+            break
+    return events
+
+
+@pytest.mark.asyncio
+async def test_backlog_live_entries_and_resume(streams):
+    for i in range(3):
+        await api._append_response("run-1", {"type": "assistant", "content": f"part {i}"})
+
+    viewer = asyncio.create_task(collect(await api.stream_agent_run("run-1", request=FakeRequest())))
+    await asyncio.sleep(0.05)
+    await api._append_response("run-1", {"type": "assistant", "content": "part 3"})
+    await api._append_response("run-1", {"type": "status", "status": "completed"})
+    events = await asyncio.wait_for(viewer, 5)
+
+    assert [data.get("content") for _, data in events[:4]] == ["part 0", "part 1", "part 2", "part 3"]
+    assert events[-1][1] == {"type": "status", "status": "completed"}
+    assert [event_id for event_id, _ in events] == ["1-0", "2-0", "3-0", "4-0", "5-0"]
+
+    # Reconnect after the second event: only later entries are replayed
+    resumed = await collect(await api.stream_agent_run("run-1", request=FakeRequest(last_event_id="2-0")))
+    assert [event_id for event_id, _ in resumed] == ["3-0", "4-0", "5-0"]
+    assert await api._read_responses("run-1") == [data for _, data in events]
+
+
+@pytest.mark.asyncio
+async def test_control_signal_ends_stream(streams):
+    await api._append_response("run-2", {"type": "assistant", "content": "working"})
+    viewer = asyncio.create_task(collect(await api.stream_agent_run("run-2", request=FakeRequest())))
+    await asyncio.sleep(0.05)
+    await api._publish_control_signal("run-2", "STOP")
+    events = await asyncio.wait_for(viewer, 5)
+    assert events[-1][1] == {"type": "status", "status": "STOP"}
+    # Control entries are not part of the stored responses
+    assert await api._read_responses("run-2") == [{"type": "assistant", "content": "working"}]
+
+
+@pytest.mark.asyncio
+async def test_finished_run_ends_after_backlog(streams, monkeypatch):
+    monkeypatch.setattr(api, "db", FakeDB(status="completed"))
+    await api._append_response("run-3", {"type": "assistant", "content": "done"})
+    events = await collect(await api.stream_agent_run("run-3", request=FakeRequest()))
+    assert events == [("1-0", {"type": "assistant", "content": "done"}), (None, {"type": "status", "status": "completed"})]
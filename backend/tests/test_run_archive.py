@@ -0,0 +1,181 @@
+"""
+Tests for run summaries and response stream archives.
+
+Redis and Supabase are replaced by in-memory fakes. The tests check that
+stopping a run stores a compact summary instead of reading and uploading
+every response, and that the stream archive is read in pages, stored as
+gzip-compressed JSON lines and only written when retention is enabled. The
+summary marks the archive as pending; the archive task records its location
+only after the upload, or marks it failed.
+
+Run with:
+    python -m pytest -q tests/test_run_archive.py
+"""
+
+import gzip
+import json
+
+import pytest
+
+from agent import api, run_archive
+
+
+class FakeRedis:
+    def __init__(self):
+        self.streams = {}
+        self.commands = []
+
+    def add(self, key, count):
+        stream = self.streams.setdefault(key, [])
+        for i in range(count):
+            stream.append((f"{len(stream) + 1}-0", {"data": json.dumps({"type": "assistant", "content": f"chunk {i}"})}))
+        stream.append((f"{len(stream) + 1}-0", {"control": "END_STREAM"}))
+
+    async def xrange(self, key, min="-", max="+", count=None):
+        self.commands.append("xrange")
+        entries = self.streams.get(key, [])
+        if min.startswith("("):
+            after = int(min[1:].split("-")[0])
+            entries = [e for e in entries if int(e[0].split("-")[0]) > after]
+        return entries[:count]
+
+    async def xlen(self, key):
+        self.commands.append("xlen")
+        return len(self.streams.get(key, []))
+
+    async def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.commands.append("xadd")
+
+    async def publish(self, channel, message):
+        self.commands.append("publish")
+
+    async def smembers(self, key):
+        return set()
+
+    async def expire(self, key, seconds):
+        self.commands.append("expire")
+
+
+class FakeTable:
+    def __init__(self, client):
+        self.client = client
+
+    def update(self, data):
+        self.client.updates.append(data)
+        return self
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        return type("Result", (), {"data": [{"status": "stopped"}]})()
+
+
+class FakeBucket:
+    def __init__(self, client):
+        self.client = client
+
+    async def upload(self, path, data, file_options=None):
+        if self.client.upload_error:
+            raise self.client.upload_error
+        self.client.uploads[path] = data
+        self.client.events.append("upload")
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client, self.name, self.params = client, name, params
+
+    async def execute(self):
+        self.client.rpcs.append((self.name, self.params))
+        self.client.events.append(self.name)
+
+
+class FakeClient:
+    def __init__(self):
+        self.updates = []
+        self.uploads = {}
+        self.upload_error = None
+        self.rpcs = []
+        self.events = []
+        self.storage = type("Storage", (), {"from_": lambda storage, bucket: FakeBucket(self)})()
+
+    def table(self, name):
+        return FakeTable(self)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    for name in ("xrange", "xlen", "xadd", "publish", "smembers", "expire"):
+        monkeypatch.setattr(api.redis, name, getattr(fake, name))
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_stop_stores_a_summary_without_reading_responses(fake_redis, monkeypatch):
+    client = FakeClient()
+
+    class FakeDB:
+        @property
+        async def client(self):
+            return client
+    monkeypatch.setattr(api, "db", FakeDB())
+    fake_redis.add(api._response_stream_key("run-1"), 5000)
+
+    await api.stop_agent_run("run-1", error_message="Server restarted while agent was running")
+
+    assert "xrange" not in fake_redis.commands
+    update = client.updates[0]
+    assert "responses" not in update
+    assert update["status"] == "failed"
+    assert update["summary"]["response_count"] == 5001
+    assert update["summary"]["last_error"] == "Server restarted while agent was running"
+    assert update["summary"]["stream"]["key"] == "agent_run:run-1:response_stream"
+    assert len(json.dumps(update)) < 1000
+
+
+@pytest.mark.asyncio
+async def test_archive_is_paged_and_compressed(fake_redis, monkeypatch):
+    client = FakeClient()
+    stream_key = api._response_stream_key("run-2")
+    fake_redis.add(stream_key, 2500)
+
+    assert run_archive.schedule_archive(client, "run-2", stream_key) is None  # Retention disabled
+
+    monkeypatch.setattr(run_archive.config, "AGENT_RUN_ARCHIVE_ENABLED", True)
+    task = run_archive.schedule_archive(client, "run-2", stream_key)
+    assert await task == "run-2.jsonl.gz"
+    assert fake_redis.commands.count("xrange") == 3
+
+    lines = gzip.decompress(client.uploads["run-2.jsonl.gz"]).decode().split("\n")
+    assert len(lines) == 2500  # Control entries are not archived
+    assert json.loads(lines[-1]) == {"type": "assistant", "content": "chunk 2499"}
+    assert client.events == ["upload", "set_agent_run_archive"]
+    assert client.rpcs[0][1]["p_archive"]["status"] == "archived"
+    assert client.rpcs[0][1]["p_archive"]["path"] == "run-2.jsonl.gz"
+    assert client.rpcs[0][1]["p_archive"]["responses"] == 2500
+    assert api._run_summary("run-2", "completed", 2501)["archive"] == {
+        "status": "pending", "bucket": "agent_run_archives", "path": "run-2.jsonl.gz"}
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_is_recorded(fake_redis, monkeypatch):
+    client = FakeClient()
+    client.upload_error = ConnectionError("storage unavailable")
+    stream_key = api._response_stream_key("run-3")
+    fake_redis.add(stream_key, 10)
+    monkeypatch.setattr(run_archive.config, "AGENT_RUN_ARCHIVE_ENABLED", True)
+
+    assert await run_archive.schedule_archive(client, "run-3", stream_key) is None
+    assert client.uploads == {}
+    assert client.rpcs == [("set_agent_run_archive", {
+        "p_agent_run_id": "run-3", "p_archive": {"status": "failed", "error": "storage unavailable"}})]
+
+    # A run without responses has no archive
+    client = FakeClient()
+    assert await run_archive.schedule_archive(client, "run-4", api._response_stream_key("run-4")) is None
+    assert client.rpcs == [("set_agent_run_archive", {"p_agent_run_id": "run-4", "p_archive": None})]
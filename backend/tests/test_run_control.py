@@ -0,0 +1,151 @@
+"""
+Tests for the shared control-channel watcher of agent runs.
+
+Redis pub/sub is replaced by an in-memory broker, behind the shared pub/sub
+connection of services.redis, that counts the commands it receives. The tests
+check that control signals reach only the run they are published for, that
+unwatched runs stop receiving them, and that with many idle runs the command
+rate no longer grows with the number of runs: one subscribe per run start
+plus one batched heartbeat per interval.
+
+Run with:
+    python -m pytest -q tests/test_run_control.py -s
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from agent import run_control
+from agent.run_control import RunControlWatcher
+
+
+class FakeBroker:
+    def __init__(self):
+        self.pubsubs = []
+        self.commands = 0
+
+    async def create_pubsub(self):
+        pubsub = FakePubSub(self)
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+    async def publish(self, channel, message):
+        self.commands += 1
+        for pubsub in self.pubsubs:
+            if channel in pubsub.channels:
+                pubsub.queue.put_nowait({"type": "message", "channel": channel, "data": message})
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.channels = set()
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        self.broker.commands += 1
+        self.channels.update(channels)
+
+    async def unsubscribe(self, *channels):
+        self.broker.commands += 1
+        self.channels.difference_update(channels)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        # Waiting for a message is a socket read, not a command
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        self.channels.clear()
+
+
+@pytest_asyncio.fixture
+async def broker(monkeypatch):
+    fake = FakeBroker()
+    monkeypatch.setattr(run_control.redis, "create_pubsub", fake.create_pubsub)
+    monkeypatch.setattr(run_control.redis, "_multiplexer", run_control.redis.PubSubMultiplexer())
+    yield fake
+    await run_control.redis._multiplexer.close()
+
+
+def channels(agent_run_id):
+    return [f"agent_run:{agent_run_id}:control:inst-a", f"agent_run:{agent_run_id}:control"]
+
+
+@pytest.mark.asyncio
+async def test_signals_are_dispatched_to_the_matching_run(broker):
+    async def heartbeat(agent_run_ids):
+        pass
+    watcher = RunControlWatcher(heartbeat=heartbeat)
+    try:
+        first = await watcher.watch("run-1", channels("run-1"))
+        second = await watcher.watch("run-2", channels("run-2"))
+
+        await broker.publish("agent_run:run-1:control:inst-a", "STOP")
+        assert await asyncio.wait_for(first.wait(), 1) == "STOP"
+        assert not second.event.is_set()
+
+        await broker.publish("agent_run:run-2:control", "END_STREAM")
+        assert await asyncio.wait_for(second.wait(), 1) == "END_STREAM"
+
+        third = await watcher.watch("run-3", channels("run-3"))
+        await watcher.unwatch("run-3")
+        await broker.publish("agent_run:run-3:control", "STOP")
+        await asyncio.sleep(0.05)
+        assert not third.event.is_set()
+        assert watcher.active_runs() == ["run-1", "run-2"]
+    finally:
+        await watcher.close()
+
+
+@pytest.mark.asyncio
+async def test_command_rate_does_not_grow_with_runs(broker):
+    heartbeats = []
+
+    async def heartbeat(agent_run_ids):
+        broker.commands += 1  # One pipelined round trip
+        heartbeats.append(list(agent_run_ids))
+
+    runs, seconds, interval = 100, 1.0, 0.25
+    watcher = RunControlWatcher(heartbeat=heartbeat, heartbeat_interval=interval)
+    try:
+        for i in range(runs):
+            await watcher.watch(f"run-{i}", channels(f"run-{i}"))
+        setup_commands = broker.commands
+        await asyncio.sleep(seconds)
+        idle_commands = broker.commands - setup_commands
+    finally:
+        await watcher.close()
+
+    print(f"\n📊 {runs} idle runs for {seconds:.0f}s: {setup_commands} subscribe commands, "
+          f"{idle_commands} commands while idle (100 ms polling: ~{int(runs * 10 * seconds)})")
+    assert setup_commands == runs
+    assert idle_commands <= seconds / interval + 1
+    assert all(len(batch) == runs for batch in heartbeats)
+
+
+@pytest.mark.asyncio
+async def test_listener_recovers_from_connection_errors(broker, monkeypatch):
+    monkeypatch.setattr(run_control.redis, "PUBSUB_RECONNECT_DELAY", 0.01)
+
+    async def heartbeat(agent_run_ids):
+        pass
+    watcher = RunControlWatcher(heartbeat=heartbeat)
+    try:
+        run_signal = await watcher.watch("run-1", channels("run-1"))
+        broken = broker.pubsubs[0]
+
+        async def fail(*args, **kwargs):
+            raise ConnectionError("connection reset")
+        broken.get_message = fail
+        await asyncio.sleep(0.05)
+        assert len(broker.pubsubs) == 2  # Reconnected and resubscribed
+
+        await broker.publish("agent_run:run-1:control", "STOP")
+        assert await asyncio.wait_for(run_signal.wait(), 1) == "STOP"
+    finally:
+        await watcher.close()
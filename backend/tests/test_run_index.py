@@ -0,0 +1,232 @@
+"""
+Tests for the Redis index of active agent runs.
+
+Redis is replaced by an in-memory fake whose KEYS walks every key, like the
+real command. The tests check that runs are added to and removed from the
+per-instance and per-run sets, that stopping a run and shutting down an
+instance no longer scan the keyspace, that the SCAN based migration indexes
+legacy active_run keys, and that stop latency stays flat from 1k to 100k keys.
+
+Run with:
+    python -m pytest -q tests/test_run_index.py -s
+"""
+
+import fnmatch
+import statistics
+import time
+
+import pytest
+
+from agent import api
+
+
+class FakeRedis:
+    """Strings and sets in memory, counting the keys examined by KEYS/SCAN."""
+
+    def __init__(self):
+        self.data = {}
+        self.keys_examined = 0
+        self.published = []
+
+    # Synchronous implementations, shared by direct calls and pipelines
+    def _set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def _delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def _expire(self, key, seconds):
+        return key in self.data
+
+    def _sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+
+    def _srem(self, key, *members):
+        members_set = self.data.get(key, set())
+        members_set.difference_update(members)
+        if not members_set:
+            self.data.pop(key, None)
+
+    def _xadd(self, key, fields, maxlen=None, approximate=True):
+        self.data.setdefault(key, []).append(dict(fields))
+
+    async def set(self, key, value, ex=None):
+        self._set(key, value, ex)
+
+    async def delete(self, *keys):
+        self._delete(*keys)
+
+    async def expire(self, key, seconds):
+        return self._expire(key, seconds)
+
+    async def sadd(self, key, *members):
+        self._sadd(key, *members)
+
+    async def srem(self, key, *members):
+        self._srem(key, *members)
+
+    async def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    async def xadd(self, key, fields, maxlen=None, approximate=True):
+        self._xadd(key, fields, maxlen, approximate)
+
+    async def xlen(self, key):
+        return 0
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    async def keys(self, pattern):
+        self.keys_examined += len(self.data)
+        return [key for key in self.data if fnmatch.fnmatchcase(key, pattern)]
+
+    async def scan_keys(self, pattern, count=1000):
+        for key in list(self.data):
+            self.keys_examined += 1
+            if fnmatch.fnmatchcase(key, pattern):
+                yield key
+
+    async def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues commands and applies them on execute()."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, f"_{name}")
+        return lambda *args, **kwargs: self.commands.append((method, args, kwargs))
+
+    async def execute(self):
+        commands, self.commands = self.commands, []
+        return [method(*args, **kwargs) for method, args, kwargs in commands]
+
+
+class FakeDB:
+    @property
+    async def client(self):
+        return None
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    for name in ("set", "delete", "expire", "sadd", "srem", "smembers", "xadd", "xlen",
+                 "publish", "keys", "scan_keys", "pipeline"):
+        monkeypatch.setattr(api.redis, name, getattr(fake, name))
+
+    async def no_responses(agent_run_id):
+        return []
+
+    async def update_status(*args, **kwargs):
+        return True
+    monkeypatch.setattr(api, "_read_responses", no_responses)
+    monkeypatch.setattr(api, "update_agent_run_status", update_status)
+    monkeypatch.setattr(api, "db", FakeDB())
+    monkeypatch.setattr(api, "instance_id", "inst-a")
+    return fake
+
+
+def populate_legacy_keys(fake, count, instances=50):
+    """Active run keys for other runs spread across many instances."""
+    for i in range(count):
+        fake.data[f"active_run:other-{i % instances}:run-{i}"] = "running"
+
+
+@pytest.mark.asyncio
+async def test_register_and_cleanup_maintain_both_sets(fake_redis):
+    await api._register_active_run("run-1")
+    await api._register_active_run("run-2")
+    assert fake_redis.data["active_run:inst-a:run-1"] == "running"
+    assert await fake_redis.smembers("instance_runs:inst-a") == {"run-1", "run-2"}
+    assert await fake_redis.smembers("run_instances:run-1") == {"inst-a"}
+
+    await api._cleanup_redis_instance_key("run-1")
+    assert "active_run:inst-a:run-1" not in fake_redis.data
+    assert await fake_redis.smembers("instance_runs:inst-a") == {"run-2"}
+    assert await fake_redis.smembers("run_instances:run-1") == set()
+
+
+@pytest.mark.asyncio
+async def test_stop_and_cleanup_do_not_scan_keys(fake_redis):
+    populate_legacy_keys(fake_redis, 1000)
+    await api._register_active_run("run-1")
+    await api._register_active_run("run-2")
+
+    await api.stop_agent_run("run-1")
+    assert ("agent_run:run-1:control:inst-a", "STOP") in fake_redis.published
+
+    stopped = []
+    original_stop = api.stop_agent_run
+
+    async def record_stop(agent_run_id, error_message=None):
+        stopped.append(agent_run_id)
+        await original_stop(agent_run_id, error_message)
+    api.stop_agent_run = record_stop
+    try:
+        await api.cleanup()
+    finally:
+        api.stop_agent_run = original_stop
+    assert sorted(stopped) == ["run-1", "run-2"]
+    assert fake_redis.keys_examined == 0
+
+
+@pytest.mark.asyncio
+async def test_migration_indexes_legacy_keys(fake_redis):
+    fake_redis.data["active_run:inst-b:run-9"] = "running"
+    fake_redis.data["active_run:inst-c:run-9"] = "running"
+    fake_redis.data["active_run:malformed"] = "running"
+
+    assert await api.migrate_active_run_keys() == 2
+    assert await fake_redis.smembers("run_instances:run-9") == {"inst-b", "inst-c"}
+    assert await fake_redis.smembers("instance_runs:inst-b") == {"run-9"}
+
+    await api.stop_agent_run("run-9")
+    channels = {channel for channel, _ in fake_redis.published}
+    assert {"agent_run:run-9:control:inst-b", "agent_run:run-9:control:inst-c"} <= channels
+
+
+async def time_stop(fake, runs):
+    latencies = []
+    for i in range(runs):
+        run_id = f"target-{len(fake.data)}-{i}"
+        await api._register_active_run(run_id)
+        start = time.perf_counter()
+        await api.stop_agent_run(run_id)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies)
+
+
+async def time_legacy_lookup(fake, runs):
+    latencies = []
+    for i in range(runs):
+        start = time.perf_counter()
+        await fake.keys(f"active_run:*:target-{i}")
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies)
+
+
+@pytest.mark.asyncio
+async def test_stop_latency_is_flat_with_100k_keys(fake_redis):
+    results = {}
+    for total in (1_000, 100_000):
+        fake_redis.data.clear()
+        populate_legacy_keys(fake_redis, total)
+        await api.migrate_active_run_keys()
+        fake_redis.keys_examined = 0
+        results[total] = (await time_stop(fake_redis, 50), await time_legacy_lookup(fake_redis, 5))
+        assert fake_redis.keys_examined == 5 * len(fake_redis.data)  # Only the legacy lookups scanned
+
+    print(f"\n📊 stop_agent_run median latency")
+    for total, (indexed, legacy) in results.items():
+        print(f"   {total:>7} keys: indexed {indexed * 1000:.3f} ms, KEYS lookup alone {legacy * 1000:.3f} ms")
+    indexed_small, legacy_small = results[1_000]
+    indexed_large, legacy_large = results[100_000]
+    assert indexed_large < indexed_small * 3
+    assert legacy_large > legacy_small * 10
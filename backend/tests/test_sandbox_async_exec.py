@@ -0,0 +1,146 @@
+"""
+Tests for non-blocking command execution in the Docker sandbox.
+
+The docker SDK calls are replaced by a fake low-level API whose exec_start
+blocks the calling thread for as long as the command "runs", like the real
+SDK does. This checks that concurrent execute_command calls overlap instead
+of running one after another, that the event loop stays responsive, and that
+cancel_execs() stops a running command.
+
+Run directly with:
+    python -m tests.test_sandbox_async_exec
+"""
+
+import asyncio
+import re
+import threading
+import time
+
+import pytest
+
+from sandbox.sandbox import DockerSandbox
+from agent.tools.sb_shell_tool import SandboxShellTool
+
+SLEEP_SECONDS = 5
+
+
+class FakeDockerApi:
+    """Blocking stand-in for docker.APIClient exec calls; runs `sleep N` commands."""
+
+    def __init__(self):
+        self._execs = {}
+        self._killed = {}
+        self._lock = threading.Lock()
+
+    def exec_create(self, container_id, cmd):
+        exec_id = f"exec-{len(self._execs)}"
+        pidfile = re.search(r"/tmp/\.helios-exec-\w+\.pid", cmd[2]).group(0)
+        self._execs[exec_id] = {'cmd': cmd[-1], 'pidfile': pidfile, 'exit_code': None}
+        self._killed[pidfile] = threading.Event()
+        return {'Id': exec_id}
+
+    def exec_start(self, exec_id):
+        info = self._execs[exec_id]
+        match = re.search(r"sleep (\d+)", info['cmd'])
+        seconds = int(match.group(1)) if match else 0
+        killed = self._killed[info['pidfile']].wait(seconds)
+        info['exit_code'] = 143 if killed else 0
+        return b"" if killed else b"done\n"
+
+    def exec_inspect(self, exec_id):
+        return {'ExitCode': self._execs[exec_id]['exit_code']}
+
+    def kill(self, cmd):
+        pidfile = re.search(r"/tmp/\.helios-exec-\w+\.pid", cmd[2]).group(0)
+        self._killed[pidfile].set()
+
+
+class FakeContainer:
+    id = "fake-container"
+
+    def __init__(self, api):
+        self.api = api
+
+    def exec_run(self, cmd):
+        self.api.kill(cmd)
+
+
+def make_sandbox():
+    sandbox = DockerSandbox.__new__(DockerSandbox)
+    api = FakeDockerApi()
+    sandbox.sandbox_id = "test-sandbox"
+    sandbox.client = type('obj', (object,), {'api': api})()
+    sandbox.container = FakeContainer(api)
+    sandbox._exec_semaphore = None
+    sandbox._running_execs = set()
+    return sandbox
+
+
+def make_shell_tool(sandbox):
+    tool = SandboxShellTool(project_id="test-project", thread_manager=None)
+    tool._sandbox = sandbox
+    tool._sandbox_id = sandbox.sandbox_id
+    return tool
+
+
+@pytest.mark.asyncio
+async def test_concurrent_execute_command():
+    """Two 5-second commands run side by side and the event loop keeps ticking."""
+    tool = make_shell_tool(make_sandbox())
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.1)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        tool.execute_command(f"sleep {SLEEP_SECONDS}"),
+        tool.execute_command(f"sleep {SLEEP_SECONDS}"),
+    )
+    elapsed = time.perf_counter() - start
+    ticker_task.cancel()
+
+    print(f"⏱️ Two concurrent {SLEEP_SECONDS}s commands took {elapsed:.2f}s, event loop ticked {ticks} times")
+    assert all(result.success for result in results)
+    assert elapsed < SLEEP_SECONDS * 1.5, f"Commands ran sequentially ({elapsed:.2f}s)"
+    assert ticks >= SLEEP_SECONDS * 5, "Event loop was blocked while commands ran"
+
+
+@pytest.mark.asyncio
+async def test_cancel_execs():
+    """cancel_execs() kills running commands and the callers get a failed result."""
+    sandbox = make_sandbox()
+    tool = make_shell_tool(sandbox)
+
+    start = time.perf_counter()
+    call = asyncio.create_task(tool.execute_command("sleep 30"))
+    await asyncio.sleep(0.2)
+    assert await sandbox.cancel_execs() == 1
+    result = await call
+    elapsed = time.perf_counter() - start
+
+    assert not result.success
+    assert "143" in result.output
+    assert elapsed < 2
+    assert not sandbox._running_execs
+
+
+@pytest.mark.asyncio
+async def test_timeout_kills_command():
+    """A command that exceeds its timeout is killed and reported as timed out."""
+    tool = make_shell_tool(make_sandbox())
+    result = await tool.execute_command("sleep 30", timeout=1)
+    assert not result.success
+    assert "timed out" in result.output
+
+
+if __name__ == "__main__":
+    asyncio.run(test_concurrent_execute_command())
+    asyncio.run(test_cancel_execs())
+    asyncio.run(test_timeout_kills_command())
+    print("✅ Async sandbox exec checks passed")
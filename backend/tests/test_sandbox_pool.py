@@ -0,0 +1,113 @@
+"""
+Tests for the pre-warmed sandbox pool.
+
+Container creation is replaced by fake sandboxes so the pool logic (refill,
+claim, rebind, eviction and metrics) can be checked without Docker.
+
+Run directly with:
+    python -m tests.test_sandbox_pool
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from sandbox.pool import SandboxPool
+from sandbox.sandbox import _SANDBOXES
+
+
+class FakeSandbox:
+    def __init__(self):
+        self.sandbox_id = str(uuid.uuid4())
+        self.host_workspace = f"/nonexistent/{self.sandbox_id}"
+        self.running = True
+        self.stopped = False
+
+    async def status_async(self):
+        return "running" if self.running else "exited"
+
+    async def stop_async(self):
+        self.stopped = True
+
+    def rebind(self, sandbox_id):
+        self.sandbox_id = sandbox_id
+
+
+def make_pool(size=2, max_idle_seconds=1800):
+    pool = SandboxPool.__new__(SandboxPool)
+    pool._setup()
+    pool.size = size
+    pool.max_idle_seconds = max_idle_seconds
+    pool.refill_interval = 0.05
+    pool.created = []
+
+    async def _create_one():
+        await asyncio.sleep(0.01)
+        sandbox = FakeSandbox()
+        pool.created.append(sandbox)
+        return sandbox
+    pool._create_one = _create_one
+    return pool
+
+
+async def wait_for_idle(pool, count, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if len(pool._idle) >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Pool did not reach {count} idle sandboxes")
+
+
+@pytest.mark.asyncio
+async def test_claim_and_refill():
+    """Claims are served from the pool, bound to the requested id and refilled."""
+    pool = make_pool(size=2)
+    await pool.start()
+    try:
+        await wait_for_idle(pool, 2)
+
+        fresh = await pool.claim()
+        assert fresh is not None and _SANDBOXES[fresh.sandbox_id] is fresh
+
+        bound = await pool.claim("existing-sandbox")
+        assert bound.sandbox_id == "existing-sandbox"
+        assert _SANDBOXES["existing-sandbox"] is bound
+
+        assert await pool.claim() is None  # empty until refilled
+        await wait_for_idle(pool, 2)
+
+        metrics = pool.get_metrics()
+        assert metrics['hits'] == 2 and metrics['misses'] == 1
+        assert metrics['created'] >= 4
+        assert metrics['claim_latency_avg_ms'] is not None
+        print(f"📊 Pool metrics: {metrics}")
+    finally:
+        await pool.shutdown()
+        _SANDBOXES.pop("existing-sandbox", None)
+        _SANDBOXES.pop(fresh.sandbox_id, None)
+    assert all(s.stopped for s in pool.created if s not in (fresh, bound))
+
+
+@pytest.mark.asyncio
+async def test_dead_and_expired_sandboxes_are_removed():
+    """Stopped containers are skipped on claim and idle ones are evicted."""
+    pool = make_pool(size=1, max_idle_seconds=0)
+    dead = FakeSandbox()
+    dead.running = False
+    pool._idle.append((dead, 0.0))
+    assert await pool.claim() is None
+    assert dead.stopped
+
+    await pool.start()
+    try:
+        await asyncio.sleep(0.3)
+        assert pool.get_metrics()['evicted'] >= 1
+    finally:
+        await pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_claim_and_refill())
+    asyncio.run(test_dead_and_expired_sandboxes_are_removed())
+    print("✅ Sandbox pool checks passed")
@@ -0,0 +1,231 @@
+"""
+Tests for the Redis-backed sandbox registry.
+
+Redis and Docker are replaced by in-memory fakes. The tests check that a
+worker which did not start a container (or restarted) attaches to the
+registered one instead of creating a duplicate, restarts stopped containers in
+place, and that reconciliation drops entries whose container is gone. A
+running container with the sandbox's name is adopted rather than replaced by a
+pooled one, and pooled containers are only used for the default command and
+environment they were started with.
+
+Run with:
+    python -m pytest -q tests/test_sandbox_registry.py
+"""
+
+import os
+
+import docker
+import pytest
+
+from sandbox import registry
+from sandbox import sandbox as sandbox_module
+from sandbox.pool import sandbox_pool
+from sandbox.sandbox import DockerSandbox, _SANDBOXES, create_sandbox_async, get_or_start_sandbox_async
+
+
+class FakeContainer:
+    def __init__(self, container_id, status="running"):
+        self.id = container_id
+        self.status = status
+        self.starts = 0
+
+    def start(self):
+        self.starts += 1
+        self.status = "running"
+
+    def reload(self):
+        pass
+
+    def remove(self, force=False):
+        self.status = "removed"
+
+
+class FakeContainers:
+    def __init__(self):
+        self.by_id = {}
+        self.gets = 0
+
+    def get(self, container_id):
+        self.gets += 1
+        if container_id not in self.by_id:
+            raise docker.errors.NotFound(f"No such container: {container_id}")
+        return self.by_id[container_id]
+
+
+@pytest.fixture
+def fakes(monkeypatch):
+    store = {}
+    containers = FakeContainers()
+
+    async def hset(key, field, value):
+        store.setdefault(key, {})[field] = value
+
+    async def hget(key, field):
+        return store.get(key, {}).get(field)
+
+    async def hdel(key, *fields):
+        for field in fields:
+            store.get(key, {}).pop(field, None)
+
+    async def hgetall(key):
+        return dict(store.get(key, {}))
+
+    for name, func in (('hset', hset), ('hget', hget), ('hdel', hdel), ('hgetall', hgetall)):
+        monkeypatch.setattr(registry.redis, name, func)
+
+    def attach(cls, sandbox_id, container_id):
+        sandbox = DockerSandbox.__new__(DockerSandbox)
+        sandbox.sandbox_id = sandbox_id
+        sandbox.container = containers.get(container_id)
+        sandbox.ports = {"8000/tcp": 32768}
+        sandbox.host_workspace = f"/workspace/{sandbox_id}"
+        return sandbox
+    monkeypatch.setattr(DockerSandbox, 'attach', classmethod(attach))
+    monkeypatch.setattr(docker, 'from_env', lambda: type('obj', (object,), {'containers': containers})())
+
+    yield store, containers
+    _SANDBOXES.clear()
+
+
+def make_registered_sandbox(sandbox_id, container):
+    sandbox = DockerSandbox.__new__(DockerSandbox)
+    sandbox.sandbox_id = sandbox_id
+    sandbox.container = container
+    sandbox.ports = {"8000/tcp": 32768}
+    sandbox.host_workspace = f"/workspace/{sandbox_id}"
+    return sandbox
+
+
+@pytest.mark.asyncio
+async def test_attach_from_another_worker(fakes):
+    """A worker without the sandbox in memory attaches to the registered container."""
+    store, containers = fakes
+    containers.by_id["c1"] = FakeContainer("c1")
+    await registry.register(make_registered_sandbox("sb-1", containers.by_id["c1"]))
+
+    _SANDBOXES.clear()  # as seen from another worker or after a restart
+    sandbox = await registry.attach("sb-1")
+    assert sandbox is not None and sandbox.container is containers.by_id["c1"]
+    assert _SANDBOXES["sb-1"] is sandbox
+    assert containers.gets == 1
+    entry = await registry.lookup("sb-1")
+    assert entry['ports'] == {"8000/tcp": 32768} and entry['last_used']
+
+
+@pytest.mark.asyncio
+async def test_loopback_port_binding(fakes):
+    """The browser API port is bound to (127.0.0.1, host_port); lookups still see the host port."""
+    store, containers = fakes
+    containers.by_id["c7"] = FakeContainer("c7")
+    sandbox = make_registered_sandbox("sb-7", containers.by_id["c7"])
+    sandbox.ports = {"8000/tcp": 32768, "8002/tcp": ("127.0.0.1", 32769)}
+
+    assert sandbox.get_preview_link(8002) == "http://127.0.0.1:32769"
+    assert sandbox.get_preview_link(8000) == "http://127.0.0.1:32768"
+    await registry.register(sandbox)
+    entry = await registry.lookup("sb-7")
+    assert entry['ports'] == {"8000/tcp": 32768, "8002/tcp": 32769}
+
+
+@pytest.mark.asyncio
+async def test_stopped_container_is_restarted_in_place(fakes):
+    store, containers = fakes
+    containers.by_id["c2"] = FakeContainer("c2", status="exited")
+    await registry.register(make_registered_sandbox("sb-2", containers.by_id["c2"]))
+
+    sandbox = await registry.attach("sb-2")
+    assert sandbox.container.status == "running"
+    assert containers.by_id["c2"].starts == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_container_and_reconcile(fakes):
+    """Entries whose container is gone are dropped on attach and at startup."""
+    store, containers = fakes
+    containers.by_id["c3"] = FakeContainer("c3")
+    containers.by_id["c4"] = FakeContainer("c4", status="exited")
+    await registry.register(make_registered_sandbox("sb-3", containers.by_id["c3"]))
+    await registry.register(make_registered_sandbox("sb-4", containers.by_id["c4"]))
+    await registry.register(make_registered_sandbox("sb-5", FakeContainer("gone")))
+    await registry.register(make_registered_sandbox("sb-6", FakeContainer("gone-too")))
+
+    assert await registry.attach("sb-5") is None
+    assert await registry.lookup("sb-5") is None
+
+    counts = await registry.reconcile()
+    assert counts == {'running': 1, 'stopped': 1, 'removed': 1}
+    assert set(store[registry.REGISTRY_KEY]) == {"sb-3", "sb-4"}
+
+
+@pytest.mark.asyncio
+async def test_running_named_container_is_adopted_not_replaced(fakes, monkeypatch):
+    """A running container missing from the registry is adopted; the pool is not used."""
+    store, containers = fakes
+    running = FakeContainer("c7")
+    containers.by_id["c7"] = containers.by_id["helios_sandbox_sb-7"] = running
+
+    async def claim(sandbox_id=None):
+        raise AssertionError("a pooled container must not replace a running one")
+    monkeypatch.setattr(sandbox_pool, "claim", claim)
+
+    sandbox = await get_or_start_sandbox_async("sb-7")
+    assert sandbox.container is running and running.status == "running"
+    assert _SANDBOXES["sb-7"] is sandbox
+    assert (await registry.lookup("sb-7"))['container_id'] == "c7"
+
+
+@pytest.mark.parametrize("status,rebound", [("running", False), ("created", False), ("exited", True), ("dead", True)])
+def test_rebind_only_replaces_exited_or_dead_containers(fakes, tmp_path, monkeypatch, status, rebound):
+    store, containers = fakes
+    existing = FakeContainer("old", status=status)
+    containers.by_id["helios_sandbox_sb-8"] = existing
+    monkeypatch.setattr(sandbox_module, "workspace_dir", lambda sandbox_id: str(tmp_path / sandbox_id))
+
+    target = tmp_path / "sb-8"
+    target.mkdir()
+    (target / "notes.txt").write_text("kept")
+    pooled = DockerSandbox.__new__(DockerSandbox)
+    pooled.sandbox_id = "pooled"
+    pooled.host_workspace = str(tmp_path / "pooled")
+    os.mkdir(pooled.host_workspace)
+    pooled.client = docker.from_env()
+    pooled.container = type('obj', (object,), {'renamed': None, 'rename': lambda self, name: setattr(self, 'renamed', name)})()
+
+    if not rebound:
+        with pytest.raises(RuntimeError):
+            pooled.rebind("sb-8")
+        assert existing.status == status and pooled.container.renamed is None
+        assert pooled.sandbox_id == "pooled" and os.path.isdir(pooled.host_workspace)
+        assert (target / "notes.txt").read_text() == "kept"
+        return
+
+    pooled.rebind("sb-8")
+    assert existing.status == "removed" and pooled.container.renamed == "helios_sandbox_sb-8"
+    assert pooled.sandbox_id == "sb-8" and pooled.host_workspace == str(target)
+    assert (target / "notes.txt").read_text() == "kept"
+
+
+@pytest.mark.asyncio
+async def test_pool_is_only_used_for_the_default_launch(fakes, monkeypatch):
+    store, containers = fakes
+    claimed, created = [], []
+
+    async def claim(sandbox_id=None):
+        claimed.append(sandbox_id)
+        return make_registered_sandbox(f"pooled-{len(claimed)}", FakeContainer("pooled"))
+
+    def create_sandbox(command, ports, env, sandbox_id=None):
+        created.append((command, env))
+        return make_registered_sandbox(f"new-{len(created)}", FakeContainer("new"))
+    monkeypatch.setattr(sandbox_pool, "claim", claim)
+    monkeypatch.setattr(sandbox_module, "create_sandbox", create_sandbox)
+
+    assert (await create_sandbox_async()).sandbox_id == "pooled-1"
+    assert (await create_sandbox_async(env=dict(sandbox_module.DEFAULT_SANDBOX_ENV))).sandbox_id == "pooled-2"
+
+    custom_env = {**sandbox_module.DEFAULT_SANDBOX_ENV, "EXTRA": "1"}
+    assert (await create_sandbox_async(env=custom_env)).sandbox_id == "new-1"
+    assert (await create_sandbox_async(command="sleep infinity")).sandbox_id == "new-2"
+    assert len(claimed) == 2
+    assert created == [(sandbox_module.DEFAULT_SANDBOX_COMMAND, custom_env), ("sleep infinity", None)]
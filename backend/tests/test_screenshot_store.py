@@ -0,0 +1,106 @@
+"""
+Tests for content-addressed browser screenshot storage.
+
+Screenshots are written to a temporary workspace through the real
+WorkspaceFileSystem. The tests check that identical screenshots are stored
+once, that only an identical consecutive screenshot reuses the previous
+reference (a near-identical one is stored, with its perceptual distance
+recorded as a metric), that distinct screenshots get their own file, and
+that only the most recently used screenshots are kept, out of file listings.
+
+Run with:
+    python -m pytest -q tests/test_screenshot_store.py
+"""
+
+import base64
+import io
+import os
+
+import pytest
+from PIL import Image, ImageDraw
+
+from sandbox import screenshots
+from sandbox.sandbox import WorkspaceFileSystem
+from utils.files_utils import should_exclude_file
+
+
+class FakeSandbox:
+    def __init__(self, root):
+        self.fs = WorkspaceFileSystem(str(root))
+
+
+def render(text: str, dot: int = 0) -> str:
+    """Render a page-like JPEG; `dot` moves a tiny cursor-sized mark."""
+    image = Image.new("RGB", (1024, 768), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 1024, 80), fill=(30, 60, 120))
+    draw.rectangle((100, 200, 900, 260 + len(text) * 20), fill=(200, 200, 200))
+    draw.text((120, 220), text, fill="black")
+    draw.rectangle((500 + dot, 700, 502 + dot, 702), fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=60)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def stored_files(root):
+    directory = os.path.join(root, screenshots.SCREENSHOT_DIR)
+    return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+
+@pytest.mark.asyncio
+async def test_only_identical_screenshots_are_reused(tmp_path):
+    sandbox = FakeSandbox(tmp_path)
+    first = await screenshots.store_screenshot(sandbox, render("Search results"))
+    assert first['screenshot_path'] == f"{screenshots.SCREENSHOT_DIR}/{first['screenshot_id']}.jpg"
+
+    # Same bytes without a previous reference: same file, nothing new written
+    again = await screenshots.store_screenshot(sandbox, render("Search results"))
+    assert again['screenshot_id'] == first['screenshot_id']
+
+    same = await screenshots.store_screenshot(sandbox, render("Search results"), previous=first)
+    assert same['screenshot_reused'] and same['screenshot_path'] == first['screenshot_path']
+    assert len(stored_files(tmp_path)) == 1
+
+    # A small UI change is stored even though it is perceptually close
+    nearly_base64 = render("Search results", dot=3)
+    nearly = await screenshots.store_screenshot(sandbox, nearly_base64, previous=first)
+    assert not nearly.get('screenshot_reused') and nearly['screenshot_id'] != first['screenshot_id']
+    assert nearly['screenshot_phash_distance'] <= 4
+    assert len(stored_files(tmp_path)) == 2
+    screenshots._cache.clear()
+    assert await screenshots.load_screenshot(sandbox, nearly) == nearly_base64
+
+
+@pytest.mark.asyncio
+async def test_different_screenshots_are_stored_and_loaded(tmp_path):
+    sandbox = FakeSandbox(tmp_path)
+    first = await screenshots.store_screenshot(sandbox, render("Search results"))
+    second_base64 = render("A completely different page\nwith more lines\nof text\nand more\nand more")
+    second = await screenshots.store_screenshot(sandbox, second_base64, previous=first)
+    assert not second.get('screenshot_reused')
+    assert second['screenshot_id'] != first['screenshot_id']
+    assert len(stored_files(tmp_path)) == 2
+
+    screenshots._cache.clear()
+    assert await screenshots.load_screenshot(sandbox, second) == second_base64
+    assert await screenshots.load_screenshot(sandbox, {'screenshot_id': 'missing', 'screenshot_path': 'nope.jpg'}) is None
+
+
+@pytest.mark.asyncio
+async def test_old_screenshots_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(screenshots, "MAX_STORED_SCREENSHOTS", 3)
+    sandbox = FakeSandbox(tmp_path)
+    references = []
+    for i in range(3):
+        references.append(await screenshots.store_screenshot(sandbox, render(f"Page {i}")))
+        os.utime(os.path.join(tmp_path, references[-1]['screenshot_path']), (1000 + i, 1000 + i))
+
+    # Seeing the first page again makes it the most recently used, so the second is pruned
+    await screenshots.store_screenshot(sandbox, render("Page 0"))
+    latest = await screenshots.store_screenshot(sandbox, render("Page 3"))
+    kept = {reference['screenshot_id'] + ".jpg" for reference in (references[0], references[2], latest)}
+    assert set(stored_files(tmp_path)) == kept
+
+    screenshots._cache.clear()
+    assert await screenshots.load_screenshot(sandbox, references[1]) is None
+    assert should_exclude_file(latest['screenshot_path'])
@@ -0,0 +1,189 @@
+"""
+Tests for incremental thread token counting.
+
+Messages written through ThreadManager.add_message carry their token count in
+metadata. The tests check that the count is stored at insert time, that the
+thread message cache keeps a running total without calling the tokenizer
+again, that rows dropped from the cache window (including on a cold load) stay
+in the total, that the context window of a long thread is refreshed rather than
+reloaded, and that models sharing a tokenizer share counts.
+
+Run with:
+    python -m pytest -q tests/test_token_counting.py
+"""
+
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from litellm import token_counter
+
+from agentpress import message_cache, token_counting
+from agentpress.message_cache import ThreadMessageCache
+from agentpress.thread_manager import ThreadManager
+
+THREAD_ID = "token-thread"
+
+
+class FakeClient:
+    """Stores inserted messages and serves get_llm_formatted_messages_window."""
+
+    def __init__(self):
+        self.rows = []
+        self.rpc_calls = 0
+        self.rpc_params = None
+        self._clock = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def table(self, name):
+        client = self
+
+        class _Insert:
+            def __init__(self, data):
+                self.data = data
+
+            async def execute(self):
+                client._clock += timedelta(seconds=1)
+                row = {**self.data, 'message_id': str(uuid.uuid4()), 'created_at': client._clock.isoformat()}
+                client.rows.append(row)
+                return type('obj', (object,), {'data': [row]})
+
+        return type('obj', (object,), {'insert': lambda self, data, returning=None: _Insert(data)})()
+
+    def rpc(self, name, params):
+        self.rpc_calls += 1
+        self.rpc_params = params
+        rows = [row for row in self.rows if row['is_llm_message']]
+        if params.get('p_after'):
+            rows = [row for row in rows if row['created_at'] > params['p_after']]
+        if params.get('p_limit'):
+            rows = rows[-params['p_limit']:]
+        data = [{k: row[k] for k in ('message_id', 'type', 'content', 'created_at', 'metadata')} for row in rows]
+
+        class _Query:
+            async def execute(self):
+                return type('obj', (object,), {'data': data})
+        return _Query()
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture
+def thread_manager(client):
+    cache = ThreadMessageCache()
+    cache._entries.clear()
+    cache.use_redis = False
+
+    async def _client():
+        return client
+    db = type('obj', (object,), {'client': property(lambda self: _client())})()
+    cache.db = db
+
+    manager = ThreadManager(enable_write_behind=False)
+    manager.db = db
+    manager.message_cache = cache
+    return manager
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    """Record every message the tokenizer is run on."""
+    calls = []
+
+    def counting_token_counter(model, messages):
+        calls.extend(messages)
+        return token_counter(model=model, messages=messages)
+    monkeypatch.setattr(token_counting, "token_counter", counting_token_counter)
+    token_counting._counts.clear()
+    return calls
+
+
+def message(i):
+    return {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f"message number {i} " * 20}
+
+
+@pytest.mark.asyncio
+async def test_counts_are_stored_at_insert_and_summed_incrementally(thread_manager, client, counted):
+    for i in range(5):
+        await thread_manager.add_message(THREAD_ID, 'user', message(i), is_llm_message=True)
+    assert len(counted) == 5
+
+    stored = json.loads(client.rows[0]['metadata'])['llm_tokens']
+    assert stored == {'openai_tokenizer': token_counter(model="gpt-4", messages=[message(0)])}
+
+    cache = thread_manager.message_cache
+    total = await cache.get_token_count(THREAD_ID, "gpt-4")
+    assert total == sum(token_counter(model="gpt-4", messages=[message(i)]) for i in range(5))
+
+    # Appended and externally written messages are added to the running total
+    counted.clear()
+    for i in range(5, 100):
+        await thread_manager.add_message(THREAD_ID, 'user', message(i), is_llm_message=True)
+    assert len(counted) == 95  # Once each, at insert
+    counted.clear()
+    assert await cache.get_token_count(THREAD_ID, "gpt-4o") > total
+    assert await cache.get_token_count(THREAD_ID, "gpt-4") == await cache.get_token_count(THREAD_ID, "gpt-4o")
+    assert counted == []
+
+
+@pytest.mark.asyncio
+async def test_dropped_rows_stay_in_the_total(thread_manager, client, counted, monkeypatch):
+    cache = thread_manager.message_cache
+    monkeypatch.setattr(cache, "max_messages_per_thread", 10)
+    for i in range(5):
+        await thread_manager.add_message(THREAD_ID, 'user', message(i), is_llm_message=True)
+    await cache.get_token_count(THREAD_ID)
+    for i in range(5, 30):
+        await thread_manager.add_message(THREAD_ID, 'user', message(i), is_llm_message=True)
+
+    rpc_calls = client.rpc_calls
+    expected = sum(token_counter(model="gpt-4", messages=[message(i)]) for i in range(30))
+    assert await cache.get_token_count(THREAD_ID) == expected
+    assert len((await cache._get_entry(THREAD_ID))['rows']) == 10
+    assert client.rpc_calls == rpc_calls + 1  # Delta refresh only, no full reload
+
+
+@pytest.mark.asyncio
+async def test_cold_load_over_the_cap_counts_dropped_rows(thread_manager, client, counted, monkeypatch):
+    cache = thread_manager.message_cache
+    monkeypatch.setattr(cache, "max_messages_per_thread", 10)
+    for i in range(30):
+        await thread_manager.add_message(THREAD_ID, 'user', message(i), is_llm_message=True)
+    cache._entries.clear()  # e.g. another worker, or after a restart
+    counted.clear()
+
+    expected = sum(token_counter(model="gpt-4", messages=[message(i)]) for i in range(30))
+    assert await cache.get_token_count(THREAD_ID) == expected
+    assert len((await cache._get_entry(THREAD_ID))['rows']) == 10
+    assert counted == []  # Stored counts are used, dropped rows included
+
+
+@pytest.mark.asyncio
+async def test_context_window_of_a_long_thread_is_refreshed(thread_manager, client, counted, monkeypatch):
+    cache = thread_manager.message_cache
+    monkeypatch.setattr(cache, "max_messages_per_thread", 10)
+    for i in range(30):
+        await thread_manager.add_message(THREAD_ID, 'user', message(i), is_llm_message=True)
+    cache._entries.clear()
+
+    assert len(await cache.get_context_window(THREAD_ID, 100_000)) == 10
+    assert client.rpc_params == {'p_thread_id': THREAD_ID, 'p_limit': 10}
+    expected = await cache.get_token_count(THREAD_ID)
+
+    for turn in range(30, 33):
+        await thread_manager.add_message(THREAD_ID, 'user', message(turn), is_llm_message=True)
+        rpc_calls = client.rpc_calls
+        window = await cache.get_context_window(THREAD_ID, 100_000)
+        assert window[-1] == message(turn) and len(window) == 10
+        assert client.rpc_calls == rpc_calls + 1 and 'p_after' in client.rpc_params  # No full reload
+    expected += sum(token_counter(model="gpt-4", messages=[message(i)]) for i in range(30, 33))
+    assert await cache.get_token_count(THREAD_ID) == expected
+
+
+def test_tokenizer_keys_are_shared():
+    assert token_counting.tokenizer_key("gpt-4") == token_counting.tokenizer_key("gpt-4o-mini")
+    assert message_cache.stored_token_counts('{"llm_tokens": {"openai_tokenizer": 7}}') == {'openai_tokenizer': 7}
+    assert message_cache.stored_token_counts(None) == {}
@@ -0,0 +1,122 @@
+"""
+Tests for the tool result cache.
+
+A fake tool counts how often its body runs, and Redis is replaced by an
+in-memory dict. The tests check that equivalent calls share a cached result,
+that failures are not cached, that results expire after their TTL, that a
+second worker is served from the Redis tier, that identical concurrent calls
+run once, and that hit/miss counters are reported in the result metadata.
+
+Run with:
+    python -m pytest -q tests/test_tool_cache.py
+"""
+
+import asyncio
+
+import pytest
+
+from agentpress import tool_cache
+from agentpress.tool import Tool
+from agentpress.tool_cache import ToolResultCache, cached_tool_result
+
+
+class SearchTool(Tool):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    @cached_tool_result(ttl=60, normalize=lambda args: {**args, "query": str(args["query"]).lower()})
+    async def search(self, query: str, num_results: int = 20):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if query == "fail":
+            return self.fail_response("provider error")
+        return self.success_response(f"{num_results} results for {query}")
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+def new_cache():
+    cache = object.__new__(ToolResultCache)
+    cache._setup()
+    cache.enabled = True
+    cache.use_redis = True
+    return cache
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(tool_cache.redis, "get", fake.get)
+    monkeypatch.setattr(tool_cache.redis, "set", fake.set)
+    return fake
+
+
+@pytest.fixture
+def cache(monkeypatch, fake_redis):
+    cache = new_cache()
+    monkeypatch.setattr(ToolResultCache, "_instance", cache)
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_equivalent_calls_share_a_result(cache):
+    tool = SearchTool()
+    first = await tool.search("Python  asyncio")
+    assert first.metadata["cache"] == {"hit": False, "tier": None, "hits": 0, "misses": 1}
+
+    # Different case and whitespace, and the default passed as a string like XML calls do
+    second = await tool.search(query=" python asyncio ", num_results="20")
+    assert tool.calls == 1
+    assert second.output == first.output
+    assert second.metadata["cache"] == {"hit": True, "tier": "memory", "hits": 1, "misses": 1}
+    assert "metadata" not in repr(second)  # The LLM only sees success and output
+
+    await tool.search("Python asyncio", num_results=5)
+    assert tool.calls == 2
+    assert cache.get_stats() == {"SearchTool.search": {"hits": 1, "misses": 2}}
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached_and_results_expire(cache, monkeypatch):
+    tool = SearchTool()
+    await tool.search("fail")
+    await tool.search("fail")
+    assert tool.calls == 2
+
+    now = tool_cache.time.time()
+    await tool.search("news")
+    monkeypatch.setattr(tool_cache.time, "time", lambda: now + 61)
+    cache.use_redis = False
+    await tool.search("news")
+    assert tool.calls == 4
+
+
+@pytest.mark.asyncio
+async def test_other_workers_read_the_redis_tier(cache, monkeypatch):
+    await SearchTool().search("shared")
+
+    other_worker = new_cache()
+    monkeypatch.setattr(ToolResultCache, "_instance", other_worker)
+    tool = SearchTool()
+    result = await tool.search("shared")
+    assert tool.calls == 0
+    assert result.metadata["cache"]["tier"] == "redis"
+    assert (await tool.search("shared")).metadata["cache"]["tier"] == "memory"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_run_once(cache):
+    tool = SearchTool()
+    results = await asyncio.gather(*(tool.search("parallel") for _ in range(3)))
+    assert tool.calls == 1
+    assert [r.metadata["cache"]["tier"] for r in results] == [None, "inflight", "inflight"]
@@ -0,0 +1,120 @@
+"""
+Tests for webpage crawling over the pooled Tavily client.
+
+A local stand-in for Tavily's extract endpoint counts connections and
+concurrent requests, and fails for some URLs. The tests check that crawls
+reuse pooled connections, that a bulk crawl extracts pages concurrently up to
+its limit, keeps the order of the given URLs and reports failed pages without
+failing the others, and that repeated pages come from the result cache.
+
+Run with:
+    python -m pytest -q tests/test_web_crawl.py
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import pytest_asyncio
+
+from agent.tools import web_search_tool
+from agent.tools.web_search_tool import WebSearchTool
+from agentpress.tool_cache import ToolResultCache
+
+
+class FakeTavilyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = {}
+
+    def setup(self):
+        super().setup()
+        with self.state["lock"]:
+            self.state["connections"] += 1
+
+    def do_POST(self):
+        state = self.state
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        url = payload["urls"]
+        with state["lock"]:
+            state["requests"].append(url)
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        time.sleep(0.05)
+        with state["lock"]:
+            state["active"] -= 1
+
+        if "broken" in url:
+            status, data = 422, {"detail": "Could not extract"}
+        else:
+            status, data = 200, {"results": [{"url": url, "title": f"Title of {url}", "raw_content": f"Text of {url}"}]}
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    FakeTavilyHandler.state = {"lock": threading.Lock(), "connections": 0, "requests": [], "active": 0, "max_active": 0}
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeTavilyHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setattr(web_search_tool, "TAVILY_EXTRACT_URL", f"http://127.0.0.1:{httpd.server_address[1]}/extract")
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest_asyncio.fixture
+async def tool(server, monkeypatch):
+    cache = object.__new__(ToolResultCache)
+    cache._setup()
+    cache.enabled = True
+    cache.use_redis = False
+    monkeypatch.setattr(ToolResultCache, "_instance", cache)
+    yield WebSearchTool(api_key="test-key")
+    await web_search_tool.close_tavily_http_client()
+
+
+@pytest.mark.asyncio
+async def test_crawls_reuse_pooled_connections(tool):
+    for i in range(5):
+        result = await tool.crawl_webpage(f"https://example.com/{i}")
+        assert json.loads(result.output)[0]["Text"] == f"Text of https://example.com/{i}"
+    assert FakeTavilyHandler.state["connections"] == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_crawl_is_concurrent_ordered_and_partial(tool, monkeypatch):
+    monkeypatch.setattr(web_search_tool, "CRAWL_MAX_CONCURRENCY", 3)
+    urls = [f"https://example.com/{i}" for i in range(8)] + ["https://example.com/broken"]
+    start = time.monotonic()
+    result = await tool.crawl_webpages(urls)
+    elapsed = time.monotonic() - start
+
+    pages = json.loads(result.output)
+    assert result.success
+    assert [page["URL"] for page in pages] == urls
+    assert "Error crawling webpage" in pages[-1]["Error"]
+    assert FakeTavilyHandler.state["max_active"] == 3
+    assert elapsed < 0.05 * len(urls)  # Faster than one page at a time
+
+    # XML calls pass the URLs as text; pages crawled before come from the cache
+    requests_before = len(FakeTavilyHandler.state["requests"])
+    result = await tool.crawl_webpages("https://example.com/0\nhttps://example.com/new, https://example.com/0")
+    assert [page["URL"] for page in json.loads(result.output)] == ["https://example.com/0", "https://example.com/new"]
+    assert FakeTavilyHandler.state["requests"][requests_before:] == ["https://example.com/new"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_crawl_limits(tool):
+    assert not (await tool.crawl_webpages([])).success
+    assert not (await tool.crawl_webpages([f"https://example.com/{i}" for i in range(web_search_tool.CRAWL_MAX_URLS + 1)])).success
+    result = await tool.crawl_webpages(["https://example.com/broken"])
+    assert not result.success and "Error crawling webpages" in result.output
@@ -0,0 +1,185 @@
+"""
+Tests and microbenchmark for the incremental XML tool call parser.
+
+This module checks that XmlToolCallStreamParser emits the same tool calls no
+matter how the response is split into chunks, that a single multi-megabyte
+tool call is parsed in linear time, and measures throughput when feeding
+multi-megabyte responses in small chunks.
+
+Run the benchmark directly with:
+    python -m tests.test_xml_stream_parser
+"""
+
+import random
+import time
+
+from agentpress.xml_tool_parser import XmlTagMatcher, XmlToolCallStreamParser
+
+TAGS = [
+    "create-file", "str-replace", "full-file-rewrite", "delete-file",
+    "execute-command", "browser-navigate-to", "browser-click-element",
+    "web-search", "crawl-webpage", "ask", "complete", "wait", "wait-sequence",
+]
+
+TOOL_CALLS = [
+    '<create-file file_path="src/app.py">\nprint("<hello>")\n</create-file>',
+    '<str-replace file_path="a.txt"><old_str>x</old_str><new_str>y</new_str></str-replace>',
+    '<execute-command folder="scripts">\nls -la | grep "<ask>"\n</execute-command>',
+    '<ask attachments="report.md">Does this look right?</ask>',
+    '<wait seconds="1">This is wait 1</wait>',
+    '<wait-sequence count="2" seconds="1" label="Test" />',
+    '<complete></complete>',
+]
+
+FILLER = (
+    "Let me think about the next step. I will inspect the files, compare the output "
+    "with what we expect and then decide which tool to use. <b>Bold</b> is not a tool. "
+)
+
+
+def build_response(target_size: int, seed: int = 7) -> tuple:
+    """Build a response of roughly target_size characters with interleaved tool calls."""
+    rng = random.Random(seed)
+    parts = []
+    expected = []
+    size = 0
+    while size < target_size:
+        filler = FILLER * rng.randint(1, 20)
+        call = rng.choice(TOOL_CALLS)
+        parts.extend([filler, call])
+        expected.append(call)
+        size += len(filler) + len(call)
+    return "".join(parts), expected
+
+
+def stream_chunks(content: str, chunk_size: int):
+    """Split content into fixed-size chunks, as an LLM stream would deliver it."""
+    for i in range(0, len(content), chunk_size):
+        yield content[i:i + chunk_size]
+
+
+def legacy_extract(content: str, tags: list) -> list:
+    """The previous rescan-from-zero extraction, kept only as a benchmark baseline."""
+    chunks = []
+    pos = 0
+    while pos < len(content):
+        next_tag_start, current_tag = -1, None
+        for tag_name in tags:
+            tag_pos = content.find(f'<{tag_name}', pos)
+            if tag_pos != -1 and (next_tag_start == -1 or tag_pos < next_tag_start):
+                next_tag_start, current_tag = tag_pos, tag_name
+        if current_tag is None:
+            break
+        end_pattern = f'</{current_tag}>'
+        next_end = content.find(end_pattern, next_tag_start)
+        if next_end == -1:
+            break
+        chunks.append(content[next_tag_start:next_end + len(end_pattern)])
+        pos = next_end + len(end_pattern)
+    return chunks
+
+
+def test_chunking_invariance():
+    """Every chunk size yields the same tool calls in the same order."""
+    content, expected = build_response(50_000)
+    matcher = XmlTagMatcher.build(TAGS)
+    for chunk_size in (1, 2, 3, 7, 16, 64, 1024, len(content)):
+        parser = XmlToolCallStreamParser(matcher)
+        found = []
+        for piece in stream_chunks(content, chunk_size):
+            found.extend(parser.feed(piece))
+        assert found == expected, f"Mismatch with chunk_size={chunk_size}"
+        assert not parser.in_tool_call
+
+
+def test_nested_and_prefix_tags():
+    """Same-name nesting is tracked and a tag never matches a longer tag's prefix."""
+    matcher = XmlTagMatcher.build(["wait", "wait-sequence", "create-file"])
+    nested = '<create-file file_path="x.xml"><create-file>inner</create-file></create-file>'
+    content = f'text <wait-sequence count="2" />mid {nested} <waiter>no</waiter><wait>ok</wait>'
+    parser = XmlToolCallStreamParser(matcher)
+    found = []
+    for piece in stream_chunks(content, 5):
+        found.extend(parser.feed(piece))
+    assert found == ['<wait-sequence count="2" />', nested, '<wait>ok</wait>']
+
+
+def test_unterminated_call_is_held():
+    """A call without its closing tag is not emitted until the tag arrives."""
+    parser = XmlToolCallStreamParser(XmlTagMatcher.build(["ask"]))
+    assert parser.feed("Question: <ask>Are you") == []
+    assert parser.in_tool_call
+    assert parser.feed(" sure?</as") == []
+    assert parser.feed("k> done") == ["<ask>Are you sure?</ask>"]
+    assert not parser.in_tool_call
+
+
+def build_large_call(target_size: int) -> str:
+    """One create-file call of roughly target_size characters, e.g. a big generated file."""
+    line = 'html += "<div class=\'row\'><ask>" + str(i) + "</ask></div>"\n'
+    return f'<create-file file_path="big.py">\n{line * (target_size // len(line))}</create-file>'
+
+
+def test_large_tool_call_is_linear():
+    """A 4 MB tool call fed in small chunks never rebuilds the whole call per chunk."""
+    content = build_large_call(4_000_000)
+    parser = XmlToolCallStreamParser(XmlTagMatcher.build(TAGS))
+    found = []
+    max_buffer = 0
+    start = time.perf_counter()
+    for piece in stream_chunks(content, 8):
+        found.extend(parser.feed(piece))
+        max_buffer = max(max_buffer, len(parser._buffer))
+    elapsed = time.perf_counter() - start
+
+    assert found == [content]
+    # Only the look-behind window plus the newest chunk stays in the buffer
+    assert max_buffer <= len("create-file") + 3 + 8
+    assert elapsed < 20  # Quadratic appends took minutes here
+
+
+def run_benchmark(sizes=(1_000_000, 4_000_000), chunk_size: int = 8, baseline_size: int = 100_000):
+    """Feed multi-megabyte responses in small chunks and report throughput."""
+    matcher = XmlTagMatcher.build(TAGS)
+    print(f"\n📊 Incremental parser, {len(TAGS)} registered tags, {chunk_size}-char chunks")
+    for size in sizes:
+        content, expected = build_response(size)
+        parser = XmlToolCallStreamParser(matcher)
+        found = 0
+        start = time.perf_counter()
+        for piece in stream_chunks(content, chunk_size):
+            found += len(parser.feed(piece))
+        elapsed = time.perf_counter() - start
+        mb = len(content) / 1_000_000
+        print(f"   {mb:5.1f} MB: {elapsed:6.2f}s ({mb / elapsed:6.2f} MB/s), {found} tool calls")
+        assert found == len(expected)
+
+    for size in sizes:
+        content = build_large_call(size)
+        parser = XmlToolCallStreamParser(matcher)
+        start = time.perf_counter()
+        found = [chunk for piece in stream_chunks(content, chunk_size) for chunk in parser.feed(piece)]
+        elapsed = time.perf_counter() - start
+        mb = len(content) / 1_000_000
+        print(f"   {mb:5.1f} MB in one tool call: {elapsed:6.2f}s ({mb / elapsed:6.2f} MB/s)")
+        assert found == [content]
+
+    # The old approach re-scanned the whole accumulated buffer on every delta
+    content, _ = build_response(baseline_size)
+    buffer = ""
+    start = time.perf_counter()
+    for piece in stream_chunks(content, chunk_size):
+        buffer += piece
+        for chunk in legacy_extract(buffer, TAGS):
+            buffer = buffer.replace(chunk, "", 1)
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 Legacy rescan baseline on {baseline_size / 1_000_000:.1f} MB: {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    test_chunking_invariance()
+    test_nested_and_prefix_tags()
+    test_unterminated_call_is_held()
+    test_large_tool_call_is_linear()
+    print("✅ Parser correctness checks passed")
+    run_benchmark()
@@ -1,4 +1,6 @@
+from collections import OrderedDict
 from datetime import datetime, timezone
+import time
 from typing import Dict, Optional, Tuple
 from utils.logger import logger
 from utils.config import config, EnvMode
@@ -10,8 +12,24 @@ SUBSCRIPTION_TIERS = {
     'price_1RGJ9JG6l1KZGqIrVUU4ZRv6': {'name': 'extra', 'minutes': 2400}
 }
 
+SUBSCRIPTION_CACHE_TTL = 60      # Seconds a subscription lookup is reused
+SUBSCRIPTION_CACHE_SIZE = 1024   # Accounts whose subscription is kept
+BILLING_CHECK_INTERVAL = 60      # Seconds between billing checks during a run
+
+# account_id -> (expires_at, subscription)
+_subscription_cache: "OrderedDict[str, Tuple[float, Optional[Dict]]]" = OrderedDict()
+
 async def get_account_subscription(client, account_id: str) -> Optional[Dict]:
-    """Get the current subscription for an account."""
+    """Get the current subscription for an account.
+
+    Lookups are cached for SUBSCRIPTION_CACHE_TTL seconds, so a subscription
+    change takes up to that long to be seen by billing checks.
+    """
+    cached = _subscription_cache.get(account_id)
+    if cached and cached[0] > time.monotonic():
+        _subscription_cache.move_to_end(account_id)
+        return cached[1]
+
     result = await client.schema('basejump').from_('billing_subscriptions') \
         .select('*') \
         .eq('account_id', account_id) \
@@ -20,12 +38,43 @@ async def get_account_subscription(client, account_id: str) -> Optional[Dict]:
         .limit(1) \
         .execute()
     
-    if result.data and len(result.data) > 0:
-        return result.data[0]
-    return None
+    subscription = result.data[0] if result.data and len(result.data) > 0 else None
+    _subscription_cache[account_id] = (time.monotonic() + SUBSCRIPTION_CACHE_TTL, subscription)
+    _subscription_cache.move_to_end(account_id)
+    while len(_subscription_cache) > SUBSCRIPTION_CACHE_SIZE:
+        _subscription_cache.popitem(last=False)
+    return subscription
 
 async def calculate_monthly_usage(client, account_id: str) -> float:
-    """Calculate total agent run minutes for the current month for an account."""
+    """Get total agent run minutes for the current month for an account.
+
+    Reads the account_monthly_usage counter, which the database updates when
+    a run completes, plus the time so far of the account's runs still in
+    progress, in one get_account_monthly_usage call. Falls back to summing the
+    month's agent runs if it cannot be called.
+
+    Args:
+        client: Supabase client
+        account_id: The account to check
+
+    Returns:
+        Minutes used this month
+    """
+    now = datetime.now(timezone.utc)
+    start_of_month = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+    try:
+        result = await client.rpc('get_account_monthly_usage', {
+            'p_account_id': account_id,
+            'p_month': start_of_month.date().isoformat(),
+        }).execute()
+    except Exception as e:
+        logger.warning(f"Failed to read monthly usage counter for {account_id}, summing agent runs: {str(e)}")
+        return await calculate_monthly_usage_from_runs(client, account_id)
+
+    return float(result.data or 0) / 60  # Convert to minutes
+
+async def calculate_monthly_usage_from_runs(client, account_id: str) -> float:
+    """Calculate total agent run minutes for the current month from the account's agent runs."""
     # Get start of current month in UTC
     now = datetime.now(timezone.utc)
     start_of_month = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
@@ -111,6 +160,23 @@ async def check_billing_status(client, account_id: str) -> Tuple[bool, str, Opti
     
     return True, "OK", subscription
 
+class RunBillingCheck:
+    """Billing check for a run in progress, repeated at most every BILLING_CHECK_INTERVAL seconds."""
+
+    def __init__(self, client, account_id: str, interval: float = BILLING_CHECK_INTERVAL):
+        self.client = client
+        self.account_id = account_id
+        self.interval = interval
+        self._checked_at: Optional[float] = None
+        self._result: Optional[Tuple[bool, str, Optional[Dict]]] = None
+
+    async def check(self) -> Tuple[bool, str, Optional[Dict]]:
+        """Check billing on the first call and once the interval has passed, otherwise reuse the last result."""
+        if self._result is None or time.monotonic() - self._checked_at >= self.interval:
+            self._result = await check_billing_status(self.client, self.account_id)
+            self._checked_at = time.monotonic()
+        return self._result
+
 # Helper function to get account ID from thread
 async def get_account_id_from_thread(client, thread_id: str) -> Optional[str]:
     """Get the account ID associated with a thread."""
@@ -53,6 +53,13 @@ class Configuration:
     
     # Model configuration
     MODEL_TO_USE: str = "anthropic/claude-3-7-sonnet-latest"
+    # Token budgets for the messages sent per model, as JSON of model name or prefix to tokens,
+    # e.g. {"anthropic/": 80000, "gpt-4o": 48000}; unlisted models use the built-in budgets
+    CONTEXT_TOKEN_BUDGETS: Optional[str] = None
+    # Tool outputs above this many tokens have their middle elided in the context window
+    CONTEXT_MAX_TOOL_OUTPUT_TOKENS: int = 4000
+    # Tool calls allowed per LLM response when a run opts into parallel tool calls
+    AGENT_MAX_PARALLEL_TOOL_CALLS: int = 5
     
     # Supabase configuration
     SUPABASE_URL: Optional[str] = None
@@ -64,12 +71,31 @@ class Configuration:
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: Optional[str] = None
     REDIS_SSL: bool = True
+    # Mirror per-thread LLM message caches to Redis so other instances start warm
+    THREAD_MESSAGE_CACHE_REDIS: bool = False
+    # Cache results of idempotent tools (search, crawl, data providers), optionally shared through Redis
+    TOOL_RESULT_CACHE_ENABLED: bool = True
+    TOOL_RESULT_CACHE_REDIS: bool = True
+    
+    # Archive each finished agent run's response stream (gzip JSON lines) to Supabase storage
+    AGENT_RUN_ARCHIVE_ENABLED: bool = False
+    AGENT_RUN_ARCHIVE_BUCKET: str = "agent_run_archives"
+    
+    # Streamed assistant chunks are merged for this long (or up to this size) before being written to Redis
+    STREAM_CHUNK_WINDOW_MS: int = 30
+    STREAM_CHUNK_MAX_BYTES: int = 512
     
     # Daytona sandbox configuration
     DAYTONA_API_KEY: Optional[str] = None
     DAYTONA_SERVER_URL: Optional[str] = None
     DAYTONA_TARGET: Optional[str] = None
     
+    # Docker sandbox configuration
+    SANDBOX_EXECUTOR_WORKERS: int = 32        # Threads for blocking docker SDK calls
+    SANDBOX_MAX_CONCURRENT_EXECS: int = 4     # Concurrent commands per sandbox
+    SANDBOX_POOL_SIZE: int = 0                # Pre-warmed containers per worker (0 disables the pool)
+    SANDBOX_POOL_MAX_IDLE_SECONDS: int = 1800 # Unclaimed containers are removed after this long
+    
     # Search and other API keys
     TAVILY_API_KEY: Optional[str] = None
     RAPID_API_KEY: Optional[str] = None
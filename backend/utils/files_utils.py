@@ -20,7 +20,8 @@ EXCLUDED_DIRS = {
     ".next",
     "dist",
     "build",
-    ".git"
+    ".git",
+    ".browser_screenshots"  # Stored browser screenshots (sandbox/screenshots.py)
 }
 
 # File extensions to exclude from operations
@@ -1,10 +1,11 @@
-import React, { useMemo } from "react";
+import React, { useEffect, useMemo, useState } from "react";
 import { Globe, MonitorPlay, ExternalLink, CheckCircle, AlertTriangle, CircleDashed } from "lucide-react";
 import { ToolViewProps } from "./types";
 import { extractBrowserUrl, extractBrowserOperation, formatTimestamp, getToolTitle } from "./utils";
 import { ApiMessageType } from '@/components/thread/types';
 import { safeJsonParse } from '@/components/thread/utils';
 import { cn } from "@/lib/utils";
+import { getSandboxFileContent } from "@/lib/api";
 
 export function BrowserToolView({ 
   name = "browser-operation",
@@ -52,6 +53,7 @@ export function BrowserToolView({
 
   // Find the browser_state message and extract the screenshot
   let screenshotBase64: string | null = null;
+  let screenshotPath: string | null = null;
   if (browserStateMessageId && messages.length > 0) {
     const browserStateMessage = messages.find(msg => 
         (msg.type as string) === 'browser_state' && 
@@ -59,10 +61,37 @@ export function BrowserToolView({
     );
     
     if (browserStateMessage) {
-        const browserStateContent = safeJsonParse<{ screenshot_base64?: string }>(browserStateMessage.content, {});
+        const browserStateContent = safeJsonParse<{ screenshot_base64?: string; screenshot_path?: string }>(browserStateMessage.content, {});
         screenshotBase64 = browserStateContent?.screenshot_base64 || null;
+        screenshotPath = browserStateContent?.screenshot_path || null;
     }
   }
+
+  // Newer browser_state messages reference a screenshot stored in the sandbox workspace
+  const sandboxId = project?.sandbox?.id;
+  const [storedScreenshotUrl, setStoredScreenshotUrl] = useState<string | null>(null);
+  useEffect(() => {
+    if (screenshotBase64 || !screenshotPath || !sandboxId) {
+      setStoredScreenshotUrl(null);
+      return;
+    }
+    let objectUrl: string | null = null;
+    let cancelled = false;
+    getSandboxFileContent(sandboxId, screenshotPath)
+      .then(content => {
+        if (cancelled) return;
+        const blob = content instanceof Blob ? content : new Blob([content], { type: "image/jpeg" });
+        objectUrl = URL.createObjectURL(blob);
+        setStoredScreenshotUrl(objectUrl);
+      })
+      .catch(error => console.error("[BrowserToolView] Error loading stored screenshot:", error));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [screenshotBase64, screenshotPath, sandboxId]);
+
+  const screenshotSrc = screenshotBase64 ? `data:image/jpeg;base64,${screenshotBase64}` : storedScreenshotUrl;
   
   // Check if we have a VNC preview URL from the project
   const vncPreviewUrl = project?.sandbox?.vnc_preview ? 
@@ -110,10 +139,10 @@ export function BrowserToolView({
               isRunning && vncIframe ? (
                 // Use the memoized iframe for live preview
                 vncIframe
-              ) : screenshotBase64 ? (
+              ) : screenshotSrc ? (
                 <div className="flex items-center justify-center w-full h-full max-h-[650px] overflow-auto">
                   <img 
-                    src={`data:image/jpeg;base64,${screenshotBase64}`} 
+                    src={screenshotSrc} 
                     alt="Browser Screenshot"
                     className="max-w-full max-h-full object-contain"
                   />
@@ -139,10 +168,10 @@ export function BrowserToolView({
               )
             ) : (
               // For non-last tool calls, only show screenshot if available, otherwise show "No Browser State image found"
-              screenshotBase64 ? (
+              screenshotSrc ? (
                 <div className="flex items-center justify-center w-full h-full max-h-[650px] overflow-auto">
                   <img 
-                    src={`data:image/jpeg;base64,${screenshotBase64}`} 
+                    src={screenshotSrc} 
                     alt="Browser Screenshot"
                     className="max-w-full max-h-full object-contain"
                   />
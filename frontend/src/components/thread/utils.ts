@@ -9,10 +9,14 @@ import {
 export const SHOULD_RENDER_TOOL_RESULTS = false;
 
 // Helper function to safely parse JSON strings from content/metadata
-export function safeJsonParse<T>(jsonString: string | undefined | null, fallback: T): T {
+// Values that are already parsed (e.g. metadata of write-behind status messages) are returned as is
+export function safeJsonParse<T>(jsonString: string | object | undefined | null, fallback: T): T {
   if (!jsonString) {
     return fallback;
   }
+  if (typeof jsonString !== 'string') {
+    return jsonString as T;
+  }
   try {
     return JSON.parse(jsonString);
   } catch (e) {